@@ -0,0 +1,6655 @@
+#!/usr/bin/env python3
+# pyonetrue 0.7.1 fresh 1 options=2f5e14132af98062 body=86af40424556d936
+# pyonetrue input ccb890206696de52 3307 ../src/pyonetrue/__init__.py
+# pyonetrue input db2a1b6913f1bb79 5572 ../src/pyonetrue/analyze_names.py
+# pyonetrue input 6cd980f32c6cb78d 6761 ../src/pyonetrue/archives.py
+# pyonetrue input 2e0cc266a14efeb9 4255 ../src/pyonetrue/bytecode.py
+# pyonetrue input 67e46feaa9c1df8e 2631 ../src/pyonetrue/cache.py
+# pyonetrue input 60cb625d83d5f5fb 33253 ../src/pyonetrue/cli.py
+# pyonetrue input b6b795c28b674dde 1096 ../src/pyonetrue/depfile.py
+# pyonetrue input 485cff4cd4b82d28 7227 ../src/pyonetrue/entry_points.py
+# pyonetrue input b3ff0a50f805a9f5 2762 ../src/pyonetrue/exceptions.py
+# pyonetrue input 078d0e723982e63e 4291 ../src/pyonetrue/extract_ast.py
+# pyonetrue input c82198c8f9a45852 43777 ../src/pyonetrue/flattening.py
+# pyonetrue input 2395a465a3ae4cee 6437 ../src/pyonetrue/freshness.py
+# pyonetrue input af02bd609da91d36 2915 ../src/pyonetrue/git_index.py
+# pyonetrue input 1812af250f532579 8540 ../src/pyonetrue/lazy_sections.py
+# pyonetrue input f16a4b61f1641902 3567 ../src/pyonetrue/minify.py
+# pyonetrue input 2d965a79b88f0226 13889 ../src/pyonetrue/normalize_imports.py
+# pyonetrue input a54d3eeebfd90bd8 11652 ../src/pyonetrue/pgo.py
+# pyonetrue input 9bb196b8d053b94f 2318 ../src/pyonetrue/prefetch.py
+# pyonetrue input b2a325c48d5241c1 7947 ../src/pyonetrue/profile_startup.py
+# pyonetrue input ce97da3950ff46dc 3756 ../src/pyonetrue/pyz.py
+# pyonetrue input f9ed23d576443c14 8270 ../src/pyonetrue/remote_cache.py
+# pyonetrue input eaf4c754dcf53480 7648 ../src/pyonetrue/reorder.py
+# pyonetrue input 84e124e35eaa5a79 6474 ../src/pyonetrue/schedule.py
+# pyonetrue input a46f790e48cdc082 4575 ../src/pyonetrue/sfx.py
+# pyonetrue input 33324aa700dbe1ec 2757 ../src/pyonetrue/spill.py
+# pyonetrue input 4967207996342c44 4822 ../src/pyonetrue/type_hints.py
+# pyonetrue input e3b0c44298fc1c14 0 ../src/pyonetrue/vendor/__init__.py
+# pyonetrue input a7cf0bb1ee781b5a 20010 ../src/pyonetrue/vendor/docopt.py
+# pyonetrue input 21637572fa907330 42347 ../src/pyonetrue/vendor/pathlib.py
+# pyonetrue tree 2cea0f3746353881 ../src/pyonetrue
+"""
+pyonetrue: Flatten Python packages into a well-ordered single module.
+
+Provides CLI entry point and core flattening functionality under the pyonetrue namespace.
+
+Submodules are imported on first use of one of their names (PEP 562), so
+that importing the package, e.g. to run the CLI, only pays for what is used.
+"""
+
+import ast
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from errno import EEXIST, EINVAL, ENOENT
+import functools
+from functools import lru_cache
+import importlib.util
+from importlib.util import decode_source
+from itertools import groupby
+import json
+import marshal
+import os
+import re
+import subprocess
+import sys
+import time
+import types
+from types import ModuleType
+from typing import (
+    Callable,
+    IO,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+import base64
+import bisect
+import fnmatch
+import hashlib
+import io
+import lzma
+import ntpath
+from operator import attrgetter, itemgetter
+import posixpath
+import py_compile
+from stat import S_ISBLK, S_ISCHR, S_ISDIR, S_ISFIFO, S_ISLNK, S_ISREG, S_ISSOCK
+import tempfile
+import tokenize
+import zipfile
+import zlib
+
+
+_LAZY_NAMES = {
+# cli
+    "__version__": "cli",
+    "main": "cli",
+# bytecode
+    "write_pyc": "bytecode",
+    "write_launcher": "bytecode",
+# git_index
+    "git_tracked_files": "git_index",
+    "blob_spans": "git_index",
+# pgo
+    "record_profile": "pgo",
+    "load_profile": "pgo",
+# prefetch
+    "prefetch_files": "prefetch",
+# reorder
+    "canonical_text": "reorder",
+    "reorder_files": "reorder",
+# remote_cache
+    "remote_get": "remote_cache",
+    "remote_put": "remote_cache",
+    "serve_remote_cache": "remote_cache",
+# schedule
+    "plan_batches": "schedule",
+    "schedule_tasks": "schedule",
+# spill
+    "SpilledSpan": "spill",
+    "parse_memory_size": "spill",
+# pyz
+    "write_pyz": "pyz",
+# sfx
+    "write_sfx": "sfx",
+    "sfx_text": "sfx",
+# extract_ast
+    "extract_spans": "extract_ast",
+    "Span": "extract_ast",
+# flattening
+    "FlatteningContext": "flattening",
+    "FlatteningModule": "flattening",
+    "normalize_a_module_name": "flattening",
+    "normalize_module_names": "flattening",
+# lazy_sections
+    "plan_lazy_sections": "lazy_sections",
+    "render_lazy_sections": "lazy_sections",
+# minify
+    "minify_source": "minify",
+    "strip_docstrings_and_asserts": "minify",
+# normailize_imports :
+    "normalize_imports": "normalize_imports",
+    "format_plain_import": "normalize_imports",
+    "format_from_import": "normalize_imports",
+    "is_stdlib_module": "normalize_imports",
+    "set_line_length": "normalize_imports",
+    "get_line_length": "normalize_imports",
+    "ImportEntry": "normalize_imports",
+# type_hints
+    "strip_annotations": "type_hints",
+# exceptions
+    "PyonetrueError": "exceptions",
+    "CLIOptionError": "exceptions",
+    "DuplicateNameError": "exceptions",
+    "ImportNormalizationError": "exceptions",
+    "IncludeExcludeError": "exceptions",
+    "FlatteningError": "exceptions",
+    "ModuleInferenceError": "exceptions",
+    "PathError": "exceptions",
+}
+
+__all__ = list(_LAZY_NAMES)
+
+def __getattr__(name):
+    """Import the submodule defining ``name`` and return it."""
+    submodule = _LAZY_NAMES.get(name)
+    if submodule is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+    value = getattr(import_module(f"{__name__}.{submodule}"), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
+class LazyPackage(ModuleType):
+    """Keeps public names bound when a submodule of the same name is imported.
+
+    Importing ``pyonetrue.normalize_imports`` binds the submodule as an
+    attribute of the package, hiding the function ``normalize_imports``.
+    """
+    def __setattr__(self, name, value):
+        if isinstance(value, ModuleType) and _LAZY_NAMES.get(name) == name:
+            value = getattr(value, name)
+        super().__setattr__(name, value)
+
+sys.modules[__name__].__class__ = LazyPackage
+
+"""Find the global names referenced by top-level code spans."""
+
+def referenced_names(spans: Iterable["Span"]) -> Set[str]:
+    """Collect every name the given spans may read.
+
+    A name counts as referenced when it is loaded or deleted anywhere in a
+    span, including inside functions and classes, when it appears in a
+    string annotation, or when it is listed in ``__all__``.
+
+    Args:
+        spans (Iterable[Span]): Spans to scan.
+
+    Returns:
+        Set[str]: Referenced names.
+
+    Examples:
+        >>> sorted(referenced_names([Span('x = os.sep\n', 'logic')]))
+        ['os']
+    """
+    names = set()
+    for span in spans:
+        if not span.text.strip():
+            continue
+        collect_referenced_names(ast.parse(span.text), names)
+    return names
+
+def collect_referenced_names(tree: ast.AST, names: Set[str]) -> None:
+    """Add the names referenced within ``tree`` to ``names``."""
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            if not isinstance(node.ctx, ast.Store):
+                names.add(node.id)
+        elif isinstance(node, ast.AugAssign):
+            # `x += 1` reads x as well as storing it
+            if isinstance(node.target, ast.Name):
+                names.add(node.target.id)
+        if isinstance(node, (ast.Assign, ast.AugAssign, ast.AnnAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            if any(isinstance(t, ast.Name) and t.id == '__all__' for t in targets):
+                names.update(string_constants(node.value))
+        for annotation in annotations_of(node):
+            if isinstance(annotation, ast.Constant) and isinstance(annotation.value, str):
+                try:
+                    collect_referenced_names(ast.parse(annotation.value, mode='eval'), names)
+                except SyntaxError:
+                    pass
+
+def annotations_of(node: ast.AST) -> list:
+    """Return the annotation expressions directly attached to ``node``."""
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        return [node.returns] if node.returns else []
+    if isinstance(node, (ast.arg, ast.AnnAssign)):
+        return [node.annotation] if node.annotation else []
+    return []
+
+def string_constants(node: ast.AST) -> list:
+    """Return the str constants within ``node``, e.g. the entries of ``__all__``."""
+    if node is None:
+        return []
+    return [ n.value for n in ast.walk(node)
+             if isinstance(n, ast.Constant) and isinstance(n.value, str) ]
+
+IDEMPOTENT_NODES = (
+    ast.Module, ast.Expr, ast.Pass, ast.Import, ast.ImportFrom, ast.alias,
+    ast.Try, ast.ExceptHandler, ast.If, ast.Assign, ast.AnnAssign,
+    ast.Name, ast.Attribute, ast.Constant, ast.Tuple, ast.Starred,
+    ast.BoolOp, ast.IfExp,
+    ast.expr_context, ast.operator, ast.unaryop, ast.boolop, ast.cmpop,
+)
+
+CONSTANT_OPERATOR_NODES = (ast.BinOp, ast.UnaryOp, ast.Compare)
+
+def is_idempotent_binding(tree: ast.AST) -> bool:
+    """True when running ``tree`` again binds the same names to the same values.
+
+    Only imports, assignments of immutable expressions and the ``try``
+    and ``if`` statements around them qualify.
+
+    Examples:
+        >>> is_idempotent_binding(ast.parse("try:\\n    import a\\nexcept ImportError:\\n    a = None\\n"))
+        True
+        >>> is_idempotent_binding(ast.parse("REGISTRY = {}\\n"))
+        False
+        >>> is_idempotent_binding(ast.parse("SIZE = 4 * 1024\\n"))
+        True
+        >>> is_idempotent_binding(ast.parse("ITEMS = BASE + BASE\\n"))
+        False
+    """
+    for node in ast.walk(tree):
+        if isinstance(node, CONSTANT_OPERATOR_NODES):
+            if not all(isinstance(n, (ast.Constant, *CONSTANT_OPERATOR_NODES, ast.expr_context, ast.operator,
+                                      ast.unaryop, ast.cmpop)) for n in ast.walk(node)):
+                return False
+        elif not isinstance(node, IDEMPOTENT_NODES):
+            return False
+    return True
+
+def bound_names(tree: ast.AST) -> Set[str]:
+    """Collect the global names ``tree`` may bind when it runs.
+
+    Covers assignment targets, imports, definitions and the names functions
+    declare ``global``.
+
+    Examples:
+        >>> sorted(bound_names(ast.parse("import a.b\\nx, y = 1, 2\\ndef f():\\n    global z\\n")))
+        ['a', 'f', 'x', 'y', 'z']
+    """
+    names = set()
+    todo = [tree]
+    while todo:
+        node = todo.pop()
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+            # Nested scopes only bind globals they declare
+            names.update(name for n in ast.walk(node) if isinstance(n, ast.Global) for name in n.names)
+            todo.extend(node.decorator_list)
+            continue
+        if isinstance(node, ast.Lambda):
+            continue
+        if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            names.add(node.id)
+        elif isinstance(node, ast.alias):
+            names.add(node.asname or node.name.split(".", 1)[0])
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+        todo.extend(ast.iter_child_nodes(node))
+    return names
+
+"""Read the Python sources of a package from a wheel, sdist or zip archive.
+
+Members are enumerated and read with ``zipfile`` or ``tarfile``, nothing is
+extracted to disk.  The package is the top-most directory holding an
+``__init__.py``, e.g. ``pkg/`` in a wheel or ``pkg-1.0/src/pkg/`` in an
+sdist.  Archives holding several packages use the one named after the
+distribution, an archive holding a single top-level module, e.g. the
+``docopt`` wheel, flattens as that file would.
+
+``read_tar_stream_package()`` reads a tar stream, e.g. stdin, parsing each
+member as it arrives.
+"""
+
+ARCHIVE_SUFFIXES = (".whl", ".zip", ".tar.gz", ".tgz", ".tar")
+
+def is_archive(path) -> bool:
+    """True when ``path`` names a supported archive, by its suffix."""
+    return str(path).lower().endswith(ARCHIVE_SUFFIXES)
+
+def read_archive_members(path) -> dict[str, bytes]:
+    """Return the ``.py`` members of the archive at ``path``, by member name."""
+    # Imported here, flattening checks is_archive() on every run
+    import tarfile
+    import zipfile
+    try:
+        if zipfile.is_zipfile(str(path)):
+            with zipfile.ZipFile(str(path)) as archive:
+                return { info.filename: archive.read(info) for info in archive.infolist()
+                         if info.filename.endswith(".py") and not info.is_dir() }
+        with tarfile.open(str(path), "r:*") as archive:
+            return dict(iter_tar_members(archive))
+    except (OSError, zipfile.BadZipFile, tarfile.TarError) as e:
+        raise PathError(f"cannot read archive '{path}': {e}")
+
+def iter_tar_members(archive: "tarfile.TarFile") -> Iterator[Tuple[str, bytes]]:
+    """Yield ``(name, content)`` of the ``.py`` files of ``archive`` as they are read.
+
+    Works on a stream, e.g. ``tarfile.open(fileobj=..., mode="r|*")``.
+    """
+    for member in archive:
+        if member.isfile() and member.name.endswith(".py"):
+            name = member.name[2:] if member.name.startswith("./") else member.name
+            yield name, archive.extractfile(member).read()
+
+def archive_package(members: dict[str, bytes], archive_name: str) -> Tuple[str, dict[str, str]]:
+    """Locate the package within archive ``members``.
+
+    Args:
+        members (dict[str, bytes]): ``.py`` members by name, see read_archive_members().
+        archive_name (str): File name of the archive, e.g. ``pkg-1.0-py3-none-any.whl``,
+            its distribution name picks among several packages.
+
+    Returns:
+        tuple: ``(package_name, sources)``, sources maps each module's path
+        relative to the package, e.g. ``sub/mod.py``, to its decoded source.
+
+    Examples:
+        >>> archive_package({"pkg-1.0/src/pkg/__init__.py": b"", "pkg-1.0/setup.py": b""}, "pkg-1.0.tar.gz")
+        ('pkg', {'__init__.py': ''})
+    """
+    package_name, relpaths = archive_package_members(members, archive_name)
+    return package_name, { relpath: decode_source(members[name]) for name, relpath in relpaths.items() }
+
+def archive_package_members(names, archive_name: str) -> Tuple[str, dict[str, str]]:
+    """Return the package name and the path of each of its members within it, by member name."""
+    packages = { posixpath.dirname(name) for name in names
+                 if posixpath.basename(name) == "__init__.py" }
+    roots = sorted(d for d in packages if d and posixpath.dirname(d) not in packages)
+    if len(roots) > 1:
+        distribution = archive_name.split("-", 1)[0].lower().replace(".", "_")
+        roots = [ d for d in roots if posixpath.basename(d).lower() == distribution ] or roots
+    if len(roots) == 1:
+        prefix = roots[0] + "/"
+        return posixpath.basename(roots[0]), { name: name[len(prefix):] for name in names
+                                               if name.startswith(prefix) }
+    if roots:
+        raise ModuleInferenceError(f"archive '{archive_name}' holds several packages: {', '.join(roots)}")
+
+    modules = [ name for name in names if "/" not in name and name != "setup.py" ]
+    if len(modules) != 1:
+        raise ModuleInferenceError(f"cannot infer the package of archive '{archive_name}'")
+    return modules[0][:-len(".py")], { modules[0]: modules[0] }
+
+def read_archive_package(path) -> Tuple[str, dict[str, str]]:
+    """Read the package of the archive at ``path``, see archive_package()."""
+    return archive_package(read_archive_members(path), posixpath.basename(str(path)))
+
+def read_tar_stream_package(stream: IO[bytes], archive_name: str = "-") -> Tuple[str, dict[str, str], dict[str, list]]:
+    """Read the package of an uncompressed or gzip tar ``stream``, in memory.
+
+    Each member is parsed as soon as it has been read, while a thread
+    reads the next one.  A member which does not parse is left for
+    flattening to report, should it belong to the package.
+
+    Returns:
+        tuple: ``(package_name, sources, spans)``, sources and their spans
+        by path within the package, see archive_package().
+    """
+    pass
+
+    def parse(name, content):
+        text = decode_source(content)
+        try:
+            return text, extract_spans(text, name)
+        except SyntaxError:
+            return text, None
+
+    parsed = read_tar_stream(stream, parse)
+    package_name, relpaths = archive_package_members(parsed, archive_name)
+    sources = { relpath: parsed[name][0] for name, relpath in relpaths.items() }
+    spans = { relpath: parsed[name][1] for name, relpath in relpaths.items() if parsed[name][1] is not None }
+    return package_name, sources, spans
+
+def read_tar_stream(stream: IO[bytes], parse: Callable[[str, bytes], object]) -> dict[str, object]:
+    """Return ``parse(name, content)`` of each ``.py`` member of tar ``stream``, by name.
+
+    A thread reads the stream, the members are parsed as they arrive.
+    """
+    import queue
+    import tarfile
+    import threading
+
+    arrived = queue.Queue(maxsize=64)
+
+    def read():
+        try:
+            with tarfile.open(fileobj=stream, mode="r|*") as archive:
+                for member in iter_tar_members(archive):
+                    arrived.put(member)
+        except (OSError, EOFError, tarfile.TarError) as e:
+            arrived.put(e)
+        else:
+            arrived.put(None)
+
+    threading.Thread(target=read, name="pyonetrue-tar-reader", daemon=True).start()
+    results = {}
+    while True:
+        member = arrived.get()
+        if member is None:
+            return results
+        if isinstance(member, Exception):
+            raise PathError(f"cannot read tar stream: {member}")
+        name, content = member
+        results[name] = parse(name, content)
+
+"""Compile a flattened module to bytecode at build time.
+
+``write_pyc()`` writes the ``__pycache__`` entry the import system looks for
+next to the flattened module, using hash-based invalidation (PEP 552) so the
+file stays valid when copied, e.g. into a container image, where timestamps
+change and ``__pycache__`` may not be writable.
+
+A script run as ``python tool.py`` never uses ``__pycache__``.
+``write_launcher()`` writes a small script that loads the marshalled code
+object from the ``.pyc`` instead and falls back to compiling the source when
+the ``.pyc`` is missing, stale or was built for another Python version.
+"""
+
+try :
+    from pathlib import Path
+except ImportError:
+    pass
+
+PYC_INVALIDATION = {
+    "checked": py_compile.PycInvalidationMode.CHECKED_HASH,
+    "unchecked": py_compile.PycInvalidationMode.UNCHECKED_HASH,
+}
+
+LAUNCHER_TEMPLATE = '''{shebang}
+"""Launcher for {source}, runs its precompiled bytecode."""
+
+def _pyonetrue_run():
+    # Imported and bound here, the program runs in this module's namespace
+    import importlib.util, marshal, os
+    here = os.path.dirname(os.path.realpath(__file__))
+    source = os.path.join(here, {source!r})
+    pyc = os.path.join(here, {pyc!r})
+    code = None
+    try:
+        with open(pyc, "rb") as f:
+            data = f.read()
+        flags = int.from_bytes(data[4:8], "little")
+        if data[:4] == importlib.util.MAGIC_NUMBER and flags & 0b1:
+            if flags & 0b10:  # checked, validate against the source
+                with open(source, "rb") as f:
+                    if importlib.util.source_hash(f.read()) != data[8:16]:
+                        raise ValueError("stale")
+            code = marshal.loads(memoryview(data)[16:])
+    except (OSError, ValueError, EOFError, TypeError):
+        pass
+    if code is None:
+        with open(source, "rb") as f:
+            code = compile(f.read(), source, "exec", dont_inherit=True)
+    namespace = globals()
+    del namespace["_pyonetrue_run"]
+    namespace["__file__"] = source
+    namespace["__doc__"] = None
+    exec(code, namespace)
+
+_pyonetrue_run()
+'''
+
+def write_pyc(source_path: Path, invalidation: str = "checked") -> Path:
+    """Compile ``source_path`` into the ``__pycache__`` entry the import system uses.
+
+    Args:
+        source_path (Path): Flattened module, already written.
+        invalidation (str): ``checked`` validates the pyc against the hash of
+            the source on every import, ``unchecked`` trusts it.
+
+    Returns:
+        Path: The written ``.pyc``.
+    """
+    if invalidation not in PYC_INVALIDATION:
+        raise ValueError(f"unknown pyc invalidation '{invalidation}', use one of: {', '.join(PYC_INVALIDATION)}")
+    source_path = Path(source_path)
+    if not source_path.is_file():
+        raise PathError(f"cannot compile '{source_path}', it is not a file")
+    cfile = importlib.util.cache_from_source(str(source_path))
+    py_compile.compile(str(source_path), cfile=cfile, doraise=True,
+                       invalidation_mode=PYC_INVALIDATION[invalidation])
+    return Path(cfile)
+
+def write_launcher(launcher_path: Path, source_path: Path, pyc_path: Path,
+                   shebang: str = "#!/usr/bin/env python3") -> Path:
+    """Write a script which runs the bytecode in ``pyc_path``.
+
+    The source and the pyc are located relative to the launcher, so the
+    three files can be moved together.
+
+    Args:
+        launcher_path (Path): Script to write, made executable.
+        source_path (Path): Flattened module, the fallback.
+        pyc_path (Path): Its compiled bytecode, see ``write_pyc()``.
+        shebang (str): First line of the launcher.
+
+    Returns:
+        Path: ``launcher_path``.
+    """
+    launcher_path = Path(launcher_path)
+    here = os.path.dirname(os.path.abspath(str(launcher_path)))
+    text = LAUNCHER_TEMPLATE.format(
+        shebang=(shebang or "#!/usr/bin/env python3").rstrip("\n"),
+        source=os.path.relpath(os.path.abspath(str(source_path)), here),
+        pyc=os.path.relpath(os.path.abspath(str(pyc_path)), here),
+    )
+    launcher_path.write_text(text)
+    os.chmod(str(launcher_path), 0o755)
+    return launcher_path
+
+"""Small on-disk cache shared by pyonetrue commands.
+
+Entries are JSON documents stored under ``<cache-dir>/<namespace>/<key>.json``.
+The cache directory is ``$PYONETRUE_CACHE_DIR`` when set, otherwise
+``$XDG_CACHE_HOME/pyonetrue`` or ``~/.cache/pyonetrue``.  A cache that cannot
+be read or written is treated as empty, never as an error.
+
+Given the URL of a remote cache, see remote_cache, a local miss is looked
+up remotely and a stored entry is shared.
+"""
+
+def cache_dir(namespace: str = "") -> Path:
+    """Return the cache directory, or one of its namespaces."""
+    root = os.environ.get("PYONETRUE_CACHE_DIR")
+    if not root:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        root = os.path.join(base, "pyonetrue")
+    return Path(root) / namespace if namespace else Path(root)
+
+def cache_key(*parts) -> str:
+    """Digest ``parts`` into a cache key, str parts are utf-8 encoded."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        digest.update(len(part).to_bytes(8, "little"))
+        digest.update(part)
+    return digest.hexdigest()
+
+def load_cached_json(namespace: str, key: str, remote: str = None):
+    """Return the cached document for ``key``, or None."""
+    try:
+        with open(cache_dir(namespace) / f"{key}.json", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        pass
+    if remote:
+        pass
+        data = remote_get(remote, namespace, key)
+        try:
+            document = json.loads(data) if data is not None else None
+        except ValueError:
+            return None
+        if document is not None:
+            store_cached_json(namespace, key, document)
+        return document
+    return None
+
+def store_cached_json(namespace: str, key: str, document, remote: str = None) -> None:
+    """Store ``document`` for ``key``.  The write is atomic, failures are ignored."""
+    if remote:
+        pass
+        remote_put(remote, namespace, key, json.dumps(document).encode("utf-8"))
+    directory = cache_dir(namespace)
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        temp = directory / f".{key}.{os.getpid()}.tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump(document, f)
+        os.replace(temp, directory / f"{key}.json")
+    except OSError:
+        pass
+
+USAGE=r"""
+Usage:
+  pyonetrue [options] <input>
+  pyonetrue [options] --input-tar <tar>
+  pyonetrue [options] (--in-place | --check) <file>...
+  pyonetrue profile-startup [options] <artifact> [--] [<argv>...]
+  pyonetrue pgo record [options] <artifact> [--] [<argv>...]
+  pyonetrue cache serve [options] <directory>
+  pyonetrue [options] --is-fresh <artifact>
+  pyonetrue (-h | --help)
+  pyonetrue --version
+
+Flatten Python package files into a well ordered, single module.
+
+<input> can be a python package name, a directory or a file:
+  package    The <package-root> via PYTHONPATH becomes the directory.
+  directory  All Python files under the directory will be flattened.
+  file       It will be ordered, fixes a poor ordering.
+  archive    A .whl, .zip, .tar.gz or .tgz holding the package, read without
+             extracting it.  The package is its top-most directory with an
+             __init__.py, e.g. <name>-<version>/src/<name> in an sdist.
+
+With --input-tar, the package is read from an uncompressed or gzip tar
+<tar>, `-` for stdin, entirely in memory.  Each module is parsed as it
+arrives.
+
+In all cases, the module is written to the specified output file or stdout.
+A `py` output file starts with comments recording its inputs: the digest
+of each file read, of the module names of the package directory and of
+the options changing the output.  With --is-fresh, those are checked,
+without parsing anything, against the options given with it, e.g.
+`pyonetrue -M --is-fresh out.py` for `pyonetrue -M -o out.py pkg`.  The
+exit status is 0 when <artifact> is current, 1 when it is stale.
+
+With --in-place, each <file> is put in canonical order, the order flattening
+it alone gives, keeping its main guards, shebang, header comments and
+relative imports, and rewritten if that changes it.  A file with comments
+between its top-level statements, which flattening drops, is reported and
+left as it is.  With --check, no file is written, the exit status is 1 if
+any <file> is not in canonical order.  Files are processed in parallel,
+those already found canonical and unchanged since are skipped without
+parsing.
+
+profile-startup runs a flattened <artifact> with <argv> under
+`python -X importtime` and reports the cost of each import it makes,
+attributed to the import line of the artifact and, with --source, to the
+original modules which carry the import.  Measurements are cached per
+interpreter and artifact content.
+
+pgo record runs a flattened <artifact> with <argv>, a typical workload, and
+records which of its functions, classes and logic spans run, in order, at
+startup or once its main guard is reached.  The JSON profile is written to
+the --output file or stdout.  A later build given `--pgo <profile>` puts
+the functions which ran first, binds the third-party modules only the
+others use lazily, and reports the profile's coverage on stderr.
+
+cache serve runs a reference remote cache server, storing its entries under
+<directory>, for builds given `--remote-cache http://<host>:<port>`.  It
+serves plain HTTP without authentication, bind it to a trusted network.
+
+A main guard is a block of code that is only executed when the module
+is run as a script. It is typically used to test the module or to
+provide a command-line interface. The main guard is usually
+written as:
+
+    if __name__ == '__main__':
+        # code to execute when the module is run as a script
+        pass
+
+<package>/__main__.py is a special module that is executed when the
+package is run as a script.  It is typically used to provide a command-line
+interface to the package.  If such a module is present, it will be included
+at the end of without reordering unless the --module-only option is used.  Other
+__main__.py modules are not included by default.  If you want to include
+one of them instead, you can use the --main-from option to specify the
+sub-package from which to include __main__.py.
+
+Default behavior is to :
+* All relative imports are eliminated. Flattened output is fully self-contained.
+* Main guards are discarded, but this can be changed with the --all-guards
+  or --guards-from options.
+* Write the output to stdout, but this can be changed with the --output
+* Name clashes, duplicate top-level names, are not allowed by default.
+* If `__main__.py` is being included, prepend shebang.
+
+Options:
+  -s, --shebang <shebang>  Prepend <shebang> if `__main__.py` is being appended.  [default: #!/usr/bin/env python3]
+  -o, --output <file>      Write output to file (default: stdout).
+  -M, --module-only        Build a pure module without an entry point, i.e. no
+                           __main__ guard, no __main__.py, no CLI.
+  --entry <entry>          Explicitly build for the given entry point.  May be
+                           repeated. If omitted, all entry points are built.
+  -m, --main-from <mod>    Include __main__.py from the specified sub-package.
+                           Only one __main__.py module is allowed.
+                           Incompatible with --module-only.
+  -a, --all-guards         Include all __main__ guards. (default: discard)
+  -g, --guards-from <mod>  Include __main__ guards only from <mod>.
+  -E, --exclude <exclude>  Exclude specified packages or modules, comma separated.
+  -i, --include <include>  Include specified packages or modules, comma separated.
+  --git                    Discover the modules git tracks, from the git index of
+                           the package directory, instead of walking it.  Their
+                           spans are cached by content hash.
+  --input-tar <tar>        Read the input from the tar stream <tar>, `-` for stdin.
+  --is-fresh               Check that <artifact> is current, see above.
+  --in-place               Put each <file> in canonical order, see above.
+  --check                  Only check that each <file> is in canonical order.
+  -j, --jobs <n>           Worker processes parsing the modules, largest first.
+                           (default: one, one per CPU for --in-place and --check)
+  --read-threads <n>       Threads reading the modules ahead of their parsing, `1`
+                           reads each as it is parsed.  (default: 4)
+  --schedule-stats         Report the busy time of each worker and the time work
+                           waited for one.
+  --inline-deps <pkgs>     Flatten these installed pure Python packages into the
+                           output too, comma separated.  Their imports are
+                           rewritten as those of the package's own modules.
+  --ignore-clashes         Allow duplicate top-level names without error.
+  --prune-imports          Drop imports whose names are never referenced by the
+                           flattened output.
+  --lazy-imports           Bind third-party `import x` statements lazily, the module
+                           is loaded on first attribute access.  `from x import y`
+                           statements are left as is.
+  --lazy-allow <mods>      Only bind these modules lazily, comma separated.
+  --lazy-deny <mods>       Never bind these modules lazily, comma separated.
+  --dedupe-logic           Drop top-level logic repeated across modules, e.g. the
+                           same `try: import ... except ImportError:` fallback,
+                           when running it again could not change anything.
+  --lazy-sections          Experimental.  Run the top-level logic of each module
+                           on first use of a name it defines, via a module
+                           `__getattr__`.  Logic with side effects, or whose
+                           names the module uses itself, stays eager; each such
+                           span is reported on stderr.
+  --pgo <profile>          Lay out the output as the profile recorded by
+                           `pgo record` suggests, see above.
+  --annotations <mode>     `keep` annotations as written, `defer` their evaluation
+                           with `from __future__ import annotations`, or `strip`
+                           those of module variables and undecorated function
+                           signatures.  `defer` and `strip` also drop
+                           `if TYPE_CHECKING:` blocks and the imports only they
+                           use.  Class body annotations are always kept.
+                           [default: keep]
+  --minify                 Strip docstrings, comments, blank lines and `assert`
+                           statements and indent by one space.  The output runs
+                           as the original does under `python -OO`.
+  --keep-docstring         With --minify, keep the module docstring.
+  --format <format>        Output format: `py`, `pyz`, an executable zipapp holding
+                           the module and its bytecode, or `sfx`, a script holding
+                           the compressed module.  `pyz` and `sfx` require --output.
+                           [default: py]
+  --compression <method>   Compression of a `pyz`, `stored` or `deflated[:<level>]`
+                           (default: deflated), or of an `sfx`, `zlib[:<level>]`
+                           or `lzma[:<preset>]` (default: lzma).
+  --sfx-cache              Have an `sfx` cache its compiled code on first run.
+  --pyc <mode>             Also compile the output to its __pycache__ .pyc with
+                           hash based invalidation, <mode> is `checked` or
+                           `unchecked`.  Requires --output.
+  --launcher <file>        Also write <file>, a script which runs the compiled
+                           output, falling back to the source when the .pyc
+                           does not match the running Python.  Implies
+                           `--pyc unchecked` unless --pyc is given.
+  --depfile <file>         Also write the files the build read, its modules, the
+                           project config defining its entry points and the
+                           profile, as a Makefile rule of the output for make or
+                           ninja.  Files added to the package are not tracked.
+                           Requires --output.
+  --max-memory <size>      Keep the text of the modules read in memory only up to
+                           <size>, e.g. 512M, and the rest in a temporary file.
+                           The output is written span by span.  Does not apply
+                           to --minify, the `pyz` and `sfx` formats, nor the
+                           output cache of --remote-cache.
+  --remote-cache <url>     Share the output, and with --git the parsed modules,
+                           through the remote cache at <url>, falling back to
+                           building locally when it fails.  The default is
+                           $PYONETRUE_REMOTE_CACHE.
+  -h, --help               Show this help message.
+  --version                Show version.
+  --show-cli-args          Show the command line arguments that would be passed to the
+                           CLI and exit.  This is useful for debugging.
+
+Profiling options:
+  --python <python>        Interpreter to run the artifact with (default: current).
+  --source <source>        Package, directory or file the artifact was built from.
+  --json                   Report as JSON.
+  --no-cache               Measure again, ignoring any cached measurement.
+
+Cache serve options:
+  --bind <host>            Address to listen on.  [default: 127.0.0.1]
+  --port <port>            Port to listen on.  [default: 8765]
+"""
+
+__version__ = "0.7.1"
+
+def run_profile_startup(args) -> int:
+    """Run the profile-startup command, see USAGE."""
+    pass
+    pass
+    artifact = Path(args['<artifact>'])
+    measurement = measure_import_times(
+        artifact,
+        args['<argv>'],
+        python=args['--python'],
+        use_cache=not args['--no-cache'],
+    )
+    importers = None
+    if args['--source']:
+        importers = source_importers(FlatteningContext(package_path=args['--source']))
+    rows = attribute_import_times(measurement, artifact_import_lines(artifact), importers)
+    if args['--json']:
+        import json
+        report = { "returncode": measurement["returncode"], "imports": rows }
+        sys.stdout.write(json.dumps(report, indent=2) + "\n")
+    else:
+        sys.stdout.write(format_startup_report(rows, measurement["returncode"]))
+    return 0
+
+def run_pgo_record(args) -> int:
+    """Run the pgo record command, see USAGE."""
+    import json
+    pass
+    profile = record_profile(Path(args['<artifact>']), args['<argv>'], python=args['--python'])
+    text = json.dumps(profile, indent=2) + "\n"
+    if args['--output']:
+        with open(args['--output'], "w") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+    startup = sum(1 for entry in profile["spans"] if entry["phase"] == "startup")
+    total = len(profile["spans"]) + len(profile["cold"])
+    print(f"[INFO] pgo: {len(profile['spans'])} of {total} spans ran, {startup} at startup,"
+          f" artifact exited with status {profile['returncode']}", file=sys.stderr)
+    return 0
+
+def flatten_text(ctx) -> str:
+    """Flatten ``ctx`` and return the text of the module, reporting on stderr."""
+    spans = flatten_spans(ctx)
+    lines = []
+    if ctx.shebang:
+        lines.append(ctx.shebang.rstrip("\n") + "\n")
+    lines.extend(span.text for span in spans)
+    text = "".join(lines)
+    if ctx.minify:
+        pass
+        text = minify_source(text, ctx.keep_docstring)
+    return text
+
+def flatten_spans(ctx) -> list:
+    """Flatten ``ctx`` and return the spans of the module, reporting on stderr."""
+    ctx.discover_modules()
+    ctx.gather_main_guard_spans()
+    spans = ctx.get_final_output_spans()
+    for module, span, reason in ctx.lazy_refusals:
+        first_line = span.text.strip().split("\n", 1)[0]
+        print(f"[INFO] {module}: kept eager, {reason}: {first_line}", file=sys.stderr)
+    for line in ctx.pgo_report:
+        print(f"[INFO] pgo: {line}", file=sys.stderr)
+    if ctx.parse_stats and ctx.schedule_stats:
+        pass
+        for line in format_schedule_stats("parse", ctx.parse_stats):
+            print(line, file=sys.stderr)
+    return spans
+
+def parse_jobs(args):
+    """Return the number of ``--jobs``, None when not given."""
+    if not args.get('--jobs'):
+        return None
+    try:
+        jobs = int(args['--jobs'])
+    except ValueError:
+        jobs = 0
+    if jobs < 1:
+        raise CLIOptionError("--jobs must be a positive number")
+    return jobs
+
+def parse_read_threads(args) -> int:
+    """Return the number of ``--read-threads``, 4 when not given."""
+    if not args.get('--read-threads'):
+        return 4
+    try:
+        threads = int(args['--read-threads'])
+    except ValueError:
+        threads = 0
+    if threads < 1:
+        raise CLIOptionError("--read-threads must be a positive number")
+    return threads
+
+def run_reorder(args) -> int:
+    """Run --in-place or --check, see USAGE."""
+    pass
+    jobs = parse_jobs(args)
+    if args['--annotations'] not in ('keep', 'defer', 'strip'):
+        raise CLIOptionError("--annotations must be 'keep', 'defer' or 'strip'")
+    options = {
+        "ignore_clashes": bool(args['--ignore-clashes']),
+        "prune_imports": bool(args['--prune-imports']),
+        "annotations": args['--annotations'] or 'keep',
+        "dedupe_logic": bool(args['--dedupe-logic']),
+    }
+    stats = {}
+    results = reorder_files(args['<file>'], options, write=bool(args['--in-place']), jobs=jobs, stats=stats)
+    if stats and args['--schedule-stats']:
+        pass
+        for line in format_schedule_stats("reorder", stats):
+            print(line, file=sys.stderr)
+    counts = {}
+    for path, status, message in results:
+        counts[status] = counts.get(status, 0) + 1
+        if status == "error":
+            print(f"[ERROR] {path}: {message}", file=sys.stderr)
+        elif status == "reordered":
+            print(f"[INFO] reordered {path}", file=sys.stderr)
+        elif status == "unordered":
+            print(f"[INFO] would reorder {path}", file=sys.stderr)
+    summary = ", ".join(f"{counts[status]} {status}" for status in
+                        ("reordered", "unordered", "unchanged", "cached", "error") if status in counts)
+    print(f"[INFO] {summary}", file=sys.stderr)
+    return 1 if counts.get("unordered") or counts.get("error") else 0
+
+def run_is_fresh(args) -> int:
+    """Run --is-fresh, see USAGE."""
+    pass
+    reason = check_freshness(args['<artifact>'], fresh_options(args))
+    if reason:
+        print(f"[INFO] {args['<artifact>']} is stale: {reason}", file=sys.stderr)
+        return 1
+    return 0
+
+def run_cache_serve(args) -> int:
+    """Run the cache serve command, see USAGE."""
+    pass
+    try:
+        port = int(args['--port'])
+    except ValueError:
+        raise CLIOptionError("--port must be a number")
+    server = serve_remote_cache(args['<directory>'], args['--bind'], port)
+    host, port = server.server_address[:2]
+    print(f"[INFO] cache serve: http://{host}:{port}/ storing in {args['<directory>']}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+def main(argv=sys.argv):
+    """Main entry point for the CLI tool.
+
+    Parses command-line arguments, configures the FlatteningContext,
+    executes the flattening process, and handles output.
+
+    Args:
+        argv (list of str): Command-line arguments (including program name).
+
+    Returns:
+        int: Exit code (0 on success, non-zero on error).
+
+    Examples:
+        >>> main(["pyonetrue", "my_package"])
+        0
+    """
+
+    # Answer the informational options without loading the parser
+    if argv[1:] == ['--version']:
+        print(__version__)
+        sys.exit()
+    if argv[1:] in (['-h'], ['--help']):
+        print(USAGE.strip('\n'))
+        sys.exit()
+
+    pass
+    args = docopt(USAGE, argv=argv[1:], version=__version__)
+
+    if args['profile-startup']:
+        return run_profile_startup(args)
+    if args['pgo']:
+        return run_pgo_record(args)
+    if args['cache']:
+        return run_cache_serve(args)
+    if args['--in-place'] or args['--check']:
+        return run_reorder(args)
+    if args['--is-fresh']:
+        return run_is_fresh(args)
+
+    if args['--module-only'] and args['--main-from']:
+        raise CLIOptionError("cannot specify both --module-only and --main-from")
+    if args['--module-only'] and args['--entry']:
+        raise CLIOptionError("cannot specify both --module-only and --entry")
+    if args['--main-from'] and args['--entry']:
+        raise CLIOptionError("cannot specify both --main-from and --entry")
+
+    if (args['--lazy-allow'] or args['--lazy-deny']) and not args['--lazy-imports']:
+        raise CLIOptionError("--lazy-allow and --lazy-deny require --lazy-imports")
+
+    if args['--annotations'] not in ('keep', 'defer', 'strip'):
+        raise CLIOptionError("--annotations must be 'keep', 'defer' or 'strip'")
+
+    if args['--keep-docstring'] and not args['--minify']:
+        raise CLIOptionError("--keep-docstring requires --minify")
+
+    if args['--format'] not in ('py', 'pyz', 'sfx'):
+        raise CLIOptionError("--format must be 'py', 'pyz' or 'sfx'")
+    if args['--format'] != 'py' and not args['--output']:
+        raise CLIOptionError(f"--format {args['--format']} requires --output")
+    if args['--format'] != 'py' and (args['--pyc'] or args['--launcher']):
+        raise CLIOptionError("--pyc and --launcher only apply to --format py")
+    if args['--sfx-cache'] and args['--format'] != 'sfx':
+        raise CLIOptionError("--sfx-cache only applies to --format sfx")
+    if args['--compression'] and args['--format'] == 'py':
+        raise CLIOptionError("--compression only applies to --format pyz or sfx")
+    if args['--compression']:
+        if args['--format'] == 'pyz':
+            pass
+        else:
+            parse_compression = parse_sfx_compression
+        try:
+            parse_compression(args['--compression'])
+        except ValueError as e:
+            raise CLIOptionError(str(e))
+
+    max_memory = None
+    if args['--max-memory']:
+        pass
+        try:
+            max_memory = parse_memory_size(args['--max-memory'])
+        except ValueError as e:
+            raise CLIOptionError(f"--max-memory: {e}")
+        if args['--minify'] or args['--format'] != 'py':
+            raise CLIOptionError("--max-memory does not apply to --minify nor --format pyz or sfx")
+
+    if args['--depfile'] and not args['--output']:
+        raise CLIOptionError("--depfile requires --output")
+
+    if (args['--pyc'] or args['--launcher']) and not args['--output']:
+        raise CLIOptionError("--pyc and --launcher require --output")
+    if args['--pyc'] and args['--pyc'] not in ('checked', 'unchecked'):
+        raise CLIOptionError("--pyc must be 'checked' or 'unchecked'")
+
+    if args['--main-from']:
+        if ',' in args['--main-from']:
+            raise CLIOptionError("--main-from cannot specify multiple modules")
+        if not args['--main-from'].strip():
+            raise CLIOptionError("--main-from cannot be empty")
+
+    pass
+    pass
+
+    entries = args.get('--entry') or []
+    if not isinstance(entries, list):
+        entries = [entries] if entries else []
+
+    # `--entry pkg.cli:main` or `--entry pkg.cli`
+    entries = [ make_entry_point(ent.partition(':')[2] or ent, ent) for ent in entries if ent ]
+
+    package_name, archive_sources, archive_spans = "", {}, {}
+    if args['--input-tar']:
+        pass
+        if args['--input-tar'] == '-':
+            package_name, archive_sources, archive_spans = read_tar_stream_package(sys.stdin.buffer)
+        else:
+            with open(args['--input-tar'], 'rb') as stream:
+                package_name, archive_sources, archive_spans = read_tar_stream_package(
+                    stream, Path(args['--input-tar']).name)
+
+    ctx = FlatteningContext(
+        package_path=args['<input>'] or args['--input-tar'],
+        package_name=package_name,
+        archive_sources=archive_sources,
+        archive_spans=archive_spans,
+        output=args.get('--output') or 'stdout',
+        module_only=bool(args.get('--module-only')),
+        main_from=args.get('--main-from') or None,
+        guards_all=bool(args.get('--all-guards')),
+        guards_from=args.get('--guards-from', '').split(',') if args.get('--guards-from') else [],
+        ignore_clashes=bool(args.get('--ignore-clashes')),
+        exclude=args.get('--exclude', '').split(',') if args.get('--exclude') else [],
+        include=args.get('--include', '').split(',') if args.get('--include') else [],
+        git=bool(args.get('--git')),
+        inline_deps=args.get('--inline-deps', '').split(',') if args.get('--inline-deps') else [],
+        shebang=args.get('--shebang', '#!/usr/bin/env python3'),
+        entry_points=entries,
+        prune_imports=bool(args.get('--prune-imports')),
+        lazy_imports=bool(args.get('--lazy-imports')),
+        lazy_allow=args.get('--lazy-allow', '').split(',') if args.get('--lazy-allow') else [],
+        lazy_deny=args.get('--lazy-deny', '').split(',') if args.get('--lazy-deny') else [],
+        pyc=args.get('--pyc') or ('unchecked' if args.get('--launcher') else None),
+        launcher=args.get('--launcher') or None,
+        dedupe_logic=bool(args.get('--dedupe-logic')),
+        lazy_sections=bool(args.get('--lazy-sections')),
+        pgo=args.get('--pgo') or None,
+        annotations=args.get('--annotations') or 'keep',
+        minify=bool(args.get('--minify')),
+        keep_docstring=bool(args.get('--keep-docstring')),
+        output_format=args.get('--format') or 'py',
+        compression=args.get('--compression') or None,
+        sfx_cache=bool(args.get('--sfx-cache')),
+        remote_cache=args.get('--remote-cache') or os.environ.get('PYONETRUE_REMOTE_CACHE') or None,
+        max_memory=max_memory,
+        jobs=parse_jobs(args) or 1,
+        read_threads=parse_read_threads(args),
+        schedule_stats=bool(args.get('--schedule-stats')),
+    )
+
+    if ctx.module_only and (ctx.main_from or ctx.entry_points):
+        raise CLIOptionError("cannot specify --module-only with --main-from or --entry")
+
+    if ctx.main_from and ctx.entry_points:
+        raise CLIOptionError("cannot specify both --main-from and --entry")
+
+    if ctx.git and (ctx.archive_sources or not Path(ctx.package_path).is_dir()):
+        raise CLIOptionError("--git requires a package directory")
+
+    # A single file has no project or distribution defining its entry points
+    # nor does a stream
+    discover = (not ctx.entry_points and not ctx.module_only and not ctx.archive_sources
+                and not Path(ctx.package_path).is_file())
+
+    # Inputs of every output, besides its modules, see --depfile
+    build_inputs = [ctx.pgo] if ctx.pgo else []
+
+    if discover:
+        pass
+        ctx.entry_points = discover_defined_entry_points(Path(ctx.package_path))
+        config = find_project_config(Path(ctx.package_path))
+        if config:
+            build_inputs.append(str(config))
+
+    if discover and not ctx.entry_points:
+        pass
+        ctx.entry_points = discover_script_entry_points(Path(ctx.package_path))
+
+    if not ctx.entry_points and not ctx.module_only:
+        if not ctx.main_from:
+            ctx.main_from = '__main__' # primary package
+        # Create a fake Entry Point structure for the package's main module
+        # as if it were returned by discover_script_entry_points(), i.e.
+        # mirroring the attributes of ``importlib.metadata.EntryPoint``.
+        # This is only used for informational purposes.
+        ctx.entry_points = [
+            make_entry_point(ctx.package_name, f"{ctx.package_name}.{ctx.main_from}:main")
+        ]
+
+    if args['--show-cli-args']:
+        print(f"CLI args:\n{ctx}")
+        return 0
+
+    entry_mods = (
+        [ep.module for ep in ctx.entry_points]
+        if ctx.entry_points
+        else ([ctx.main_from] if ctx.main_from else [])
+    )
+    if not entry_mods:
+        entry_mods = [None]
+
+    output_path = ctx.output
+    if len(entry_mods) > 1 and ctx.launcher:
+        raise CLIOptionError("--launcher requires a single entry point")
+
+    if len(entry_mods) > 1 and output_path != "stdout":
+        out_dir = Path(output_path)
+        out_dir.mkdir(parents=True, exist_ok=True)
+    else:
+        out_dir = None
+
+    depends = []
+    for mod in entry_mods:
+        sub_ctx = FlatteningContext(
+            package_path=ctx.package_path,
+            package_name=ctx.package_name if ctx.archive_sources else "",
+            archive_sources=ctx.archive_sources,
+            archive_spans=ctx.archive_spans,
+            output=output_path,
+            module_only=ctx.module_only,
+            main_from=[mod] if mod else [],
+            guards_all=ctx.guards_all,
+            guards_from=ctx.guards_from,
+            ignore_clashes=ctx.ignore_clashes,
+            exclude=ctx.exclude,
+            include=ctx.include,
+            git=ctx.git,
+            inline_deps=ctx.inline_deps,
+            shebang=ctx.shebang,
+            prune_imports=ctx.prune_imports,
+            lazy_imports=ctx.lazy_imports,
+            lazy_allow=ctx.lazy_allow,
+            lazy_deny=ctx.lazy_deny,
+            pyc=ctx.pyc,
+            launcher=ctx.launcher,
+            dedupe_logic=ctx.dedupe_logic,
+            lazy_sections=ctx.lazy_sections,
+            pgo=ctx.pgo,
+            annotations=ctx.annotations,
+            minify=ctx.minify,
+            keep_docstring=ctx.keep_docstring,
+            output_format=ctx.output_format,
+            compression=ctx.compression,
+            sfx_cache=ctx.sfx_cache,
+            remote_cache=ctx.remote_cache,
+            max_memory=ctx.max_memory,
+            jobs=ctx.jobs,
+            read_threads=ctx.read_threads,
+            schedule_stats=ctx.schedule_stats,
+        )
+
+        sub_ctx.main_from = sub_ctx.main_from[0] if sub_ctx.main_from else None
+        if sub_ctx.main_from:
+            sub_ctx.module_only = False
+        elif not sub_ctx.module_only:
+            sub_ctx.main_from = "__main__"
+
+        cached = output_key = spans = None
+        if sub_ctx.remote_cache and sub_ctx.max_memory is None:
+            pass
+            pass
+            output_key = output_cache_key(sub_ctx)
+            cached = load_cached_json("output", output_key, sub_ctx.remote_cache)
+
+        if cached is not None:
+            pass
+            text = cached["text"]
+            inputs = absolute_inputs(cached.get("inputs", []), sub_ctx.package_path)
+            print(f"[INFO] {mod or sub_ctx.package_name}: output reused from the cache", file=sys.stderr)
+        elif sub_ctx.max_memory is not None:
+            # Written span by span, see spill
+            text = None
+            spans = flatten_spans(sub_ctx)
+            inputs = sub_ctx.input_files
+        else:
+            text = flatten_text(sub_ctx)
+            inputs = sub_ctx.input_files
+            if output_key:
+                pass
+                pass
+                document = { "text": text, "inputs": relative_inputs(inputs, sub_ctx.package_path) }
+                store_cached_json("output", output_key, document, sub_ctx.remote_cache)
+
+        shebang = sub_ctx.shebang.rstrip("\n") + "\n" if sub_ctx.shebang else ""
+        if sub_ctx.output == "stdout" and text is None:
+            pass
+            sys.stdout.write(shebang)
+            write_spans(sys.stdout, spans)
+        elif sub_ctx.output == "stdout":
+            sys.stdout.write(text)
+        else:
+            if out_dir:
+                fname = mod or "output"
+                target = Path(out_dir / f"{fname}.{sub_ctx.output_format}")
+            else:
+                target = Path(sub_ctx.output)
+            depends.append((target, inputs + build_inputs))
+            if sub_ctx.output_format == "pyz":
+                pass
+                entry = next((ep for ep in ctx.entry_points if ep.module == mod), None)
+                # A package __main__ is run as a script, like the flattened .py
+                attr = entry.attr if entry and not entry.module.endswith("__main__") else None
+                write_pyz(target, text, sub_ctx.package_name, attr, sub_ctx.shebang,
+                          sub_ctx.compression or "deflated")
+                continue
+            if sub_ctx.output_format == "sfx":
+                pass
+                # The stub carries the shebang, drop the one within the text
+                if sub_ctx.shebang and text.startswith(sub_ctx.shebang.rstrip("\n") + "\n"):
+                    text = text.split("\n", 1)[1]
+                write_sfx(target, text, sub_ctx.package_name, sub_ctx.compression or "lzma",
+                          sub_ctx.sfx_cache, sub_ctx.shebang)
+                continue
+            pass
+            trees = [ sub_ctx.package_path ] if Path(sub_ctx.package_path).is_dir() else []
+            if text is None:
+                pass
+                header = fresh_header(target, inputs + build_inputs, trees, fresh_options(args),
+                                      spans_digest(spans))
+                with open(target, "w") as f:
+                    f.write(shebang + header)
+                    write_spans(f, spans)
+            else:
+                text = add_fresh_header(text, target, inputs + build_inputs, trees, fresh_options(args))
+                target.write_text(text)
+            if sub_ctx.pyc:
+                pass
+                pyc_path = write_pyc(target, sub_ctx.pyc)
+                if sub_ctx.launcher:
+                    write_launcher(sub_ctx.launcher, target, pyc_path, sub_ctx.shebang)
+
+    if args['--depfile']:
+        pass
+        write_depfile(args['--depfile'], depends)
+
+    return 0
+
+"""Write the inputs of a build as a Makefile dependency file, see ``--depfile``.
+
+The format is the one ``gcc -MD`` writes, which both make and ninja
+(``depfile =``) read:
+
+    out.py: \\
+      pkg/__init__.py \\
+      pkg/cli.py \\
+      pyproject.toml
+"""
+
+def make_escape(path: str) -> str:
+    """Escape the spaces, ``#`` and ``$`` of ``path`` for a Makefile rule."""
+    return path.replace(" ", "\\ ").replace("#", "\\#").replace("$", "$$")
+
+def format_depfile(rules: List[tuple]) -> str:
+    """Return the dependency file text of ``rules``, ``(target, [input, ...])`` each."""
+    text = []
+    for target, inputs in rules:
+        lines = [ make_escape(str(target)) + ":" ]
+        lines += [ "  " + make_escape(str(path)) for path in dict.fromkeys(inputs) ]
+        text.append(" \\\n".join(lines) + "\n")
+    return "".join(text)
+
+def write_depfile(path, rules: List[tuple]) -> None:
+    """Write the dependency file of ``rules`` to ``path``, see format_depfile()."""
+    with open(str(path), "w", encoding="utf-8") as f:
+        f.write(format_depfile(rules))
+
+"""Discover the script entry points of the package being flattened.
+
+Entry points are read from the project's own ``pyproject.toml`` or
+``setup.cfg`` when one is found above the package.  Otherwise they are
+looked up in an index of the ``entry_points.txt`` files of installed
+distributions.  The index is cached per ``sys.path`` directory and rebuilt
+only when that directory changes, which avoids loading the metadata of every
+installed distribution through ``importlib.metadata``.
+"""
+
+SCRIPT_GROUPS = ("scripts", "console_scripts", "gui_scripts")
+
+def make_entry_point(name: str, value: str, group: str = "console_scripts"):
+    """Create an entry point with the attributes of ``importlib.metadata.EntryPoint``.
+
+    Args:
+        name (str): Name of the entry point, e.g. the script name.
+        value (str): ``module:attr`` or ``module``.
+        group (str): Entry point group.
+
+    Returns:
+        types.SimpleNamespace: With name, group, value, module, attr, extras,
+        dist and load().
+    """
+    ep = types.SimpleNamespace()
+    module, _, attr = value.partition(":")
+    ep.name = name
+    ep.group = group
+    ep.value = value
+    ep.module = module.strip()
+    ep.attr = attr.split("[", 1)[0].strip() or None
+    ep.extras = []
+    ep.dist = None
+    ep.load = lambda: None
+    return ep
+
+def belongs_to_package(value: str, pkg_name: str) -> bool:
+    """True when entry point ``value`` targets ``pkg_name`` or one of its modules."""
+    target_mod = value.split(":", 1)[0].strip()
+    return target_mod == pkg_name or target_mod.startswith(pkg_name + ".")
+
+def find_project_config(package_path: Path) -> Optional[Path]:
+    """Return the nearest pyproject.toml or setup.cfg at or above ``package_path``."""
+    path = Path(package_path).resolve()
+    if not path.is_dir():
+        path = path.parent
+    for directory in (path, *path.parents):
+        for name in ("pyproject.toml", "setup.cfg"):
+            candidate = directory / name
+            if candidate.is_file():
+                return candidate
+    return None
+
+def read_project_entry_points(config: Path) -> List[tuple]:
+    """Read ``(group, name, value)`` script entry points from a project config.
+
+    pyproject.toml: ``[project.scripts]``, ``[project.gui-scripts]``,
+    ``[project.entry-points.<group>]`` and ``[tool.poetry.scripts]``.
+    setup.cfg: ``[options.entry_points]``.
+    """
+    entries = []
+    if config.name == "pyproject.toml":
+        try:
+            import tomllib
+        except ImportError:
+            import tomli as tomllib  # For Python 3.10 and earlier
+        with open(config, "rb") as f:
+            data = tomllib.load(f)
+        project = data.get("project", {})
+        tables = [
+            ("console_scripts", project.get("scripts", {})),
+            ("gui_scripts", project.get("gui-scripts", {})),
+            ("console_scripts", data.get("tool", {}).get("poetry", {}).get("scripts", {})),
+        ]
+        for group, table in project.get("entry-points", {}).items():
+            if group in SCRIPT_GROUPS:
+                tables.append((group, table))
+        for group, table in tables:
+            for name, value in table.items():
+                if isinstance(value, str):
+                    entries.append((group, name, value))
+    else:
+        import configparser
+        parser = configparser.ConfigParser(interpolation=None)
+        parser.read(config)
+        if parser.has_section("options.entry_points"):
+            for group in SCRIPT_GROUPS:
+                text = parser.get("options.entry_points", group, fallback="")
+                for line in text.splitlines():
+                    name, sep, value = line.partition("=")
+                    if sep:
+                        entries.append((group, name.strip(), value.strip()))
+    return entries
+
+def discover_defined_entry_points(package_path: Path) -> list:
+    """Discover entry points the package's own project config defines for it.
+
+    Args:
+        package_path (Path): The path to the package directory or module.
+
+    Returns:
+        list: Entry points, see ``make_entry_point()``.  Empty when there is
+        no project config or it defines none for the package.
+    """
+    config = find_project_config(package_path)
+    if config is None:
+        return []
+    pkg_name = Path(package_path).stem
+    return [ make_entry_point(name, value, group)
+             for group, name, value in read_project_entry_points(config)
+             if belongs_to_package(value, pkg_name) ]
+
+def discover_script_entry_points(package_path: Path) -> list:
+    """Discover entry points installed distributions define for the package.
+
+    Args:
+        package_path (Path): The path to the package directory.
+
+    Returns:
+        list: Entry points, see ``make_entry_point()``.
+    """
+    pkg_name = Path(package_path).name
+    return [ make_entry_point(name, value, group)
+             for group, name, value in installed_entry_points()
+             if group in SCRIPT_GROUPS and belongs_to_package(value, pkg_name) ]
+
+def installed_entry_points(search_path: Optional[List[str]] = None) -> List[tuple]:
+    """Return ``(group, name, value)`` for each entry point installed on ``search_path``.
+
+    Each directory is indexed separately and its index is cached, keyed by
+    the directory and its modification time.  Installing or removing a
+    distribution adds or removes its metadata directory, which changes that
+    time and invalidates the index.
+    """
+    pass
+    entries = []
+    for directory in (sys.path if search_path is None else search_path):
+        directory = directory or os.curdir
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            continue
+        key = cache_key(os.path.abspath(directory))
+        index = load_cached_json("entry-points", key)
+        if index is None or index.get("mtime") != mtime:
+            index = { "mtime": mtime, "entries": index_entry_points(directory) }
+            store_cached_json("entry-points", key, index)
+        entries.extend(tuple(entry) for entry in index["entries"])
+    return entries
+
+def index_entry_points(directory: str) -> List[list]:
+    """Read the entry_points.txt of every distribution installed in ``directory``."""
+    import configparser
+    entries = []
+    try:
+        names = sorted(os.listdir(directory))
+    except OSError:
+        return entries
+    for name in names:
+        if not name.endswith((".dist-info", ".egg-info")):
+            continue
+        path = os.path.join(directory, name, "entry_points.txt")
+        if not os.path.isfile(path):
+            continue
+        parser = configparser.ConfigParser(interpolation=None, delimiters=("=",))
+        parser.optionxform = str
+        try:
+            parser.read(path, encoding="utf-8")
+        except configparser.Error:
+            continue
+        for group in parser.sections():
+            for ep_name, value in parser.items(group):
+                entries.append([group, ep_name, value])
+    return entries
+
+"""
+Custom exceptions for pyonetrue, each representing a single, specific error scenario.
+"""
+
+class PyonetrueError(Exception):
+    """TODO: Expand this docstring."""
+    """TODO: Expand this docstring."""
+    """TODO: Expand this docstring."""
+    """TODO: Expand this docstring."""
+    """TODO: Expand this docstring."""
+    """Base exception for all pyonetrue errors."""
+    pass
+
+class CLIOptionError(PyonetrueError):
+    """Raised when invalid or incompatible command-line options are provided to the CLI.
+
+    Use this exception to signal errors such as specifying mutually exclusive flags
+    (e.g., `--module-only` and `--main-from`).
+    """
+    """TODO: Expand this docstring."""
+    """TODO: Expand this docstring."""
+    """TODO: Expand this docstring."""
+    """TODO: Expand this docstring."""
+    """TODO: Expand this docstring."""
+    """Invalid combination or value of CLI options."""
+    pass
+
+class DuplicateNameError(PyonetrueError):
+    """TODO: Expand this docstring."""
+    """TODO: Expand this docstring."""
+    """TODO: Expand this docstring."""
+    """TODO: Expand this docstring."""
+    """TODO: Expand this docstring."""
+    """Detected duplicate top-level symbol names."""
+    pass
+
+class ImportNormalizationError(PyonetrueError):
+    """TODO: Expand this docstring."""
+    """TODO: Expand this docstring."""
+    """TODO: Expand this docstring."""
+    """TODO: Expand this docstring."""
+    """TODO: Expand this docstring."""
+    """Errors during import deduplication and normalization processes."""
+    pass
+
+class IncludeExcludeError(PyonetrueError):
+    """TODO: Expand this docstring."""
+    """TODO: Expand this docstring."""
+    """TODO: Expand this docstring."""
+    """TODO: Expand this docstring."""
+    """TODO: Expand this docstring."""
+    """Invalid usage of include/exclude flags."""
+    pass
+
+class FlatteningError(PyonetrueError):
+    """TODO: Expand this docstring."""
+    """TODO: Expand this docstring."""
+    """TODO: Expand this docstring."""
+    """TODO: Expand this docstring."""
+    """TODO: Expand this docstring."""
+    """General errors occurring in the flattening pipeline."""
+    pass
+
+class ModuleInferenceError(PyonetrueError):
+    """TODO: Expand this docstring."""
+    """TODO: Expand this docstring."""
+    """TODO: Expand this docstring."""
+    """TODO: Expand this docstring."""
+    """TODO: Expand this docstring."""
+    """Cannot infer package or module name from the given path."""
+    pass
+
+class PathError(PyonetrueError):
+    """TODO: Expand this docstring."""
+    """TODO: Expand this docstring."""
+    """TODO: Expand this docstring."""
+    """TODO: Expand this docstring."""
+    """TODO: Expand this docstring."""
+    """Errors related to filesystem paths or module resolution."""
+    pass
+"""Parsing Python source and extract top-level code spans."""
+
+class Span:
+    """Represents a contiguous block of top-level code in the source file.
+
+    Attributes:
+        text (str): The exact source text of the span, including decorators or comments.
+        kind (str): The category of the span, one of 'import', 'class', 'function', 'logic', or 'main_guard'.
+    """
+    def __init__(self, text: str, kind: str):
+        """Initialize a Span with source text and its classification.
+
+        Args:
+            text (str): The source code text for this span.
+            kind (str): The type of span (e.g., 'import', 'class', 'function', etc.).
+        """
+        self.text = text
+        self.kind = kind  # 'import', 'class', 'function', 'logic', 'main_guard'
+
+    def __repr__(self):
+        """Return a representation showing kind and truncated text for debugging."""
+        return f"Span(kind={self.kind!r}, text={self.text!r})"
+
+def extract_spans(source: Union[str, Path], filename: str = '<unknown>') -> List[Span]:
+    """Parse Python source to extract ordered top-level code spans.
+
+    Args:
+        source (str or Path): Raw Python source or path to a .py file.
+        filename (str): Optional filename for AST parsing error messages.
+
+    Returns:
+        List[Span]: A list of Span objects representing each top-level section of code.
+
+    Examples:
+        >>> spans = extract_spans('x = 1\n')
+        >>> isinstance(spans[0], Span)
+        True
+    """
+    if isinstance(source, Path):
+        source = source.read_text()
+
+    lines = source.splitlines(keepends=True)
+    tree = ast.parse(source, filename)
+    spans: List[Span] = []
+
+    for node in tree.body:
+        start = node.lineno - 1
+        end = node.end_lineno or node.lineno
+        # Determine kind
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            kind = 'import'
+        elif isinstance(node, ast.ClassDef):
+            kind = 'class'
+            # If it has decorators, we consider the decorator as part of it
+            if node.decorator_list:
+                start = node.decorator_list[0].lineno - 1
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            kind = 'function'
+            # If it has decorators, we consider the decorator as part of it
+            if node.decorator_list:
+                start = node.decorator_list[0].lineno - 1
+        elif isinstance(node, ast.If):
+            # Detect main guard: if __name__ == '__main__'
+            test = node.test
+            is_guard = (
+                isinstance(test, ast.Compare)
+                and isinstance(test.left, ast.Name)
+                and test.left.id == '__name__'
+                and any(
+                    isinstance(op, ast.Eq) for op in test.ops
+                )
+                and any(
+                    isinstance(elt, ast.Constant) and elt.value == '__main__'
+                    for elt in test.comparators
+                )
+            )
+            kind = 'main_guard' if is_guard else 'logic'
+        else:
+            kind = 'logic'
+
+        # Extract the text from the lines -- required to capture decorators
+        spans.append(Span(''.join(lines[start:end]), kind))
+
+    return spans
+
+def replace_source_ranges(text: str, edits: List[tuple]) -> str:
+    """Replace ranges of ``text`` given by ast positions.
+
+    Args:
+        text (str): Source the positions refer to.
+        edits (List[tuple]): ``((lineno, col_offset), (end_lineno, end_col_offset),
+            replacement)``, columns count utf-8 bytes as ast positions do.
+            Ranges must not overlap.
+
+    Returns:
+        str: ``text`` with every range replaced.
+    """
+    if not edits:
+        return text
+    data = text.encode("utf-8")
+    starts = [0]
+    for line in data.splitlines(keepends=True):
+        starts.append(starts[-1] + len(line))
+    for (line, col), (end_line, end_col), replacement in sorted(edits, key=lambda e: e[0], reverse=True):
+        start = starts[line - 1] + col
+        end = starts[end_line - 1] + end_col
+        data = data[:start] + replacement.encode("utf-8") + data[end:]
+    return data.decode("utf-8")
+
+DEBUG = False
+
+@dataclass
+class FlatteningContext:
+
+    package_path       : Union[Path, str]
+    package_name       : str                           = ""
+    main_py            : tuple[str, List[Span]]        = (None, [])
+    module_spans       : List[tuple[str, List[Span]]]  = field(default_factory=list)
+    guard_sources      : dict[str, List[Span]]         = field(default_factory=dict)
+    archive_sources    : dict[str, str]                = field(default_factory=dict)
+    archive_spans      : dict[str, List[Span]]         = field(default_factory=dict)
+    input_files        : List[str]                     = field(default_factory=list)
+
+    # Discovery -- inclusion/exclusion
+    module_only        : bool                          = False
+    main_from          : str | None                    = None
+    exclude            : List[str]                     = field(default_factory=list)
+    include            : List[str]                     = field(default_factory=list)
+    git                : bool                          = False
+
+    # Installed pure Python packages flattened into the output
+    inline_deps        : List[str]                     = field(default_factory=list)
+
+    # Conflict detection
+    ignore_clashes     : bool                          = False
+
+    # Output generation
+    output             : str                           = "stdout"
+    shebang            : str                           = "#!/usr/bin/env python3"
+    guards_all         : bool                          = False
+    guards_from        : List[str]                     = field(default_factory=list)
+    entry_points       : List[str]                     = field(default_factory=list)
+    prune_imports      : bool                          = False
+    lazy_imports       : bool                          = False
+    lazy_allow         : List[str]                     = field(default_factory=list)
+    lazy_deny          : List[str]                     = field(default_factory=list)
+    annotations        : str                           = "keep"
+    dedupe_logic       : bool                          = False
+    lazy_sections      : bool                          = False
+    lazy_refusals      : List[tuple]                   = field(default_factory=list)
+    pgo                : str | None                    = None
+    pgo_report         : List[str]                     = field(default_factory=list)
+    pgo_cold_modules   : set                           = field(default_factory=set)
+    pyc                : str | None                    = None
+    launcher           : str | None                    = None
+    minify             : bool                          = False
+    keep_docstring     : bool                          = False
+    output_format      : str                           = "py"
+    compression        : str | None                    = None
+    sfx_cache          : bool                          = False
+    remote_cache       : str | None                    = None
+
+    # Bounded memory, see spill
+    max_memory         : int | None                    = None
+    span_store         : object                        = None
+    resident_bytes     : int                           = 0
+
+    # Parallel reading and parsing, see prefetch and schedule
+    jobs               : int                           = 1
+    read_threads       : int                           = 4
+    schedule_stats     : bool                          = False
+    parse_stats        : dict | None                   = None
+
+    def __post_init__(self):
+        if not self.package_path:
+            raise PathError("package_path cannot be empty")
+        # Resolve package_path to file, dir, or package name
+        path = Path(self.package_path)
+        if DEBUG: print(f"DEBUG: Resolved path = {path}", file=sys.stderr)
+        if self.archive_sources:
+            # Read already, e.g. from a tar stream, package_name is given
+            if not self.package_name:
+                raise ModuleInferenceError("package_name is required with archive_sources")
+        elif path.is_file() and is_archive(path):
+            # Members are read in memory, see discover_modules()
+            pass
+            self.package_name, self.archive_sources = read_archive_package(path)
+        elif path.exists():
+            if path.is_dir():
+                self.package_name = path.name
+            elif path.is_file():
+                self.package_name = path.stem
+            else:
+                raise PathError(f"input path '{self.package_path}' is not a file or directory")
+        else:
+            if DEBUG: print("DEBUG: package_path not found as file/dir, trying as package name", file=sys.stderr)
+            spec = importlib.util.find_spec(self.package_path)
+            if spec and spec.submodule_search_locations:
+                path = Path(spec.submodule_search_locations[0])
+                self.package_name = path.name
+            else:
+                raise ModuleInferenceError(f"cannot infer package name from '{self.package_path!r}'")
+
+        self.package_path = path
+
+        if DEBUG: print(f"DEBUG: package_path = {self.package_path}", file=sys.stderr)
+        if DEBUG: print(f"DEBUG: package_name = {self.package_name}", file=sys.stderr)
+
+        # Normalize excludes/includes lists to fully-qualified names (if provided)
+        if self.exclude:
+            if isinstance(self.exclude, str):
+                self.exclude = self.exclude.split(",")
+            self.exclude = normalize_module_names(self.package_name, self.exclude)
+            if self.include:
+                if isinstance(self.include, str):
+                    self.include = self.include.split(",")
+                self.include = normalize_module_names(self.package_name, self.include)
+            else:
+                self.include = []
+            if DEBUG: print(f"DEBUG: exclude = {self.exclude}", file=sys.stderr)
+            if DEBUG: print(f"DEBUG: include = {self.include}", file=sys.stderr)
+        elif self.include:
+            raise IncludeExcludeError("`include` flag require `exclude` to be set")
+
+        # Normalize self.guards_from to fully-qualified names
+        if self.guards_from:
+            if isinstance(self.guards_from, str):
+                self.guards_from = self.guards_from.split(",")
+            self.guards_from = [ normalize_a_module_name(mod, self.package_name) 
+                                 for mod in self.guards_from ]
+
+        # Lazy import allow/deny lists name third-party modules, as is
+        if isinstance(self.lazy_allow, str):
+            self.lazy_allow = self.lazy_allow.split(",")
+        if isinstance(self.lazy_deny, str):
+            self.lazy_deny = self.lazy_deny.split(",")
+        if isinstance(self.inline_deps, str):
+            self.inline_deps = self.inline_deps.split(",")
+
+        if self.annotations not in ANNOTATION_MODES:
+            raise FlatteningError(f"annotations must be one of {', '.join(ANNOTATION_MODES)}, not '{self.annotations}'")
+
+    def new_module(self, path: Path) -> "FlatteningModule":
+        return FlatteningModule(self, path)
+
+    def add_module(self, obj: Union[str, Path, "FlatteningModule"], source: str = None,
+                   spans: List[Span] = None) -> None:
+        if not obj:
+            raise PathError("module path cannot be empty")
+        if isinstance(obj, FlatteningModule):
+            fm = obj
+        elif isinstance(obj, (Path, str)):
+            fm = FlatteningModule(self, Path(obj))
+        else:
+            raise PathError(f"Invalid module path: {obj} -- must be str, Path, or FlatteningModule")
+
+        if DEBUG: print(f"\nDEBUG: Adding module {fm.module = } from {fm.path = }", file=sys.stderr)
+
+        if spans is None:
+            try:
+                spans = extract_spans(fm.path if source is None else source, str(fm.path))
+            except Exception as e:
+                raise FlatteningError(f"failed to extract spans from {fm.path}") from e
+        if self.max_memory is not None:
+            spans = self.spill_spans(spans)
+        if DEBUG: print("DEBUG add_module : spans :\n"+"\n".join(span.text for span in spans), file=sys.stderr)
+        self.module_spans.append((fm.module, spans))
+        if source is None and fm.path.is_file():
+            self.input_files.append(str(fm.path))  # not an archive member
+
+        for span in spans:
+            if span.kind == 'main_guard':
+                self.guard_sources.setdefault(fm.module, []).append(span)
+
+        if fm.module.endswith("__main__"):
+            self.main_py = (fm.module, spans)
+            if DEBUG: print("DEBUG add_module : main spans :\n"+"\n".join(span.text for span in spans), file=sys.stderr)
+
+    def discover_modules(self) -> None:
+
+        if self.archive_sources:
+            self.discover_archive_modules()
+            self.discover_inline_deps()
+            return
+
+        if self.package_path.is_file():
+            self.add_module(self.package_path)
+            self.discover_inline_deps()
+            return
+
+        path = Path(self.package_path)
+
+        if path.is_file():
+            self.add_module(path)
+            self.discover_inline_deps()
+            return
+
+        if DEBUG: print(f"\nDEBUG: Discovering modules in {self.package_path = }", file=sys.stderr)
+
+        allowed_main = self.allowed_main_module()
+        if self.git:
+            self.discover_git_modules(path, allowed_main)
+        else:
+            self.add_module_files([ subpath for subpath in sorted(path.rglob('*.py'))
+                                    if self.wanted_module(subpath.relative_to(path), allowed_main) ])
+
+        self.discover_inline_deps()
+
+    def add_module_files(self, paths: List[Path]) -> None:
+        """Add the modules at ``paths``, in order, parsed by ``jobs`` workers, see schedule.
+
+        Parsed here, the files are read ahead by ``read_threads`` threads,
+        see prefetch.  A file which cannot be read ahead, or which the
+        workers fail to parse, is parsed again by add_module(), which
+        reports the error.
+        """
+        if len(paths) < 2 or (self.jobs <= 1 and self.read_threads <= 1):
+            for path in paths:
+                self.add_module(path)
+            return
+
+        if self.jobs <= 1:
+            pass
+            for path, data in prefetch_files(paths, self.read_threads):
+                spans = None
+                if data is not None:
+                    try:
+                        spans = extract_spans(importlib.util.decode_source(data), str(path))
+                    except Exception as e:
+                        raise FlatteningError(f"failed to extract spans from {path}") from e
+                self.add_module(path, spans=spans)
+            return
+
+        pass
+        parsed, self.parse_stats = schedule_tasks(parse_file_spans, [ str(path) for path in paths ],
+                                                  jobs=self.jobs)
+        for path, pairs in zip(paths, parsed):
+            spans = None if pairs is None else [ Span(text, kind) for kind, text in pairs ]
+            self.add_module(path, spans=spans)
+
+    def discover_git_modules(self, path: Path, allowed_main) -> None:
+        """Add the modules git tracks under directory ``path``, see git_index.
+
+        Modules are named, selected and ordered as the directory walk does.
+        Tracked files deleted from the work tree are skipped.
+        """
+        pass
+
+        if DEBUG: print(f"DEBUG: Discover - from the git index of {path = }", file=sys.stderr)
+
+        tracked = git_tracked_files(path)
+        modified = git_modified_files(path)
+        for relpath in sorted(Path(name) for name in tracked):
+            subpath = path / relpath
+            if not subpath.is_file() or not self.wanted_module(relpath, allowed_main):
+                continue
+            if relpath.as_posix() in modified:
+                self.add_module(subpath)
+                continue
+            try:
+                spans = blob_spans(tracked[relpath.as_posix()], subpath, self.remote_cache)
+            except Exception as e:
+                raise FlatteningError(f"failed to extract spans from {subpath}") from e
+            self.add_module(subpath, spans=spans)
+
+    def discover_archive_modules(self) -> None:
+        """Add the modules read from the ``package_path`` archive, see archives.
+
+        Modules are named and selected as they are in a directory.
+        """
+        if DEBUG: print(f"\nDEBUG: Discovering modules in archive {self.package_path = }", file=sys.stderr)
+
+        if Path(self.package_path).is_file():
+            self.input_files.append(str(self.package_path))
+
+        allowed_main = self.allowed_main_module()
+        for name in sorted(self.archive_sources, key=lambda name: Path(name)):
+            relpath = Path(name)
+            if "/" not in name and name == self.package_name + ".py":
+                wanted = True  # a single module archive, as a single file
+            else:
+                wanted = self.wanted_module(relpath, allowed_main)
+            if wanted:
+                module = FlatteningModule.module_name(self, relpath)
+                fm = FlatteningModule(self, Path(self.package_path) / relpath, module)
+                if name in self.archive_spans:
+                    # Parsed as it was read, spans are rewritten in place so copy them
+                    spans = [ Span(s.text, s.kind) for s in self.archive_spans[name] ]
+                    self.add_module(fm, spans=spans)
+                else:
+                    self.add_module(fm, source=self.archive_sources[name])
+
+    def spill_spans(self, spans: List[Span]) -> List[Span]:
+        """Move ``spans`` to the span store once ``max_memory`` is used up, see spill."""
+        size = sum(len(span.text.encode("utf-8", "surrogatepass")) for span in spans)
+        if self.resident_bytes + size <= self.max_memory:
+            self.resident_bytes += size
+            return spans
+        pass
+        if self.span_store is None:
+            self.span_store = SpanStore()
+        return [ SpilledSpan(self.span_store, span.text, span.kind) for span in spans ]
+
+    def allowed_main_module(self):
+        """Return the one __main__ module discovery may accept, None for none."""
+        # Determine exactly which __main__.py (if any) we are allowed to accept
+        if self.module_only:
+            allowed_main = None
+        elif self.main_from:
+            allowed_main = normalize_a_module_name(self.main_from, self.package_name)
+            if not allowed_main.endswith(".__main__"):
+                allowed_main = allowed_main + ".__main__"
+        else:
+            allowed_main = self.package_name + ".__main__"
+
+        if DEBUG: print(f"DEBUG: Discover - {allowed_main = }", file=sys.stderr)
+        return allowed_main
+
+    def wanted_module(self, relpath: Path, allowed_main) -> bool:
+        """Apply exclude/include and the __main__ selection to the module at ``relpath``."""
+        dotted = str(relpath.with_suffix('')).replace('/', '.').replace('\\', '.')
+        if dotted.endswith(".__init__"):
+            dotted = dotted.rsplit(".", 1)[0]
+
+        full_mod = normalize_a_module_name(dotted, self.package_name)
+
+        if self.exclude and dotted_member_of(full_mod, self.exclude):
+            if not (self.include and dotted_member_of(full_mod, self.include)):
+                if DEBUG: print(f"DEBUG: Discover - excluded - skipping module {full_mod = }, from {relpath = }", file=sys.stderr)
+                return False
+
+        if full_mod.endswith(".__main__"):
+            if allowed_main is None:
+                if DEBUG: print(f"DEBUG: Discover - no cli - skipping module {full_mod = }, from {relpath = }", file=sys.stderr)
+                return False  # module_only active, skip all __main__.py
+            if allowed_main and full_mod != allowed_main:
+                if DEBUG: print(f"DEBUG: Discover - wrong cli - skipping module {full_mod = }, from {relpath = }", file=sys.stderr)
+                return False  # only allow exactly the requested __main__.py
+            self.main_py = full_mod
+
+        return True
+
+    def discover_inline_deps(self) -> None:
+        """Add the modules of the installed ``inline_deps`` packages.
+
+        Each dependency is located as ``import`` would locate it and must be
+        pure Python.  Its ``__main__.py``, if any, is skipped.
+        """
+        for dep in self.inline_deps:
+            spec = importlib.util.find_spec(dep)
+            if spec is None:
+                raise ModuleInferenceError(f"cannot find inline dependency '{dep}'")
+            if spec.submodule_search_locations:
+                for location in spec.submodule_search_locations:
+                    root = Path(location)
+                    for subpath in sorted(root.rglob('*')):
+                        if subpath.suffix in (".so", ".pyd"):
+                            raise FlatteningError(f"inline dependency '{dep}' is not pure Python: {subpath}")
+                        if subpath.suffix != ".py" or subpath.name == "__main__.py":
+                            continue
+                        dotted = str(subpath.relative_to(root).with_suffix('')).replace('/', '.').replace('\\', '.')
+                        if dotted.endswith("__init__"):
+                            dotted = dotted[:-len("__init__")].rstrip(".")
+                        module = dep + "." + dotted if dotted else dep
+                        self.add_module(FlatteningModule(self, subpath, module))
+            elif spec.origin and spec.origin.endswith(".py"):
+                self.add_module(FlatteningModule(self, Path(spec.origin), dep))
+            else:
+                raise FlatteningError(f"inline dependency '{dep}' is not pure Python: {spec.origin}")
+
+    def is_inlined_module(self, module: str) -> bool:
+        """True when ``module`` belongs to one of the ``inline_deps``."""
+        return dotted_member_of(module, self.inline_deps)
+
+    def gather_inline_dep_spans(self):
+        """Return the spans of the inlined dependencies, in discovery order.
+
+        Their ``__all__``, main guards and module dunders such as
+        ``__version__`` describe the dependency, not the output, and are
+        dropped.
+        """
+        dep_spans = []
+        for mod, spans in self.module_spans:
+            if not self.is_inlined_module(mod):
+                continue
+            for s in spans:
+                if s.kind in ("__all__", "main_guard"):
+                    continue
+                if s.kind == "logic" and s.text.strip():
+                    names = bound_names(ast.parse(s.text))
+                    if names and all(n.startswith("__") and n.endswith("__") for n in names):
+                        continue
+                dep_spans.append(s)
+        return dep_spans
+
+    def check_inline_dep_clashes(self, dep_spans, spans) -> None:
+        """Raise DuplicateNameError when an inlined dependency and the package bind the same name."""
+        if self.ignore_clashes:
+            return
+        owner = {}
+        for span in dep_spans:
+            if span.kind != "import" and span.text.strip():
+                for name in bound_names(ast.parse(span.text)):
+                    owner[name] = span
+        for span in spans:
+            if span.kind in ("import", "__all__") or not span.text.strip():
+                continue
+            for name in sorted(bound_names(ast.parse(span.text)) & set(owner)):
+                if span.text.strip() != owner[name].text.strip():
+                    raise DuplicateNameError(f"Duplicate top-level name: {name}, also bound by an inlined dependency")
+
+    def gather_root_spans(self):
+        docstring = None
+        retained_all = None
+        retained_imports = []
+        retained_logic = []
+
+        for mod, spans in self.module_spans:
+            first_logic = True
+            for s in spans:
+                if docstring is None and first_logic and s.kind == "logic" and not self.is_inlined_module(mod) and (
+                    s.text.lstrip().startswith("\"\"\"") or s.text.lstrip().startswith("'''")
+                ):
+                    docstring = s
+                    first_logic = False
+                    continue
+                first_logic = False
+
+                if mod == self.package_name:
+                    if s.kind == "__all__":
+                        retained_all = s
+                    elif s.kind == "import":
+                        retained_imports.append(s)
+                    elif s.kind == "main_guard":
+                        pass
+                    else:
+                        retained_logic.append(s)
+        return docstring, retained_all, retained_imports, retained_logic
+
+    def gather_module_spans(self, docstring: Span = None):
+        """Return the spans of the modules other than the root, __main__ and inlined ones.
+
+        ``docstring``, hoisted to the top of the output, is left out.
+        """
+        non_root_spans = []
+
+        main_mod, _ = self.main_py
+
+        for mod, spans in self.module_spans:
+            if mod == self.package_name or mod == main_mod or self.is_inlined_module(mod):
+                continue
+            for s in spans:
+                if s.kind != "main_guard" and s is not docstring:
+                    non_root_spans.append(s)
+
+        return non_root_spans
+
+    def gather_main_guard_spans(self):
+        result = []
+        if self.guards_all:
+            for spans in self.guard_sources.values():
+                result.extend(spans)
+        elif self.guards_from:
+            for mod in self.guards_from:
+                if mod in self.guard_sources:
+                    result.extend(self.guard_sources[mod])
+        return result
+
+    def get_main_spans(self):
+        main_mod, main_spans = self.main_py
+        if not (main_mod and main_spans and not self.module_only):
+            return []
+        return [s for s in main_spans if s.kind != "import"]
+
+    def normalize_and_assemble(self, imports, all_decl, logic, guards, main, docstring=None,
+                               type_checking=None):
+        future_imports = [s for s in imports if "from __future__" in s.text]
+        regular_imports = [s for s in imports if s not in future_imports]
+
+        if self.annotations == "defer" and not any("annotations" in s.text for s in future_imports):
+            future_imports.append(Span(DEFER_ANNOTATIONS, "import"))
+
+        emitted = ([all_decl] if all_decl else []) + logic + guards + main
+        used_names = None
+        if self.prune_imports:
+            used_names = referenced_names(emitted)
+
+        # Names only the dropped `if TYPE_CHECKING:` blocks referenced
+        unused_names = None
+        if type_checking:
+            unused_names = ((referenced_names(type_checking) | {"TYPE_CHECKING"})
+                            - referenced_names(emitted))
+
+        regular_imports, import_symbols = normalize_imports(
+            package_name=self.package_name,
+            import_spans=regular_imports,
+            used_names=used_names,
+            lazy_import=self.wants_lazy_import if self.lazy_imports or self.pgo_cold_modules else None,
+            unused_names=unused_names,
+            inline_packages=self.inline_deps,
+        )
+
+        if self.lazy_sections:
+            logic = self.defer_logic_sections(logic, future_imports + regular_imports, guards + main)
+
+        ordered = []
+        blank_line = Span(kind="blank", text="\n")
+
+        if docstring:
+            ordered.append(docstring)
+            ordered.append(blank_line)
+
+        ordered.extend(future_imports)
+        if future_imports:
+            ordered.append(blank_line)
+
+        ordered.extend(regular_imports)
+        if regular_imports:
+            ordered.append(blank_line)
+
+        if all_decl:
+            ordered.append(all_decl)
+            ordered.append(blank_line)
+
+        for s in logic + guards:
+            ordered.append(s)
+            ordered.append(blank_line)
+
+        ordered.extend(main)
+
+        return ordered, import_symbols
+
+    def eliminate_type_hints(self, logic, guards, main):
+        """Apply ``annotations`` to the spans, see type_hints.
+
+        With ``defer`` or ``strip``, ``if TYPE_CHECKING:`` blocks are dropped,
+        with ``strip`` the annotations evaluated at import time are removed
+        from the spans in place.
+
+        Returns:
+            tuple: The remaining logic spans and the dropped blocks.
+        """
+        if self.annotations == "keep":
+            return logic, []
+        dropped = [ s for s in logic if s.kind == "logic" and is_type_checking_block(s.text) ]
+        logic = [ s for s in logic if s not in dropped ]
+        if self.annotations == "strip":
+            for span in logic + guards + main:
+                span.text = strip_annotations(span.text)
+        return logic, dropped
+
+    def dedupe_logic_spans(self, logic):
+        """Drop logic spans repeating an earlier span when running it again is a no-op.
+
+        A repeat is dropped when the span is an idempotent binding, see
+        analyze_names.is_idempotent_binding(), and no span in between binds
+        a name the span binds or reads.  E.g. the `try: import x / except
+        ImportError: ...` fallback many modules of a package repeat.
+
+        Returns:
+            list: The remaining logic spans, in order.
+        """
+        first_seen = {}   # text -> index of its first span within logic
+        analyzed = {}     # text -> names bound or read, None if not idempotent
+        bound = [ None ] * len(logic)
+        result = []
+        for index, span in enumerate(logic):
+            key = span.text.strip()
+            if span.kind != "logic" or not key:
+                result.append(span)
+                continue
+            if key not in first_seen:
+                first_seen[key] = index
+                result.append(span)
+                continue
+            if key not in analyzed:
+                tree = ast.parse(span.text)
+                analyzed[key] = ((bound_names(tree) | referenced_names([span]))
+                                 if is_idempotent_binding(tree) else None)
+            names = analyzed[key]
+            # Copies in between, dropped or not, bind the same values
+            if names is not None and not any(
+                    names & self.span_bound_names(logic, bound, between)
+                    for between in range(first_seen[key] + 1, index)
+                    if logic[between].text.strip() != key):
+                if DEBUG: print(f"DEBUG: dropped duplicate logic span {key[:40]!r}", file=sys.stderr)
+                continue
+            # Rerunning it may matter, later repeats compare against this one
+            first_seen[key] = index
+            result.append(span)
+        return result
+
+    def apply_profile(self, imports, logic, trailing):
+        """Lay out the spans as the ``pgo`` profile suggests, see pgo.
+
+        Hot functions move ahead of cold ones, modules only cold functions
+        import are recorded in ``pgo_cold_modules`` to be bound lazily, and
+        ``pgo_report`` summarizes how well the profile covers the spans.
+
+        Returns:
+            list: The logic spans, reordered.
+        """
+        pass
+
+        profile = load_profile(self.pgo)
+        logic = order_hot_first(logic, profile)
+        ran = { entry["key"] for entry in profile["spans"] }
+        hot = [ s for s in logic if s.kind != "function" or span_key(s) in ran ]
+        self.pgo_cold_modules = cold_modules(imports, hot + trailing)
+        self.pgo_report = profile_coverage(logic, profile)
+        # As normalize_imports() does, local modules go and stdlib ones stay eager
+        lazy = sorted(m for m in self.pgo_cold_modules if self.wants_lazy_import(m)
+                      and not dotted_of_module(self.package_name, m)
+                      and not is_stdlib_module(m.split(".", 1)[0]))
+        if lazy:
+            self.pgo_report.append(f"bound lazily, only cold functions use them: {', '.join(lazy)}")
+        return logic
+
+    def defer_logic_sections(self, logic, imports, trailing):
+        """Move the logic each module may run on first use into lazy sections.
+
+        See lazy_sections.  The spans kept eager, and why, are recorded in
+        ``lazy_refusals`` as ``(module, span, reason)``.
+
+        Returns:
+            list: The eager logic spans followed by the sections and the
+            module ``__getattr__`` running them.
+        """
+        pass
+
+        module_of = { id(s): mod for mod, spans in self.module_spans for s in spans }
+        sections, self.lazy_refusals = plan_lazy_sections(
+            [ (module_of.get(id(s), self.package_name), s) for s in logic ], imports, trailing)
+        if not sections:
+            return logic
+        deferred = { id(s) for spans in sections.values() for s in spans }
+        if DEBUG: print(f"DEBUG: lazy sections defer {len(deferred)} spans of {len(sections)} modules", file=sys.stderr)
+        return [ s for s in logic if id(s) not in deferred ] + render_lazy_sections(sections)
+
+    @staticmethod
+    def span_bound_names(logic, bound, index):
+        """Return, and memoize in ``bound``, the names logic[index] binds."""
+        if bound[index] is None:
+            try:
+                bound[index] = bound_names(ast.parse(logic[index].text))
+            except SyntaxError:
+                bound[index] = set()
+        return bound[index]
+
+    def wants_lazy_import(self, module: str) -> bool:
+        """True when third-party `module` should be bound lazily."""
+        if module in self.pgo_cold_modules and not dotted_member_of(module, self.lazy_deny):
+            return True
+        if not self.lazy_imports:
+            return False
+        if self.lazy_allow and not dotted_member_of(module, self.lazy_allow):
+            return False
+        return not dotted_member_of(module, self.lazy_deny)
+
+    def check_clashes(self, spans, import_symbols):
+        if not self.ignore_clashes:
+            seen = set(import_symbols)
+            for span in spans:
+                if span.kind in ("function", "class"):
+                    header = span.text.lstrip()
+                    if header.startswith("def "):
+                        name = header[4:].split("(", 1)[0].strip()
+                    elif header.startswith("class "):
+                        name = header[6:].split("(", 1)[0].strip()
+                    else:
+                        continue
+                    if name in seen:
+                        raise DuplicateNameError(f"Duplicate top-level name: {name}")
+                    seen.add(name)
+
+
+    def rewrite_local_imports(self) -> None:
+        """Rewrite the local imports nested within functions, classes and logic.
+
+        Top-level local imports are dropped by normalize_imports().  Those
+        nested deeper, e.g. lazy imports within a function or a fallback in a
+        try block, would fail in the flattened module.  Their names are
+        globals of the flattened module, so each becomes ``pass``, or an
+        assignment for an alias.  The modules named through a plain
+        ``import pkg.mod`` no longer exist, ``pkg.mod.name`` becomes
+        ``name``, see rewrite_module_references().  A top-level
+        ``import dep`` of an inlined dependency is dropped along with the
+        package's own, unless ``dep`` is used as a value.  Spans are
+        rewritten in place.
+        """
+        module_basenames = { mod.rsplit(".", 1)[-1] for mod, _ in self.module_spans }
+        modules = { mod for mod, _ in self.module_spans } | { self.package_name, *self.inline_deps }
+        for _, spans in self.module_spans:
+            bindings = {}
+            for span in spans:
+                if IMPORT_KEYWORD.search(span.text):
+                    bindings.update(local_module_bindings(span.text, self.package_name, self.inline_deps))
+            bare = set()
+            for span in spans:
+                if bindings and span.kind != "import":
+                    bare |= bare_references(span.text, bindings)
+            for span in spans:
+                if bindings and any(name in span.text for name in bindings):
+                    span.text = rewrite_module_references(span.text, bindings, modules)
+                if span.kind != "import" and IMPORT_KEYWORD.search(span.text):
+                    span.text = rewrite_nested_local_imports(
+                        span.text, self.package_name, module_basenames, self.inline_deps)
+                elif (span.kind == "import" and self.inline_deps and plain_imports_of(span.text, self.inline_deps)
+                      and bare & set(local_module_bindings(span.text, self.package_name, self.inline_deps))):
+                    # `import dep` used as a value binds the module, here the flattened one
+                    span.text = rewrite_nested_local_imports(
+                        span.text, self.package_name, module_basenames, self.inline_deps)
+                    span.kind = "logic"
+
+    def get_final_output_spans(self):
+        self.rewrite_local_imports()
+        docstring, all_decl, root_imports, root_logic = self.gather_root_spans()
+        module_spans = self.gather_module_spans(docstring)
+        main_guards = self.gather_main_guard_spans()
+        main_body = self.get_main_spans()
+
+        imports = root_imports + [s for s in module_spans if s.kind == "import"]
+        logic = root_logic + [s for s in module_spans if s.kind not in["import", "main_guard"]]
+
+        if self.inline_deps:
+            # Dependencies run first, as they would on import
+            dep_spans = self.gather_inline_dep_spans()
+            self.check_inline_dep_clashes(dep_spans, logic + main_guards + main_body)
+            imports = [s for s in dep_spans if s.kind == "import"] + imports
+            logic = [s for s in dep_spans if s.kind != "import"] + logic
+
+        logic, type_checking = self.eliminate_type_hints(logic, main_guards, main_body)
+        if self.dedupe_logic:
+            logic = self.dedupe_logic_spans(logic)
+        if self.pgo:
+            logic = self.apply_profile(imports, logic, main_guards + main_body)
+
+        spans, import_symbols = self.normalize_and_assemble(
+            imports, all_decl, logic, main_guards, main_body, docstring, type_checking
+        )
+
+        self.check_clashes(spans, import_symbols)
+        return spans
+
+class FlatteningModule:
+
+    __slots__ = ("module", "path")
+
+    def __init__(self, ctx : FlatteningContext, path: Path, module: str = None):
+        self.path = path
+        if module:
+            # e.g. an inlined dependency or an archive member, outside the package root
+            self.module = module
+            return
+
+        if not path.is_file():
+            raise PathError(f"FlatteningModule must be created from a file: {path}")
+
+        try:
+            relpath = path.relative_to(ctx.package_path)
+        except ValueError:
+            raise PathError(f"Path {path} is not inside package root {ctx.package_path}")
+
+        if relpath == Path('.'):
+            relpath = Path(ctx.package_path.name)
+        self.module = FlatteningModule.module_name(ctx, relpath)
+
+    @staticmethod
+    def module_name(ctx : FlatteningContext, relpath: Path) -> str:
+        """Name the module at ``relpath`` within the package."""
+        if relpath.name == "__init__.py":
+            return ctx.package_name
+        mod_suffix = str(relpath.with_suffix('')).replace('/', '.')
+        return ctx.package_name + "." + mod_suffix
+
+IMPORT_KEYWORD = re.compile(r"\bimport\b")
+
+FLATTENED_MODULE = "__import__('sys').modules[__name__]"
+
+def rewrite_nested_local_imports(text: str, package_name: str, module_basenames: set,
+                                 inline_deps: List[str] = ()) -> str:
+    """Replace the local import statements within ``text``, see rewrite_local_imports()."""
+    edits = []
+    for node in ast.walk(ast.parse(text)):
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            replacement = local_import_replacement(node, package_name, module_basenames, inline_deps)
+            if replacement is not None:
+                edits.append(((node.lineno, node.col_offset),
+                              (node.end_lineno, node.end_col_offset), replacement))
+    return replace_source_ranges(text, edits)
+
+def local_import_replacement(node, package_name: str, module_basenames: set, inline_deps: List[str] = ()):
+    """Return the statement replacing local import ``node``, None if it is not local.
+
+    Modules of the ``inline_deps`` are local too.
+    """
+    def is_local(module):
+        return dotted_of_module(package_name, module) or dotted_member_of(module, inline_deps)
+
+    if isinstance(node, ast.ImportFrom):
+        if not (node.level > 0 or (node.module and is_local(node.module))):
+            return None
+        bindings = []
+        for alias in node.names:
+            bound = alias.asname or alias.name
+            if node.level > 0 and not node.module and alias.name in module_basenames:
+                bindings.append(f"{bound} = {FLATTENED_MODULE}")  # from . import module
+            elif alias.name != '*' and bound != alias.name:
+                bindings.append(f"{bound} = {alias.name}")
+        return "; ".join(bindings) or "pass"
+
+    local = [ alias for alias in node.names if is_local(alias.name) ]
+    if not local:
+        return None
+    kept = [ ast.unparse(alias) for alias in node.names if alias not in local ]
+    bindings = [ f"import {', '.join(kept)}" ] if kept else []
+    for alias in local:
+        bound = alias.asname or alias.name.split(".", 1)[0]
+        bindings.append(f"{bound} = {FLATTENED_MODULE}")
+    return "; ".join(bindings)
+
+def local_module_bindings(text: str, package_name: str, inline_deps: List[str] = ()) -> dict:
+    """Map the names bound by the plain local imports of ``text`` to the module each refers to.
+
+    Examples:
+        ``import pkg.mod`` binds ``{"pkg": "pkg"}``, ``import pkg.mod as m``
+        binds ``{"m": "pkg.mod"}``.
+    """
+    bindings = {}
+    for node in ast.walk(ast.parse(text)):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if dotted_of_module(package_name, alias.name) or dotted_member_of(alias.name, inline_deps):
+                    if alias.asname:
+                        bindings[alias.asname] = alias.name
+                    else:
+                        bindings[alias.name.split(".", 1)[0]] = alias.name.split(".", 1)[0]
+    return bindings
+
+def bare_references(text: str, names) -> set:
+    """Return the ``names`` which ``text`` uses other than as the start of an ``a.b`` expression."""
+    tree = ast.parse(text)
+    bases = { id(node.value) for node in ast.walk(tree) if isinstance(node, ast.Attribute) }
+    return { node.id for node in ast.walk(tree)
+             if isinstance(node, ast.Name) and node.id in names and id(node) not in bases }
+
+def attribute_chain(node) -> List[str]:
+    """Return the names of a ``a.b.c`` expression, None for any other expression."""
+    names = []
+    while isinstance(node, ast.Attribute):
+        names.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    names.append(node.id)
+    return names[::-1]
+
+def rewrite_module_references(text: str, bindings: dict, modules: set) -> str:
+    """Replace the references through local modules within ``text`` by flattened ones.
+
+    Args:
+        text (str): Source of a span.
+        bindings (dict): Names bound to local modules, see local_module_bindings().
+        modules (set): The local modules, e.g. ``pkg`` and ``pkg.mod``.
+
+    ``pkg.mod.name`` becomes ``name``, or, when assigned or deleted,
+    the attribute of the flattened module.  ``pkg.mod`` used as a value
+    becomes the flattened module.
+    """
+    edits = []
+
+    def visit(node):
+        names = attribute_chain(node) if isinstance(node, ast.Attribute) else None
+        if not names or names[0] not in bindings:
+            for child in ast.iter_child_nodes(node):
+                visit(child)
+            return
+        dotted = bindings[names[0]].split(".") + names[1:]
+        covered = len(bindings[names[0]].split("."))
+        while covered < len(dotted) and ".".join(dotted[:covered + 1]) in modules:
+            covered += 1
+        depth = covered - len(bindings[names[0]].split(".")) + 1  # names of the chain naming the module
+        if depth == len(names):
+            if depth > 1:
+                edits.append(((node.lineno, node.col_offset), (node.end_lineno, node.end_col_offset), FLATTENED_MODULE))
+            return
+        target = node
+        for _ in range(len(names) - depth - 1):
+            target = target.value
+        if isinstance(target.ctx, ast.Load):
+            replacement = target.attr
+        else:
+            replacement = f"{FLATTENED_MODULE}.{target.attr}"
+        edits.append(((target.lineno, target.col_offset), (target.end_lineno, target.end_col_offset), replacement))
+
+    visit(ast.parse(text))
+    return replace_source_ranges(text, edits)
+
+def plain_imports_of(text: str, modules: List[str]) -> bool:
+    """True when ``text`` holds an ``import x`` statement of one of ``modules``."""
+    return any(isinstance(node, ast.Import) and any(dotted_member_of(a.name, modules) for a in node.names)
+               for node in ast.parse(text).body)
+
+def dotted_member_of(dotted: str, module_list: List[str]) -> bool:
+    if not module_list:
+        return False
+    for module in module_list:
+        if dotted_of_module(module, dotted):
+            return True
+    return False
+
+def dotted_of_module(module: str, dotted: str) -> bool:
+    if dotted == module:
+        return True
+    if dotted.startswith(module + "."):
+        return True
+    return False
+
+def normalize_a_module_name(module_name: str, package_name: str) -> str:
+    if not isinstance(module_name, str):
+        raise FlatteningError(f"module_name must be str, not {type(module_name)} : {module_name!r}")
+    if module_name.startswith(package_name + ".") or module_name == package_name:
+        return module_name
+    else:
+        return package_name + "." + module_name.lstrip('.')
+
+def normalize_module_names(
+    package_name: str,
+    module_names: Union[str, List[str]]
+) -> list[str]:
+    if isinstance(module_names, str):
+        module_names = [normalize_a_module_name(module_names, package_name)]
+    if not isinstance(module_names, list):
+        raise FlatteningError(f"module_names must be str or list of str, not {type(module_names)}")
+    return [normalize_a_module_name(mod, package_name) for mod in module_names]
+
+"""Record the inputs of an output in its header, check it is still current.
+
+A ``.py`` output written to a file starts, after its shebang, with:
+
+    # pyonetrue 0.7.1 fresh 1 options=<digest> body=<digest>
+    # pyonetrue input <digest> <size> <path>
+    # pyonetrue tree <digest> <path>
+
+One ``input`` line per file flattening read, one ``tree`` line per package
+directory, whose digest covers the names of its ``.py`` files so an added or
+removed module is noticed.  Paths are relative to the output's directory.
+Digests are the first 16 hex digits of a sha256.
+
+``check_freshness()`` re-reads the inputs, without parsing them, and the
+body, and compares.  An output built by another version of pyonetrue is
+stale.  ``options`` digests the command line options which change the
+output, see fresh_options(), an output checked with other options is
+stale.
+"""
+
+FRESH_HEADER_VERSION = 1
+
+FRESH_HEADER_PREFIX = "# pyonetrue "
+
+FRESH_IGNORED_OPTIONS = (
+    "--", "--bind", "--check", "--depfile", "--help", "--in-place", "--input-tar", "--is-fresh",
+    "--jobs", "--json", "--launcher", "--max-memory", "--no-cache", "--output", "--port", "--pyc",
+    "--python", "--read-threads", "--remote-cache", "--schedule-stats", "--show-cli-args",
+    "--source", "--version",
+)
+
+def fresh_options(args: dict) -> List[str]:
+    """Return ``name=value`` of the command line options in ``args`` which change the output."""
+    return [ f"{name}={args[name]!r}" for name in sorted(args)
+             if name.startswith("-") and name not in FRESH_IGNORED_OPTIONS ]
+
+def short_digest(data: bytes) -> str:
+    """Return the first 16 hex digits of the sha256 of ``data``."""
+    return hashlib.sha256(data).hexdigest()[:16]
+
+def spans_digest(spans) -> str:
+    """Return the short_digest() of the text of ``spans``, read one at a time."""
+    digest = hashlib.sha256()
+    for span in spans:
+        digest.update(span.text.encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+def tree_digest(directory: Path) -> str:
+    """Digest the paths of the ``.py`` files under ``directory``."""
+    names = sorted(subpath.relative_to(directory).as_posix() for subpath in Path(directory).rglob("*.py"))
+    return short_digest("\n".join(names).encode("utf-8"))
+
+def header_path(path, output_dir: str) -> str:
+    """Return ``path`` relative to ``output_dir``, absolute when on another drive."""
+    try:
+        return Path(os.path.relpath(os.path.abspath(str(path)), output_dir)).as_posix()
+    except ValueError:
+        return os.path.abspath(str(path))
+
+def add_fresh_header(text: str, output, inputs: List[str], trees: List[str], options: List[str]) -> str:
+    """Return ``text``, the output to be written to ``output``, with its header.
+
+    Args:
+        text (str): The output, starting with its shebang if any.
+        output: Path the output is written to.
+        inputs (List[str]): Files flattening read.
+        trees (List[str]): Package directories flattening walked.
+        options (List[str]): The command line options, see fresh_options().
+    """
+    shebang = ""
+    if text.startswith("#!"):
+        shebang, _, text = text.partition("\n")
+        shebang += "\n"
+    return shebang + fresh_header(output, inputs, trees, options, short_digest(text.encode("utf-8"))) + text
+
+def fresh_header(output, inputs: List[str], trees: List[str], options: List[str], body: str) -> str:
+    """Return the header lines of ``output``, whose text after the shebang has digest ``body``.
+
+    See add_fresh_header() for the other arguments.
+    """
+    pass
+
+    output_dir = os.path.dirname(os.path.abspath(str(output)))
+    lines = [ f"{__version__} fresh {FRESH_HEADER_VERSION}"
+              f" options={short_digest(chr(10).join(options).encode('utf-8'))} body={body}" ]
+    for path in dict.fromkeys(inputs):
+        data = Path(path).read_bytes()
+        lines.append(f"input {short_digest(data)} {len(data)} {header_path(path, output_dir)}")
+    for directory in dict.fromkeys(trees):
+        lines.append(f"tree {tree_digest(Path(directory))} {header_path(directory, output_dir)}")
+    return "".join(FRESH_HEADER_PREFIX + line + "\n" for line in lines)
+
+def check_freshness(output, options: List[str] = None) -> Optional[str]:
+    """Return why ``output`` is stale, None when it is current.
+
+    With ``options``, see fresh_options(), an output built with other
+    options is stale.
+    """
+    pass
+
+    try:
+        with open(str(output), encoding="utf-8", newline="") as f:
+            lines = f.readlines()
+    except (OSError, UnicodeDecodeError) as e:
+        return f"cannot read '{output}': {e}"
+    if lines and lines[0].startswith("#!"):
+        lines = lines[1:]
+    header = []
+    while lines and lines[0].startswith(FRESH_HEADER_PREFIX):
+        header.append(lines.pop(0)[len(FRESH_HEADER_PREFIX):].rstrip("\n").split(" ", 3))
+    if not header or header[0][1:3] != ["fresh", str(FRESH_HEADER_VERSION)]:
+        return "no pyonetrue freshness header"
+    if header[0][0] != __version__:
+        return f"built by pyonetrue {header[0][0]}, this is {__version__}"
+    fields = dict(field.split("=", 1) for field in header[0][3].split())
+    if fields.get("body") != short_digest("".join(lines).encode("utf-8")):
+        return "the output was modified"
+    if options is not None and fields.get("options") != short_digest("\n".join(options).encode("utf-8")):
+        return "built with other options"
+
+    output_dir = os.path.dirname(os.path.abspath(str(output)))
+    for entry in header[1:]:
+        kind, digest, rest = entry[0], entry[1], " ".join(entry[2:])
+        if kind == "input":
+            size, _, name = rest.partition(" ")
+            path = os.path.join(output_dir, name)
+            try:
+                if os.stat(path).st_size != int(size) or short_digest(Path(path).read_bytes()) != digest:
+                    return f"{name} changed"
+            except OSError:
+                return f"{name} is missing"
+        elif kind == "tree":
+            if tree_digest(Path(os.path.join(output_dir, rest))) != digest:
+                return f"modules were added to or removed from {rest}"
+    return None
+
+"""Discover the modules of a package from the local git index.
+
+``git ls-files`` lists the tracked ``.py`` files with their blob hashes, in
+place of walking the directory, which in a large work tree also visits
+build outputs, environments and other untracked files.  A blob hash names
+the exact content of a file, so it keys a cache of the file's spans.
+Files modified in the work tree are parsed from disk, never from the
+cache.
+"""
+
+SPAN_CACHE_FORMAT = 1
+
+def git_ls_files(directory: Path, *options: str) -> List[str]:
+    """Run ``git ls-files -z`` in ``directory`` for its ``.py`` files, return the entries."""
+    try:
+        result = subprocess.run(
+            ["git", "-C", str(directory), "ls-files", "-z", *options, "--", "*.py"],
+            stdin=subprocess.DEVNULL, capture_output=True, check=True,
+        )
+    except FileNotFoundError:
+        raise PathError("--git requires the git command")
+    except subprocess.CalledProcessError as e:
+        message = e.stderr.decode(errors="replace").strip()
+        raise PathError(f"cannot list the git tracked files of '{directory}': {message}")
+    return [ entry for entry in result.stdout.decode("utf-8", "surrogateescape").split("\0") if entry ]
+
+def git_tracked_files(directory: Path) -> dict[str, str]:
+    """Map each tracked ``.py`` file under ``directory``, relative to it, to its blob hash.
+
+    Examples:
+        ``100644 8ab6...e1 0\\tpkg/mod.py`` is listed as ``{"pkg/mod.py": "8ab6...e1"}``.
+    """
+    tracked = {}
+    for entry in git_ls_files(directory, "--stage"):
+        info, _, path = entry.partition("\t")
+        mode, blob, _ = info.split(" ", 2)
+        if mode != "160000":  # a submodule, not a file
+            tracked[path] = blob
+    return tracked
+
+def git_modified_files(directory: Path) -> set:
+    """Return the tracked ``.py`` files under ``directory`` changed in the work tree."""
+    return set(git_ls_files(directory, "--modified"))
+
+def blob_spans(blob: str, path: Path, remote: str = None) -> List[Span]:
+    """Return the spans of ``path``, whose content is git blob ``blob``, cached by blob.
+
+    With ``remote``, the URL of a remote cache, entries are shared through it.
+    """
+    key = cache_key(blob, f"{SPAN_CACHE_FORMAT}:{sys.version_info[0]}.{sys.version_info[1]}")
+    cached = load_cached_json("spans", key, remote)
+    if cached is not None:
+        return [ Span(text, kind) for kind, text in cached ]
+    spans = extract_spans(path)
+    store_cached_json("spans", key, [ [span.kind, span.text] for span in spans ], remote)
+    return spans
+
+"""Defer the top-level logic of each original module until first use.
+
+Experimental.  Functions and classes stay eager.  The logic spans of an
+original module which only bind names, e.g. ``TABLE = build_table()``, are
+moved into a section function, which runs the first time one of those
+names is looked up on the flattened module.  A module level
+``__getattr__`` (PEP 562) detects the lookup.
+
+Python resolves a global name used within the module itself without
+consulting ``__getattr__``.  A span is therefore only deferred when no
+eager code of the flattened module uses the names it binds, so in practice
+when they are only used by importers of the module.  The analysis also
+refuses spans with side effects it cannot defer: any statement other than
+an assignment to names, an import, or an ``if`` or ``try`` around those.
+"""
+
+LAZY_SECTION_PREFIX = "_pyonetrue_section_"
+
+LAZY_SECTION_TABLE = "_PYONETRUE_SECTIONS"
+
+LAZY_SECTION_GETATTR = f'''\
+_pyonetrue_module_getattr = globals().get("__getattr__")
+
+def __getattr__(name):
+    """Run the lazy section defining ``name`` on first use (PEP 562)."""
+    section = {LAZY_SECTION_TABLE}.get(name)
+    if section is not None:
+        for key in [ key for key, value in {LAZY_SECTION_TABLE}.items() if value is section ]:
+            del {LAZY_SECTION_TABLE}[key]
+        section()
+        if name in globals():
+            return globals()[name]
+    if _pyonetrue_module_getattr is not None:
+        return _pyonetrue_module_getattr(name)
+    raise AttributeError(f"module {{__name__!r}} has no attribute {{name!r}}")
+'''
+
+def deferral_refusal(tree: ast.Module) -> Optional[str]:
+    """Return why the statements of ``tree`` cannot be deferred, None if they can.
+
+    Examples:
+        >>> deferral_refusal(ast.parse("TABLE = build()\\n")) is None
+        True
+        >>> deferral_refusal(ast.parse("sys.path.append('x')\\n"))
+        'line 1: expression statement may have side effects'
+    """
+    for node in tree.body:
+        refusal = statement_refusal(node)
+        if refusal:
+            return refusal
+    names = bound_names(tree)
+    dunders = sorted(name for name in names if name.startswith("__") and name.endswith("__"))
+    if dunders:
+        return f"binds {', '.join(dunders)}, which the import system reads directly"
+    if not names:
+        return "binds no names"
+    return None
+
+def statement_refusal(node: ast.stmt) -> Optional[str]:
+    """Return why ``node`` cannot be deferred, None if it can."""
+    if isinstance(node, (ast.Import, ast.ImportFrom, ast.Pass)):
+        return None
+    if is_constant_statement(node):
+        return None
+    if isinstance(node, (ast.Assign, ast.AnnAssign)):
+        targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+        if isinstance(node, ast.AnnAssign) and node.value is None:
+            return f"line {node.lineno}: annotation without a value"
+        for target in targets:
+            elements = target.elts if isinstance(target, (ast.Tuple, ast.List)) else [target]
+            if not all(isinstance(e, ast.Name) for e in elements):
+                return f"line {node.lineno}: assignment to an attribute or item may have side effects"
+        return None
+    if isinstance(node, (ast.If, ast.Try)):
+        handlers = [ stmt for h in getattr(node, "handlers", []) for stmt in h.body ]
+        for stmt in node.body + node.orelse + getattr(node, "finalbody", []) + handlers:
+            refusal = statement_refusal(stmt)
+            if refusal:
+                return refusal
+        return None
+    if isinstance(node, ast.Expr):
+        return f"line {node.lineno}: expression statement may have side effects"
+    return f"line {node.lineno}: {type(node).__name__.lower()} statement may have side effects"
+
+def plan_lazy_sections(logic: list, imports: List[Span], trailing: List[Span]):
+    """Decide which logic spans to defer.
+
+    A span is deferred when ``deferral_refusal()`` accepts it and the
+    names it binds are bound nowhere else and read by no eager code.  The
+    names it reads must not be rebound later in the output, since the
+    section sees their final values, nor be bound by another section.
+    Refusing a span makes it eager, which may refuse others in turn.
+
+    Args:
+        logic (list): ``(module, span)`` of the logic spans, in output order.
+        imports (List[Span]): The normalized imports, emitted before the logic.
+        trailing (List[Span]): The guards and main, emitted after the logic.
+
+    Returns:
+        tuple: ``(sections, refusals)``, sections maps each module to its
+        deferred spans in order, refusals lists ``(module, span, reason)``.
+    """
+    refusals = []
+    bound = []
+    used = []
+    deferred = set()  # indices into logic
+    for index, (module, span) in enumerate(logic):
+        tree = ast.parse(span.text) if span.text.strip() else ast.Module(body=[], type_ignores=[])
+        bound.append(bound_names(tree))
+        # Listing a name in __all__ reads it through __getattr__
+        used.append(set() if span.kind == "__all__" else referenced_names([span]))
+        if span.kind != "logic" or all(is_constant_statement(node) for node in tree.body):
+            continue  # e.g. a docstring, nothing to defer
+        reason = deferral_refusal(tree)
+        if reason:
+            refusals.append((module, span, reason))
+        else:
+            deferred.add(index)
+
+    def names_bound_by(spans):
+        return set().union(*(bound_names(ast.parse(s.text)) for s in spans if s.text.strip()))
+
+    eager_bound = names_bound_by(imports + trailing)
+    trailing_bound = names_bound_by(trailing)
+    eager_used = referenced_names(imports + trailing)
+
+    changed = True
+    while changed:
+        changed = False
+        for index in sorted(deferred):
+            module, span = logic[index]
+            section = { i for i in deferred if logic[i][0] == module }
+            others = [ i for i in range(len(logic)) if i not in section ]
+            used_eagerly = bound[index] & set().union(
+                eager_used, *(used[i] for i in others if i not in deferred))
+            bound_elsewhere = bound[index] & set().union(eager_bound, *(bound[i] for i in others))
+            rebound = used[index] & set().union(
+                trailing_bound, *(bound[i] for i in others if i > index or i in deferred))
+            reason = None
+            if used_eagerly:
+                reason = f"{', '.join(sorted(used_eagerly))} read by eager code"
+            elif bound_elsewhere:
+                reason = f"{', '.join(sorted(bound_elsewhere))} bound elsewhere too"
+            elif rebound:
+                reason = f"reads {', '.join(sorted(rebound))}, bound later or by another section"
+            if reason:
+                refusals.append((module, span, reason))
+                deferred.discard(index)
+                changed = True
+
+    sections = {}
+    for index in sorted(deferred):
+        module, span = logic[index]
+        sections.setdefault(module, []).append(span)
+    return sections, refusals
+
+def render_lazy_sections(sections: dict) -> List[Span]:
+    """Return the spans defining each section, their name table and ``__getattr__``."""
+    rendered = []
+    table = []
+    for index, (module, spans) in enumerate(sections.items()):
+        function = f"{LAZY_SECTION_PREFIX}{index}"
+        names = set()
+        for span in spans:
+            names |= bound_names(ast.parse(span.text))
+        body = "".join(indent_source(span.text) for span in spans)
+        rendered.append(Span(
+            f"def {function}():\n"
+            f"    \"\"\"Deferred top-level logic of {module}.\"\"\"\n"
+            f"    global {', '.join(sorted(names))}\n"
+            f"{body}",
+            "logic",
+        ))
+        table.extend(f"    {name!r}: {function},\n" for name in sorted(names))
+    rendered.append(Span(f"{LAZY_SECTION_TABLE} = {{\n{''.join(table)}}}\n", "logic"))
+    rendered.append(Span(LAZY_SECTION_GETATTR, "logic"))
+    return rendered
+
+def indent_source(text: str) -> str:
+    """Indent ``text`` by four spaces, leaving multi-line string contents as they are."""
+    in_string = string_continuation_lines(text)
+    return "".join(
+        line if number in in_string or not line.strip() else "    " + line
+        for number, line in enumerate(text.splitlines(keepends=True), start=1)
+    )
+
+"""Minify a flattened module.
+
+The module is parsed, its docstrings and ``assert`` statements are removed
+from the tree and the tree is unparsed, which drops comments and
+normalizes formatting.  Blank lines are then dropped and indentation is
+reduced to one space per level.  The result compiles to the same code as
+the original run with ``python -OO``.
+"""
+
+def minify_source(text: str, keep_docstring: bool = False) -> str:
+    """Return a minified equivalent of the module source ``text``.
+
+    Args:
+        text (str): Module source.
+        keep_docstring (bool): Keep the module docstring, e.g. for a CLI
+            that parses ``__doc__``.
+
+    Returns:
+        str: Minified source, a leading ``#!`` line is kept.
+
+    Examples:
+        >>> minify_source('def f(x):\\n    "Doc."\\n    assert x\\n\\n    return x  # same\\n')
+        'def f(x):\\n return x\\n'
+    """
+    shebang = text.split("\n", 1)[0] + "\n" if text.startswith("#!") else ""
+    tree = ast.parse(text)
+    strip_docstrings_and_asserts(tree, keep_docstring)
+    return shebang + compact_lines(ast.unparse(tree) + "\n")
+
+def is_constant_statement(node: ast.stmt) -> bool:
+    """True for a statement which is only a constant, e.g. a docstring or ``...``."""
+    return isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant)
+
+def strip_docstrings_and_asserts(tree: ast.Module, keep_docstring: bool = False) -> None:
+    """Remove docstrings and ``assert`` statements from ``tree`` in place.
+
+    Every constant statement goes, not only docstrings, since a string
+    following a removed docstring would otherwise become the docstring.
+    A body left empty receives a ``pass``.
+    """
+    for node in ast.walk(tree):
+        for name in ("body", "orelse", "finalbody"):
+            body = getattr(node, name, None)
+            if not isinstance(body, list) or not body or not isinstance(body[0], ast.stmt):
+                continue
+            keep = []
+            for index, stmt in enumerate(body):
+                if isinstance(stmt, ast.Assert):
+                    continue
+                if is_constant_statement(stmt):
+                    module_docstring = (index == 0 and isinstance(node, ast.Module)
+                                        and isinstance(stmt.value.value, str))
+                    if not (keep_docstring and module_docstring):
+                        continue
+                keep.append(stmt)
+            if not keep and not isinstance(node, ast.Module):
+                keep = [ ast.Pass() ]
+            body[:] = keep
+
+def compact_lines(source: str) -> str:
+    """Drop blank lines and indent by one space per level.
+
+    Lines within multi-line strings are kept as they are.
+    """
+    in_string = string_continuation_lines(source)
+    lines: List[str] = []
+    for number, line in enumerate(source.splitlines(keepends=True), start=1):
+        if number in in_string:
+            lines.append(line)
+        elif line.strip():
+            stripped = line.lstrip(" ")
+            lines.append(" " * ((len(line) - len(stripped)) // 4) + stripped)
+    return "".join(lines)
+
+def string_continuation_lines(source: str) -> set:
+    """Return the numbers of the lines which continue a multi-line string."""
+    lines = set()
+    for token in tokenize.generate_tokens(io.StringIO(source).readline):
+        if token.type == tokenize.STRING or token.type == getattr(tokenize, "FSTRING_MIDDLE", None):
+            lines.update(range(token.start[0] + 1, token.end[0] + 1))
+    return lines
+
+"""Functions for normalizing and rewriting import statements."""
+
+"""
+TODO: Add module-level docstring.
+"""
+
+try :
+    from stdlib_list import stdlib_list
+    STDLIB_MODULES = None
+except ImportError:
+    STDLIB_MODULES = {
+        'ast', 'os', 'sys', 'math', 'json', 're', 'pathlib', 'collections',
+        'typing', 'asyncio', 'threading', 'subprocess', 'itertools', 'functools',
+        'http', 'email', 'unittest', 'logging', 'time', 'shutil',
+        'contextlib', 'pickle', 'dataclasses', 'socket', 'inspect',
+        'importlib', 'types', 'copy', 'errno', 'statistics',
+        # and more... (expand as needed)
+    }
+    stdlib_list = False
+
+DEFAULT_LINE_LENGTH = 80
+
+LINE_LENGTH = DEFAULT_LINE_LENGTH
+
+@dataclass(order=True)
+class ImportEntry:
+    """
+    Note:
+    - All None values are coerced to '' for sorting/equality purposes.
+    - This guarantees compatibility with @dataclass(order=True).
+    """
+    module: str
+    symbol: str
+    asname: str
+    is_plain_import: bool
+    def __post_init__(self):
+        # Explicitly coerce types
+        """TODO: Add detailed docstring."""
+        object.__setattr__(self, 'module', self.module or '')
+        object.__setattr__(self, 'symbol', self.symbol or '')
+        object.__setattr__(self, 'asname', self.asname or '')
+
+IE = ImportEntry
+
+def normalize_imports(package_name: str, import_spans: List[Span], pyver=None,
+                      used_names=None, lazy_import=None, unused_names=None,
+                      inline_packages=()) -> Tuple[List[Span], List[str]]:
+    """
+    Normalize import spans:
+    - Eliminate all relative imports.
+    - Eliminate all absolute local imports matching the project_package, or
+      one of the `inline_packages` flattened along with it.
+    - Eliminate imports whose bound name is not in `used_names`, when given,
+      or is in `unused_names`.  Star imports are always kept.
+    - Deduplicate surviving imports by (module, alias-or-symbol).
+    - Regroup into from-import lines.
+    - Apply line-wrapping for >80 char lines.
+    - Group stdlib and third-party imports separately.
+    - Bind third-party `import x` and `import x.y as z` statements lazily when
+      `lazy_import(module)` is true.  See LAZY_IMPORT_HELPER.
+    Returns a tuple of (list of formatted import spans, list of imported global names).
+    """
+    rows = build_import_table(package_name, import_spans, inline_packages)
+
+    # Deduplicate by (module, alias-or-symbol)
+    names = {}
+    seen = set()
+    groups = {}
+    table = []
+    imported_names = []
+
+    for module, symbol, asname, is_plain_import in rows:
+        if (used_names is not None or unused_names) and symbol != '*':
+            # `import a.b` binds `a`
+            bound = asname or (module.split('.', 1)[0] if is_plain_import else symbol)
+            if used_names is not None and bound not in used_names:
+                continue
+            if unused_names and bound in unused_names:
+                continue
+        # use alias if present, else symbol, else module stem
+        name = asname or symbol or module.rsplit('.', 1)[-1]
+        key = (module, name)
+        if key in seen:
+            continue
+        if name in names:
+            raise ImportNormalizationError(f"name clash importing `{name}` from {module}, already imported from {names[name]}")
+        seen.add(key)
+        names[name] = module
+        imported_names.append(name)
+        # Sort key: stdlib group first, then module, plain imports before
+        # from-imports, then symbol and alias.  One sort orders everything.
+        group = groups.get(module)
+        if group is None:
+            group = 0 if is_stdlib_module(module.split('.', 1)[0], pyver=pyver) else 1
+            groups[module] = group
+        table.append((group, module, not is_plain_import, symbol, asname))
+
+    table.sort()
+
+    output_spans = []
+    lazy_bindings = []
+    previous_group = None
+
+    for (group, module, is_from), members in groupby(table, key=itemgetter(0, 1, 2)):
+        pairs = tuple((symbol, asname) for _, _, _, symbol, asname in members)
+        if group == 1 and not is_from and lazy_import and lazy_import(module):
+            eager = []
+            for symbol, asname in pairs:
+                if not asname and '.' in module:
+                    eager.append((symbol, asname))  # `import a.b` binds `a`, keep it
+                else:
+                    lazy_bindings.append(f"{asname or module} = {LAZY_IMPORT_FUNCTION}({module!r})\n")
+            pairs = tuple(eager)
+            if not pairs:
+                continue
+        if previous_group is not None and group != previous_group:
+            output_spans.append(Span(kind="blank", text="\n"))
+        previous_group = group
+        text = format_import_group(module, not is_from, pairs, LINE_LENGTH)
+        output_spans.append(Span(kind="import", text=text))
+
+    if output_spans:
+        output_spans.append(Span(kind="blank", text="\n"))
+
+    if lazy_bindings:
+        output_spans.append(Span(kind="function", text=LAZY_IMPORT_HELPER))
+        output_spans.append(Span(kind="blank", text="\n"))
+        output_spans.append(Span(kind="import", text="".join(lazy_bindings)))
+        output_spans.append(Span(kind="blank", text="\n"))
+
+    return output_spans, imported_names
+
+LAZY_IMPORT_FUNCTION = "_pyonetrue_lazy_import"
+
+LAZY_IMPORT_HELPER = f'''def {LAZY_IMPORT_FUNCTION}(name):
+    import importlib.util
+    import sys
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {{name!r}}", name=name)
+    if not hasattr(spec.loader, "exec_module"):
+        return importlib.import_module(name)
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    parent, _, child = name.rpartition(".")
+    if parent:
+        setattr(sys.modules[parent], child, module)
+    return module
+'''
+
+def build_import_table(package_name: str, import_spans: List[Span], inline_packages=()) -> List[tuple]:
+    """Parse import spans into import table rows.
+
+    Each distinct span text is parsed once.  Simple single line statements,
+    by far the most common, are split directly; anything else goes through
+    ``ast``.  Relative imports and absolute imports of ``package_name`` or
+    ``inline_packages`` are dropped.
+
+    Args:
+        package_name (str): Name of the package being flattened.
+        import_spans (List[Span]): Spans of kind 'import'.
+        inline_packages (Iterable[str]): Other packages flattened into the output.
+
+    Returns:
+        List[tuple]: Rows of ``(module, symbol, asname, is_plain_import)``.
+    """
+    intern = sys.intern
+    local_names = (package_name, *inline_packages)
+    local_prefixes = tuple(name + '.' for name in local_names)
+    rows = []
+    for text in dict.fromkeys(span.text for span in import_spans):
+        parsed = split_simple_import(text)
+        if parsed is None:
+            parsed = parse_import_statements(text)
+        for level, module, aliases in parsed:
+            if level > 0:
+                continue  # Eliminate relative imports
+            if module is None:
+                # plain import : each alias names a module
+                for name, asname in aliases:
+                    if name in local_names or name.startswith(local_prefixes):
+                        continue  # Eliminate local absolute imports
+                    name = intern(name)
+                    rows.append((name, name, intern(asname), True))
+                continue
+            if module and ( module in local_names
+                         or module.startswith(local_prefixes) ):
+                continue  # Eliminate local absolute imports
+            module = intern(module)
+            for name, asname in aliases:
+                rows.append((module, intern(name), intern(asname), False))
+    return rows
+
+SIMPLE_FROM_IMPORT = re.compile(r"from\s+(\.*)\s*([\w.]*)\s+import\s+(.+)")
+
+def split_simple_import(text: str):
+    """Split a single line import statement without invoking the parser.
+
+    Returns a list of ``(level, module, aliases)`` tuples, as does
+    ``parse_import_statements()``, or None when ``text`` is anything other
+    than one plain ``import ...`` or ``from ... import ...`` line.  Plain
+    imports have a module of None and list the imported modules as aliases.
+    """
+    text = text.strip()
+    if not text or any(c in text for c in "()\\#;\n"):
+        return None
+    if text.startswith("import "):
+        names = split_import_names(text[7:])
+        if names is None:
+            return None
+        return [(0, None, names)]
+    match = SIMPLE_FROM_IMPORT.fullmatch(text)
+    if not match:
+        return None
+    dots, module, rest = match.groups()
+    if not (module or dots):
+        return None
+    names = split_import_names(rest)
+    if names is None:
+        return None
+    return [(len(dots), module, names)]
+
+def split_import_names(text: str):
+    """Split ``a as b, c`` into ``[('a', 'b'), ('c', '')]``, None if malformed."""
+    names = []
+    for part in text.split(','):
+        words = part.split()
+        if len(words) == 1:
+            names.append((words[0], ''))
+        elif len(words) == 3 and words[1] == 'as':
+            names.append((words[0], words[2]))
+        else:
+            return None
+    return names
+
+def parse_import_statements(text: str):
+    """Parse import statements with ``ast``, see ``split_simple_import()``."""
+    parsed = []
+    for node in ast.parse(text).body:
+        if isinstance(node, ast.ImportFrom):
+            aliases = [ (alias.name, alias.asname or '') for alias in node.names ]
+            parsed.append((node.level, node.module or '', aliases))
+        elif isinstance(node, ast.Import):
+            names = [ (alias.name, alias.asname or '') for alias in node.names ]
+            parsed.append((0, None, names))
+    return parsed
+
+@lru_cache(maxsize=4096)
+def format_import_group(module: str, is_plain_import: bool, pairs: tuple, line_length: int) -> str:
+    """Format the imports of one module as source text.
+
+    Results are cached per module key, so identical groups seen again (by
+    repeated runs, or by several entry points of one package) are free.
+
+    Args:
+        module (str): Imported module.
+        is_plain_import (bool): ``import x`` when True, ``from x import ...`` otherwise.
+        pairs (tuple): Sorted, unique ``(symbol, asname)`` pairs.
+        line_length (int): Wrap from-imports longer than this.
+
+    Returns:
+        str: Newline terminated import statement(s).
+    """
+    if is_plain_import:
+        lines = [ f"import {module} as {asname}" if asname else f"import {module}"
+                  for _, asname in pairs ]
+        return "\n".join(lines) + "\n"
+    symbols = [ f"{symbol} as {asname}" if asname else symbol
+                for symbol, asname in pairs ]
+    joined = ", ".join(symbols)
+    if len(joined) <= (line_length-len(f"from {module} import ")):
+        return f"from {module} import {joined}\n"
+    parts = [f"from {module} import ("]
+    for sym in symbols:
+        parts.append(f"    {sym},")
+    parts.append(")")
+    return "\n".join(parts) + "\n"
+
+    """TODO: Add detailed docstring."""
+
+def format_plain_import(entries: List[ImportEntry]) -> List[str]:
+    if not entries:
+        return []
+    module = entries[-1].module
+    pairs = sorted({ ('', e.asname) for e in entries })
+    return format_import_group(module, True, tuple(pairs), LINE_LENGTH).splitlines()
+
+    """TODO: Add detailed docstring."""
+
+def format_from_import(entries: List[ImportEntry]) -> List[str]:
+    if not entries:
+        return []
+    module = entries[-1].module
+    pairs = sorted({ (e.symbol, e.asname) for e in entries })
+    return format_import_group(module, False, tuple(pairs), LINE_LENGTH).splitlines()
+
+    """TODO: Expand this docstring."""
+
+def is_stdlib_module(module, pyver=None):
+    """
+    Check if a module is part of the standard library.
+    """
+    global STDLIB_MODULES
+    if module in sys.builtin_module_names:
+        return True
+    if stdlib_list and pyver is not None:
+        # If stdlib_list is available, use it to check for stdlib modules
+        if STDLIB_MODULES is None:
+            STDLIB_MODULES = stdlib_list(pyver)
+        return module in STDLIB_MODULES
+    return module in STDLIB_MODULES
+
+# User configurable line length
+    """TODO: Expand this docstring."""
+
+def set_line_length(length: int):
+    """
+    Set the line length for formatting imports.
+    """
+    global LINE_LENGTH
+    if length > 0:
+        LINE_LENGTH = length
+    else:
+        raise ImportNormalizationError("`line_length` must be > 0")
+
+# Get the current line length
+    """TODO: Expand this docstring."""
+
+def get_line_length() -> int:
+    """
+    Get the current line length for formatting imports.
+    """
+    return LINE_LENGTH
+
+"""Profile-guided layout of the flattened module.
+
+``record_profile()`` runs a flattened artifact with a workload, i.e. its
+command line, under ``sys.monitoring`` (Python 3.12+) or ``sys.settrace``
+and records which of its top-level spans run, in order, and whether they
+first ran at startup or once the main guard was reached.  Spans are keyed
+by kind and name, see ``node_key()``, so a profile applies to later builds
+of the same source.
+
+A build given the profile puts the functions which ran ahead of those
+which did not, see ``order_hot_first()``, and binds the third-party
+modules only cold functions use lazily, see ``cold_modules()``.
+"""
+
+PGO_PROFILE_VERSION = 1
+
+PGO_RUNNER = """
+import json, pkgutil, runpy, sys  # run_path() imports pkgutil
+path, output, guards = sys.argv[1], sys.argv[2], json.loads(sys.argv[3])
+sys.argv[:] = [path] + sys.argv[4:]
+guard_lines = { line for start, end in guards for line in range(start, end + 1) }
+events = []
+state = { "phase": "startup" }
+
+def on_line(line):
+    if line in guard_lines:
+        state["phase"] = "run"
+    events.append(["line", line, state["phase"]])
+
+if hasattr(sys, "monitoring"):
+    tracer = "sys.monitoring"
+    monitoring = sys.monitoring
+    monitoring.use_tool_id(monitoring.PROFILER_ID, "pyonetrue-pgo")
+
+    def on_start(code, offset):
+        if code.co_filename == path:
+            if code.co_name == "<module>":
+                monitoring.set_local_events(monitoring.PROFILER_ID, code, monitoring.events.LINE)
+            else:
+                events.append(["call", code.co_firstlineno, state["phase"]])
+        return monitoring.DISABLE
+
+    def on_monitored_line(code, line):
+        on_line(line)
+        return monitoring.DISABLE
+
+    monitoring.register_callback(monitoring.PROFILER_ID, monitoring.events.PY_START, on_start)
+    monitoring.register_callback(monitoring.PROFILER_ID, monitoring.events.LINE, on_monitored_line)
+    monitoring.set_events(monitoring.PROFILER_ID, monitoring.events.PY_START)
+else:
+    tracer = "sys.settrace"
+    seen = set()
+
+    def trace_lines(frame, event, arg):
+        if event == "line" and frame.f_lineno not in seen:
+            seen.add(frame.f_lineno)
+            on_line(frame.f_lineno)
+        return trace_lines
+
+    def trace_calls(frame, event, arg):
+        code = frame.f_code
+        if event != "call" or code.co_filename != path:
+            return None
+        if code.co_name == "<module>":
+            return trace_lines
+        if code not in seen:
+            seen.add(code)
+            events.append(["call", code.co_firstlineno, state["phase"]])
+        return None
+
+    sys.settrace(trace_calls)
+
+try:
+    runpy.run_path(path, run_name="__main__")
+finally:
+    sys.settrace(None)
+    if tracer == "sys.monitoring":
+        monitoring.set_events(monitoring.PROFILER_ID, 0)
+    with open(output, "w") as f:
+        json.dump({ "tracer": tracer, "events": events }, f)
+"""
+
+def record_profile(artifact: Path, argv: List[str], python: Optional[str] = None) -> dict:
+    """Run ``artifact`` with ``argv`` and record which of its spans run.
+
+    Args:
+        artifact (Path): Flattened script to run.
+        argv (List[str]): Arguments passed to the artifact, the workload.
+        python (str): Interpreter to run, default is the current one.
+
+    Returns:
+        dict: The profile, ``{"version", "artifact", "argv", "returncode",
+        "tracer", "spans": [ {"key", "phase"}, ... ], "cold": [ key, ... ]}``.
+        ``spans`` are in the order they first ran, ``cold`` never ran.
+    """
+    artifact = Path(artifact)
+    if not artifact.is_file():
+        raise PathError(f"artifact '{artifact}' is not a file")
+    nodes = ast.parse(artifact.read_text(), str(artifact)).body
+    guards = [ [node.lineno, node.end_lineno] for node in nodes if is_main_guard(node) ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "events.json")
+        result = subprocess.run(
+            [python or sys.executable, "-c", PGO_RUNNER, str(artifact), output, json.dumps(guards), *argv],
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            with open(output) as f:
+                recorded = json.load(f)
+        except (OSError, ValueError):
+            raise FlatteningError(f"recording '{artifact}' failed, exit status {result.returncode}")
+
+    ranges = top_level_ranges(nodes)
+    starts = [ start for _, start, _ in ranges ]
+    spans = []
+    ran = set()
+    for event, line, phase in recorded["events"]:
+        index = bisect.bisect_right(starts, line) - 1
+        key = ranges[index][0] if index >= 0 and line <= ranges[index][2] else None
+        if key is None or key in ran:
+            continue
+        # Running a `def` only defines the function
+        if event == "call" or not key.startswith("function:"):
+            ran.add(key)
+            spans.append({ "key": key, "phase": phase })
+    return {
+        "version": PGO_PROFILE_VERSION,
+        "artifact": artifact.name,
+        "argv": list(argv),
+        "returncode": result.returncode,
+        "tracer": recorded["tracer"],
+        "spans": spans,
+        "cold": [ key for key, _, _ in ranges if key not in ran ],
+    }
+
+def is_main_guard(node: ast.stmt) -> bool:
+    """True for ``if __name__ == "__main__":``."""
+    test = getattr(node, "test", None)
+    return (isinstance(node, ast.If) and isinstance(test, ast.Compare)
+            and isinstance(test.left, ast.Name) and test.left.id == "__name__"
+            and any(isinstance(c, ast.Constant) and c.value == "__main__" for c in test.comparators))
+
+def top_level_ranges(nodes: List[ast.stmt]) -> List[tuple]:
+    """Return ``(key, first line, last line)`` of each keyed top-level statement."""
+    ranges = []
+    for node in nodes:
+        key = node_key(node)
+        if key is not None:
+            start = min([ node.lineno ] + [ d.lineno for d in getattr(node, "decorator_list", []) ])
+            ranges.append((key, start, node.end_lineno))
+    return ranges
+
+def node_key(node: ast.stmt) -> Optional[str]:
+    """Identify a top-level statement across builds.
+
+    Functions and classes are keyed by name, other logic by the names it
+    binds.  Imports, main guards and statements binding nothing, e.g. a
+    docstring, have no key.
+
+    Examples:
+        >>> node_key(ast.parse("def main(): pass").body[0])
+        'function:main'
+        >>> node_key(ast.parse("A = B = 1").body[0])
+        'logic:A,B'
+    """
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        return f"function:{node.name}"
+    if isinstance(node, ast.ClassDef):
+        return f"class:{node.name}"
+    if isinstance(node, (ast.Import, ast.ImportFrom)) or is_main_guard(node):
+        return None
+    names = bound_names(node)
+    return f"logic:{','.join(sorted(names))}" if names else None
+
+def span_key(span) -> Optional[str]:
+    """Return the ``node_key()`` of a span holding a single top-level statement."""
+    if span.kind not in ("function", "class", "logic") or not span.text.strip():
+        return None
+    body = ast.parse(span.text).body
+    return node_key(body[0]) if len(body) == 1 else None
+
+def load_profile(path) -> dict:
+    """Read a profile written by ``pyonetrue pgo record``."""
+    try:
+        with open(str(path)) as f:
+            profile = json.load(f)
+    except OSError as e:
+        raise PathError(f"cannot read profile '{path}': {e.strerror}")
+    except ValueError:
+        raise FlatteningError(f"profile '{path}' is not JSON")
+    if not isinstance(profile, dict) or profile.get("version") != PGO_PROFILE_VERSION:
+        raise FlatteningError(f"profile '{path}' is not a version {PGO_PROFILE_VERSION} pyonetrue profile")
+    return profile
+
+def order_hot_first(spans: list, profile: dict) -> list:
+    """Move the functions which ran ahead of those which did not.
+
+    Only runs of consecutive, undecorated function definitions are
+    reordered, hot functions in the order they first ran.  A definition
+    evaluates its defaults and annotations, so one whose defaults or
+    annotations read a function of its run is not moved, nor is anything
+    moved across it.
+    """
+    order = { entry["key"]: index for index, entry in enumerate(profile["spans"]) }
+    result = []
+    run = []
+
+    def flush():
+        hot = sorted((s for s in run if span_key(s) in order), key=lambda s: order[span_key(s)])
+        result.extend(hot + [ s for s in run if span_key(s) not in order ])
+        run.clear()
+
+    for span in spans:
+        if not is_movable_function(span, run):
+            flush()
+            result.append(span)
+        else:
+            run.append(span)
+    flush()
+    return result
+
+def is_movable_function(span, run: list) -> bool:
+    """True when ``span`` is a plain function definition independent of ``run``."""
+    if span.kind != "function":
+        return False
+    body = ast.parse(span.text).body
+    if len(body) != 1 or not isinstance(body[0], (ast.FunctionDef, ast.AsyncFunctionDef)):
+        return False
+    node = body[0]
+    if node.decorator_list:
+        return False
+    arguments = node.args
+    evaluated = arguments.defaults + [ d for d in arguments.kw_defaults if d is not None ]
+    evaluated += [ a.annotation for a in arguments.posonlyargs + arguments.args + arguments.kwonlyargs
+                   + [ a for a in (arguments.vararg, arguments.kwarg) if a ] if a.annotation ]
+    evaluated += [ node.returns ] if node.returns else []
+    read = set()
+    for expr in evaluated:
+        read |= { n.id for n in ast.walk(expr) if isinstance(n, ast.Name) }
+    return not read & { span_key(s).split(":", 1)[1] for s in run }
+
+def cold_modules(imports: list, hot: list) -> set:
+    """Return the modules of plain ``import`` statements no hot span uses."""
+    used = referenced_names(span for span in hot if span.kind != "__all__")
+    modules = set()
+    for span in imports:
+        for node in ast.parse(span.text).body:
+            if isinstance(node, ast.Import):
+                for alias in node.names:
+                    if (alias.asname or alias.name.split(".", 1)[0]) not in used:
+                        modules.add(alias.name)
+    return modules
+
+def profile_coverage(spans: list, profile: dict) -> List[str]:
+    """Summarize how much of ``spans`` the profile covers, one line each."""
+    phases = { entry["key"]: entry["phase"] for entry in profile["spans"] }
+    keys = set()
+    lines = []
+    for kind in ("function", "class", "logic"):
+        of_kind = [ key for key in map(span_key, spans) if key and key.startswith(kind + ":") ]
+        keys.update(of_kind)
+        if not of_kind:
+            continue
+        ran = [ key for key in of_kind if key in phases ]
+        startup = sum(1 for key in ran if phases[key] == "startup")
+        lines.append(f"{len(ran)} of {len(of_kind)} {kind} spans ran, {startup} at startup")
+    unknown = sorted(set(phases) - keys)
+    if unknown:
+        lines.append(f"{len(unknown)} profiled spans not found: {', '.join(unknown)}")
+    return lines
+
+"""Read the modules of a package ahead of parsing them.
+
+On a network file system reading a file mostly waits on the server, and
+reading then parsing each module in turn adds up those waits.  So a pool
+of threads reads the files ahead, in order, while they are parsed: at most
+``PREFETCH_DEPTH`` files are read or waiting to be parsed, which bounds the
+memory held, and they are handed to the parser in the order given, so the
+output does not depend on which read finishes first.
+
+Where the platform has ``posix_fadvise``, each file is declared read
+sequentially, so the kernel reads ahead within it.
+"""
+
+PREFETCH_DEPTH = 16
+
+def read_source_bytes(path) -> bytes:
+    """Return the content of ``path``, hinting that it is read sequentially."""
+    import os
+    with open(str(path), "rb") as f:
+        if hasattr(os, "posix_fadvise"):
+            try:
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            except OSError:
+                pass  # a hint, e.g. not supported by the file system
+        return f.read()
+
+def prefetch_files(paths: List[Path], threads: int, depth: int = PREFETCH_DEPTH) -> Iterator[Tuple[Path, Optional[bytes]]]:
+    """Yield ``(path, content)`` for each of ``paths``, in order, read by ``threads`` threads.
+
+    At most ``depth`` files are read ahead of the one last yielded.  The
+    content of a file which cannot be read is None, the caller reads it
+    again to report the error.
+    """
+    import collections
+    import concurrent.futures
+
+    remaining = iter(paths)
+    window = collections.deque()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as pool:
+
+        def read_next():
+            path = next(remaining, None)
+            if path is not None:
+                window.append((path, pool.submit(read_source_bytes, path)))
+
+        for _ in range(max(1, depth)):
+            read_next()
+        while window:
+            path, future = window.popleft()
+            try:
+                data = future.result()
+            except OSError:
+                data = None
+            read_next()
+            yield path, data
+
+"""Measure the import time of a flattened artifact.
+
+The artifact is run in a subprocess under ``python -X importtime``.  Each
+top-level import it triggers is attributed to the import line of the
+artifact responsible for it and, given the original source, to the source
+modules which carried that import.
+"""
+
+STARTUP_MARKER = "pyonetrue: artifact start"
+
+IMPORTTIME_LINE = re.compile(r"import time:\s*(\d+)\s*\|\s*(\d+)\s*\|( *)(\S+)")
+
+LAZY_BINDING = re.compile(r"\w+\s*=\s*_pyonetrue_lazy_import\(['\"]([\w.]+)['\"]\)")
+
+STARTUP_RUNNER = f"""
+import pkgutil, runpy, sys  # run_path() imports pkgutil
+path, sys.argv[:] = sys.argv[1], sys.argv[1:]
+sys.stderr.write({STARTUP_MARKER!r} + "\\n")
+sys.stderr.flush()
+runpy.run_path(path, run_name="__main__")
+"""
+
+def measure_import_times(artifact: Path, argv: List[str], python: Optional[str] = None,
+                         use_cache: bool = True) -> dict:
+    """Run ``artifact`` under ``-X importtime`` and collect its import costs.
+
+    Results are cached by interpreter, artifact content and argv.
+
+    Args:
+        artifact (Path): Flattened module to run.
+        argv (List[str]): Arguments passed to the artifact.
+        python (str): Interpreter to run, default is the current one.
+        use_cache (bool): Reuse a cached measurement when available.
+
+    Returns:
+        dict: ``{"returncode": int, "imports": [ {"module", "self_us",
+        "cumulative_us", "depth"}, ... ]}`` in the order the imports completed.
+    """
+    artifact = Path(artifact)
+    if not artifact.is_file():
+        raise PathError(f"artifact '{artifact}' is not a file")
+    python = python or sys.executable
+
+    key = cache_key(interpreter_identity(python), artifact.read_bytes(), "\0".join(argv))
+    if use_cache:
+        cached = load_cached_json("importtime", key)
+        if cached is not None:
+            return cached
+
+    result = subprocess.run(
+        [python, "-X", "importtime", "-c", STARTUP_RUNNER, str(artifact), *argv],
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        text=True,
+    )
+    measurement = {
+        "returncode": result.returncode,
+        "imports": parse_importtime(result.stderr),
+    }
+    store_cached_json("importtime", key, measurement)
+    return measurement
+
+def interpreter_identity(python: str) -> str:
+    """Identify an interpreter by resolved path and modification time."""
+    path = os.path.realpath(python)
+    try:
+        return f"{path}:{os.stat(path).st_mtime_ns}"
+    except OSError:
+        return path
+
+def parse_importtime(stderr: str) -> List[dict]:
+    """Parse ``-X importtime`` output, keeping imports made after STARTUP_MARKER."""
+    imports = []
+    started = False
+    for line in stderr.splitlines():
+        if line == STARTUP_MARKER:
+            started = True
+            continue
+        if not started:
+            continue
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            imports.append({
+                "module": module,
+                "self_us": int(self_us),
+                "cumulative_us": int(cumulative_us),
+                "depth": max(len(indent) - 1, 0) // 2,
+            })
+    return imports
+
+def artifact_import_lines(artifact: Path) -> dict[str, int]:
+    """Map each module imported at the top level of ``artifact`` to its line number.
+
+    Lazy bindings emitted by ``--lazy-imports`` count as imports.
+    """
+    lines = {}
+    source = Path(artifact).read_text()
+    for node in ast.parse(source, str(artifact)).body:
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                lines.setdefault(alias.name, node.lineno)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            lines.setdefault(node.module, node.lineno)
+        elif isinstance(node, ast.Assign):
+            match = LAZY_BINDING.match(ast.get_source_segment(source, node) or "")
+            if match:
+                lines.setdefault(match.group(1), node.lineno)
+    return lines
+
+def source_importers(ctx) -> dict[str, List[str]]:
+    """Map each imported module to the source modules importing it.
+
+    Args:
+        ctx (FlatteningContext): Context for the original source, modules
+            are discovered but not flattened.
+    """
+    ctx.discover_modules()
+    importers = {}
+    for module, spans in ctx.module_spans:
+        for span in spans:
+            if span.kind != "import":
+                continue
+            for node in ast.parse(span.text).body:
+                if isinstance(node, ast.Import):
+                    names = [ alias.name for alias in node.names ]
+                elif node.level == 0 and node.module:
+                    names = [ node.module ]
+                else:
+                    continue
+                for name in names:
+                    found = importers.setdefault(name, [])
+                    if module not in found:
+                        found.append(module)
+    return importers
+
+def attribute_import_times(measurement: dict, import_lines: dict[str, int],
+                           importers: Optional[dict[str, List[str]]] = None) -> List[dict]:
+    """Attribute top-level import costs to artifact lines and source modules.
+
+    Only imports at depth 0 are reported, the cost of the imports they make
+    is included in their cumulative time.  Imports not made by a top-level
+    import line of the artifact, e.g. from within a function, have no line.
+
+    Returns:
+        List[dict]: Rows sorted by descending cumulative time.
+    """
+    importers = importers or {}
+    rows = []
+    for entry in measurement["imports"]:
+        if entry["depth"] != 0:
+            continue
+        module = entry["module"]
+        statement = responsible_import(module, import_lines)
+        rows.append({
+            "module": module,
+            "self_us": entry["self_us"],
+            "cumulative_us": entry["cumulative_us"],
+            "line": import_lines.get(statement),
+            "statement": statement,
+            "sources": importers.get(statement, []) if statement else [],
+        })
+    rows.sort(key=lambda row: (-row["cumulative_us"], row["module"]))
+    return rows
+
+def responsible_import(module: str, import_lines: dict[str, int]) -> Optional[str]:
+    """Return the imported module whose import statement loaded ``module``.
+
+    ``import a.b`` loads ``a`` and then ``a.b``, both belong to ``a.b``.
+    """
+    candidates = [ name for name in import_lines
+                   if name == module or name.startswith(module + ".") or module.startswith(name + ".") ]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda name: import_lines[name])
+
+def format_startup_report(rows: List[dict], returncode: int = 0) -> str:
+    """Format attributed import times as a table."""
+    total = sum(row["cumulative_us"] for row in rows)
+    lines = [f"{'cumulative':>10}  {'self':>8}  {'line':>5}  module  [sources]"]
+    for row in rows:
+        line = row["line"] if row["line"] is not None else "-"
+        sources = f"  [{', '.join(row['sources'])}]" if row["sources"] else ""
+        lines.append(f"{row['cumulative_us']:>10}  {row['self_us']:>8}  {line:>5}  {row['module']}{sources}")
+    lines.append(f"{total:>10}  {'':>8}  {'':>5}  total (us)")
+    if returncode:
+        lines.append(f"artifact exited with status {returncode}")
+    return "\n".join(lines) + "\n"
+
+"""Write a flattened module as an executable zipapp (PEP 441).
+
+The archive holds the flattened module, its bytecode and a ``__main__.py``:
+
+    <shebang>
+    __main__.py     runs the entry point
+    <module>.py     the flattened source
+    <module>.pyc    unchecked hash-based bytecode, loaded by zipimport
+
+zipimport uses the ``.pyc`` when its magic number matches the running
+Python and otherwise compiles ``<module>.py``, so the archive still runs on
+other versions, only slower.  zipimport reads stored and deflated members
+only, so those are the compression methods offered.
+"""
+
+PYZ_COMPRESSION = {
+    "stored": zipfile.ZIP_STORED,
+    "deflated": zipfile.ZIP_DEFLATED,
+}
+
+PYZ_CALL_ENTRY = """\
+import sys
+from {module} import {attr}
+sys.exit({attr}())
+"""
+
+PYZ_RUN_MODULE = """\
+import runpy
+runpy.run_module({module!r}, run_name="__main__", alter_sys=True)
+"""
+
+def hash_based_pyc(source: bytes, filename: str) -> bytes:
+    """Compile ``source`` to the bytes of an unchecked hash-based ``.pyc``."""
+    code = compile(source, filename, "exec", dont_inherit=True)
+    return b"".join([
+        importlib.util.MAGIC_NUMBER,
+        (0b01).to_bytes(4, "little"),
+        importlib.util.source_hash(source),
+        marshal.dumps(code),
+    ])
+
+def pyz_main(module: str, attr: str = None) -> str:
+    """Return the ``__main__.py`` of a zipapp running ``module``.
+
+    Args:
+        module (str): Name of the flattened module within the archive.
+        attr (str): Entry function to call, the module is run as
+            ``__main__`` when None.
+    """
+    if attr:
+        return PYZ_CALL_ENTRY.format(module=module, attr=attr)
+    return PYZ_RUN_MODULE.format(module=module)
+
+def parse_compression(compression: str) -> tuple:
+    """Parse ``stored`` or ``deflated[:<level>]`` into ``(method, level)``.
+
+    Examples:
+        >>> parse_compression("deflated:9") == (zipfile.ZIP_DEFLATED, 9)
+        True
+    """
+    name, _, level = compression.partition(":")
+    if name not in PYZ_COMPRESSION or (level and (name == "stored" or not level.isdigit() or int(level) > 9)):
+        raise ValueError(f"invalid compression '{compression}', use `stored` or `deflated[:<0-9>]`")
+    return PYZ_COMPRESSION[name], int(level) if level else None
+
+def write_pyz(target: Path, text: str, module: str, attr: str = None,
+              shebang: str = "#!/usr/bin/env python3", compression: str = "deflated") -> Path:
+    """Write the flattened module ``text`` as an executable zipapp.
+
+    Args:
+        target (Path): Archive to write, made executable.
+        text (str): Flattened module source.
+        module (str): Name of the module within the archive.
+        attr (str): Entry function, see ``pyz_main()``.
+        shebang (str): Interpreter line, omitted when empty.
+        compression (str): ``stored`` or ``deflated[:<level>]``.
+
+    Returns:
+        Path: ``target``.
+    """
+    method, level = parse_compression(compression)
+    source = text.encode("utf-8")
+    target = Path(target)
+    with open(target, "wb") as f:
+        if shebang:
+            f.write(shebang.rstrip("\n").encode("utf-8") + b"\n")
+        with zipfile.ZipFile(f, "w", compression=method, compresslevel=level) as archive:
+            archive.writestr("__main__.py", pyz_main(module, attr))
+            archive.writestr(f"{module}.py", source)
+            archive.writestr(f"{module}.pyc", hash_based_pyc(source, f"{module}.py"))
+    os.chmod(str(target), 0o755)
+    return target
+
+"""Share cache entries between machines over HTTP.
+
+The protocol is content addressed, an entry never changes once stored:
+
+    GET  <url>/<namespace>/<key>   200 and the entry, or 404
+    PUT  <url>/<namespace>/<key>   stores the request body, 201
+
+``<namespace>`` is e.g. ``spans`` or ``output``, ``<key>`` a ``cache_key()``,
+64 hex digits, digesting every input of the entry, including the versions
+of pyonetrue and Python.  Entries are the JSON documents of the local
+cache, see cache.  Any server implementing the two requests will do, e.g. a
+bucket behind a proxy.  ``serve_remote_cache()`` is a reference server
+storing the entries in a directory, see ``pyonetrue cache serve``.
+
+The client gives up on a request after ``REMOTE_CACHE_TIMEOUT`` seconds
+and on a server it could not reach for the rest of the run, the caller
+then computes the entry itself.
+"""
+
+REMOTE_CACHE_TIMEOUT = 2.0
+
+REMOTE_CACHE_MAX_ENTRY = 256 * 1024 * 1024
+
+REMOTE_CACHE_PATH = re.compile(r"/([a-z0-9-]+)/([0-9a-f]{64})")
+
+REMOTE_CACHE_UNREACHABLE = set()
+
+def remote_entry_url(url: str, namespace: str, key: str) -> str:
+    """Return the URL of entry ``key`` of ``namespace`` on the server at ``url``."""
+    return f"{url.rstrip('/')}/{namespace}/{key}"
+
+def remote_get(url: str, namespace: str, key: str) -> Optional[bytes]:
+    """Fetch an entry, None when it is missing or the server fails."""
+    import http.client
+    import urllib.error
+    import urllib.request
+    if url in REMOTE_CACHE_UNREACHABLE:
+        return None
+    try:
+        with urllib.request.urlopen(remote_entry_url(url, namespace, key),
+                                    timeout=REMOTE_CACHE_TIMEOUT) as response:
+            return response.read()
+    except urllib.error.HTTPError:
+        return None  # e.g. 404, a miss
+    except (OSError, ValueError, http.client.HTTPException) as e:
+        remote_unreachable(url, e)
+        return None
+
+def remote_put(url: str, namespace: str, key: str, data: bytes) -> bool:
+    """Store an entry, False when the server fails."""
+    import http.client
+    import urllib.error
+    import urllib.request
+    if url in REMOTE_CACHE_UNREACHABLE:
+        return False
+    request = urllib.request.Request(remote_entry_url(url, namespace, key), data=data, method="PUT",
+                                     headers={ "Content-Type": "application/json" })
+    try:
+        with urllib.request.urlopen(request, timeout=REMOTE_CACHE_TIMEOUT):
+            return True
+    except urllib.error.HTTPError:
+        return False
+    except (OSError, ValueError, http.client.HTTPException) as e:
+        remote_unreachable(url, e)
+        return False
+
+def remote_unreachable(url: str, error: Exception) -> None:
+    """Stop using the server at ``url`` for the rest of the run."""
+    REMOTE_CACHE_UNREACHABLE.add(url)
+    print(f"[INFO] remote cache {url} unreachable, computing locally: {error}", file=sys.stderr)
+
+def serve_remote_cache(directory, host: str = "127.0.0.1", port: int = 0):
+    """Return a reference server storing the entries under ``directory``.
+
+    Call ``serve_forever()`` on the server, ``server_address`` holds the
+    port actually bound when ``port`` is 0.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    root = Path(directory)
+
+    class RemoteCacheHandler(BaseHTTPRequestHandler):
+
+        def entry_path(self):
+            match = REMOTE_CACHE_PATH.fullmatch(self.path)
+            if not match:
+                self.send_error(400, "expected /<namespace>/<key>")
+                return None
+            return root / match.group(1) / match.group(2)
+
+        def do_GET(self):
+            path = self.entry_path()
+            if path is None:
+                return
+            try:
+                data = path.read_bytes()
+            except OSError:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_PUT(self):
+            path = self.entry_path()
+            if path is None:
+                return
+            length = int(self.headers.get("Content-Length") or -1)
+            if not 0 <= length <= REMOTE_CACHE_MAX_ENTRY:
+                self.send_error(411 if length < 0 else 413)
+                return
+            data = self.rfile.read(length)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temp = path.with_name(f".{path.name}.{os.getpid()}.{id(self)}.tmp")
+            temp.write_bytes(data)
+            os.replace(temp, path)
+            self.send_response(201)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            print(f"[INFO] cache serve: {self.address_string()} {format % args}", file=sys.stderr)
+
+    return ThreadingHTTPServer((host, port), RemoteCacheHandler)
+
+def output_cache_key(ctx) -> str:
+    """Digest every input of flattening ``ctx`` into the key of its output.
+
+    The options, the source of each ``.py`` file it may read and the
+    versions of pyonetrue and Python.  Paths are relative to the package,
+    so checkouts at different locations share entries.
+    """
+    pass
+    pass
+
+    parts = [ "output", __version__, f"{sys.version_info[0]}.{sys.version_info[1]}" ] + option_parts(ctx)
+    if ctx.pgo:
+        try:
+            parts += [ "pgo", Path(ctx.pgo).read_bytes() ]
+        except OSError:
+            parts += [ "pgo", ctx.pgo ]  # flattening reports it
+
+    path = Path(ctx.package_path)
+    if ctx.archive_sources:
+        for name in sorted(ctx.archive_sources):
+            parts += [ name, ctx.archive_sources[name] ]
+    elif path.is_file():
+        parts += [ path.name, path.read_bytes() ]
+    else:
+        parts += package_file_parts(path)
+
+    for dep in ctx.inline_deps:
+        import importlib.util
+        spec = importlib.util.find_spec(dep)
+        if spec is None:
+            continue  # flattening reports it
+        for location in spec.submodule_search_locations or [ spec.origin ]:
+            parts += [ dep ] + package_file_parts(Path(location))
+    return cache_key(*parts)
+
+def option_parts(ctx) -> List[str]:
+    """Return ``name=value`` of each option of ``ctx`` affecting the output text.
+
+    Results of flattening and inputs, read by content, are left out.
+    """
+    import dataclasses
+    skipped = { "package_path", "output", "main_py", "module_spans", "guard_sources",
+                "archive_sources", "archive_spans", "input_files", "lazy_refusals", "pgo",
+                "pgo_report", "pgo_cold_modules", "remote_cache", "max_memory", "span_store",
+                "resident_bytes", "jobs", "read_threads", "schedule_stats",
+                "parse_stats" }
+    return [ f"{f.name}={getattr(ctx, f.name)!r}" for f in dataclasses.fields(ctx) if f.name not in skipped ]
+
+def package_file_parts(path: Path) -> list:
+    """Return the path, relative to ``path``, and content of each ``.py`` file under it."""
+    if path.is_file():
+        return [ path.name, path.read_bytes() ]
+    parts = []
+    for subpath in sorted(path.rglob("*.py")):
+        parts += [ subpath.relative_to(path).as_posix(), subpath.read_bytes() ]
+    return parts
+
+def relative_inputs(paths: List[str], root) -> List[str]:
+    """Return ``paths`` relative to ``root`` when within it, for a cache entry."""
+    relative = []
+    for path in paths:
+        name = os.path.relpath(os.path.abspath(path), os.path.abspath(str(root)))
+        relative.append(path if name.startswith(os.pardir) else Path(name).as_posix())
+    return relative
+
+def absolute_inputs(names: List[str], root) -> List[str]:
+    """Undo relative_inputs() for a cache entry read in the package at ``root``."""
+    return [ name if os.path.isabs(name) else str(Path(root) / name) for name in names ]
+
+"""Put single files in canonical order, see ``pyonetrue --in-place`` and ``--check``.
+
+A file is in canonical order when flattening it on its own, keeping its
+main guards, shebang, header comments and relative imports, reproduces it.  Flattening drops
+the comments between top-level statements, a file which has any is not
+rewritten.  Files are processed by a pool of worker processes, largest
+first, see schedule.  The content hash of each file found or made
+canonical is cached, so an unchanged file is skipped on later runs without
+being parsed.
+"""
+
+REORDER_CACHE_FORMAT = 2
+
+RELATIVE_IMPORT_MARK = re.compile(r"_pyonetrue_relative_(\d+)_\.?")
+
+REORDER_OPTIONS = ("ignore_clashes", "prune_imports", "annotations", "dedupe_logic")
+
+def canonical_text(path: Path, options: dict) -> str:
+    """Return the text of the file at ``path`` in canonical order.
+
+    Args:
+        path (Path): The file.
+        options (dict): FlatteningContext options, see REORDER_OPTIONS.
+    """
+    pass
+
+    with open(str(path), encoding="utf-8") as f:
+        lines = f.readlines()
+    shebang = lines[0].rstrip("\n") if lines and lines[0].startswith("#!") else ""
+    header = []
+    for line in lines[1 if shebang else 0:]:
+        if line.strip() and not line.lstrip().startswith("#"):
+            break
+        header.append(line)
+    header = "".join(header).strip("\n")
+
+    ctx = FlatteningContext(package_path=str(path), module_only=True, guards_all=True,
+                            shebang=shebang, **options)
+    ctx.add_module(Path(path), source=mark_relative_imports("".join(lines)))
+    spans = ctx.get_final_output_spans()
+    text = RELATIVE_IMPORT_MARK.sub(lambda m: "." * int(m.group(1)), "".join(span.text for span in spans))
+    if header:
+        text = header + "\n\n" + text
+    if shebang:
+        text = shebang + "\n" + text
+    return text
+
+def mark_relative_imports(source: str) -> str:
+    """Return ``source`` with its relative imports made absolute imports of a marker module.
+
+    Flattening drops or rewrites relative imports, the modules they name are
+    flattened along.  A reordered file stays in its package, so they are
+    kept as the imports of a third-party module, ``from ..mod import x``
+    becomes ``from _pyonetrue_relative_2_.mod import x``, and restored by
+    canonical_text().
+
+    Examples:
+        >>> mark_relative_imports("from . import a\\nfrom ..b import c\\n")
+        'from _pyonetrue_relative_1_ import a\\nfrom _pyonetrue_relative_2_.b import c\\n'
+    """
+    import ast
+    import re
+    pass
+
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return source  # reported by flattening
+    lines = source.splitlines(keepends=True)
+    edits = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.level:
+            line = lines[node.lineno - 1].encode("utf-8")[node.col_offset:].decode("utf-8")
+            match = re.match(r"from\s+(\.+)\s*", line)
+            if match is None:  # the dots on a continuation line, left to flattening
+                continue
+            module = f"_pyonetrue_relative_{node.level}_" + ("." if node.module else " ")
+            start = node.col_offset + len(line[:match.start(1)].encode("utf-8"))
+            end = node.col_offset + len(line[:match.end()].encode("utf-8"))
+            edits.append(((node.lineno, start), (node.lineno, end), module))
+    return replace_source_ranges(source, edits)
+
+def dropped_comments(original: str, text: str) -> List[Tuple[int, str]]:
+    """Return the ``(line, comment)`` of ``original`` missing from ``text``."""
+    import collections
+    import io
+    import tokenize
+
+    def comments(source):
+        tokens = tokenize.generate_tokens(io.StringIO(source).readline)
+        return [ (token.start[0], token.string) for token in tokens if token.type == tokenize.COMMENT ]
+
+    kept = collections.Counter(comment for _, comment in comments(text))
+    dropped = []
+    for line, comment in comments(original):
+        if kept[comment]:
+            kept[comment] -= 1
+        else:
+            dropped.append((line, comment))
+    return dropped
+
+def reorder_cache_key(content: bytes, options: dict) -> str:
+    """Return the cache key of a file with ``content`` which is canonical under ``options``."""
+    pass
+    pass
+    return cache_key("reorder", str(REORDER_CACHE_FORMAT), __version__,
+                     f"{sys.version_info[0]}.{sys.version_info[1]}", repr(sorted(options.items())), content)
+
+def reorder_file(path: str, options: dict, write: bool) -> Tuple[str, str, str]:
+    """Reorder one file, run by a worker.
+
+    Returns:
+        tuple: ``(path, status, message)``, status is ``unchanged``,
+        ``reordered``, or with ``write`` false ``unordered``, or ``error``.
+    """
+    pass
+    pass
+    try:
+        content = Path(path).read_bytes()
+        text = canonical_text(Path(path), options)
+    except (OSError, UnicodeDecodeError, PyonetrueError) as e:
+        cause = e.__cause__ if isinstance(e.__cause__, SyntaxError) else e
+        return path, "error", str(cause)
+    canonical = text.encode("utf-8")
+    dropped = dropped_comments(content.decode("utf-8"), text) if canonical != content else []
+    if dropped:
+        line, comment = dropped[0]
+        return path, "error", f"reordering would drop {len(dropped)} comments, e.g. line {line}: {comment}"
+    if canonical == content:
+        status = "unchanged"
+    elif not write:
+        return path, "unordered", ""
+    else:
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+        status = "reordered"
+    store_cached_json("reorder", reorder_cache_key(canonical, options), True)
+    return path, status, ""
+
+def reorder_files(paths: List[str], options: dict, write: bool, jobs: int = None,
+                  stats: dict = None) -> List[Tuple[str, str, str]]:
+    """Reorder ``paths`` with a pool of ``jobs`` workers, default one per CPU.
+
+    Files whose content is cached as canonical are reported ``cached``
+    without being parsed.  See reorder_file() for the other statuses.
+    When workers are used, ``stats`` is updated with the statistics of
+    schedule.schedule_tasks().
+    """
+    pass
+
+    paths = list(dict.fromkeys(paths))
+    results = {}
+    pending = []
+    for path in paths:
+        try:
+            content = Path(path).read_bytes()
+        except OSError as e:
+            results[path] = (path, "error", e.strerror or str(e))
+            continue
+        if load_cached_json("reorder", reorder_cache_key(content, options)):
+            results[path] = (path, "cached", "")
+        else:
+            pending.append(path)
+
+    if len(pending) < 2 or jobs == 1:
+        done = [ reorder_file(path, options, write) for path in pending ]
+    else:
+        pass
+        done, run_stats = schedule_tasks(reorder_file, pending, (options, write), jobs)
+        if stats is not None:
+            stats.update(run_stats)
+    for result in done:
+        results[result[0]] = result
+    return [ results[path] for path in paths ]
+
+"""Spread per-file work over worker processes, largest files first.
+
+Parsing time grows with file size, and packages are skewed: one large
+generated module can take longer than all the others together.  Handing
+files out in directory order leaves it for last, and the run waits on one
+worker.  So files are handed out largest first, and small files, where
+the cost of sending the work to a worker outweighs the work itself, are
+grouped into batches of about ``SCHEDULE_BATCH_BYTES``.
+
+Batches wait in a single queue and an idle worker takes the next one, so a
+worker held up by a large file never has work waiting behind it which
+another, idle, worker could do.  Only ``2 * jobs`` batches are submitted at
+a time, the rest stay in order in the queue.
+
+The statistics of a run are returned with its results, see
+schedule_tasks().
+"""
+
+SCHEDULE_SMALL_FILE = 32 * 1024
+
+SCHEDULE_BATCH_BYTES = 128 * 1024
+
+def plan_batches(sizes: dict[str, int]) -> List[List[str]]:
+    """Group the files of ``sizes``, path to size in bytes, into batches, largest first.
+
+    Examples:
+        >>> plan_batches({"a.py": 100, "big.py": 50000, "b.py": 200})
+        [['big.py'], ['b.py', 'a.py']]
+    """
+    batches = []
+    batch, batch_bytes = [], 0
+    for path in sorted(sizes, key=lambda path: (-sizes[path], path)):
+        if sizes[path] >= SCHEDULE_SMALL_FILE:
+            batches.append([path])
+            continue
+        batch.append(path)
+        batch_bytes += sizes[path]
+        if batch_bytes >= SCHEDULE_BATCH_BYTES:
+            batches.append(batch)
+            batch, batch_bytes = [], 0
+    if batch:
+        batches.append(batch)
+    return batches
+
+def file_sizes(paths: List[str]) -> dict[str, int]:
+    """Map each of ``paths`` to its size, 0 when it cannot be read."""
+    import os
+    sizes = {}
+    for path in paths:
+        try:
+            sizes[path] = os.stat(str(path)).st_size
+        except OSError:
+            sizes[path] = 0
+    return sizes
+
+def parse_file_spans(path: str) -> Optional[List[Tuple[str, str]]]:
+    """Return the ``(kind, text)`` of the spans of ``path``, None when it fails to parse.
+
+    Run by a worker, the failure is reported when the file is parsed again
+    by flattening itself.
+    """
+    pass
+    from importlib.util import decode_source
+    pass
+    try:
+        return [ (span.kind, span.text) for span in extract_spans(decode_source(read_source_bytes(path)), path) ]
+    except Exception:
+        return None
+
+def run_batch(task: Callable, batch: List[str], args: tuple, submitted: float) -> dict:
+    """Run ``task(path, *args)`` for each path of ``batch``, run by a worker."""
+    import os
+    import time
+    started = time.time()
+    clock = time.perf_counter()
+    results = [ task(path, *args) for path in batch ]
+    return { "pid": os.getpid(), "wait": max(0.0, started - submitted),
+             "busy": time.perf_counter() - clock, "results": results }
+
+def schedule_tasks(task: Callable, paths: List[str], args: tuple = (), jobs: int = None) -> Tuple[list, dict]:
+    """Run ``task(path, *args)`` for each of ``paths`` on ``jobs`` workers, default one per CPU.
+
+    ``task`` must be a module level function, it runs in another process.
+
+    Returns:
+        tuple: ``(results, stats)``, the results in the order of ``paths``
+        and the statistics of the run:
+
+        - ``files``, ``batches``, ``workers``: the counts;
+        - ``wall``: seconds from the first submission to the last result;
+        - ``per_worker``: per worker process, ``{"busy", "batches", "files"}``,
+          the seconds spent running ``task`` and the work done;
+        - ``wait_mean``, ``wait_max``: seconds batches waited, once
+          submitted, for a worker;
+        - ``utilization``: the share of ``workers * wall`` spent busy.
+    """
+    import collections
+    import concurrent.futures
+    import os
+    import time
+
+    paths = list(dict.fromkeys(paths))
+    batches = collections.deque(plan_batches(file_sizes(paths)))
+    workers = max(1, min(jobs or os.cpu_count() or 1, len(batches)))
+    stats = { "files": len(paths), "batches": len(batches), "workers": workers, "per_worker": {} }
+    results = {}
+    waits = []
+
+    start = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+
+        def submit():
+            batch = batches.popleft()
+            pending[pool.submit(run_batch, task, batch, args, time.time())] = batch
+
+        while batches and len(pending) < 2 * workers:
+            submit()
+        while pending:
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                batch = pending.pop(future)
+                run = future.result()
+                results.update(zip(batch, run["results"]))
+                worker = stats["per_worker"].setdefault(run["pid"], { "busy": 0.0, "batches": 0, "files": 0 })
+                worker["busy"] += run["busy"]
+                worker["batches"] += 1
+                worker["files"] += len(batch)
+                waits.append(run["wait"])
+                if batches:
+                    submit()
+    stats["wall"] = time.perf_counter() - start
+    stats["wait_mean"] = sum(waits) / len(waits) if waits else 0.0
+    stats["wait_max"] = max(waits, default=0.0)
+    busy = sum(worker["busy"] for worker in stats["per_worker"].values())
+    stats["utilization"] = busy / (workers * stats["wall"]) if stats["wall"] else 0.0
+    return [ results[path] for path in paths ], stats
+
+def format_schedule_stats(label: str, stats: dict) -> List[str]:
+    """Return the ``[INFO]`` lines reporting the ``stats`` of schedule_tasks()."""
+    lines = [ f"[INFO] {label}: {stats['files']} files in {stats['batches']} batches on {stats['workers']} workers,"
+              f" {stats['wall']:.3f}s wall, {stats['utilization']:.0%} busy" ]
+    lines.append(f"[INFO] {label}: queue wait {stats['wait_mean']:.3f}s mean, {stats['wait_max']:.3f}s max")
+    for pid, worker in sorted(stats["per_worker"].items()):
+        lines.append(f"[INFO] {label}: worker {pid}: {worker['busy']:.3f}s busy,"
+                     f" {worker['files']} files in {worker['batches']} batches")
+    return lines
+
+"""Write a flattened module as a compressed, self-extracting script.
+
+The script is a short stub followed by the compressed source, base85
+encoded.  The stub decompresses, compiles and executes the source in its
+own namespace, so ``__name__`` and ``__file__`` are those of the script
+whether it is run or imported.
+
+With ``cache=True`` the stub stores the compiled code object on first run,
+keyed by the digest of the source and the interpreter's cache tag, and
+later runs load it without decompressing or compiling.  The cache lives in
+``$PYONETRUE_SFX_CACHE``, else ``$XDG_CACHE_HOME/pyonetrue/sfx`` or
+``~/.cache/pyonetrue/sfx``.  A cache that cannot be written is ignored.
+"""
+
+SFX_STUB = '''{shebang}
+# Self-extracting {module}: {size} bytes of {method} compressed source.
+def _pyonetrue_sfx_code(payload, digest, cache):
+    import marshal, os, sys
+    path = None
+    if cache:
+        root = os.environ.get("PYONETRUE_SFX_CACHE") or os.path.join(
+            os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+            "pyonetrue", "sfx")
+        path = os.path.join(root, f"{{digest}}.{{sys.implementation.cache_tag}}.code")
+        try:
+            with open(path, "rb") as f:
+                return marshal.load(f)
+        except (OSError, ValueError, EOFError, TypeError):
+            pass
+    import base64, {method}
+    code = compile({method}.decompress(base64.b85decode(payload)), __file__, "exec", dont_inherit=True)
+    if path:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp = f"{{path}}.{{os.getpid()}}.tmp"
+            with open(temp, "wb") as f:
+                marshal.dump(code, f)
+            os.replace(temp, path)
+        except OSError:
+            pass
+    return code
+
+_pyonetrue_sfx_code = _pyonetrue_sfx_code({payload}, {digest!r}, {cache!r})
+exec(_pyonetrue_sfx_code)
+'''
+
+SFX_PAYLOAD_WIDTH = 76
+
+def parse_sfx_compression(compression: str) -> tuple:
+    """Parse ``zlib[:<level>]`` or ``lzma[:<preset>]`` into ``(method, level)``.
+
+    Examples:
+        >>> parse_sfx_compression("zlib:9")
+        ('zlib', 9)
+    """
+    name, _, level = compression.partition(":")
+    if name not in ("zlib", "lzma") or (level and (not level.isdigit() or int(level) > 9)):
+        raise ValueError(f"invalid compression '{compression}', use `zlib[:<0-9>]` or `lzma[:<0-9>]`")
+    return name, int(level) if level else None
+
+def compress_source(source: bytes, compression: str = "lzma") -> bytes:
+    """Compress ``source`` as described by ``compression``, see ``parse_sfx_compression()``."""
+    method, level = parse_sfx_compression(compression)
+    if method == "zlib":
+        return zlib.compress(source, 9 if level is None else level)
+    return lzma.compress(source, preset=9 if level is None else level)
+
+def sfx_text(text: str, module: str, compression: str = "lzma", cache: bool = False,
+             shebang: str = "#!/usr/bin/env python3") -> str:
+    """Return the self-extracting script running the flattened module ``text``.
+
+    Args:
+        text (str): Flattened module source.
+        module (str): Name of the module, for the stub's comment.
+        compression (str): ``zlib[:<level>]`` or ``lzma[:<preset>]``.
+        cache (bool): Cache the compiled code on first run.
+        shebang (str): Interpreter line, omitted when empty.
+    """
+    source = text.encode("utf-8")
+    method, _ = parse_sfx_compression(compression)
+    encoded = base64.b85encode(compress_source(source, compression)).decode("ascii")
+    lines = [ encoded[i:i + SFX_PAYLOAD_WIDTH] for i in range(0, len(encoded), SFX_PAYLOAD_WIDTH) ]
+    payload = "(\n" + "".join(f"    {line!r}\n" for line in lines) + ")"
+    return SFX_STUB.format(
+        shebang=shebang.rstrip("\n") if shebang else "",
+        module=module,
+        size=len(source),
+        method=method,
+        payload=payload,
+        digest=hashlib.sha256(source).hexdigest()[:32],
+        cache=bool(cache),
+    ).lstrip("\n")
+
+def write_sfx(target: Path, text: str, module: str, compression: str = "lzma",
+              cache: bool = False, shebang: str = "#!/usr/bin/env python3") -> Path:
+    """Write ``sfx_text()`` to ``target`` and make it executable."""
+    target = Path(target)
+    target.write_text(sfx_text(text, module, compression, cache, shebang))
+    os.chmod(str(target), 0o755)
+    return target
+
+"""Keep span text on disk to bound memory, see ``--max-memory``.
+
+Once the text of the spans discovered exceeds the budget, further spans
+are spilled: their text moves to an anonymous temporary file, a
+``SpanStore``, and only its offset and length stay in memory.  A
+``SpilledSpan`` reads its text back when asked for it, so flattening works
+on it unchanged, and the output is written span by span rather than
+joined into one string.
+"""
+
+MEMORY_UNITS = { "": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4 }
+
+def parse_memory_size(text: str) -> int:
+    """Parse a size in bytes, with an optional K, M, G or T suffix.
+
+    Examples:
+        >>> parse_memory_size("512M")
+        536870912
+        >>> parse_memory_size("2g")
+        2147483648
+    """
+    text = text.strip().upper()
+    if text.endswith("B"):
+        text = text[:-1]
+    unit = text[-1:] if text[-1:] in MEMORY_UNITS else ""
+    number = text[:-1] if unit else text
+    try:
+        size = int(float(number) * MEMORY_UNITS[unit])
+    except ValueError:
+        raise ValueError(f"invalid memory size '{text}', e.g. 512M or 2G")
+    if size < 0:
+        raise ValueError(f"invalid memory size '{text}', e.g. 512M or 2G")
+    return size
+
+class SpanStore:
+    """Span text appended to an anonymous temporary file."""
+
+    def __init__(self):
+        import tempfile
+        self.file = tempfile.TemporaryFile()
+        self.size = 0
+
+    def put(self, text: str) -> Tuple[int, int]:
+        """Store ``text``, return its ``(offset, length)`` in bytes."""
+        data = text.encode("utf-8", "surrogatepass")
+        offset = self.size
+        self.file.seek(offset)
+        self.file.write(data)
+        self.size += len(data)
+        return offset, len(data)
+
+    def get(self, offset: int, length: int) -> str:
+        """Return the text stored at ``offset``."""
+        self.file.seek(offset)
+        return self.file.read(length).decode("utf-8", "surrogatepass")
+
+class SpilledSpan(Span):
+    """A span whose text is kept in a SpanStore.
+
+    Assigning ``text``, e.g. when imports are rewritten, stores the new
+    text, the old one is left unused in the store.
+    """
+
+    def __init__(self, store: SpanStore, text: str, kind: str):
+        self.store = store
+        super().__init__(text, kind)
+
+    @property
+    def text(self) -> str:
+        return self.store.get(self.offset, self.length)
+
+    @text.setter
+    def text(self, value: str) -> None:
+        self.offset, self.length = self.store.put(value)
+
+def write_spans(stream: IO[str], spans: Iterable[Span]) -> None:
+    """Write the text of ``spans`` to ``stream`` one at a time."""
+    for span in spans:
+        stream.write(span.text)
+
+"""Remove the import time cost of type hints from flattened spans.
+
+Annotations of function signatures and module-level variables are
+evaluated when the module is imported.  ``strip_annotations()`` removes
+them from source text, ``is_type_checking_block()`` recognizes the
+``if TYPE_CHECKING:`` blocks which only exist for type checkers.
+
+Annotations read at runtime are kept: those within class bodies, which
+dataclasses, NamedTuple and TypedDict turn into fields, and those of
+decorated functions, which decorators such as ``functools.singledispatch``
+may inspect.
+"""
+
+ANNOTATION_MODES = ("keep", "defer", "strip")
+
+DEFER_ANNOTATIONS = "from __future__ import annotations\n"
+
+def strip_annotations(text: str) -> str:
+    """Remove the annotations evaluated at import time from ``text``.
+
+    Args:
+        text (str): Source of one or more top-level statements.
+
+    Returns:
+        str: ``text`` without the annotations of undecorated module-level
+        function signatures and of module-level assignments.  Methods keep
+        theirs.  ``X: int`` without a
+        value is left as is, removing it would change ``__annotations__``
+        for nothing.
+
+    Examples:
+        >>> strip_annotations("def f(a: int, *b: str) -> bool:\\n    return a\\n")
+        'def f(a, *b):\\n    return a\\n'
+    """
+    if ":" not in text:
+        return text
+    tree = ast.parse(text)
+    data = text.encode("utf-8")
+    line_starts = [0]
+    for line in data.splitlines(keepends=True):
+        line_starts.append(line_starts[-1] + len(line))
+
+    edits = []
+    for node in tree.body:
+        if isinstance(node, ast.AnnAssign) and node.value is not None:
+            edits.append(((node.target.end_lineno, node.target.end_col_offset),
+                          (node.value.lineno, node.value.col_offset), " = "))
+    for node in module_level_functions(tree.body):
+        if not node.decorator_list:
+            edits.extend(signature_annotation_edits(node, data, line_starts))
+    return replace_source_ranges(text, edits)
+
+def module_level_functions(body: List[ast.stmt]) -> List[ast.FunctionDef]:
+    """Return the functions defined by ``body``, also within its ``if``, ``try`` and other blocks.
+
+    Methods and nested functions are not module-level, their annotations
+    are not evaluated at import time.
+    """
+    functions = []
+    for node in body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            functions.append(node)
+        elif not isinstance(node, ast.ClassDef):
+            for field in ("body", "orelse", "finalbody"):
+                functions += module_level_functions(getattr(node, field, []))
+            for handler in getattr(node, "handlers", []):
+                functions += module_level_functions(handler.body)
+    return functions
+
+def signature_annotation_edits(node: ast.FunctionDef, data: bytes, line_starts: List[int]) -> List[tuple]:
+    """Return the ``replace_source_ranges()`` edits removing ``node``'s annotations."""
+    edits = []
+    arguments = node.args
+    for arg in (arguments.posonlyargs + arguments.args + arguments.kwonlyargs
+                + [ a for a in (arguments.vararg, arguments.kwarg) if a ]):
+        if arg.annotation is not None:
+            name_end = arg.col_offset + len(arg.arg.encode("utf-8"))
+            edits.append(((arg.lineno, name_end),
+                          (arg.annotation.end_lineno, arg.annotation.end_col_offset), ""))
+    if node.returns is not None:
+        # The arrow is the last `->` before the annotation
+        returns_start = line_starts[node.returns.lineno - 1] + node.returns.col_offset
+        arrow = data.rindex(b"->", 0, returns_start)
+        while arrow > 0 and data[arrow - 1:arrow] in (b" ", b"\t"):
+            arrow -= 1
+        line = next(i for i in range(len(line_starts) - 1, -1, -1) if line_starts[i] <= arrow)
+        edits.append(((line + 1, arrow - line_starts[line]),
+                      (node.returns.end_lineno, node.returns.end_col_offset), ""))
+    return edits
+
+def is_type_checking_block(text: str) -> bool:
+    """True when ``text`` is only ``if TYPE_CHECKING:`` blocks without an else.
+
+    ``typing.TYPE_CHECKING`` is False at runtime, so such blocks never run.
+    """
+    if "TYPE_CHECKING" not in text:
+        return False
+    body = ast.parse(text).body
+    return bool(body) and all(
+        isinstance(node, ast.If) and not node.orelse and is_type_checking_test(node.test)
+        for node in body
+    )
+
+def is_type_checking_test(test: ast.expr) -> bool:
+    """True for ``TYPE_CHECKING`` or ``<module>.TYPE_CHECKING``."""
+    if isinstance(test, ast.Name):
+        return test.id == "TYPE_CHECKING"
+    return isinstance(test, ast.Attribute) and test.attr == "TYPE_CHECKING"
+
+"""Pythonic command-line interface parser that will make you smile.
+
+ * http://docopt.org
+ * Repository and issue-tracker: https://github.com/docopt/docopt
+ * Licensed under terms of MIT license (see LICENSE-MIT)
+ * Copyright (c) 2013 Vladimir Keleshev, vladimir@keleshev.com
+
+"""
+
+__all__ = ['docopt']
+
+__version__ = '0.6.2'
+
+class DocoptLanguageError(Exception):
+
+    """Error in construction of usage-message by developer."""
+
+class DocoptExit(SystemExit):
+
+    """Exit in case user invoked program with incorrect arguments."""
+
+    usage = ''
+
+    def __init__(self, message=''):
+        SystemExit.__init__(self, (message + '\n' + self.usage).strip())
+
+class Pattern(object):
+
+    def __eq__(self, other):
+        return repr(self) == repr(other)
+
+    def __hash__(self):
+        return hash(repr(self))
+
+    def fix(self):
+        self.fix_identities()
+        self.fix_repeating_arguments()
+        return self
+
+    def fix_identities(self, uniq=None):
+        """Make pattern-tree tips point to same object if they are equal."""
+        if not hasattr(self, 'children'):
+            return self
+        uniq = list(set(self.flat())) if uniq is None else uniq
+        for i, c in enumerate(self.children):
+            if not hasattr(c, 'children'):
+                assert c in uniq
+                self.children[i] = uniq[uniq.index(c)]
+            else:
+                c.fix_identities(uniq)
+
+    def fix_repeating_arguments(self):
+        """Fix elements that should accumulate/increment values."""
+        either = [list(c.children) for c in self.either.children]
+        for case in either:
+            for e in [c for c in case if case.count(c) > 1]:
+                if type(e) is Argument or type(e) is Option and e.argcount:
+                    if e.value is None:
+                        e.value = []
+                    elif type(e.value) is not list:
+                        e.value = e.value.split()
+                if type(e) is Command or type(e) is Option and e.argcount == 0:
+                    e.value = 0
+        return self
+
+    @property
+    def either(self):
+        """Transform pattern into an equivalent, with only top-level Either."""
+        # Currently the pattern will not be equivalent, but more "narrow",
+        # although good enough to reason about list arguments.
+        ret = []
+        groups = [[self]]
+        while groups:
+            children = groups.pop(0)
+            types = [type(c) for c in children]
+            if Either in types:
+                either = [c for c in children if type(c) is Either][0]
+                children.pop(children.index(either))
+                for c in either.children:
+                    groups.append([c] + children)
+            elif Required in types:
+                required = [c for c in children if type(c) is Required][0]
+                children.pop(children.index(required))
+                groups.append(list(required.children) + children)
+            elif DocoptOptional in types:
+                optional = [c for c in children if type(c) is DocoptOptional][0]
+                children.pop(children.index(optional))
+                groups.append(list(optional.children) + children)
+            elif DocoptAnyOptions in types:
+                optional = [c for c in children if type(c) is DocoptAnyOptions][0]
+                children.pop(children.index(optional))
+                groups.append(list(optional.children) + children)
+            elif OneOrMore in types:
+                oneormore = [c for c in children if type(c) is OneOrMore][0]
+                children.pop(children.index(oneormore))
+                groups.append(list(oneormore.children) * 2 + children)
+            else:
+                ret.append(children)
+        return Either(*[Required(*e) for e in ret])
+
+class ChildPattern(Pattern):
+
+    def __init__(self, name, value=None):
+        self.name = name
+        self.value = value
+
+    def __repr__(self):
+        return '%s(%r, %r)' % (self.__class__.__name__, self.name, self.value)
+
+    def flat(self, *types):
+        return [self] if not types or type(self) in types else []
+
+    def match(self, left, collected=None):
+        collected = [] if collected is None else collected
+        pos, match = self.single_match(left)
+        if match is None:
+            return False, left, collected
+        left_ = left[:pos] + left[pos + 1:]
+        same_name = [a for a in collected if a.name == self.name]
+        if type(self.value) in (int, list):
+            if type(self.value) is int:
+                increment = 1
+            else:
+                increment = ([match.value] if type(match.value) is str
+                             else match.value)
+            if not same_name:
+                match.value = increment
+                return True, left_, collected + [match]
+            same_name[0].value += increment
+            return True, left_, collected
+        return True, left_, collected + [match]
+
+class ParentPattern(Pattern):
+
+    def __init__(self, *children):
+        self.children = list(children)
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__,
+                           ', '.join(repr(a) for a in self.children))
+
+    def flat(self, *types):
+        if type(self) in types:
+            return [self]
+        return sum([c.flat(*types) for c in self.children], [])
+
+class Argument(ChildPattern):
+
+    def single_match(self, left):
+        for n, p in enumerate(left):
+            if type(p) is Argument:
+                return n, Argument(self.name, p.value)
+        return None, None
+
+    @classmethod
+    def parse(class_, source):
+        name = re.findall(r'(<\S*?>)', source)[0]
+        value = re.findall(r'\[default: (.*)\]', source, flags=re.I)
+        return class_(name, value[0] if value else None)
+
+class Command(Argument):
+
+    def __init__(self, name, value=False):
+        self.name = name
+        self.value = value
+
+    def single_match(self, left):
+        for n, p in enumerate(left):
+            if type(p) is Argument:
+                if p.value == self.name:
+                    return n, Command(self.name, True)
+                else:
+                    break
+        return None, None
+
+class Option(ChildPattern):
+
+    def __init__(self, short=None, long=None, argcount=0, value=False):
+        assert argcount in (0, 1)
+        self.short, self.long = short, long
+        self.argcount, self.value = argcount, value
+        self.value = None if value is False and argcount else value
+
+    @classmethod
+    def parse(class_, option_description):
+        short, long, argcount, value = None, None, 0, False
+        options, _, description = option_description.strip().partition('  ')
+        options = options.replace(',', ' ').replace('=', ' ')
+        for s in options.split():
+            if s.startswith('--'):
+                long = s
+            elif s.startswith('-'):
+                short = s
+            else:
+                argcount = 1
+        if argcount:
+            matched = re.findall(r'\[default: (.*)\]', description, flags=re.I)
+            value = matched[0] if matched else None
+        return class_(short, long, argcount, value)
+
+    def single_match(self, left):
+        for n, p in enumerate(left):
+            if self.name == p.name:
+                return n, p
+        return None, None
+
+    @property
+    def name(self):
+        return self.long or self.short
+
+    def __repr__(self):
+        return 'Option(%r, %r, %r, %r)' % (self.short, self.long,
+                                           self.argcount, self.value)
+
+class Required(ParentPattern):
+
+    def match(self, left, collected=None):
+        collected = [] if collected is None else collected
+        l = left
+        c = collected
+        for p in self.children:
+            matched, l, c = p.match(l, c)
+            if not matched:
+                return False, left, collected
+        return True, l, c
+
+class DocoptOptional(ParentPattern):
+
+    def match(self, left, collected=None):
+        collected = [] if collected is None else collected
+        for p in self.children:
+            m, left, collected = p.match(left, collected)
+        return True, left, collected
+
+class DocoptAnyOptions(DocoptOptional):
+
+    """Marker/placeholder for [options] shortcut."""
+
+class OneOrMore(ParentPattern):
+
+    def match(self, left, collected=None):
+        assert len(self.children) == 1
+        collected = [] if collected is None else collected
+        l = left
+        c = collected
+        l_ = None
+        matched = True
+        times = 0
+        while matched:
+            # could it be that something didn't match but changed l or c?
+            matched, l, c = self.children[0].match(l, c)
+            times += 1 if matched else 0
+            if l_ == l:
+                break
+            l_ = l
+        if times >= 1:
+            return True, l, c
+        return False, left, collected
+
+class Either(ParentPattern):
+
+    def match(self, left, collected=None):
+        collected = [] if collected is None else collected
+        outcomes = []
+        for p in self.children:
+            matched, _, _ = outcome = p.match(left, collected)
+            if matched:
+                outcomes.append(outcome)
+        if outcomes:
+            return min(outcomes, key=lambda outcome: len(outcome[1]))
+        return False, left, collected
+
+class TokenStream(list):
+
+    def __init__(self, source, error):
+        self += source.split() if hasattr(source, 'split') else source
+        self.error = error
+
+    def move(self):
+        return self.pop(0) if len(self) else None
+
+    def current(self):
+        return self[0] if len(self) else None
+
+def parse_long(tokens, options):
+    """long ::= '--' chars [ ( ' ' | '=' ) chars ] ;"""
+    long, eq, value = tokens.move().partition('=')
+    assert long.startswith('--')
+    value = None if eq == value == '' else value
+    similar = [o for o in options if o.long == long]
+    if tokens.error is DocoptExit and similar == []:  # if no exact match
+        similar = [o for o in options if o.long and o.long.startswith(long)]
+    if len(similar) > 1:  # might be simply specified ambiguously 2+ times?
+        raise tokens.error('%s is not a unique prefix: %s?' %
+                           (long, ', '.join(o.long for o in similar)))
+    elif len(similar) < 1:
+        argcount = 1 if eq == '=' else 0
+        o = Option(None, long, argcount)
+        options.append(o)
+        if tokens.error is DocoptExit:
+            o = Option(None, long, argcount, value if argcount else True)
+    else:
+        o = Option(similar[0].short, similar[0].long,
+                   similar[0].argcount, similar[0].value)
+        if o.argcount == 0:
+            if value is not None:
+                raise tokens.error('%s must not have an argument' % o.long)
+        else:
+            if value is None:
+                if tokens.current() is None:
+                    raise tokens.error('%s requires argument' % o.long)
+                value = tokens.move()
+        if tokens.error is DocoptExit:
+            o.value = value if value is not None else True
+    return [o]
+
+def parse_shorts(tokens, options):
+    """shorts ::= '-' ( chars )* [ [ ' ' ] chars ] ;"""
+    token = tokens.move()
+    assert token.startswith('-') and not token.startswith('--')
+    left = token.lstrip('-')
+    parsed = []
+    while left != '':
+        short, left = '-' + left[0], left[1:]
+        similar = [o for o in options if o.short == short]
+        if len(similar) > 1:
+            raise tokens.error('%s is specified ambiguously %d times' %
+                               (short, len(similar)))
+        elif len(similar) < 1:
+            o = Option(short, None, 0)
+            options.append(o)
+            if tokens.error is DocoptExit:
+                o = Option(short, None, 0, True)
+        else:  # why copying is necessary here?
+            o = Option(short, similar[0].long,
+                       similar[0].argcount, similar[0].value)
+            value = None
+            if o.argcount != 0:
+                if left == '':
+                    if tokens.current() is None:
+                        raise tokens.error('%s requires argument' % short)
+                    value = tokens.move()
+                else:
+                    value = left
+                    left = ''
+            if tokens.error is DocoptExit:
+                o.value = value if value is not None else True
+        parsed.append(o)
+    return parsed
+
+def parse_pattern(source, options):
+    tokens = TokenStream(re.sub(r'([\[\]\(\)\|]|\.\.\.)', r' \1 ', source),
+                         DocoptLanguageError)
+    result = parse_expr(tokens, options)
+    if tokens.current() is not None:
+        raise tokens.error('unexpected ending: %r' % ' '.join(tokens))
+    return Required(*result)
+
+def parse_expr(tokens, options):
+    """expr ::= seq ( '|' seq )* ;"""
+    seq = parse_seq(tokens, options)
+    if tokens.current() != '|':
+        return seq
+    result = [Required(*seq)] if len(seq) > 1 else seq
+    while tokens.current() == '|':
+        tokens.move()
+        seq = parse_seq(tokens, options)
+        result += [Required(*seq)] if len(seq) > 1 else seq
+    return [Either(*result)] if len(result) > 1 else result
+
+def parse_seq(tokens, options):
+    """seq ::= ( atom [ '...' ] )* ;"""
+    result = []
+    while tokens.current() not in [None, ']', ')', '|']:
+        atom = parse_atom(tokens, options)
+        if tokens.current() == '...':
+            atom = [OneOrMore(*atom)]
+            tokens.move()
+        result += atom
+    return result
+
+def parse_atom(tokens, options):
+    """atom ::= '(' expr ')' | '[' expr ']' | 'options'
+             | long | shorts | argument | command ;
+    """
+    token = tokens.current()
+    result = []
+    if token in '([':
+        tokens.move()
+        matching, pattern = {'(': [')', Required], '[': [']', DocoptOptional]}[token]
+        result = pattern(*parse_expr(tokens, options))
+        if tokens.move() != matching:
+            raise tokens.error("unmatched '%s'" % token)
+        return [result]
+    elif token == 'options':
+        tokens.move()
+        return [DocoptAnyOptions()]
+    elif token.startswith('--') and token != '--':
+        return parse_long(tokens, options)
+    elif token.startswith('-') and token not in ('-', '--'):
+        return parse_shorts(tokens, options)
+    elif token.startswith('<') and token.endswith('>') or token.isupper():
+        return [Argument(tokens.move())]
+    else:
+        return [Command(tokens.move())]
+
+def parse_argv(tokens, options, options_first=False):
+    """Parse command-line argument vector.
+
+    If options_first:
+        argv ::= [ long | shorts ]* [ argument ]* [ '--' [ argument ]* ] ;
+    else:
+        argv ::= [ long | shorts | argument ]* [ '--' [ argument ]* ] ;
+
+    """
+    parsed = []
+    while tokens.current() is not None:
+        if tokens.current() == '--':
+            return parsed + [Argument(None, v) for v in tokens]
+        elif tokens.current().startswith('--'):
+            parsed += parse_long(tokens, options)
+        elif tokens.current().startswith('-') and tokens.current() != '-':
+            parsed += parse_shorts(tokens, options)
+        elif options_first:
+            return parsed + [Argument(None, v) for v in tokens]
+        else:
+            parsed.append(Argument(None, tokens.move()))
+    return parsed
+
+def parse_defaults(doc):
+    # in python < 2.7 you can't pass flags=re.MULTILINE
+    split = re.split(r'\n *(<\S+?>|-\S+?)', doc)[1:]
+    split = [s1 + s2 for s1, s2 in zip(split[::2], split[1::2])]
+    options = [Option.parse(s) for s in split if s.startswith('-')]
+    #arguments = [Argument.parse(s) for s in split if s.startswith('<')]
+    #return options, arguments
+    return options
+
+def printable_usage(doc):
+    # in python < 2.7 you can't pass flags=re.IGNORECASE
+    usage_split = re.split(r'([Uu][Ss][Aa][Gg][Ee]:)', doc)
+    if len(usage_split) < 3:
+        raise DocoptLanguageError('"usage:" (case-insensitive) not found.')
+    if len(usage_split) > 3:
+        raise DocoptLanguageError('More than one "usage:" (case-insensitive).')
+    return re.split(r'\n\s*\n', ''.join(usage_split[1:]))[0].strip()
+
+def formal_usage(printable_usage):
+    pu = printable_usage.split()[1:]  # split and drop "usage:"
+    return '( ' + ' '.join(') | (' if s == pu[0] else s for s in pu[1:]) + ' )'
+
+def extras(help, version, options, doc):
+    if help and any((o.name in ('-h', '--help')) and o.value for o in options):
+        print(doc.strip("\n"))
+        sys.exit()
+    if version and any(o.name == '--version' and o.value for o in options):
+        print(version)
+        sys.exit()
+
+class Dict(dict):
+    def __repr__(self):
+        return '{%s}' % ',\n '.join('%r: %r' % i for i in sorted(self.items()))
+
+def docopt(doc, argv=None, help=True, version=None, options_first=False):
+    """Parse `argv` based on command-line interface described in `doc`.
+
+    `docopt` creates your command-line interface based on its
+    description that you pass as `doc`. Such description can contain
+    --options, <positional-argument>, commands, which could be
+    [optional], (required), (mutually | exclusive) or repeated...
+
+    Parameters
+    ----------
+    doc : str
+        Description of your command-line interface.
+    argv : list of str, optional
+        Argument vector to be parsed. sys.argv[1:] is used if not
+        provided.
+    help : bool (default: True)
+        Set to False to disable automatic help on -h or --help
+        options.
+    version : any object
+        If passed, the object will be printed if --version is in
+        `argv`.
+    options_first : bool (default: False)
+        Set to True to require options preceed positional arguments,
+        i.e. to forbid options and positional arguments intermix.
+
+    Returns
+    -------
+    args : dict
+        A dictionary, where keys are names of command-line elements
+        such as e.g. "--verbose" and "<path>", and values are the
+        parsed values of those elements.
+
+    Example
+    -------
+    >>> from docopt import docopt
+    >>> doc = '''
+    Usage:
+        my_program tcp <host> <port> [--timeout=<seconds>]
+        my_program serial <port> [--baud=<n>] [--timeout=<seconds>]
+        my_program (-h | --help | --version)
+
+    Options:
+        -h, --help  Show this screen and exit.
+        --baud=<n>  Baudrate [default: 9600]
+    '''
+    >>> argv = ['tcp', '127.0.0.1', '80', '--timeout', '30']
+    >>> docopt(doc, argv)
+    {'--baud': '9600',
+     '--help': False,
+     '--timeout': '30',
+     '--version': False,
+     '<host>': '127.0.0.1',
+     '<port>': '80',
+     'serial': False,
+     'tcp': True}
+
+    See also
+    --------
+    * For video introduction see http://docopt.org
+    * Full documentation is available in README.rst as well as online
+      at https://github.com/docopt/docopt#readme
+
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    DocoptExit.usage = printable_usage(doc)
+    options = parse_defaults(doc)
+    pattern = parse_pattern(formal_usage(DocoptExit.usage), options)
+    # [default] syntax for argument is disabled
+    #for a in pattern.flat(Argument):
+    #    same_name = [d for d in arguments if d.name == a.name]
+    #    if same_name:
+    #        a.value = same_name[0].value
+    argv = parse_argv(TokenStream(argv, DocoptExit), list(options),
+                      options_first)
+    pattern_options = set(pattern.flat(Option))
+    for ao in pattern.flat(DocoptAnyOptions):
+        doc_options = parse_defaults(doc)
+        ao.children = list(set(doc_options) - pattern_options)
+        #if any_options:
+        #    ao.children += [Option(o.short, o.long, o.argcount)
+        #                    for o in argv if type(o) is Option]
+    extras(help, version, argv, doc)
+    matched, left, collected = pattern.fix().match(argv)
+    if matched and left == []:  # better error message if left?
+        return Dict((a.name, a.value) for a in (pattern.flat() + collected))
+    raise DocoptExit()
+
+try:
+    from collections.abc import Sequence
+except ImportError:  # pragma: no cover - for older Python
+    from collections import Sequence
+
+try:
+    from urllib import quote as urlquote, quote as urlquote_from_bytes
+except ImportError:
+    from urllib.parse import quote as urlquote, quote_from_bytes as urlquote_from_bytes
+
+try:
+    intern = intern
+except NameError:
+    intern = sys.intern
+
+supports_symlinks = True
+
+try:
+    import nt
+except ImportError:
+    nt = None
+else:
+    if sys.getwindowsversion()[:2] >= (6, 0) and sys.version_info >= (3, 2):
+        from nt import _getfinalpathname
+    else:
+        supports_symlinks = False
+        _getfinalpathname = None
+
+__all__ = [
+    "PurePath", "PurePosixPath", "PureWindowsPath",
+    "Path", "PosixPath", "WindowsPath",
+    ]
+
+def _is_wildcard_pattern(pat):
+    # Whether this pattern needs actual matching using fnmatch, or can
+    # be looked up directly as a file.
+    return "*" in pat or "?" in pat or "[" in pat
+
+class _Flavour(object):
+    """A flavour implements a particular (platform-specific) set of path
+    semantics."""
+
+    def __init__(self):
+        self.join = self.sep.join
+
+    def parse_parts(self, parts):
+        parsed = []
+        sep = self.sep
+        altsep = self.altsep
+        drv = root = ''
+        it = reversed(parts)
+        for part in it:
+            if not part:
+                continue
+            if altsep:
+                part = part.replace(altsep, sep)
+            drv, root, rel = self.splitroot(part)
+            if sep in rel:
+                for x in reversed(rel.split(sep)):
+                    if x and x != '.':
+                        parsed.append(intern(x))
+            else:
+                if rel and rel != '.':
+                    parsed.append(intern(rel))
+            if drv or root:
+                if not drv:
+                    # If no drive is present, try to find one in the previous
+                    # parts. This makes the result of parsing e.g.
+                    # ("C:", "/", "a") reasonably intuitive.
+                    for part in it:
+                        drv = self.splitroot(part)[0]
+                        if drv:
+                            break
+                break
+        if drv or root:
+            parsed.append(drv + root)
+        parsed.reverse()
+        return drv, root, parsed
+
+    def join_parsed_parts(self, drv, root, parts, drv2, root2, parts2):
+        """
+        Join the two paths represented by the respective
+        (drive, root, parts) tuples.  Return a new (drive, root, parts) tuple.
+        """
+        if root2:
+            if not drv2 and drv:
+                return drv, root2, [drv + root2] + parts2[1:]
+        elif drv2:
+            if drv2 == drv or self.casefold(drv2) == self.casefold(drv):
+                # Same drive => second path is relative to the first
+                return drv, root, parts + parts2[1:]
+        else:
+            # Second path is non-anchored (common case)
+            return drv, root, parts + parts2
+        return drv2, root2, parts2
+
+class _WindowsFlavour(_Flavour):
+    # Reference for Windows paths can be found at
+    # http://msdn.microsoft.com/en-us/library/aa365247%28v=vs.85%29.aspx
+
+    sep = '\\'
+    altsep = '/'
+    has_drv = True
+    pathmod = ntpath
+
+    is_supported = (nt is not None)
+
+    drive_letters = (
+        set(chr(x) for x in range(ord('a'), ord('z') + 1)) |
+        set(chr(x) for x in range(ord('A'), ord('Z') + 1))
+    )
+    ext_namespace_prefix = '\\\\?\\'
+
+    reserved_names = (
+        {'CON', 'PRN', 'AUX', 'NUL'} |
+        {'COM%d' % i for i in range(1, 10)} |
+        {'LPT%d' % i for i in range(1, 10)}
+        )
+
+    # Interesting findings about extended paths:
+    # - '\\?\c:\a', '//?/c:\a' and '//?/c:/a' are all supported
+    #   but '\\?\c:/a' is not
+    # - extended paths are always absolute; "relative" extended paths will
+    #   fail.
+
+    def splitroot(self, part, sep=sep):
+        first = part[0:1]
+        second = part[1:2]
+        if (second == sep and first == sep):
+            # XXX extended paths should also disable the collapsing of "."
+            # components (according to MSDN docs).
+            prefix, part = self._split_extended_path(part)
+            first = part[0:1]
+            second = part[1:2]
+        else:
+            prefix = ''
+        third = part[2:3]
+        if (second == sep and first == sep and third != sep):
+            # is a UNC path:
+            # vvvvvvvvvvvvvvvvvvvvv root
+            # \\machine\mountpoint\directory\etc\...
+            #            directory ^^^^^^^^^^^^^^
+            index = part.find(sep, 2)
+            if index != -1:
+                index2 = part.find(sep, index + 1)
+                # a UNC path can't have two slashes in a row
+                # (after the initial two)
+                if index2 != index + 1:
+                    if index2 == -1:
+                        index2 = len(part)
+                    if prefix:
+                        return prefix + part[1:index2], sep, part[index2+1:]
+                    else:
+                        return part[:index2], sep, part[index2+1:]
+        drv = root = ''
+        if second == ':' and first in self.drive_letters:
+            drv = part[:2]
+            part = part[2:]
+            first = third
+        if first == sep:
+            root = first
+            part = part.lstrip(sep)
+        return prefix + drv, root, part
+
+    def casefold(self, s):
+        return s.lower()
+
+    def casefold_parts(self, parts):
+        return [p.lower() for p in parts]
+
+    def resolve(self, path):
+        s = str(path)
+        if not s:
+            return os.getcwd()
+        if _getfinalpathname is not None:
+            return self._ext_to_normal(_getfinalpathname(s))
+        # Means fallback on absolute
+        return None
+
+    def _split_extended_path(self, s, ext_prefix=ext_namespace_prefix):
+        prefix = ''
+        if s.startswith(ext_prefix):
+            prefix = s[:4]
+            s = s[4:]
+            if s.startswith('UNC\\'):
+                prefix += s[:3]
+                s = '\\' + s[3:]
+        return prefix, s
+
+    def _ext_to_normal(self, s):
+        # Turn back an extended path into a normal DOS-like path
+        return self._split_extended_path(s)[1]
+
+    def is_reserved(self, parts):
+        # NOTE: the rules for reserved names seem somewhat complicated
+        # (e.g. r"..\NUL" is reserved but not r"foo\NUL").
+        # We err on the side of caution and return True for paths which are
+        # not considered reserved by Windows.
+        if not parts:
+            return False
+        if parts[0].startswith('\\\\'):
+            # UNC paths are never reserved
+            return False
+        return parts[-1].partition('.')[0].upper() in self.reserved_names
+
+    def make_uri(self, path):
+        # Under Windows, file URIs use the UTF-8 encoding.
+        drive = path.drive
+        if len(drive) == 2 and drive[1] == ':':
+            # It's a path on a local drive => 'file:///c:/a/b'
+            rest = path.as_posix()[2:].lstrip('/')
+            return 'file:///%s/%s' % (
+                drive, urlquote_from_bytes(rest.encode('utf-8')))
+        else:
+            # It's a path on a network drive => 'file://host/share/a/b'
+            return 'file:' + urlquote_from_bytes(path.as_posix().encode('utf-8'))
+
+class _PosixFlavour(_Flavour):
+    sep = '/'
+    altsep = ''
+    has_drv = False
+    pathmod = posixpath
+
+    is_supported = (os.name != 'nt')
+
+    def splitroot(self, part, sep=sep):
+        if part and part[0] == sep:
+            stripped_part = part.lstrip(sep)
+            # According to POSIX path resolution:
+            # http://pubs.opengroup.org/onlinepubs/009695399/basedefs/xbd_chap04.html#tag_04_11
+            # "A pathname that begins with two successive slashes may be
+            # interpreted in an implementation-defined manner, although more
+            # than two leading slashes shall be treated as a single slash".
+            if len(part) - len(stripped_part) == 2:
+                return '', sep * 2, stripped_part
+            else:
+                return '', sep, stripped_part
+        else:
+            return '', '', part
+
+    def casefold(self, s):
+        return s
+
+    def casefold_parts(self, parts):
+        return parts
+
+    def resolve(self, path):
+        sep = self.sep
+        def split(p):
+            return [x for x in p.split(sep) if x]
+        def absparts(p):
+            # Our own abspath(), since the posixpath one makes
+            # the mistake of "normalizing" the path without resolving the
+            # symlinks first.
+            if not p.startswith(sep):
+                return split(os.getcwd()) + split(p)
+            else:
+                return split(p)
+        parts = absparts(str(path))[::-1]
+        accessor = path._accessor
+        resolved = cur = ""
+        symlinks = {}
+        while parts:
+            part = parts.pop()
+            cur = resolved + sep + part
+            if cur in symlinks and symlinks[cur] <= len(parts):
+                # We've already seen the symlink and there's not less
+                # work to do than the last time.
+                raise RuntimeError("Symlink loop from %r" % cur)
+            try:
+                target = accessor.readlink(cur)
+            except OSError as e:
+                if e.errno != EINVAL:
+                    raise
+                # Not a symlink
+                resolved = cur
+            else:
+                # Take note of remaining work from this symlink
+                symlinks[cur] = len(parts)
+                if target.startswith(sep):
+                    # Symlink points to absolute path
+                    resolved = ""
+                parts.extend(split(target)[::-1])
+        return resolved or sep
+
+    def is_reserved(self, parts):
+        return False
+
+    def make_uri(self, path):
+        # We represent the path using the local filesystem encoding,
+        # for portability to other applications.
+        bpath = bytes(path)
+        return 'file://' + urlquote_from_bytes(bpath)
+
+_windows_flavour = _WindowsFlavour()
+
+_posix_flavour = _PosixFlavour()
+
+class _Accessor:
+    """An accessor implements a particular (system-specific or not) way of
+    accessing paths on the filesystem."""
+
+class _NormalAccessor(_Accessor):
+
+    def _wrap_strfunc(strfunc):
+        @functools.wraps(strfunc)
+        def wrapped(pathobj, *args):
+            return strfunc(str(pathobj), *args)
+        return staticmethod(wrapped)
+
+    def _wrap_binary_strfunc(strfunc):
+        @functools.wraps(strfunc)
+        def wrapped(pathobjA, pathobjB, *args):
+            return strfunc(str(pathobjA), str(pathobjB), *args)
+        return staticmethod(wrapped)
+
+    stat = _wrap_strfunc(os.stat)
+
+    lstat = _wrap_strfunc(os.lstat)
+
+    open = _wrap_strfunc(os.open)
+
+    listdir = _wrap_strfunc(os.listdir)
+
+    chmod = _wrap_strfunc(os.chmod)
+
+    if hasattr(os, "lchmod"):
+        lchmod = _wrap_strfunc(os.lchmod)
+    else:
+        def lchmod(self, pathobj, mode):
+            raise NotImplementedError("lchmod() not available on this system")
+
+    mkdir = _wrap_strfunc(os.mkdir)
+
+    unlink = _wrap_strfunc(os.unlink)
+
+    rmdir = _wrap_strfunc(os.rmdir)
+
+    rename = _wrap_binary_strfunc(os.rename)
+
+    if sys.version_info >= (3, 3):
+        replace = _wrap_binary_strfunc(os.replace)
+
+    if nt:
+        if supports_symlinks:
+            symlink = _wrap_binary_strfunc(os.symlink)
+        else:
+            def symlink(a, b, target_is_directory):
+                raise NotImplementedError("symlink() not available on this system")
+    else:
+        # Under POSIX, os.symlink() takes two args
+        @staticmethod
+        def symlink(a, b, target_is_directory):
+            return os.symlink(str(a), str(b))
+
+    utime = _wrap_strfunc(os.utime)
+
+    # Helper for resolve()
+    def readlink(self, path):
+        return os.readlink(path)
+
+_normal_accessor = _NormalAccessor()
+
+@contextmanager
+def _cached(func):
+    try:
+        func.__cached__
+        yield func
+    except AttributeError:
+        cache = {}
+        def wrapper(*args):
+            try:
+                return cache[args]
+            except KeyError:
+                value = cache[args] = func(*args)
+                return value
+        wrapper.__cached__ = True
+        try:
+            yield wrapper
+        finally:
+            cache.clear()
+
+def _make_selector(pattern_parts):
+    pat = pattern_parts[0]
+    child_parts = pattern_parts[1:]
+    if pat == '**':
+        cls = _RecursiveWildcardSelector
+    elif '**' in pat:
+        raise ValueError("Invalid pattern: '**' can only be an entire path component")
+    elif _is_wildcard_pattern(pat):
+        cls = _WildcardSelector
+    else:
+        cls = _PreciseSelector
+    return cls(pat, child_parts)
+
+if hasattr(functools, "lru_cache"):
+    _make_selector = functools.lru_cache()(_make_selector)
+
+class _Selector:
+    """A selector matches a specific glob pattern part against the children
+    of a given path."""
+
+    def __init__(self, child_parts):
+        self.child_parts = child_parts
+        if child_parts:
+            self.successor = _make_selector(child_parts)
+        else:
+            self.successor = _TerminatingSelector()
+
+    def select_from(self, parent_path):
+        """Iterate over all child paths of `parent_path` matched by this
+        selector.  This can contain parent_path itself."""
+        path_cls = type(parent_path)
+        is_dir = path_cls.is_dir
+        exists = path_cls.exists
+        listdir = parent_path._accessor.listdir
+        return self._select_from(parent_path, is_dir, exists, listdir)
+
+class _TerminatingSelector:
+
+    def _select_from(self, parent_path, is_dir, exists, listdir):
+        yield parent_path
+
+class _PreciseSelector(_Selector):
+
+    def __init__(self, name, child_parts):
+        self.name = name
+        _Selector.__init__(self, child_parts)
+
+    def _select_from(self, parent_path, is_dir, exists, listdir):
+        if not is_dir(parent_path):
+            return
+        path = parent_path._make_child_relpath(self.name)
+        if exists(path):
+            for p in self.successor._select_from(path, is_dir, exists, listdir):
+                yield p
+
+class _WildcardSelector(_Selector):
+
+    def __init__(self, pat, child_parts):
+        self.pat = re.compile(fnmatch.translate(pat))
+        _Selector.__init__(self, child_parts)
+
+    def _select_from(self, parent_path, is_dir, exists, listdir):
+        if not is_dir(parent_path):
+            return
+        cf = parent_path._flavour.casefold
+        for name in listdir(parent_path):
+            casefolded = cf(name)
+            if self.pat.match(casefolded):
+                path = parent_path._make_child_relpath(name)
+                for p in self.successor._select_from(path, is_dir, exists, listdir):
+                    yield p
+
+class _RecursiveWildcardSelector(_Selector):
+
+    def __init__(self, pat, child_parts):
+        _Selector.__init__(self, child_parts)
+
+    def _iterate_directories(self, parent_path, is_dir, listdir):
+        yield parent_path
+        for name in listdir(parent_path):
+            path = parent_path._make_child_relpath(name)
+            if is_dir(path):
+                for p in self._iterate_directories(path, is_dir, listdir):
+                    yield p
+
+    def _select_from(self, parent_path, is_dir, exists, listdir):
+        if not is_dir(parent_path):
+            return
+        with _cached(listdir) as listdir:
+            yielded = set()
+            try:
+                successor_select = self.successor._select_from
+                for starting_point in self._iterate_directories(parent_path, is_dir, listdir):
+                    for p in successor_select(starting_point, is_dir, exists, listdir):
+                        if p not in yielded:
+                            yield p
+                            yielded.add(p)
+            finally:
+                yielded.clear()
+
+class _PathParents(Sequence):
+    """This object provides sequence-like access to the logical ancestors
+    of a path.  Don't try to construct it yourself."""
+    __slots__ = ('_pathcls', '_drv', '_root', '_parts')
+
+    def __init__(self, path):
+        # We don't store the instance to avoid reference cycles
+        self._pathcls = type(path)
+        self._drv = path._drv
+        self._root = path._root
+        self._parts = path._parts
+
+    def __len__(self):
+        if self._drv or self._root:
+            return len(self._parts) - 1
+        else:
+            return len(self._parts)
+
+    def __getitem__(self, idx):
+        if idx < 0 or idx >= len(self):
+            raise IndexError(idx)
+        return self._pathcls._from_parsed_parts(self._drv, self._root,
+                                                self._parts[:-idx - 1])
+
+    def __repr__(self):
+        return "<{}.parents>".format(self._pathcls.__name__)
+
+class PurePath(object):
+    """PurePath represents a filesystem path and offers operations which
+    don't imply any actual filesystem I/O.  Depending on your system,
+    instantiating a PurePath will return either a PurePosixPath or a
+    PureWindowsPath object.  You can also instantiate either of these classes
+    directly, regardless of your system.
+    """
+    __slots__ = (
+        '_drv', '_root', '_parts',
+        '_str', '_hash', '_pparts', '_cached_cparts',
+    )
+
+    def __new__(cls, *args):
+        """Construct a PurePath from one or several strings and or existing
+        PurePath objects.  The strings and path objects are combined so as
+        to yield a canonicalized path, which is incorporated into the
+        new PurePath object.
+        """
+        if cls is PurePath:
+            cls = PureWindowsPath if os.name == 'nt' else PurePosixPath
+        return cls._from_parts(args)
+
+    def __reduce__(self):
+        # Using the parts tuple helps share interned path parts
+        # when pickling related paths.
+        return (self.__class__, tuple(self._parts))
+
+    @classmethod
+    def _parse_args(cls, args):
+        # This is useful when you don't want to create an instance, just
+        # canonicalize some constructor arguments.
+        parts = []
+        for a in args:
+            if isinstance(a, PurePath):
+                parts += a._parts
+            elif isinstance(a, str):
+                # Assuming a str
+                parts.append(a)
+            else:
+                raise TypeError(
+                    "argument should be a path or str object, not %r"
+                    % type(a))
+        return cls._flavour.parse_parts(parts)
+
+    @classmethod
+    def _from_parts(cls, args, init=True):
+        # We need to call _parse_args on the instance, so as to get the
+        # right flavour.
+        self = object.__new__(cls)
+        drv, root, parts = self._parse_args(args)
+        self._drv = drv
+        self._root = root
+        self._parts = parts
+        if init:
+            self._init()
+        return self
+
+    @classmethod
+    def _from_parsed_parts(cls, drv, root, parts, init=True):
+        self = object.__new__(cls)
+        self._drv = drv
+        self._root = root
+        self._parts = parts
+        if init:
+            self._init()
+        return self
+
+    @classmethod
+    def _format_parsed_parts(cls, drv, root, parts):
+        if drv or root:
+            return drv + root + cls._flavour.join(parts[1:])
+        else:
+            return cls._flavour.join(parts)
+
+    def _init(self):
+        # Overriden in concrete Path
+        pass
+
+    def _make_child(self, args):
+        drv, root, parts = self._parse_args(args)
+        drv, root, parts = self._flavour.join_parsed_parts(
+            self._drv, self._root, self._parts, drv, root, parts)
+        return self._from_parsed_parts(drv, root, parts)
+
+    def __str__(self):
+        """Return the string representation of the path, suitable for
+        passing to system calls."""
+        try:
+            return self._str
+        except AttributeError:
+            self._str = self._format_parsed_parts(self._drv, self._root,
+                                                  self._parts) or '.'
+            return self._str
+
+    def as_posix(self):
+        """Return the string representation of the path with forward (/)
+        slashes."""
+        f = self._flavour
+        return str(self).replace(f.sep, '/')
+
+    def __bytes__(self):
+        """Return the bytes representation of the path.  This is only
+        recommended to use under Unix."""
+        if sys.version_info < (3, 2):
+            raise NotImplementedError("needs Python 3.2 or later")
+        return os.fsencode(str(self))
+
+    def __fspath__(self):
+        return str(self)
+
+    def __repr__(self):
+        return "{}({!r})".format(self.__class__.__name__, self.as_posix())
+
+    def as_uri(self):
+        """Return the path as a 'file' URI."""
+        if not self.is_absolute():
+            raise ValueError("relative path can't be expressed as a file URI")
+        return self._flavour.make_uri(self)
+
+    @property
+    def _cparts(self):
+        # Cached casefolded parts, for hashing and comparison
+        try:
+            return self._cached_cparts
+        except AttributeError:
+            self._cached_cparts = self._flavour.casefold_parts(self._parts)
+            return self._cached_cparts
+
+    def __eq__(self, other):
+        if not isinstance(other, PurePath):
+            return NotImplemented
+        return self._cparts == other._cparts and self._flavour is other._flavour
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        try:
+            return self._hash
+        except AttributeError:
+            self._hash = hash(tuple(self._cparts))
+            return self._hash
+
+    def __lt__(self, other):
+        if not isinstance(other, PurePath) or self._flavour is not other._flavour:
+            return NotImplemented
+        return self._cparts < other._cparts
+
+    def __le__(self, other):
+        if not isinstance(other, PurePath) or self._flavour is not other._flavour:
+            return NotImplemented
+        return self._cparts <= other._cparts
+
+    def __gt__(self, other):
+        if not isinstance(other, PurePath) or self._flavour is not other._flavour:
+            return NotImplemented
+        return self._cparts > other._cparts
+
+    def __ge__(self, other):
+        if not isinstance(other, PurePath) or self._flavour is not other._flavour:
+            return NotImplemented
+        return self._cparts >= other._cparts
+
+    drive = property(attrgetter('_drv'),
+                     doc="""The drive prefix (letter or UNC path), if any.""")
+
+    root = property(attrgetter('_root'),
+                    doc="""The root of the path, if any.""")
+
+    @property
+    def anchor(self):
+        """The concatenation of the drive and root, or ''."""
+        anchor = self._drv + self._root
+        return anchor
+
+    @property
+    def name(self):
+        """The final path component, if any."""
+        parts = self._parts
+        if len(parts) == (1 if (self._drv or self._root) else 0):
+            return ''
+        return parts[-1]
+
+    @property
+    def suffix(self):
+        """The final component's last suffix, if any."""
+        name = self.name
+        i = name.rfind('.')
+        if 0 < i < len(name) - 1:
+            return name[i:]
+        else:
+            return ''
+
+    @property
+    def suffixes(self):
+        """A list of the final component's suffixes, if any."""
+        name = self.name
+        if name.endswith('.'):
+            return []
+        name = name.lstrip('.')
+        return ['.' + suffix for suffix in name.split('.')[1:]]
+
+    @property
+    def stem(self):
+        """The final path component, minus its last suffix."""
+        name = self.name
+        i = name.rfind('.')
+        if 0 < i < len(name) - 1:
+            return name[:i]
+        else:
+            return name
+
+    def with_name(self, name):
+        """Return a new path with the file name changed."""
+        if not self.name:
+            raise ValueError("%r has an empty name" % (self,))
+        return self._from_parsed_parts(self._drv, self._root,
+                                       self._parts[:-1] + [name])
+
+    def with_suffix(self, suffix):
+        """Return a new path with the file suffix changed (or added, if none)."""
+        # XXX if suffix is None, should the current suffix be removed?
+        name = self.name
+        if not name:
+            raise ValueError("%r has an empty name" % (self,))
+        old_suffix = self.suffix
+        if not old_suffix:
+            name = name + suffix
+        else:
+            name = name[:-len(old_suffix)] + suffix
+        return self._from_parsed_parts(self._drv, self._root,
+                                       self._parts[:-1] + [name])
+
+    def relative_to(self, *other):
+        """Return the relative path to another path identified by the passed
+        arguments.  If the operation is not possible (because this is not
+        a subpath of the other path), raise ValueError.
+        """
+        # For the purpose of this method, drive and root are considered
+        # separate parts, i.e.:
+        #   Path('c:/').relative_to('c:')  gives Path('/')
+        #   Path('c:/').relative_to('/')   raise ValueError
+        if not other:
+            raise TypeError("need at least one argument")
+        parts = self._parts
+        drv = self._drv
+        root = self._root
+        if drv or root:
+            if root:
+                abs_parts = [drv, root] + parts[1:]
+            else:
+                abs_parts = [drv] + parts[1:]
+        else:
+            abs_parts = parts
+        to_drv, to_root, to_parts = self._parse_args(other)
+        if to_drv or to_root:
+            if to_root:
+                to_abs_parts = [to_drv, to_root] + to_parts[1:]
+            else:
+                to_abs_parts = [to_drv] + to_parts[1:]
+        else:
+            to_abs_parts = to_parts
+        n = len(to_abs_parts)
+        if n == 0 and (drv or root) or abs_parts[:n] != to_abs_parts:
+            formatted = self._format_parsed_parts(to_drv, to_root, to_parts)
+            raise ValueError("{!r} does not start with {!r}"
+                             .format(str(self), str(formatted)))
+        return self._from_parsed_parts('', '', abs_parts[n:])
+
+    @property
+    def parts(self):
+        """An object providing sequence-like access to the
+        components in the filesystem path."""
+        # We cache the tuple to avoid building a new one each time .parts
+        # is accessed.  XXX is this necessary?
+        try:
+            return self._pparts
+        except AttributeError:
+            self._pparts = tuple(self._parts)
+            return self._pparts
+
+    def joinpath(self, *args):
+        """Combine this path with one or several arguments, and return a
+        new path representing either a subpath (if all arguments are relative
+        paths) or a totally different path (if one of the arguments is
+        anchored).
+        """
+        return self._make_child(args)
+
+    def __truediv__(self, key):
+        return self._make_child((key,))
+
+    def __rtruediv__(self, key):
+        return self._from_parts([key] + self._parts)
+
+    if sys.version_info < (3,):
+        __div__ = __truediv__
+        __rdiv__ = __rtruediv__
+        del __truediv__, __rtruediv__
+
+    @property
+    def parent(self):
+        """The logical parent of the path."""
+        drv = self._drv
+        root = self._root
+        parts = self._parts
+        if len(parts) == 1 and (drv or root):
+            return self
+        return self._from_parsed_parts(drv, root, parts[:-1])
+
+    @property
+    def parents(self):
+        """A sequence of this path's logical parents."""
+        return _PathParents(self)
+
+    def is_absolute(self):
+        """True if the path is absolute (has both a root and, if applicable,
+        a drive)."""
+        if not self._root:
+            return False
+        return not self._flavour.has_drv or bool(self._drv)
+
+    def is_reserved(self):
+        """Return True if the path contains one of the special names reserved
+        by the system, if any."""
+        return self._flavour.is_reserved(self._parts)
+
+    def match(self, path_pattern):
+        """
+        Return True if this path matches the given pattern.
+        """
+        cf = self._flavour.casefold
+        path_pattern = cf(path_pattern)
+        drv, root, pat_parts = self._flavour.parse_parts((path_pattern,))
+        if not pat_parts:
+            raise ValueError("empty pattern")
+        if drv and drv != cf(self._drv):
+            return False
+        if root and root != cf(self._root):
+            return False
+        parts = self._cparts
+        if drv or root:
+            if len(pat_parts) != len(parts):
+                return False
+            pat_parts = pat_parts[1:]
+        elif len(pat_parts) > len(parts):
+            return False
+        for part, pat in zip(reversed(parts), reversed(pat_parts)):
+            if not fnmatch.fnmatchcase(part, pat):
+                return False
+        return True
+
+class PurePosixPath(PurePath):
+    _flavour = _posix_flavour
+    __slots__ = ()
+
+class PureWindowsPath(PurePath):
+    _flavour = _windows_flavour
+    __slots__ = ()
+
+class Path(PurePath):
+    __slots__ = (
+        '_accessor',
+    )
+
+    def __new__(cls, *args, **kwargs):
+        if cls is Path:
+            cls = WindowsPath if os.name == 'nt' else PosixPath
+        self = cls._from_parts(args, init=False)
+        if not self._flavour.is_supported:
+            raise NotImplementedError("cannot instantiate %r on your system"
+                                      % (cls.__name__,))
+        self._init()
+        return self
+
+    def _init(self,
+              # Private non-constructor arguments
+              template=None,
+              ):
+        if template is not None:
+            self._accessor = template._accessor
+        else:
+            self._accessor = _normal_accessor
+
+    def _make_child_relpath(self, part):
+        # This is an optimization used for dir walking.  `part` must be
+        # a single part relative to this path.
+        parts = self._parts + [part]
+        return self._from_parsed_parts(self._drv, self._root, parts)
+
+    def _opener(self, name, flags, mode=0o666):
+        # A stub for the opener argument to built-in open()
+        return self._accessor.open(self, flags, mode)
+
+    def _raw_open(self, flags, mode=0o777):
+        """
+        Open the file pointed by this path and return a file descriptor,
+        as os.open() does.
+        """
+        return self._accessor.open(self, flags, mode)
+
+    # Public API
+
+    @classmethod
+    def cwd(cls):
+        """Return a new path pointing to the current working directory
+        (as returned by os.getcwd()).
+        """
+        return cls(os.getcwd())
+
+    def iterdir(self):
+        """Iterate over the files in this directory.  Does not yield any
+        result for the special paths '.' and '..'.
+        """
+        for name in self._accessor.listdir(self):
+            if name in {'.', '..'}:
+                # Yielding a path object for these makes little sense
+                continue
+            yield self._make_child_relpath(name)
+
+    def glob(self, pattern):
+        """Iterate over this subtree and yield all existing files (of any
+        kind, including directories) matching the given pattern.
+        """
+        pattern = self._flavour.casefold(pattern)
+        drv, root, pattern_parts = self._flavour.parse_parts((pattern,))
+        if drv or root:
+            raise NotImplementedError("Non-relative patterns are unsupported")
+        selector = _make_selector(tuple(pattern_parts))
+        for p in selector.select_from(self):
+            yield p
+
+    def rglob(self, pattern):
+        """Recursively yield all existing files (of any kind, including
+        directories) matching the given pattern, anywhere in this subtree.
+        """
+        pattern = self._flavour.casefold(pattern)
+        drv, root, pattern_parts = self._flavour.parse_parts((pattern,))
+        if drv or root:
+            raise NotImplementedError("Non-relative patterns are unsupported")
+        selector = _make_selector(("**",) + tuple(pattern_parts))
+        for p in selector.select_from(self):
+            yield p
+
+    def absolute(self):
+        """Return an absolute version of this path.  This function works
+        even if the path doesn't point to anything.
+
+        No normalization is done, i.e. all '.' and '..' will be kept along.
+        Use resolve() to get the canonical path to a file.
+        """
+        # XXX untested yet!
+        if self.is_absolute():
+            return self
+        # FIXME this must defer to the specific flavour (and, under Windows,
+        # use nt._getfullpathname())
+        obj = self._from_parts([os.getcwd()] + self._parts, init=False)
+        obj._init(template=self)
+        return obj
+
+    def resolve(self):
+        """
+        Make the path absolute, resolving all symlinks on the way and also
+        normalizing it (for example turning slashes into backslashes under
+        Windows).
+        """
+        s = self._flavour.resolve(self)
+        if s is None:
+            # No symlink resolution => for consistency, raise an error if
+            # the path doesn't exist or is forbidden
+            self.stat()
+            s = str(self.absolute())
+        # Now we have no symlinks in the path, it's safe to normalize it.
+        normed = self._flavour.pathmod.normpath(s)
+        obj = self._from_parts((normed,), init=False)
+        obj._init(template=self)
+        return obj
+
+    def stat(self):
+        """
+        Return the result of the stat() system call on this path, like
+        os.stat() does.
+        """
+        return self._accessor.stat(self)
+
+    def owner(self):
+        """
+        Return the login name of the file owner.
+        """
+        import pwd
+        return pwd.getpwuid(self.stat().st_uid).pw_name
+
+    def group(self):
+        """
+        Return the group name of the file gid.
+        """
+        import grp
+        return grp.getgrgid(self.stat().st_gid).gr_name
+
+    def open(self, mode='r', buffering=-1, encoding=None,
+             errors=None, newline=None):
+        """
+        Open the file pointed by this path and return a file object, as
+        the built-in open() function does.
+        """
+        if sys.version_info >= (3, 3):
+            return io.open(str(self), mode, buffering, encoding, errors, newline,
+                           opener=self._opener)
+        else:
+            return io.open(str(self), mode, buffering, encoding, errors, newline)
+
+    def read_bytes(self):
+        """Open the file in bytes mode, read it, and close the file."""
+        with self.open(mode='rb') as f:
+            return f.read()
+
+    def read_text(self, encoding=None, errors=None):
+        """Open the file in text mode, read it, and close the file."""
+        with self.open(mode='r', encoding=encoding, errors=errors) as f:
+            return f.read()
+
+    def write_bytes(self, data):
+        """Open the file in bytes mode, write to it, and close the file."""
+        view = memoryview(data)
+        with self.open(mode='wb') as f:
+            return f.write(view)
+
+    def write_text(self, data, encoding=None, errors=None, newline=None):
+        """Open the file in text mode, write to it, and close the file."""
+        if not isinstance(data, str):
+            raise TypeError('data must be str, not %s' % data.__class__.__name__)
+        with self.open(mode='w', encoding=encoding, errors=errors, newline=newline) as f:
+            return f.write(data)
+
+    def touch(self, mode=0o666, exist_ok=True):
+        """
+        Create this file with the given access mode, if it doesn't exist.
+        """
+        if exist_ok:
+            # First try to bump modification time
+            # Implementation note: GNU touch uses the UTIME_NOW option of
+            # the utimensat() / futimens() functions.
+            t = time.time()
+            try:
+                self._accessor.utime(self, (t, t))
+            except OSError:
+                # Avoid exception chaining
+                pass
+            else:
+                return
+        flags = os.O_CREAT | os.O_WRONLY
+        if not exist_ok:
+            flags |= os.O_EXCL
+        fd = self._raw_open(flags, mode)
+        os.close(fd)
+
+    def mkdir(self, mode=0o777, parents=False, exist_ok=False):
+        if not parents:
+            try:
+                self._accessor.mkdir(self, mode)
+            except OSError as e:
+                if not (exist_ok and e.errno == EEXIST):
+                    raise
+        else:
+            try:
+                self._accessor.mkdir(self, mode)
+            except OSError as e:
+                if e.errno == ENOENT:
+                    self.parent.mkdir(mode, True, exist_ok)
+                    try:
+                        self._accessor.mkdir(self, mode)
+                    except OSError as e2:
+                        if not (exist_ok and e2.errno == EEXIST):
+                            raise
+                elif not (exist_ok and e.errno == EEXIST):
+                    raise
+
+    def chmod(self, mode):
+        """
+        Change the permissions of the path, like os.chmod().
+        """
+        self._accessor.chmod(self, mode)
+
+    def lchmod(self, mode):
+        """
+        Like chmod(), except if the path points to a symlink, the symlink's
+        permissions are changed, rather than its target's.
+        """
+        self._accessor.lchmod(self, mode)
+
+    def unlink(self):
+        """
+        Remove this file or link.
+        If the path is a directory, use rmdir() instead.
+        """
+        self._accessor.unlink(self)
+
+    def rmdir(self):
+        """
+        Remove this directory.  The directory must be empty.
+        """
+        self._accessor.rmdir(self)
+
+    def lstat(self):
+        """
+        Like stat(), except if the path points to a symlink, the symlink's
+        status information is returned, rather than its target's.
+        """
+        return self._accessor.lstat(self)
+
+    def rename(self, target):
+        """
+        Rename this path to the given path.
+        """
+        self._accessor.rename(self, target)
+
+    def replace(self, target):
+        """
+        Rename this path to the given path, clobbering the existing
+        destination if it exists.
+        """
+        if sys.version_info < (3, 3):
+            raise NotImplementedError("replace() is only available "
+                                      "with Python 3.3 and later")
+        self._accessor.replace(self, target)
+
+    def symlink_to(self, target, target_is_directory=False):
+        """
+        Make this path a symlink pointing to the given path.
+        Note the order of arguments (self, target) is the reverse of os.symlink's.
+        """
+        self._accessor.symlink(target, self, target_is_directory)
+
+    # Convenience functions for querying the stat results
+
+    def exists(self):
+        """
+        Whether this path exists.
+        """
+        try:
+            self.stat()
+        except OSError as e:
+            if e.errno != ENOENT:
+                raise
+            return False
+        return True
+
+    def is_dir(self):
+        """
+        Whether this path is a directory.
+        """
+        try:
+            return S_ISDIR(self.stat().st_mode)
+        except OSError as e:
+            if e.errno != ENOENT:
+                raise
+            # Path doesn't exist or is a broken symlink
+            # (see https://bitbucket.org/pitrou/pathlib/issue/12/)
+            return False
+
+    def is_file(self):
+        """
+        Whether this path is a regular file (also True for symlinks pointing
+        to regular files).
+        """
+        try:
+            return S_ISREG(self.stat().st_mode)
+        except OSError as e:
+            if e.errno != ENOENT:
+                raise
+            # Path doesn't exist or is a broken symlink
+            # (see https://bitbucket.org/pitrou/pathlib/issue/12/)
+            return False
+
+    def is_symlink(self):
+        """
+        Whether this path is a symbolic link.
+        """
+        try:
+            return S_ISLNK(self.lstat().st_mode)
+        except OSError as e:
+            if e.errno != ENOENT:
+                raise
+            # Path doesn't exist
+            return False
+
+    def is_block_device(self):
+        """
+        Whether this path is a block device.
+        """
+        try:
+            return S_ISBLK(self.stat().st_mode)
+        except OSError as e:
+            if e.errno != ENOENT:
+                raise
+            # Path doesn't exist or is a broken symlink
+            # (see https://bitbucket.org/pitrou/pathlib/issue/12/)
+            return False
+
+    def is_char_device(self):
+        """
+        Whether this path is a character device.
+        """
+        try:
+            return S_ISCHR(self.stat().st_mode)
+        except OSError as e:
+            if e.errno != ENOENT:
+                raise
+            # Path doesn't exist or is a broken symlink
+            # (see https://bitbucket.org/pitrou/pathlib/issue/12/)
+            return False
+
+    def is_fifo(self):
+        """
+        Whether this path is a FIFO.
+        """
+        try:
+            return S_ISFIFO(self.stat().st_mode)
+        except OSError as e:
+            if e.errno != ENOENT:
+                raise
+            # Path doesn't exist or is a broken symlink
+            # (see https://bitbucket.org/pitrou/pathlib/issue/12/)
+            return False
+
+    def is_socket(self):
+        """
+        Whether this path is a socket.
+        """
+        try:
+            return S_ISSOCK(self.stat().st_mode)
+        except OSError as e:
+            if e.errno != ENOENT:
+                raise
+            # Path doesn't exist or is a broken symlink
+            # (see https://bitbucket.org/pitrou/pathlib/issue/12/)
+            return False
+
+class PosixPath(Path, PurePosixPath):
+    __slots__ = ()
+
+class WindowsPath(Path, PureWindowsPath):
+    __slots__ = ()
+
@@ -2,67 +2,107 @@
 pyonetrue: Flatten Python packages into a well-ordered single module.
 
 Provides CLI entry point and core flattening functionality under the pyonetrue namespace.
-"""
-
-from .extract_ast import extract_spans, Span
-
-from .flattening import (
-    FlatteningContext,
-    FlatteningModule,
-    normalize_a_module_name,
-    normalize_module_names,
-)
 
-from .normalize_imports import (
-    normalize_imports,
-    format_plain_import,
-    format_from_import,
-    is_stdlib_module,
-    set_line_length,
-    get_line_length,
-    ImportEntry,
-)
-
-from .cli import __version__, main
+Submodules are imported on first use of one of their names (PEP 562), so
+that importing the package, e.g. to run the CLI, only pays for what is used.
+"""
 
-from .exceptions import (
-    PyonetrueError,
-    CLIOptionError,
-    DuplicateNameError,
-    ImportNormalizationError,
-    IncludeExcludeError,
-    FlatteningError,
-    ModuleInferenceError,
-    PathError,
-)
+import sys
+from types import ModuleType
 
-__all__ = [
+# Public name -> submodule defining it
+_LAZY_NAMES = {
 # cli
-    "__version__",
-    "main",
+    "__version__": "cli",
+    "main": "cli",
+# bytecode
+    "write_pyc": "bytecode",
+    "write_launcher": "bytecode",
+# git_index
+    "git_tracked_files": "git_index",
+    "blob_spans": "git_index",
+# pgo
+    "record_profile": "pgo",
+    "load_profile": "pgo",
+# prefetch
+    "prefetch_files": "prefetch",
+# reorder
+    "canonical_text": "reorder",
+    "reorder_files": "reorder",
+# remote_cache
+    "remote_get": "remote_cache",
+    "remote_put": "remote_cache",
+    "serve_remote_cache": "remote_cache",
+# schedule
+    "plan_batches": "schedule",
+    "schedule_tasks": "schedule",
+# spill
+    "SpilledSpan": "spill",
+    "parse_memory_size": "spill",
+# pyz
+    "write_pyz": "pyz",
+# sfx
+    "write_sfx": "sfx",
+    "sfx_text": "sfx",
 # extract_ast
-    "extract_spans",
-    "Span",
+    "extract_spans": "extract_ast",
+    "Span": "extract_ast",
 # flattening
-    "FlatteningContext",
-    "FlatteningModule",
-    "normalize_a_module_name",
-    "normalize_module_names",
+    "FlatteningContext": "flattening",
+    "FlatteningModule": "flattening",
+    "normalize_a_module_name": "flattening",
+    "normalize_module_names": "flattening",
+# lazy_sections
+    "plan_lazy_sections": "lazy_sections",
+    "render_lazy_sections": "lazy_sections",
+# minify
+    "minify_source": "minify",
+    "strip_docstrings_and_asserts": "minify",
 # normailize_imports :
-    "normalize_imports",
-    "format_plain_import",
-    "format_from_import",
-    "is_stdlib_module",
-    "set_line_length",
-    "get_line_length",
-    "ImportEntry",
+    "normalize_imports": "normalize_imports",
+    "format_plain_import": "normalize_imports",
+    "format_from_import": "normalize_imports",
+    "is_stdlib_module": "normalize_imports",
+    "set_line_length": "normalize_imports",
+    "get_line_length": "normalize_imports",
+    "ImportEntry": "normalize_imports",
+# type_hints
+    "strip_annotations": "type_hints",
 # exceptions
-    "PyonetrueError",
-    "CLIOptionError",
-    "DuplicateNameError",
-    "ImportNormalizationError",
-    "IncludeExcludeError",
-    "FlatteningError",
-    "ModuleInferenceError",
-    "PathError",
-]
\ No newline at end of file
+    "PyonetrueError": "exceptions",
+    "CLIOptionError": "exceptions",
+    "DuplicateNameError": "exceptions",
+    "ImportNormalizationError": "exceptions",
+    "IncludeExcludeError": "exceptions",
+    "FlatteningError": "exceptions",
+    "ModuleInferenceError": "exceptions",
+    "PathError": "exceptions",
+}
+
+__all__ = list(_LAZY_NAMES)
+
+def __getattr__(name):
+    """Import the submodule defining ``name`` and return it."""
+    submodule = _LAZY_NAMES.get(name)
+    if submodule is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+    value = getattr(import_module(f"{__name__}.{submodule}"), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
+class LazyPackage(ModuleType):
+    """Keeps public names bound when a submodule of the same name is imported.
+
+    Importing ``pyonetrue.normalize_imports`` binds the submodule as an
+    attribute of the package, hiding the function ``normalize_imports``.
+    """
+    def __setattr__(self, name, value):
+        if isinstance(value, ModuleType) and _LAZY_NAMES.get(name) == name:
+            value = getattr(value, name)
+        super().__setattr__(name, value)
+
+sys.modules[__name__].__class__ = LazyPackage
@@ -0,0 +1,142 @@
+"""Find the global names referenced by top-level code spans."""
+
+import ast
+from typing import Iterable, Set
+
+from .extract_ast import Span
+
+def referenced_names(spans: Iterable["Span"]) -> Set[str]:
+    """Collect every name the given spans may read.
+
+    A name counts as referenced when it is loaded or deleted anywhere in a
+    span, including inside functions and classes, when it appears in a
+    string annotation, or when it is listed in ``__all__``.
+
+    Args:
+        spans (Iterable[Span]): Spans to scan.
+
+    Returns:
+        Set[str]: Referenced names.
+
+    Examples:
+        >>> sorted(referenced_names([Span('x = os.sep\n', 'logic')]))
+        ['os']
+    """
+    names = set()
+    for span in spans:
+        if not span.text.strip():
+            continue
+        collect_referenced_names(ast.parse(span.text), names)
+    return names
+
+def collect_referenced_names(tree: ast.AST, names: Set[str]) -> None:
+    """Add the names referenced within ``tree`` to ``names``."""
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            if not isinstance(node.ctx, ast.Store):
+                names.add(node.id)
+        elif isinstance(node, ast.AugAssign):
+            # `x += 1` reads x as well as storing it
+            if isinstance(node.target, ast.Name):
+                names.add(node.target.id)
+        if isinstance(node, (ast.Assign, ast.AugAssign, ast.AnnAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            if any(isinstance(t, ast.Name) and t.id == '__all__' for t in targets):
+                names.update(string_constants(node.value))
+        for annotation in annotations_of(node):
+            if isinstance(annotation, ast.Constant) and isinstance(annotation.value, str):
+                try:
+                    collect_referenced_names(ast.parse(annotation.value, mode='eval'), names)
+                except SyntaxError:
+                    pass
+
+def annotations_of(node: ast.AST) -> list:
+    """Return the annotation expressions directly attached to ``node``."""
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        return [node.returns] if node.returns else []
+    if isinstance(node, (ast.arg, ast.AnnAssign)):
+        return [node.annotation] if node.annotation else []
+    return []
+
+def string_constants(node: ast.AST) -> list:
+    """Return the str constants within ``node``, e.g. the entries of ``__all__``."""
+    if node is None:
+        return []
+    return [ n.value for n in ast.walk(node)
+             if isinstance(n, ast.Constant) and isinstance(n.value, str) ]
+
+# Expressions which evaluate to the same immutable value every time, given
+# the same names.  Calls, containers and lambdas create new objects.
+IDEMPOTENT_NODES = (
+    ast.Module, ast.Expr, ast.Pass, ast.Import, ast.ImportFrom, ast.alias,
+    ast.Try, ast.ExceptHandler, ast.If, ast.Assign, ast.AnnAssign,
+    ast.Name, ast.Attribute, ast.Constant, ast.Tuple, ast.Starred,
+    ast.BoolOp, ast.IfExp,
+    ast.expr_context, ast.operator, ast.unaryop, ast.boolop, ast.cmpop,
+)
+
+# Operators, idempotent only on constants: on names they may call a user
+# defined ``__add__`` or ``__lt__``, or build a new list, e.g. ``[] + x``
+CONSTANT_OPERATOR_NODES = (ast.BinOp, ast.UnaryOp, ast.Compare)
+
+def is_idempotent_binding(tree: ast.AST) -> bool:
+    """True when running ``tree`` again binds the same names to the same values.
+
+    Only imports, assignments of immutable expressions to names and the
+    ``try`` and ``if`` statements around them qualify.  Assigning to an
+    attribute or an item mutates an object, which bound_names() does not
+    follow.
+
+    Examples:
+        >>> is_idempotent_binding(ast.parse("try:\\n    import a\\nexcept ImportError:\\n    a = None\\n"))
+        True
+        >>> is_idempotent_binding(ast.parse("REGISTRY = {}\\n"))
+        False
+        >>> is_idempotent_binding(ast.parse("SIZE = 4 * 1024\\n"))
+        True
+        >>> is_idempotent_binding(ast.parse("ITEMS = BASE + BASE\\n"))
+        False
+        >>> is_idempotent_binding(ast.parse("config.debug = False\\n"))
+        False
+    """
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Attribute, ast.Subscript)) and not isinstance(node.ctx, ast.Load):
+            return False  # mutates an object another span may mutate too
+        if isinstance(node, CONSTANT_OPERATOR_NODES):
+            if not all(isinstance(n, (ast.Constant, *CONSTANT_OPERATOR_NODES, ast.expr_context, ast.operator,
+                                      ast.unaryop, ast.cmpop)) for n in ast.walk(node)):
+                return False
+        elif not isinstance(node, IDEMPOTENT_NODES):
+            return False
+    return True
+
+def bound_names(tree: ast.AST) -> Set[str]:
+    """Collect the global names ``tree`` may bind when it runs.
+
+    Covers assignment targets, imports, definitions and the names functions
+    declare ``global``.
+
+    Examples:
+        >>> sorted(bound_names(ast.parse("import a.b\\nx, y = 1, 2\\ndef f():\\n    global z\\n")))
+        ['a', 'f', 'x', 'y', 'z']
+    """
+    names = set()
+    todo = [tree]
+    while todo:
+        node = todo.pop()
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+            # Nested scopes only bind globals they declare
+            names.update(name for n in ast.walk(node) if isinstance(n, ast.Global) for name in n.names)
+            todo.extend(node.decorator_list)
+            continue
+        if isinstance(node, ast.Lambda):
+            continue
+        if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            names.add(node.id)
+        elif isinstance(node, ast.alias):
+            names.add(node.asname or node.name.split(".", 1)[0])
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+        todo.extend(ast.iter_child_nodes(node))
+    return names
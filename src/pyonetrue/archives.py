@@ -0,0 +1,150 @@
+"""Read the Python sources of a package from a wheel, sdist or zip archive.
+
+Members are enumerated and read with ``zipfile`` or ``tarfile``, nothing is
+extracted to disk.  The package is the top-most directory holding an
+``__init__.py``, e.g. ``pkg/`` in a wheel or ``pkg-1.0/src/pkg/`` in an
+sdist.  Archives holding several packages use the one named after the
+distribution, an archive holding a single top-level module, e.g. the
+``docopt`` wheel, flattens as that file would.
+
+``read_tar_stream_package()`` reads a tar stream, e.g. stdin, parsing each
+member as it arrives.
+"""
+
+import posixpath
+from importlib.util import decode_source
+from typing import IO, Callable, Iterator, Tuple
+
+from .exceptions import ModuleInferenceError, PathError
+
+ARCHIVE_SUFFIXES = (".whl", ".zip", ".tar.gz", ".tgz", ".tar")
+
+def is_archive(path) -> bool:
+    """True when ``path`` names a supported archive, by its suffix."""
+    return str(path).lower().endswith(ARCHIVE_SUFFIXES)
+
+def read_archive_members(path) -> dict[str, bytes]:
+    """Return the ``.py`` members of the archive at ``path``, by member name."""
+    # Imported here, flattening checks is_archive() on every run
+    import tarfile
+    import zipfile
+    try:
+        if zipfile.is_zipfile(str(path)):
+            with zipfile.ZipFile(str(path)) as archive:
+                return { info.filename: archive.read(info) for info in archive.infolist()
+                         if info.filename.endswith(".py") and not info.is_dir() }
+        with tarfile.open(str(path), "r:*") as archive:
+            return dict(iter_tar_members(archive))
+    except (OSError, zipfile.BadZipFile, tarfile.TarError) as e:
+        raise PathError(f"cannot read archive '{path}': {e}")
+
+def iter_tar_members(archive: "tarfile.TarFile") -> Iterator[Tuple[str, bytes]]:
+    """Yield ``(name, content)`` of the ``.py`` files of ``archive`` as they are read.
+
+    Works on a stream, e.g. ``tarfile.open(fileobj=..., mode="r|*")``.
+    """
+    for member in archive:
+        if member.isfile() and member.name.endswith(".py"):
+            name = member.name[2:] if member.name.startswith("./") else member.name
+            yield name, archive.extractfile(member).read()
+
+def archive_package(members: dict[str, bytes], archive_name: str) -> Tuple[str, dict[str, str]]:
+    """Locate the package within archive ``members``.
+
+    Args:
+        members (dict[str, bytes]): ``.py`` members by name, see read_archive_members().
+        archive_name (str): File name of the archive, e.g. ``pkg-1.0-py3-none-any.whl``,
+            its distribution name picks among several packages.
+
+    Returns:
+        tuple: ``(package_name, sources)``, sources maps each module's path
+        relative to the package, e.g. ``sub/mod.py``, to its decoded source.
+
+    Examples:
+        >>> archive_package({"pkg-1.0/src/pkg/__init__.py": b"", "pkg-1.0/setup.py": b""}, "pkg-1.0.tar.gz")
+        ('pkg', {'__init__.py': ''})
+    """
+    package_name, relpaths = archive_package_members(members, archive_name)
+    return package_name, { relpath: decode_source(members[name]) for name, relpath in relpaths.items() }
+
+def archive_package_members(names, archive_name: str) -> Tuple[str, dict[str, str]]:
+    """Return the package name and the path of each of its members within it, by member name."""
+    packages = { posixpath.dirname(name) for name in names
+                 if posixpath.basename(name) == "__init__.py" }
+    roots = sorted(d for d in packages if d and posixpath.dirname(d) not in packages)
+    if len(roots) > 1:
+        distribution = archive_name.split("-", 1)[0].lower().replace(".", "_")
+        roots = [ d for d in roots if posixpath.basename(d).lower() == distribution ] or roots
+    if len(roots) == 1:
+        prefix = roots[0] + "/"
+        return posixpath.basename(roots[0]), { name: name[len(prefix):] for name in names
+                                               if name.startswith(prefix) }
+    if roots:
+        raise ModuleInferenceError(f"archive '{archive_name}' holds several packages: {', '.join(roots)}")
+
+    modules = [ name for name in names if "/" not in name and name != "setup.py" ]
+    if len(modules) != 1:
+        raise ModuleInferenceError(f"cannot infer the package of archive '{archive_name}'")
+    return modules[0][:-len(".py")], { modules[0]: modules[0] }
+
+def read_archive_package(path) -> Tuple[str, dict[str, str]]:
+    """Read the package of the archive at ``path``, see archive_package()."""
+    return archive_package(read_archive_members(path), posixpath.basename(str(path)))
+
+def read_tar_stream_package(stream: IO[bytes], archive_name: str = "-") -> Tuple[str, dict[str, str], dict[str, list]]:
+    """Read the package of an uncompressed or gzip tar ``stream``, in memory.
+
+    Each member is parsed as soon as it has been read, while a thread
+    reads the next one.  A member which does not parse is left for
+    flattening to report, should it belong to the package.
+
+    Returns:
+        tuple: ``(package_name, sources, spans)``, sources and their spans
+        by path within the package, see archive_package().
+    """
+    from .extract_ast import extract_spans
+
+    def parse(name, content):
+        text = decode_source(content)
+        try:
+            return text, extract_spans(text, name)
+        except SyntaxError:
+            return text, None
+
+    parsed = read_tar_stream(stream, parse)
+    package_name, relpaths = archive_package_members(parsed, archive_name)
+    sources = { relpath: parsed[name][0] for name, relpath in relpaths.items() }
+    spans = { relpath: parsed[name][1] for name, relpath in relpaths.items() if parsed[name][1] is not None }
+    return package_name, sources, spans
+
+def read_tar_stream(stream: IO[bytes], parse: Callable[[str, bytes], object]) -> dict[str, object]:
+    """Return ``parse(name, content)`` of each ``.py`` member of tar ``stream``, by name.
+
+    A thread reads the stream, the members are parsed as they arrive.
+    """
+    import queue
+    import tarfile
+    import threading
+
+    arrived = queue.Queue(maxsize=64)
+
+    def read():
+        try:
+            with tarfile.open(fileobj=stream, mode="r|*") as archive:
+                for member in iter_tar_members(archive):
+                    arrived.put(member)
+        except (OSError, EOFError, tarfile.TarError) as e:
+            arrived.put(e)
+        else:
+            arrived.put(None)
+
+    threading.Thread(target=read, name="pyonetrue-tar-reader", daemon=True).start()
+    results = {}
+    while True:
+        member = arrived.get()
+        if member is None:
+            return results
+        if isinstance(member, Exception):
+            raise PathError(f"cannot read tar stream: {member}")
+        name, content = member
+        results[name] = parse(name, content)
@@ -0,0 +1,110 @@
+"""Compile a flattened module to bytecode at build time.
+
+``write_pyc()`` writes the ``__pycache__`` entry the import system looks for
+next to the flattened module, using hash-based invalidation (PEP 552) so the
+file stays valid when copied, e.g. into a container image, where timestamps
+change and ``__pycache__`` may not be writable.
+
+A script run as ``python tool.py`` never uses ``__pycache__``.
+``write_launcher()`` writes a small script that loads the marshalled code
+object from the ``.pyc`` instead and falls back to compiling the source when
+the ``.pyc`` is missing, stale or was built for another Python version.
+"""
+
+import importlib.util
+import os
+import py_compile
+
+from .exceptions import PathError
+
+try :
+    from pathlib import Path
+except ImportError:
+    from .vendor.pathlib import Path
+
+PYC_INVALIDATION = {
+    "checked": py_compile.PycInvalidationMode.CHECKED_HASH,
+    "unchecked": py_compile.PycInvalidationMode.UNCHECKED_HASH,
+}
+
+LAUNCHER_TEMPLATE = '''{shebang}
+"""Launcher for {source}, runs its precompiled bytecode."""
+
+def _pyonetrue_run():
+    # Imported and bound here, the program runs in this module's namespace
+    import importlib.util, marshal, os
+    here = os.path.dirname(os.path.realpath(__file__))
+    source = os.path.join(here, {source!r})
+    pyc = os.path.join(here, {pyc!r})
+    code = None
+    try:
+        with open(pyc, "rb") as f:
+            data = f.read()
+        flags = int.from_bytes(data[4:8], "little")
+        if data[:4] == importlib.util.MAGIC_NUMBER and flags & 0b1:
+            if flags & 0b10:  # checked, validate against the source
+                with open(source, "rb") as f:
+                    if importlib.util.source_hash(f.read()) != data[8:16]:
+                        raise ValueError("stale")
+            code = marshal.loads(memoryview(data)[16:])
+    except (OSError, ValueError, EOFError, TypeError):
+        pass
+    if code is None:
+        with open(source, "rb") as f:
+            code = compile(f.read(), source, "exec", dont_inherit=True)
+    namespace = globals()
+    del namespace["_pyonetrue_run"]
+    namespace["__file__"] = source
+    namespace["__doc__"] = None
+    exec(code, namespace)
+
+_pyonetrue_run()
+'''
+
+def write_pyc(source_path: Path, invalidation: str = "checked") -> Path:
+    """Compile ``source_path`` into the ``__pycache__`` entry the import system uses.
+
+    Args:
+        source_path (Path): Flattened module, already written.
+        invalidation (str): ``checked`` validates the pyc against the hash of
+            the source on every import, ``unchecked`` trusts it.
+
+    Returns:
+        Path: The written ``.pyc``.
+    """
+    if invalidation not in PYC_INVALIDATION:
+        raise ValueError(f"unknown pyc invalidation '{invalidation}', use one of: {', '.join(PYC_INVALIDATION)}")
+    source_path = Path(source_path)
+    if not source_path.is_file():
+        raise PathError(f"cannot compile '{source_path}', it is not a file")
+    cfile = importlib.util.cache_from_source(str(source_path))
+    py_compile.compile(str(source_path), cfile=cfile, doraise=True,
+                       invalidation_mode=PYC_INVALIDATION[invalidation])
+    return Path(cfile)
+
+def write_launcher(launcher_path: Path, source_path: Path, pyc_path: Path,
+                   shebang: str = "#!/usr/bin/env python3") -> Path:
+    """Write a script which runs the bytecode in ``pyc_path``.
+
+    The source and the pyc are located relative to the launcher, so the
+    three files can be moved together.
+
+    Args:
+        launcher_path (Path): Script to write, made executable.
+        source_path (Path): Flattened module, the fallback.
+        pyc_path (Path): Its compiled bytecode, see ``write_pyc()``.
+        shebang (str): First line of the launcher.
+
+    Returns:
+        Path: ``launcher_path``.
+    """
+    launcher_path = Path(launcher_path)
+    here = os.path.dirname(os.path.abspath(str(launcher_path)))
+    text = LAUNCHER_TEMPLATE.format(
+        shebang=(shebang or "#!/usr/bin/env python3").rstrip("\n"),
+        source=os.path.relpath(os.path.abspath(str(source_path)), here),
+        pyc=os.path.relpath(os.path.abspath(str(pyc_path)), here),
+    )
+    launcher_path.write_text(text)
+    os.chmod(str(launcher_path), 0o755)
+    return launcher_path
@@ -0,0 +1,71 @@
+"""Small on-disk cache shared by pyonetrue commands.
+
+Entries are JSON documents stored under ``<cache-dir>/<namespace>/<key>.json``.
+The cache directory is ``$PYONETRUE_CACHE_DIR`` when set, otherwise
+``$XDG_CACHE_HOME/pyonetrue`` or ``~/.cache/pyonetrue``.  A cache that cannot
+be read or written is treated as empty, never as an error.
+
+Given the URL of a remote cache, see remote_cache, a local miss is looked
+up remotely and a stored entry is shared.
+"""
+
+import hashlib
+import json
+import os
+
+try :
+    from pathlib import Path
+except ImportError:
+    from .vendor.pathlib import Path
+
+def cache_dir(namespace: str = "") -> Path:
+    """Return the cache directory, or one of its namespaces."""
+    root = os.environ.get("PYONETRUE_CACHE_DIR")
+    if not root:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        root = os.path.join(base, "pyonetrue")
+    return Path(root) / namespace if namespace else Path(root)
+
+def cache_key(*parts) -> str:
+    """Digest ``parts`` into a cache key, str parts are utf-8 encoded."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        digest.update(len(part).to_bytes(8, "little"))
+        digest.update(part)
+    return digest.hexdigest()
+
+def load_cached_json(namespace: str, key: str, remote: str = None):
+    """Return the cached document for ``key``, or None."""
+    try:
+        with open(cache_dir(namespace) / f"{key}.json", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        pass
+    if remote:
+        from .remote_cache import remote_get
+        data = remote_get(remote, namespace, key)
+        try:
+            document = json.loads(data) if data is not None else None
+        except ValueError:
+            return None
+        if document is not None:
+            store_cached_json(namespace, key, document)
+        return document
+    return None
+
+def store_cached_json(namespace: str, key: str, document, remote: str = None) -> None:
+    """Store ``document`` for ``key``.  The write is atomic, failures are ignored."""
+    if remote:
+        from .remote_cache import remote_put
+        remote_put(remote, namespace, key, json.dumps(document).encode("utf-8"))
+    directory = cache_dir(namespace)
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        temp = directory / f".{key}.{os.getpid()}.tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump(document, f)
+        os.replace(temp, directory / f"{key}.json")
+    except OSError:
+        pass
@@ -1,6 +1,12 @@
 USAGE=r"""
 Usage:
   pyonetrue [options] <input>
+  pyonetrue [options] --input-tar <tar>
+  pyonetrue [options] (--in-place | --check) <file>...
+  pyonetrue profile-startup [options] <artifact> [--] [<argv>...]
+  pyonetrue pgo record [options] <artifact> [--] [<argv>...]
+  pyonetrue cache serve [options] <directory>
+  pyonetrue [options] --is-fresh <artifact>
   pyonetrue (-h | --help)
   pyonetrue --version
 
@@ -10,8 +16,47 @@ Flatten Python package files into a well ordered, single module.
   package    The <package-root> via PYTHONPATH becomes the directory.
   directory  All Python files under the directory will be flattened.
   file       It will be ordered, fixes a poor ordering.
+  archive    A .whl, .zip, .tar.gz or .tgz holding the package, read without
+             extracting it.  The package is its top-most directory with an
+             __init__.py, e.g. <name>-<version>/src/<name> in an sdist.
+
+With --input-tar, the package is read from an uncompressed or gzip tar
+<tar>, `-` for stdin, entirely in memory.  Each module is parsed as it
+arrives.
 
 In all cases, the module is written to the specified output file or stdout.
+A `py` output file starts with comments recording its inputs: the digest
+of each file read, of the module names of the package directory and of
+the options changing the output.  With --is-fresh, those are checked,
+without parsing anything, against the options given with it, e.g.
+`pyonetrue -M --is-fresh out.py` for `pyonetrue -M -o out.py pkg`.  The
+exit status is 0 when <artifact> is current, 1 when it is stale.
+
+With --in-place, each <file> is put in canonical order, the order flattening
+it alone gives, keeping its main guards, shebang, header comments and
+relative imports, and rewritten if that changes it.  A file with comments
+between its top-level statements, which flattening drops, is reported and
+left as it is.  With --check, no file is written, the exit status is 1 if
+any <file> is not in canonical order.  Files are processed in parallel,
+those already found canonical and unchanged since are skipped without
+parsing.
+
+profile-startup runs a flattened <artifact> with <argv> under
+`python -X importtime` and reports the cost of each import it makes,
+attributed to the import line of the artifact and, with --source, to the
+original modules which carry the import.  Measurements are cached per
+interpreter and artifact content.
+
+pgo record runs a flattened <artifact> with <argv>, a typical workload, and
+records which of its functions, classes and logic spans run, in order, at
+startup or once its main guard is reached.  The JSON profile is written to
+the --output file or stdout.  A later build given `--pgo <profile>` puts
+the functions which ran first, binds the third-party modules only the
+others use lazily, and reports the profile's coverage on stderr.
+
+cache serve runs a reference remote cache server, storing its entries under
+<directory>, for builds given `--remote-cache http://<host>:<port>`.  It
+serves plain HTTP without authentication, bind it to a trusted network.
 
 A main guard is a block of code that is only executed when the module
 is run as a script. It is typically used to test the module or to
@@ -52,75 +97,273 @@ Options:
   -g, --guards-from <mod>  Include __main__ guards only from <mod>.
   -E, --exclude <exclude>  Exclude specified packages or modules, comma separated.
   -i, --include <include>  Include specified packages or modules, comma separated.
+  --git                    Discover the modules git tracks, from the git index of
+                           the package directory, instead of walking it.  Their
+                           spans are cached by content hash.
+  --input-tar <tar>        Read the input from the tar stream <tar>, `-` for stdin.
+  --is-fresh               Check that <artifact> is current, see above.
+  --in-place               Put each <file> in canonical order, see above.
+  --check                  Only check that each <file> is in canonical order.
+  -j, --jobs <n>           Worker processes parsing the modules, largest first.
+                           (default: one, one per CPU for --in-place and --check)
+  --read-threads <n>       Threads reading the modules ahead of their parsing, `1`
+                           reads each as it is parsed.  (default: 4)
+  --schedule-stats         Report the busy time of each worker and the time work
+                           waited for one.
+  --inline-deps <pkgs>     Flatten these installed pure Python packages into the
+                           output too, comma separated.  Their imports are
+                           rewritten as those of the package's own modules.
   --ignore-clashes         Allow duplicate top-level names without error.
+  --prune-imports          Drop imports whose names are never referenced by the
+                           flattened output.
+  --lazy-imports           Bind third-party `import x` statements lazily, the module
+                           is loaded on first attribute access.  `from x import y`
+                           statements are left as is.
+  --lazy-allow <mods>      Only bind these modules lazily, comma separated.
+  --lazy-deny <mods>       Never bind these modules lazily, comma separated.
+  --dedupe-logic           Drop top-level logic repeated across modules, e.g. the
+                           same `try: import ... except ImportError:` fallback,
+                           when running it again could not change anything.
+  --lazy-sections          Experimental.  Run the top-level logic of each module
+                           on first use of a name it defines, via a module
+                           `__getattr__`.  Logic with side effects, including
+                           calls but to a few builtins, or whose names the
+                           module uses itself, stays eager; each such span is
+                           reported on stderr.
+  --pgo <profile>          Lay out the output as the profile recorded by
+                           `pgo record` suggests, see above.
+  --annotations <mode>     `keep` annotations as written, `defer` their evaluation
+                           with `from __future__ import annotations`, or `strip`
+                           those of module variables and undecorated function
+                           signatures.  Functions the output uses as values, e.g.
+                           `typer.run(main)`, keep theirs; `strip` is unsafe when
+                           code outside the output reads them.  `defer` and
+                           `strip` also drop `if TYPE_CHECKING:` blocks and the
+                           imports only they use.  Class body annotations are
+                           always kept.
+                           [default: keep]
+  --minify                 Strip docstrings, comments, blank lines and `assert`
+                           statements and indent by one space.  The output runs
+                           as the original does under `python -OO`.
+  --keep-docstring         With --minify, keep the module docstring.
+  --format <format>        Output format: `py`, `pyz`, an executable zipapp holding
+                           the module and its bytecode, or `sfx`, a script holding
+                           the compressed module.  `pyz` and `sfx` require --output.
+                           [default: py]
+  --compression <method>   Compression of a `pyz`, `stored` or `deflated[:<level>]`
+                           (default: deflated), or of an `sfx`, `zlib[:<level>]`
+                           or `lzma[:<preset>]` (default: lzma).
+  --sfx-cache              Have an `sfx` cache its compiled code on first run.
+  --pyc <mode>             Also compile the output to its __pycache__ .pyc with
+                           hash based invalidation, <mode> is `checked` or
+                           `unchecked`.  Requires --output.
+  --launcher <file>        Also write <file>, a script which runs the compiled
+                           output, falling back to the source when the .pyc
+                           does not match the running Python or the source.
+                           Implies `--pyc checked` unless --pyc is given.
+  --depfile <file>         Also write the files the build read, its modules, the
+                           project config defining its entry points and the
+                           profile, as a Makefile rule of the output for make or
+                           ninja.  Files added to the package are not tracked.
+                           Requires --output.
+  --max-memory <size>      Keep the text of the modules read in memory only up to
+                           <size>, e.g. 512M, and the rest in a temporary file.
+                           The output is written span by span.  Does not apply
+                           to --minify, the `pyz` and `sfx` formats, nor the
+                           output cache of --remote-cache.  Not with --jobs,
+                           whose workers return every module at once.
+  --remote-cache <url>     Share the output, and with --git the parsed modules,
+                           through the remote cache at <url>, falling back to
+                           building locally when it fails.  The default is
+                           $PYONETRUE_REMOTE_CACHE.
   -h, --help               Show this help message.
   --version                Show version.
   --show-cli-args          Show the command line arguments that would be passed to the
                            CLI and exit.  This is useful for debugging.
+
+Profiling options:
+  --python <python>        Interpreter to run the artifact with (default: current).
+  --source <source>        Package, directory or file the artifact was built from.
+  --json                   Report as JSON.
+  --no-cache               Measure again, ignoring any cached measurement.
+
+Cache serve options:
+  --bind <host>            Address to listen on.  [default: 127.0.0.1]
+  --port <port>            Port to listen on.  [default: 8765]
 """
 
+import os
 import sys
 
-try:
-    import tomllib
-except ImportError:
-    import tomli as tomllib  # For Python 3.11 and earlier
-
 try :
     from pathlib import Path
 except ImportError:
     from .vendor.pathlib import Path
 
-if sys.version_info < (3, 10):
-    from importlib_metadata import entry_points
-else:
-    from importlib.metadata import entry_points
-
-from .flattening import FlatteningContext
 from .exceptions import CLIOptionError
-from .vendor.docopt import docopt
-from importlib.metadata import entry_points
-import types
+
+# Feature modules are imported where they are used so that, e.g.,
+# `--version` or flattening a single file only loads what it needs.
 
 __version__ = "0.7.1"
 
-def discover_script_entry_points(package_path: Path) -> list[str]:
-    """Discover script entry points in the given package path.
+def run_profile_startup(args) -> int:
+    """Run the profile-startup command, see USAGE."""
+    from .flattening import FlatteningContext
+    from .profile_startup import (
+        artifact_import_lines,
+        attribute_import_times,
+        format_startup_report,
+        measure_import_times,
+        source_importers,
+    )
+    artifact = Path(args['<artifact>'])
+    measurement = measure_import_times(
+        artifact,
+        args['<argv>'],
+        python=args['--python'],
+        use_cache=not args['--no-cache'],
+    )
+    importers = None
+    if args['--source']:
+        importers = source_importers(FlatteningContext(package_path=args['--source']))
+    rows = attribute_import_times(measurement, artifact_import_lines(artifact), importers)
+    if args['--json']:
+        import json
+        report = { "returncode": measurement["returncode"], "imports": rows }
+        sys.stdout.write(json.dumps(report, indent=2) + "\n")
+    else:
+        sys.stdout.write(format_startup_report(rows, measurement["returncode"]))
+    return 0
 
-    Args:
-            package_path (Path): The path to the package directory.
+def run_pgo_record(args) -> int:
+    """Run the pgo record command, see USAGE."""
+    import json
+    from .pgo import record_profile
+    profile = record_profile(Path(args['<artifact>']), args['<argv>'], python=args['--python'])
+    text = json.dumps(profile, indent=2) + "\n"
+    if args['--output']:
+        with open(args['--output'], "w") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+    startup = sum(1 for entry in profile["spans"] if entry["phase"] == "startup")
+    total = len(profile["spans"]) + len(profile["cold"])
+    print(f"[INFO] pgo: {len(profile['spans'])} of {total} spans ran, {startup} at startup,"
+          f" artifact exited with status {profile['returncode']}", file=sys.stderr)
+    return 0
 
-    Returns:
-            list[Dict[name,Tuple(module,func)]]: Discovered entry points.
-    """
-    eps = entry_points()
-    if not eps:
-        return []
-    entries = []
-    # TODO: permit user to specify entry point group names
-    for group in ["scripts", "console_scripts", "gui_scripts"]:
-        ep = eps.select(group=group)
-        if not ep:
-            continue
-        entries.extend(ep)
-    return entries
-
-def discover_script_entry_points(package_path: Path) -> list[str]:
-    """Discover script entry points for the package."""
-    eps = entry_points()
-    if not eps:
-        return []
-    pkg_name = Path(package_path).name
-    entries = []
-    for group in ["scripts", "console_scripts", "gui_scripts"]:
-        group_eps = eps.select(group=group)
-        if not group_eps:
-            continue
-        for ep in group_eps:
-            target_mod = ep.value.split(":", 1)[0]
-            if target_mod == pkg_name or target_mod.startswith(pkg_name + "."):
-                entries.append(ep.value)
-    return entries
+def flatten_text(ctx) -> str:
+    """Flatten ``ctx`` and return the text of the module, reporting on stderr."""
+    spans = flatten_spans(ctx)
+    lines = []
+    if ctx.shebang:
+        lines.append(ctx.shebang.rstrip("\n") + "\n")
+    lines.extend(span.text for span in spans)
+    text = "".join(lines)
+    if ctx.minify:
+        from .minify import minify_source
+        text = minify_source(text, ctx.keep_docstring)
+    return text
+
+def flatten_spans(ctx) -> list:
+    """Flatten ``ctx`` and return the spans of the module, reporting on stderr."""
+    ctx.discover_modules()
+    ctx.gather_main_guard_spans()
+    spans = ctx.get_final_output_spans()
+    for module, span, reason in ctx.lazy_refusals:
+        first_line = span.text.strip().split("\n", 1)[0]
+        print(f"[INFO] {module}: kept eager, {reason}: {first_line}", file=sys.stderr)
+    for line in ctx.pgo_report:
+        print(f"[INFO] pgo: {line}", file=sys.stderr)
+    if ctx.parse_stats and ctx.schedule_stats:
+        from .schedule import format_schedule_stats
+        for line in format_schedule_stats("parse", ctx.parse_stats):
+            print(line, file=sys.stderr)
+    return spans
+
+def parse_jobs(args):
+    """Return the number of ``--jobs``, None when not given."""
+    if not args.get('--jobs'):
+        return None
+    try:
+        jobs = int(args['--jobs'])
+    except ValueError:
+        jobs = 0
+    if jobs < 1:
+        raise CLIOptionError("--jobs must be a positive number")
+    return jobs
+
+def parse_read_threads(args) -> int:
+    """Return the number of ``--read-threads``, 4 when not given."""
+    if not args.get('--read-threads'):
+        return 4
+    try:
+        threads = int(args['--read-threads'])
+    except ValueError:
+        threads = 0
+    if threads < 1:
+        raise CLIOptionError("--read-threads must be a positive number")
+    return threads
+
+def run_reorder(args) -> int:
+    """Run --in-place or --check, see USAGE."""
+    from .reorder import reorder_files
+    jobs = parse_jobs(args)
+    if args['--annotations'] not in ('keep', 'defer', 'strip'):
+        raise CLIOptionError("--annotations must be 'keep', 'defer' or 'strip'")
+    options = {
+        "ignore_clashes": bool(args['--ignore-clashes']),
+        "prune_imports": bool(args['--prune-imports']),
+        "annotations": args['--annotations'] or 'keep',
+        "dedupe_logic": bool(args['--dedupe-logic']),
+    }
+    stats = {}
+    results = reorder_files(args['<file>'], options, write=bool(args['--in-place']), jobs=jobs, stats=stats)
+    if stats and args['--schedule-stats']:
+        from .schedule import format_schedule_stats
+        for line in format_schedule_stats("reorder", stats):
+            print(line, file=sys.stderr)
+    counts = {}
+    for path, status, message in results:
+        counts[status] = counts.get(status, 0) + 1
+        if status == "error":
+            print(f"[ERROR] {path}: {message}", file=sys.stderr)
+        elif status == "reordered":
+            print(f"[INFO] reordered {path}", file=sys.stderr)
+        elif status == "unordered":
+            print(f"[INFO] would reorder {path}", file=sys.stderr)
+    summary = ", ".join(f"{counts[status]} {status}" for status in
+                        ("reordered", "unordered", "unchanged", "cached", "error") if status in counts)
+    print(f"[INFO] {summary}", file=sys.stderr)
+    return 1 if counts.get("unordered") or counts.get("error") else 0
+
+def run_is_fresh(args) -> int:
+    """Run --is-fresh, see USAGE."""
+    from .freshness import check_freshness, fresh_options
+    reason = check_freshness(args['<artifact>'], fresh_options(args))
+    if reason:
+        print(f"[INFO] {args['<artifact>']} is stale: {reason}", file=sys.stderr)
+        return 1
+    return 0
+
+def run_cache_serve(args) -> int:
+    """Run the cache serve command, see USAGE."""
+    from .remote_cache import serve_remote_cache
+    try:
+        port = int(args['--port'])
+    except ValueError:
+        raise CLIOptionError("--port must be a number")
+    server = serve_remote_cache(args['<directory>'], args['--bind'], port)
+    host, port = server.server_address[:2]
+    print(f"[INFO] cache serve: http://{host}:{port}/ storing in {args['<directory>']}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
 
 def main(argv=sys.argv):
     """Main entry point for the CLI tool.
@@ -139,8 +382,28 @@ def main(argv=sys.argv):
         0
     """
 
+    # Answer the informational options without loading the parser
+    if argv[1:] == ['--version']:
+        print(__version__)
+        sys.exit()
+    if argv[1:] in (['-h'], ['--help']):
+        print(USAGE.strip('\n'))
+        sys.exit()
+
+    from .vendor.docopt import docopt
     args = docopt(USAGE, argv=argv[1:], version=__version__)
 
+    if args['profile-startup']:
+        return run_profile_startup(args)
+    if args['pgo']:
+        return run_pgo_record(args)
+    if args['cache']:
+        return run_cache_serve(args)
+    if args['--in-place'] or args['--check']:
+        return run_reorder(args)
+    if args['--is-fresh']:
+        return run_is_fresh(args)
+
     if args['--module-only'] and args['--main-from']:
         raise CLIOptionError("cannot specify both --module-only and --main-from")
     if args['--module-only'] and args['--entry']:
@@ -148,31 +411,86 @@ def main(argv=sys.argv):
     if args['--main-from'] and args['--entry']:
         raise CLIOptionError("cannot specify both --main-from and --entry")
 
+    if (args['--lazy-allow'] or args['--lazy-deny']) and not args['--lazy-imports']:
+        raise CLIOptionError("--lazy-allow and --lazy-deny require --lazy-imports")
+
+    if args['--annotations'] not in ('keep', 'defer', 'strip'):
+        raise CLIOptionError("--annotations must be 'keep', 'defer' or 'strip'")
+
+    if args['--keep-docstring'] and not args['--minify']:
+        raise CLIOptionError("--keep-docstring requires --minify")
+
+    if args['--format'] not in ('py', 'pyz', 'sfx'):
+        raise CLIOptionError("--format must be 'py', 'pyz' or 'sfx'")
+    if args['--format'] != 'py' and not args['--output']:
+        raise CLIOptionError(f"--format {args['--format']} requires --output")
+    if args['--format'] != 'py' and (args['--pyc'] or args['--launcher']):
+        raise CLIOptionError("--pyc and --launcher only apply to --format py")
+    if args['--sfx-cache'] and args['--format'] != 'sfx':
+        raise CLIOptionError("--sfx-cache only applies to --format sfx")
+    if args['--compression'] and args['--format'] == 'py':
+        raise CLIOptionError("--compression only applies to --format pyz or sfx")
+    if args['--compression']:
+        if args['--format'] == 'pyz':
+            from .pyz import parse_compression
+        else:
+            from .sfx import parse_sfx_compression as parse_compression
+        try:
+            parse_compression(args['--compression'])
+        except ValueError as e:
+            raise CLIOptionError(str(e))
+
+    max_memory = None
+    if args['--max-memory']:
+        from .spill import parse_memory_size
+        try:
+            max_memory = parse_memory_size(args['--max-memory'])
+        except ValueError as e:
+            raise CLIOptionError(f"--max-memory: {e}")
+        if args['--minify'] or args['--format'] != 'py':
+            raise CLIOptionError("--max-memory does not apply to --minify nor --format pyz or sfx")
+        if (parse_jobs(args) or 1) > 1:
+            raise CLIOptionError("--max-memory does not apply with --jobs, its workers return every module at once")
+
+    if args['--depfile'] and not args['--output']:
+        raise CLIOptionError("--depfile requires --output")
+
+    if (args['--pyc'] or args['--launcher']) and not args['--output']:
+        raise CLIOptionError("--pyc and --launcher require --output")
+    if args['--pyc'] and args['--pyc'] not in ('checked', 'unchecked'):
+        raise CLIOptionError("--pyc must be 'checked' or 'unchecked'")
+
     if args['--main-from']:
         if ',' in args['--main-from']:
             raise CLIOptionError("--main-from cannot specify multiple modules")
         if not args['--main-from'].strip():
             raise CLIOptionError("--main-from cannot be empty")
 
+    from .entry_points import make_entry_point
+    from .flattening import FlatteningContext
+
     entries = args.get('--entry') or []
     if not isinstance(entries, list):
         entries = [entries] if entries else []
 
-    parsed_funcs = []
+    # `--entry pkg.cli:main` or `--entry pkg.cli`
+    entries = [ make_entry_point(ent.partition(':')[2] or ent, ent) for ent in entries if ent ]
 
-    for ent in entries:
-        if ':' in ent:
-            ent = ent.rsplit(':', 1)[1]
-        elif '.' in ent:
-            ent = ent.split('.')[-1]
-        elif ent:
-            ent = ent
+    package_name, archive_sources, archive_spans = "", {}, {}
+    if args['--input-tar']:
+        from .archives import read_tar_stream_package
+        if args['--input-tar'] == '-':
+            package_name, archive_sources, archive_spans = read_tar_stream_package(sys.stdin.buffer)
         else:
-            continue
-        parsed_funcs.append(ent)
+            with open(args['--input-tar'], 'rb') as stream:
+                package_name, archive_sources, archive_spans = read_tar_stream_package(
+                    stream, Path(args['--input-tar']).name)
 
     ctx = FlatteningContext(
-        package_path=args['<input>'],
+        package_path=args['<input>'] or args['--input-tar'],
+        package_name=package_name,
+        archive_sources=archive_sources,
+        archive_spans=archive_spans,
         output=args.get('--output') or 'stdout',
         module_only=bool(args.get('--module-only')),
         main_from=args.get('--main-from') or None,
@@ -181,8 +499,30 @@ def main(argv=sys.argv):
         ignore_clashes=bool(args.get('--ignore-clashes')),
         exclude=args.get('--exclude', '').split(',') if args.get('--exclude') else [],
         include=args.get('--include', '').split(',') if args.get('--include') else [],
+        git=bool(args.get('--git')),
+        inline_deps=args.get('--inline-deps', '').split(',') if args.get('--inline-deps') else [],
         shebang=args.get('--shebang', '#!/usr/bin/env python3'),
         entry_points=entries,
+        prune_imports=bool(args.get('--prune-imports')),
+        lazy_imports=bool(args.get('--lazy-imports')),
+        lazy_allow=args.get('--lazy-allow', '').split(',') if args.get('--lazy-allow') else [],
+        lazy_deny=args.get('--lazy-deny', '').split(',') if args.get('--lazy-deny') else [],
+        pyc=args.get('--pyc') or ('checked' if args.get('--launcher') else None),
+        launcher=args.get('--launcher') or None,
+        dedupe_logic=bool(args.get('--dedupe-logic')),
+        lazy_sections=bool(args.get('--lazy-sections')),
+        pgo=args.get('--pgo') or None,
+        annotations=args.get('--annotations') or 'keep',
+        minify=bool(args.get('--minify')),
+        keep_docstring=bool(args.get('--keep-docstring')),
+        output_format=args.get('--format') or 'py',
+        compression=args.get('--compression') or None,
+        sfx_cache=bool(args.get('--sfx-cache')),
+        remote_cache=args.get('--remote-cache') or os.environ.get('PYONETRUE_REMOTE_CACHE') or None,
+        max_memory=max_memory,
+        jobs=parse_jobs(args) or 1,
+        read_threads=parse_read_threads(args),
+        schedule_stats=bool(args.get('--schedule-stats')),
     )
 
     if ctx.module_only and (ctx.main_from or ctx.entry_points):
@@ -191,47 +531,36 @@ def main(argv=sys.argv):
     if ctx.main_from and ctx.entry_points:
         raise CLIOptionError("cannot specify both --main-from and --entry")
 
-    if not ctx.entry_points:
+    if ctx.git and (ctx.archive_sources or not Path(ctx.package_path).is_dir()):
+        raise CLIOptionError("--git requires a package directory")
+
+    # A single file has no project or distribution defining its entry points
+    # nor does a stream
+    discover = (not ctx.entry_points and not ctx.module_only and not ctx.archive_sources
+                and not Path(ctx.package_path).is_file())
+
+    # Inputs of every output, besides its modules, see --depfile
+    build_inputs = [ctx.pgo] if ctx.pgo else []
+
+    if discover:
+        from .entry_points import discover_defined_entry_points, find_project_configs
         ctx.entry_points = discover_defined_entry_points(Path(ctx.package_path))
+        build_inputs += [ str(config) for config in find_project_configs(Path(ctx.package_path)) ]
 
-    if not ctx.entry_points:
+    if discover and not ctx.entry_points:
+        from .entry_points import discover_script_entry_points
         ctx.entry_points = discover_script_entry_points(Path(ctx.package_path))
 
     if not ctx.entry_points and not ctx.module_only:
-        fake_ep = types.SimpleNamespace()
-        ctx.main_from = ctx.main_from[0] if ctx.main_from else None
         if not ctx.main_from:
             ctx.main_from = '__main__' # primary package
-        # Create fake Entry Point structure for the main module
-        # as if it were returned by discover_script_entry_points()
-        # i.e. by importlib_metadata.entry_points()
-        # EntryPoint object: Each EntryPoint object represents a single
-        # entry point and has the following attributes:
-        #   .name:    The name of the entry point (string).
-        #   .group:   The group to which the entry point belongs (string).
-        #   .value:   The value associated with the entry point, often a string
-        #             describing the location of the callable or module.
-        #   .module:  The module name from the .value.
-        #   .attr:    The attribute name from the .value.
-        #   .extras:  A list of strings representing extra dependencies
-        #             required by the entry point.
-        #   .load():  A method that attempts to load and return the object
-        #             referenced by the entry point.
-        #   .dist:    A Distribution object representing the distribution that
-        #             defines the entry point.
         # Create a fake Entry Point structure for the package's main module
+        # as if it were returned by discover_script_entry_points(), i.e.
         # mirroring the attributes of ``importlib.metadata.EntryPoint``.
-        # This is only used for informational purposes. ``ctx.entry_points``
-        # remains a list of module strings for downstream processing.
-        fake_ep.group = "console_scripts"
-        fake_ep.name = ctx.package_name
-        fake_ep.attr = "main"
-        fake_ep.module = f"{ctx.package_name}.{ctx.main_from}"
-        fake_ep.value = f"{fake_ep.module}:{fake_ep.attr}"
-        fake_ep.extras = []
-        fake_ep.dist = None
-        fake_ep.load = lambda: None
-        ctx.entry_points = [fake_ep]
+        # This is only used for informational purposes.
+        ctx.entry_points = [
+            make_entry_point(ctx.package_name, f"{ctx.package_name}.{ctx.main_from}:main")
+        ]
 
     if args['--show-cli-args']:
         print(f"CLI args:\n{ctx}")
@@ -246,15 +575,22 @@ def main(argv=sys.argv):
         entry_mods = [None]
 
     output_path = ctx.output
+    if len(entry_mods) > 1 and ctx.launcher:
+        raise CLIOptionError("--launcher requires a single entry point")
+
     if len(entry_mods) > 1 and output_path != "stdout":
         out_dir = Path(output_path)
         out_dir.mkdir(parents=True, exist_ok=True)
     else:
         out_dir = None
 
+    depends = []
     for mod in entry_mods:
         sub_ctx = FlatteningContext(
             package_path=ctx.package_path,
+            package_name=ctx.package_name if ctx.archive_sources else "",
+            archive_sources=ctx.archive_sources,
+            archive_spans=ctx.archive_spans,
             output=output_path,
             module_only=ctx.module_only,
             main_from=[mod] if mod else [],
@@ -263,7 +599,29 @@ def main(argv=sys.argv):
             ignore_clashes=ctx.ignore_clashes,
             exclude=ctx.exclude,
             include=ctx.include,
+            git=ctx.git,
+            inline_deps=ctx.inline_deps,
             shebang=ctx.shebang,
+            prune_imports=ctx.prune_imports,
+            lazy_imports=ctx.lazy_imports,
+            lazy_allow=ctx.lazy_allow,
+            lazy_deny=ctx.lazy_deny,
+            pyc=ctx.pyc,
+            launcher=ctx.launcher,
+            dedupe_logic=ctx.dedupe_logic,
+            lazy_sections=ctx.lazy_sections,
+            pgo=ctx.pgo,
+            annotations=ctx.annotations,
+            minify=ctx.minify,
+            keep_docstring=ctx.keep_docstring,
+            output_format=ctx.output_format,
+            compression=ctx.compression,
+            sfx_cache=ctx.sfx_cache,
+            remote_cache=ctx.remote_cache,
+            max_memory=ctx.max_memory,
+            jobs=ctx.jobs,
+            read_threads=ctx.read_threads,
+            schedule_stats=ctx.schedule_stats,
         )
 
         sub_ctx.main_from = sub_ctx.main_from[0] if sub_ctx.main_from else None
@@ -272,24 +630,83 @@ def main(argv=sys.argv):
         elif not sub_ctx.module_only:
             sub_ctx.main_from = "__main__"
 
-        sub_ctx.discover_modules()
-        sub_ctx.gather_main_guard_spans()
-        spans = sub_ctx.get_final_output_spans()
-
-        lines = []
-        if sub_ctx.shebang:
-            lines.append(sub_ctx.shebang.rstrip("\n") + "\n")
-        lines.extend(span.text for span in spans)
-        text = "".join(lines)
-
-        if sub_ctx.output == "stdout":
+        cached = output_key = spans = None
+        if sub_ctx.remote_cache and sub_ctx.max_memory is None:
+            from .cache import load_cached_json
+            from .remote_cache import output_cache_key
+            output_key = output_cache_key(sub_ctx)
+            cached = load_cached_json("output", output_key, sub_ctx.remote_cache)
+
+        if cached is not None:
+            from .remote_cache import absolute_inputs
+            text = cached["text"]
+            inputs = absolute_inputs(cached.get("inputs", []), sub_ctx.package_path)
+            print(f"[INFO] {mod or sub_ctx.package_name}: output reused from the cache", file=sys.stderr)
+        elif sub_ctx.max_memory is not None:
+            # Written span by span, see spill
+            text = None
+            spans = flatten_spans(sub_ctx)
+            inputs = sub_ctx.input_files
+        else:
+            text = flatten_text(sub_ctx)
+            inputs = sub_ctx.input_files
+            if output_key:
+                from .cache import store_cached_json
+                from .remote_cache import relative_inputs
+                document = { "text": text, "inputs": relative_inputs(inputs, sub_ctx.package_path) }
+                store_cached_json("output", output_key, document, sub_ctx.remote_cache)
+
+        shebang = sub_ctx.shebang.rstrip("\n") + "\n" if sub_ctx.shebang else ""
+        if sub_ctx.output == "stdout" and text is None:
+            from .spill import write_spans
+            sys.stdout.write(shebang)
+            write_spans(sys.stdout, spans)
+        elif sub_ctx.output == "stdout":
             sys.stdout.write(text)
         else:
             if out_dir:
                 fname = mod or "output"
-                Path(out_dir / f"{fname}.py").write_text(text)
+                target = Path(out_dir / f"{fname}.{sub_ctx.output_format}")
+            else:
+                target = Path(sub_ctx.output)
+            depends.append((target, inputs + build_inputs))
+            if sub_ctx.output_format == "pyz":
+                from .pyz import write_pyz
+                entry = next((ep for ep in ctx.entry_points if ep.module == mod), None)
+                # A package __main__ is run as a script, like the flattened .py
+                attr = entry.attr if entry and not entry.module.endswith("__main__") else None
+                write_pyz(target, text, sub_ctx.package_name, attr, sub_ctx.shebang,
+                          sub_ctx.compression or "deflated")
+                continue
+            if sub_ctx.output_format == "sfx":
+                from .sfx import write_sfx
+                # The stub carries the shebang, drop the one within the text
+                if sub_ctx.shebang and text.startswith(sub_ctx.shebang.rstrip("\n") + "\n"):
+                    text = text.split("\n", 1)[1]
+                write_sfx(target, text, sub_ctx.package_name, sub_ctx.compression or "lzma",
+                          sub_ctx.sfx_cache, sub_ctx.shebang)
+                continue
+            from .freshness import add_fresh_header, fresh_header, fresh_options, spans_digest
+            trees = [ sub_ctx.package_path ] if Path(sub_ctx.package_path).is_dir() else []
+            if text is None:
+                from .spill import write_spans
+                header = fresh_header(target, inputs + build_inputs, trees, fresh_options(args),
+                                      spans_digest(spans))
+                with open(target, "w") as f:
+                    f.write(shebang + header)
+                    write_spans(f, spans)
             else:
-                Path(sub_ctx.output).write_text(text)
+                text = add_fresh_header(text, target, inputs + build_inputs, trees, fresh_options(args))
+                target.write_text(text)
+            if sub_ctx.pyc:
+                from .bytecode import write_pyc, write_launcher
+                pyc_path = write_pyc(target, sub_ctx.pyc)
+                if sub_ctx.launcher:
+                    write_launcher(sub_ctx.launcher, target, pyc_path, sub_ctx.shebang)
+
+    if args['--depfile']:
+        from .depfile import write_depfile
+        write_depfile(args['--depfile'], depends)
 
     return 0
 
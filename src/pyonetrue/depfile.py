@@ -0,0 +1,30 @@
+"""Write the inputs of a build as a Makefile dependency file, see ``--depfile``.
+
+The format is the one ``gcc -MD`` writes, which both make and ninja
+(``depfile =``) read:
+
+    out.py: \\
+      pkg/__init__.py \\
+      pkg/cli.py \\
+      pyproject.toml
+"""
+
+from typing import List
+
+def make_escape(path: str) -> str:
+    """Escape the spaces, ``#`` and ``$`` of ``path`` for a Makefile rule."""
+    return path.replace(" ", "\\ ").replace("#", "\\#").replace("$", "$$")
+
+def format_depfile(rules: List[tuple]) -> str:
+    """Return the dependency file text of ``rules``, ``(target, [input, ...])`` each."""
+    text = []
+    for target, inputs in rules:
+        lines = [ make_escape(str(target)) + ":" ]
+        lines += [ "  " + make_escape(str(path)) for path in dict.fromkeys(inputs) ]
+        text.append(" \\\n".join(lines) + "\n")
+    return "".join(text)
+
+def write_depfile(path, rules: List[tuple]) -> None:
+    """Write the dependency file of ``rules`` to ``path``, see format_depfile()."""
+    with open(str(path), "w", encoding="utf-8") as f:
+        f.write(format_depfile(rules))
@@ -0,0 +1,190 @@
+"""Discover the script entry points of the package being flattened.
+
+Entry points are read from the project's own ``pyproject.toml`` or
+``setup.cfg`` when either is found above the package.  Otherwise they are
+looked up in an index of the ``entry_points.txt`` files of installed
+distributions.  The index is cached per ``sys.path`` directory and rebuilt
+only when that directory changes, which avoids loading the metadata of every
+installed distribution through ``importlib.metadata``.
+"""
+
+import os
+import sys
+import types
+from typing import List, Optional
+
+try :
+    from pathlib import Path
+except ImportError:
+    from .vendor.pathlib import Path
+
+SCRIPT_GROUPS = ("scripts", "console_scripts", "gui_scripts")
+
+def make_entry_point(name: str, value: str, group: str = "console_scripts"):
+    """Create an entry point with the attributes of ``importlib.metadata.EntryPoint``.
+
+    Args:
+        name (str): Name of the entry point, e.g. the script name.
+        value (str): ``module:attr`` or ``module``.
+        group (str): Entry point group.
+
+    Returns:
+        types.SimpleNamespace: With name, group, value, module, attr, extras,
+        dist and load().
+    """
+    ep = types.SimpleNamespace()
+    module, _, attr = value.partition(":")
+    ep.name = name
+    ep.group = group
+    ep.value = value
+    ep.module = module.strip()
+    ep.attr = attr.split("[", 1)[0].strip() or None
+    ep.extras = []
+    ep.dist = None
+    ep.load = lambda: None
+    return ep
+
+def belongs_to_package(value: str, pkg_name: str) -> bool:
+    """True when entry point ``value`` targets ``pkg_name`` or one of its modules."""
+    target_mod = value.split(":", 1)[0].strip()
+    return target_mod == pkg_name or target_mod.startswith(pkg_name + ".")
+
+def find_project_configs(package_path: Path) -> List[Path]:
+    """Return the pyproject.toml and setup.cfg of the nearest directory at or above ``package_path`` holding either."""
+    path = Path(package_path).resolve()
+    if not path.is_dir():
+        path = path.parent
+    for directory in (path, *path.parents):
+        configs = [ directory / name for name in ("pyproject.toml", "setup.cfg") if (directory / name).is_file() ]
+        if configs:
+            return configs
+    return []
+
+def read_project_entry_points(config: Path) -> List[tuple]:
+    """Read ``(group, name, value)`` script entry points from a project config.
+
+    pyproject.toml: ``[project.scripts]``, ``[project.gui-scripts]``,
+    ``[project.entry-points.<group>]`` and ``[tool.poetry.scripts]``.
+    setup.cfg: ``[options.entry_points]``.
+    """
+    entries = []
+    if config.name == "pyproject.toml":
+        try:
+            import tomllib
+        except ImportError:
+            import tomli as tomllib  # For Python 3.10 and earlier
+        with open(config, "rb") as f:
+            data = tomllib.load(f)
+        project = data.get("project", {})
+        tables = [
+            ("console_scripts", project.get("scripts", {})),
+            ("gui_scripts", project.get("gui-scripts", {})),
+            ("console_scripts", data.get("tool", {}).get("poetry", {}).get("scripts", {})),
+        ]
+        for group, table in project.get("entry-points", {}).items():
+            if group in SCRIPT_GROUPS:
+                tables.append((group, table))
+        for group, table in tables:
+            for name, value in table.items():
+                if isinstance(value, str):
+                    entries.append((group, name, value))
+    else:
+        import configparser
+        parser = configparser.ConfigParser(interpolation=None)
+        parser.read(config)
+        if parser.has_section("options.entry_points"):
+            for group in SCRIPT_GROUPS:
+                text = parser.get("options.entry_points", group, fallback="")
+                for line in text.splitlines():
+                    name, sep, value = line.partition("=")
+                    if sep:
+                        entries.append((group, name.strip(), value.strip()))
+    return entries
+
+def discover_defined_entry_points(package_path: Path) -> list:
+    """Discover entry points the package's own project config defines for it.
+
+    Args:
+        package_path (Path): The path to the package directory or module.
+
+    The first of pyproject.toml and setup.cfg defining script entry points
+    is used, e.g. setup.cfg when pyproject.toml only holds
+    ``[build-system]``.
+
+    Returns:
+        list: Entry points, see ``make_entry_point()``.  Empty when there is
+        no project config or it defines none for the package.
+    """
+    for config in find_project_configs(package_path):
+        entries = read_project_entry_points(config)
+        if entries:
+            break
+    else:
+        return []
+    pkg_name = Path(package_path).stem
+    return [ make_entry_point(name, value, group)
+             for group, name, value in entries
+             if belongs_to_package(value, pkg_name) ]
+
+def discover_script_entry_points(package_path: Path) -> list:
+    """Discover entry points installed distributions define for the package.
+
+    Args:
+        package_path (Path): The path to the package directory.
+
+    Returns:
+        list: Entry points, see ``make_entry_point()``.
+    """
+    pkg_name = Path(package_path).name
+    return [ make_entry_point(name, value, group)
+             for group, name, value in installed_entry_points()
+             if group in SCRIPT_GROUPS and belongs_to_package(value, pkg_name) ]
+
+def installed_entry_points(search_path: Optional[List[str]] = None) -> List[tuple]:
+    """Return ``(group, name, value)`` for each entry point installed on ``search_path``.
+
+    Each directory is indexed separately and its index is cached, keyed by
+    the directory and its modification time.  Installing or removing a
+    distribution adds or removes its metadata directory, which changes that
+    time and invalidates the index.
+    """
+    from .cache import load_cached_json, store_cached_json, cache_key
+    entries = []
+    for directory in (sys.path if search_path is None else search_path):
+        directory = directory or os.curdir
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            continue
+        key = cache_key(os.path.abspath(directory))
+        index = load_cached_json("entry-points", key)
+        if index is None or index.get("mtime") != mtime:
+            index = { "mtime": mtime, "entries": index_entry_points(directory) }
+            store_cached_json("entry-points", key, index)
+        entries.extend(tuple(entry) for entry in index["entries"])
+    return entries
+
+def index_entry_points(directory: str) -> List[list]:
+    """Read the entry_points.txt of every distribution installed in ``directory``."""
+    import configparser
+    entries = []
+    try:
+        names = sorted(os.listdir(directory))
+    except OSError:
+        return entries
+    for name in names:
+        if not name.endswith((".dist-info", ".egg-info")):
+            continue
+        path = os.path.join(directory, name, "entry_points.txt")
+        if not os.path.isfile(path):
+            continue
+        parser = configparser.ConfigParser(interpolation=None, delimiters=("=",))
+        parser.optionxform = str
+        try:
+            parser.read(path, encoding="utf-8")
+        except configparser.Error:
+            continue
+        for group in parser.sections():
+            for ep_name, value in parser.items(group):
+                entries.append([group, ep_name, value])
+    return entries
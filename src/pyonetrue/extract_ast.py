@@ -46,7 +46,8 @@ def extract_spans(source: Union[str, Path], filename: str = '<unknown>') -> List
         True
     """
     if isinstance(source, Path):
-        source = source.read_text()
+        from .prefetch import read_source
+        source = read_source(source)
 
     lines = source.splitlines(keepends=True)
     tree = ast.parse(source, filename)
@@ -91,3 +92,27 @@ def extract_spans(source: Union[str, Path], filename: str = '<unknown>') -> List
         spans.append(Span(''.join(lines[start:end]), kind))
 
     return spans
+
+def replace_source_ranges(text: str, edits: List[tuple]) -> str:
+    """Replace ranges of ``text`` given by ast positions.
+
+    Args:
+        text (str): Source the positions refer to.
+        edits (List[tuple]): ``((lineno, col_offset), (end_lineno, end_col_offset),
+            replacement)``, columns count utf-8 bytes as ast positions do.
+            Ranges must not overlap.
+
+    Returns:
+        str: ``text`` with every range replaced.
+    """
+    if not edits:
+        return text
+    data = text.encode("utf-8")
+    starts = [0]
+    for line in data.splitlines(keepends=True):
+        starts.append(starts[-1] + len(line))
+    for (line, col), (end_line, end_col), replacement in sorted(edits, key=lambda e: e[0], reverse=True):
+        start = starts[line - 1] + col
+        end = starts[end_line - 1] + end_col
+        data = data[:start] + replacement.encode("utf-8") + data[end:]
+    return data.decode("utf-8")
@@ -1,11 +1,16 @@
+import ast
+import re
 import sys
 
 import importlib.util
 from dataclasses import dataclass, field
-from typing import List, Union
+from typing import List, Tuple, Union
 
-from .extract_ast import extract_spans, Span
-from .normalize_imports import normalize_imports
+from .analyze_names import bound_names, is_idempotent_binding, referenced_names
+from .extract_ast import extract_spans, replace_source_ranges, Span
+from .archives import is_archive
+from .normalize_imports import is_stdlib_module, normalize_imports
+from .type_hints import ANNOTATION_MODES, DEFER_ANNOTATIONS, is_type_checking_block, strip_annotations, value_references
 from .exceptions import (
     DuplicateNameError,
     FlatteningError,
@@ -28,12 +33,19 @@ class FlatteningContext:
     main_py            : tuple[str, List[Span]]        = (None, [])
     module_spans       : List[tuple[str, List[Span]]]  = field(default_factory=list)
     guard_sources      : dict[str, List[Span]]         = field(default_factory=dict)
+    archive_sources    : dict[str, str]                = field(default_factory=dict, repr=False)
+    archive_spans      : dict[str, List[Span]]         = field(default_factory=dict, repr=False)
+    input_files        : List[str]                     = field(default_factory=list)
 
     # Discovery -- inclusion/exclusion
     module_only        : bool                          = False
     main_from          : str | None                    = None
     exclude            : List[str]                     = field(default_factory=list)
     include            : List[str]                     = field(default_factory=list)
+    git                : bool                          = False
+
+    # Installed pure Python packages flattened into the output
+    inline_deps        : List[str]                     = field(default_factory=list)
 
     # Conflict detection
     ignore_clashes     : bool                          = False
@@ -44,6 +56,36 @@ class FlatteningContext:
     guards_all         : bool                          = False
     guards_from        : List[str]                     = field(default_factory=list)
     entry_points       : List[str]                     = field(default_factory=list)
+    prune_imports      : bool                          = False
+    lazy_imports       : bool                          = False
+    lazy_allow         : List[str]                     = field(default_factory=list)
+    lazy_deny          : List[str]                     = field(default_factory=list)
+    annotations        : str                           = "keep"
+    dedupe_logic       : bool                          = False
+    lazy_sections      : bool                          = False
+    lazy_refusals      : List[tuple]                   = field(default_factory=list)
+    pgo                : str | None                    = None
+    pgo_report         : List[str]                     = field(default_factory=list)
+    pgo_cold_modules   : set                           = field(default_factory=set)
+    pyc                : str | None                    = None
+    launcher           : str | None                    = None
+    minify             : bool                          = False
+    keep_docstring     : bool                          = False
+    output_format      : str                           = "py"
+    compression        : str | None                    = None
+    sfx_cache          : bool                          = False
+    remote_cache       : str | None                    = None
+
+    # Bounded memory, see spill
+    max_memory         : int | None                    = None
+    span_store         : object                        = None
+    resident_bytes     : int                           = 0
+
+    # Parallel reading and parsing, see prefetch and schedule
+    jobs               : int                           = 1
+    read_threads       : int                           = 4
+    schedule_stats     : bool                          = False
+    parse_stats        : dict | None                   = None
 
     def __post_init__(self):
         if not self.package_path:
@@ -51,7 +93,15 @@ class FlatteningContext:
         # Resolve package_path to file, dir, or package name
         path = Path(self.package_path)
         if DEBUG: print(f"DEBUG: Resolved path = {path}", file=sys.stderr)
-        if path.exists():
+        if self.archive_sources:
+            # Read already, e.g. from a tar stream, package_name is given
+            if not self.package_name:
+                raise ModuleInferenceError("package_name is required with archive_sources")
+        elif path.is_file() and is_archive(path):
+            # Members are read in memory, see discover_modules()
+            from .archives import read_archive_package
+            self.package_name, self.archive_sources = read_archive_package(path)
+        elif path.exists():
             if path.is_dir():
                 self.package_name = path.name
             elif path.is_file():
@@ -95,10 +145,22 @@ class FlatteningContext:
             self.guards_from = [ normalize_a_module_name(mod, self.package_name) 
                                  for mod in self.guards_from ]
 
+        # Lazy import allow/deny lists name third-party modules, as is
+        if isinstance(self.lazy_allow, str):
+            self.lazy_allow = self.lazy_allow.split(",")
+        if isinstance(self.lazy_deny, str):
+            self.lazy_deny = self.lazy_deny.split(",")
+        if isinstance(self.inline_deps, str):
+            self.inline_deps = self.inline_deps.split(",")
+
+        if self.annotations not in ANNOTATION_MODES:
+            raise FlatteningError(f"annotations must be one of {', '.join(ANNOTATION_MODES)}, not '{self.annotations}'")
+
     def new_module(self, path: Path) -> "FlatteningModule":
         return FlatteningModule(self, path)
 
-    def add_module(self, obj: Union[str, Path, "FlatteningModule"]) -> None:
+    def add_module(self, obj: Union[str, Path, "FlatteningModule"], source: str = None,
+                   spans: List[Span] = None) -> None:
         if not obj:
             raise PathError("module path cannot be empty")
         if isinstance(obj, FlatteningModule):
@@ -110,12 +172,17 @@ class FlatteningContext:
 
         if DEBUG: print(f"\nDEBUG: Adding module {fm.module = } from {fm.path = }", file=sys.stderr)
 
-        try:
-            spans = extract_spans(fm.path)
-        except Exception as e:
-            raise FlatteningError(f"failed to extract spans from {fm.path}") from e
+        if spans is None:
+            try:
+                spans = extract_spans(fm.path if source is None else source, str(fm.path))
+            except Exception as e:
+                raise FlatteningError(f"failed to extract spans from {fm.path}") from e
+        if self.max_memory is not None:
+            spans = self.spill_spans(spans)
         if DEBUG: print("DEBUG add_module : spans :\n"+"\n".join(span.text for span in spans), file=sys.stderr)
         self.module_spans.append((fm.module, spans))
+        if source is None and fm.path.is_file():
+            self.input_files.append(str(fm.path))  # not an archive member
 
         for span in spans:
             if span.kind == 'main_guard':
@@ -127,18 +194,131 @@ class FlatteningContext:
 
     def discover_modules(self) -> None:
 
+        if self.archive_sources:
+            self.discover_archive_modules()
+            self.discover_inline_deps()
+            return
+
         if self.package_path.is_file():
             self.add_module(self.package_path)
+            self.discover_inline_deps()
             return
 
         path = Path(self.package_path)
 
         if path.is_file():
             self.add_module(path)
+            self.discover_inline_deps()
             return
 
         if DEBUG: print(f"\nDEBUG: Discovering modules in {self.package_path = }", file=sys.stderr)
 
+        allowed_main = self.allowed_main_module()
+        if self.git:
+            self.discover_git_modules(path, allowed_main)
+        else:
+            self.add_module_files([ subpath for subpath in sorted(path.rglob('*.py'))
+                                    if self.wanted_module(subpath.relative_to(path), allowed_main) ])
+
+        self.discover_inline_deps()
+
+    def add_module_files(self, paths: List[Path]) -> None:
+        """Add the modules at ``paths``, in order, parsed by ``jobs`` workers, see schedule.
+
+        Parsed here, the files are read ahead by ``read_threads`` threads,
+        see prefetch.  A file which cannot be read ahead, or which the
+        workers fail to parse, is parsed again by add_module(), which
+        reports the error.
+        """
+        if len(paths) < 2 or (self.jobs <= 1 and self.read_threads <= 1):
+            for path in paths:
+                self.add_module(path)
+            return
+
+        if self.jobs <= 1:
+            from .prefetch import prefetch_files, source_text
+            for path, data in prefetch_files(paths, self.read_threads):
+                spans = None
+                if data is not None:
+                    try:
+                        spans = extract_spans(source_text(data), str(path))
+                    except Exception as e:
+                        raise FlatteningError(f"failed to extract spans from {path}") from e
+                self.add_module(path, spans=spans)
+            return
+
+        from .schedule import parse_file_spans, schedule_tasks
+        parsed, self.parse_stats = schedule_tasks(parse_file_spans, [ str(path) for path in paths ],
+                                                  jobs=self.jobs)
+        for path, pairs in zip(paths, parsed):
+            spans = None if pairs is None else [ Span(text, kind) for kind, text in pairs ]
+            self.add_module(path, spans=spans)
+
+    def discover_git_modules(self, path: Path, allowed_main) -> None:
+        """Add the modules git tracks under directory ``path``, see git_index.
+
+        Modules are named, selected and ordered as the directory walk does.
+        Tracked files deleted from the work tree are skipped.
+        """
+        from .git_index import blob_spans, git_modified_files, git_tracked_files
+
+        if DEBUG: print(f"DEBUG: Discover - from the git index of {path = }", file=sys.stderr)
+
+        tracked = git_tracked_files(path)
+        modified = git_modified_files(path)
+        for relpath in sorted(Path(name) for name in tracked):
+            subpath = path / relpath
+            if not subpath.is_file() or not self.wanted_module(relpath, allowed_main):
+                continue
+            if relpath.as_posix() in modified:
+                self.add_module(subpath)
+                continue
+            try:
+                spans = blob_spans(tracked[relpath.as_posix()], subpath, self.remote_cache)
+            except Exception as e:
+                raise FlatteningError(f"failed to extract spans from {subpath}") from e
+            self.add_module(subpath, spans=spans)
+
+    def discover_archive_modules(self) -> None:
+        """Add the modules read from the ``package_path`` archive, see archives.
+
+        Modules are named and selected as they are in a directory.
+        """
+        if DEBUG: print(f"\nDEBUG: Discovering modules in archive {self.package_path = }", file=sys.stderr)
+
+        if Path(self.package_path).is_file():
+            self.input_files.append(str(self.package_path))
+
+        allowed_main = self.allowed_main_module()
+        for name in sorted(self.archive_sources, key=lambda name: Path(name)):
+            relpath = Path(name)
+            if "/" not in name and name == self.package_name + ".py":
+                wanted = True  # a single module archive, as a single file
+            else:
+                wanted = self.wanted_module(relpath, allowed_main)
+            if wanted:
+                module = FlatteningModule.module_name(self, relpath)
+                fm = FlatteningModule(self, Path(self.package_path) / relpath, module)
+                if name in self.archive_spans:
+                    # Parsed as it was read, spans are rewritten in place so copy them
+                    spans = [ Span(s.text, s.kind) for s in self.archive_spans[name] ]
+                    self.add_module(fm, spans=spans)
+                else:
+                    self.add_module(fm, source=self.archive_sources[name])
+
+    def spill_spans(self, spans: List[Span]) -> List[Span]:
+        """Move ``spans`` to the span store once ``max_memory`` is used up, see spill."""
+        size = sum(len(span.text.encode("utf-8", "surrogatepass")) for span in spans)
+        if self.resident_bytes + size <= self.max_memory:
+            self.resident_bytes += size
+            return spans
+        from .spill import SpanStore, SpilledSpan
+        if self.span_store is None:
+            self.span_store = SpanStore()
+        return [ SpilledSpan(self.span_store, span.text, span.kind) for span in spans ]
+
+    def allowed_main_module(self):
+        """Return the one __main__ module discovery may accept, None for none."""
         # Determine exactly which __main__.py (if any) we are allowed to accept
         if self.module_only:
             allowed_main = None
@@ -150,30 +330,100 @@ class FlatteningContext:
             allowed_main = self.package_name + ".__main__"
 
         if DEBUG: print(f"DEBUG: Discover - {allowed_main = }", file=sys.stderr)
+        return allowed_main
+
+    def wanted_module(self, relpath: Path, allowed_main) -> bool:
+        """Apply exclude/include and the __main__ selection to the module at ``relpath``."""
+        dotted = str(relpath.with_suffix('')).replace('/', '.').replace('\\', '.')
+        if dotted.endswith(".__init__"):
+            dotted = dotted.rsplit(".", 1)[0]
+
+        full_mod = normalize_a_module_name(dotted, self.package_name)
+
+        if self.exclude and dotted_member_of(full_mod, self.exclude):
+            if not (self.include and dotted_member_of(full_mod, self.include)):
+                if DEBUG: print(f"DEBUG: Discover - excluded - skipping module {full_mod = }, from {relpath = }", file=sys.stderr)
+                return False
+
+        if full_mod.endswith(".__main__"):
+            if allowed_main is None:
+                if DEBUG: print(f"DEBUG: Discover - no cli - skipping module {full_mod = }, from {relpath = }", file=sys.stderr)
+                return False  # module_only active, skip all __main__.py
+            if allowed_main and full_mod != allowed_main:
+                if DEBUG: print(f"DEBUG: Discover - wrong cli - skipping module {full_mod = }, from {relpath = }", file=sys.stderr)
+                return False  # only allow exactly the requested __main__.py
+            self.main_py = full_mod
 
-        for subpath in sorted(path.rglob('*.py')):
-            relpath = subpath.relative_to(path)
-            dotted = str(relpath.with_suffix('')).replace('/', '.').replace('\\', '.')
-            if dotted.endswith(".__init__"):
-                dotted = dotted.rsplit(".", 1)[0]
+        return True
 
-            full_mod = normalize_a_module_name(dotted, self.package_name)
+    def discover_inline_deps(self) -> None:
+        """Add the modules of the installed ``inline_deps`` packages.
+
+        Each dependency is located as ``import`` would locate it and must be
+        pure Python.  Its ``__main__.py``, if any, is skipped.
+        """
+        for dep in self.inline_deps:
+            spec = importlib.util.find_spec(dep)
+            if spec is None:
+                raise ModuleInferenceError(f"cannot find inline dependency '{dep}'")
+            if spec.submodule_search_locations:
+                for location in spec.submodule_search_locations:
+                    root = Path(location)
+                    for subpath in sorted(root.rglob('*')):
+                        if subpath.suffix in (".so", ".pyd"):
+                            raise FlatteningError(f"inline dependency '{dep}' is not pure Python: {subpath}")
+                        if subpath.suffix != ".py" or subpath.name == "__main__.py":
+                            continue
+                        dotted = str(subpath.relative_to(root).with_suffix('')).replace('/', '.').replace('\\', '.')
+                        if dotted.endswith("__init__"):
+                            dotted = dotted[:-len("__init__")].rstrip(".")
+                        module = dep + "." + dotted if dotted else dep
+                        self.add_module(FlatteningModule(self, subpath, module))
+            elif spec.origin and spec.origin.endswith(".py"):
+                self.add_module(FlatteningModule(self, Path(spec.origin), dep))
+            else:
+                raise FlatteningError(f"inline dependency '{dep}' is not pure Python: {spec.origin}")
 
-            if self.exclude and dotted_member_of(full_mod, self.exclude):
-                if not (self.include and dotted_member_of(full_mod, self.include)):
-                    if DEBUG: print(f"DEBUG: Discover - excluded - skipping module {full_mod = }, from {subpath = }", file=sys.stderr)
-                    continue
+    def is_inlined_module(self, module: str) -> bool:
+        """True when ``module`` belongs to one of the ``inline_deps``."""
+        return dotted_member_of(module, self.inline_deps)
 
-            if full_mod.endswith(".__main__"):
-                if allowed_main is None:
-                    if DEBUG: print(f"DEBUG: Discover - no cli - skipping module {full_mod = }, from {subpath = }", file=sys.stderr)
-                    continue  # module_only active, skip all __main__.py
-                if allowed_main and full_mod != allowed_main:
-                    if DEBUG: print(f"DEBUG: Discover - wrong cli - skipping module {full_mod = }, from {subpath = }", file=sys.stderr)
-                    continue  # only allow exactly the requested __main__.py
-                self.main_py = full_mod
+    def gather_inline_dep_spans(self):
+        """Return the spans of the inlined dependencies, in discovery order.
 
-            self.add_module(subpath)
+        Their ``__all__``, main guards and module dunders such as
+        ``__version__`` describe the dependency, not the output, and are
+        dropped.
+        """
+        dep_spans = []
+        for mod, spans in self.module_spans:
+            if not self.is_inlined_module(mod):
+                continue
+            for s in spans:
+                if s.kind in ("__all__", "main_guard"):
+                    continue
+                if s.kind == "logic" and s.text.strip():
+                    names = bound_names(ast.parse(s.text))
+                    if names and all(n.startswith("__") and n.endswith("__") for n in names):
+                        continue
+                dep_spans.append(s)
+        return dep_spans
+
+    def check_inline_dep_clashes(self, dep_spans, spans) -> None:
+        """Raise DuplicateNameError when an inlined dependency and the package bind the same name."""
+        if self.ignore_clashes:
+            return
+        owner = {}
+        for span in dep_spans:
+            if span.kind != "import" and span.text.strip():
+                for name in bound_names(ast.parse(span.text)):
+                    owner[name] = span
+        for span in spans:
+            if span.kind in ("import", "__all__") or not span.text.strip():
+                continue
+            for name in sorted(bound_names(ast.parse(span.text)) & set(owner)):
+                if span.text.strip() != owner[name].text.strip():
+                    raise DuplicateNameError(f"Duplicate top-level name: {name}, also bound by an inlined dependency")
 
     def gather_root_spans(self):
         docstring = None
@@ -184,7 +434,7 @@ class FlatteningContext:
         for mod, spans in self.module_spans:
             first_logic = True
             for s in spans:
-                if docstring is None and first_logic and s.kind == "logic" and (
+                if docstring is None and first_logic and s.kind == "logic" and not self.is_inlined_module(mod) and (
                     s.text.lstrip().startswith("\"\"\"") or s.text.lstrip().startswith("'''")
                 ):
                     docstring = s
@@ -203,16 +453,20 @@ class FlatteningContext:
                         retained_logic.append(s)
         return docstring, retained_all, retained_imports, retained_logic
 
-    def gather_module_spans(self):
+    def gather_module_spans(self, docstring: Span = None):
+        """Return the spans of the modules other than the root, __main__ and inlined ones.
+
+        ``docstring``, hoisted to the top of the output, is left out.
+        """
         non_root_spans = []
 
         main_mod, _ = self.main_py
 
         for mod, spans in self.module_spans:
-            if mod == self.package_name or mod == main_mod:
+            if mod == self.package_name or mod == main_mod or self.is_inlined_module(mod):
                 continue
             for s in spans:
-                if s.kind != "main_guard":
+                if s.kind != "main_guard" and s is not docstring:
                     non_root_spans.append(s)
 
         return non_root_spans
@@ -234,15 +488,37 @@ class FlatteningContext:
             return []
         return [s for s in main_spans if s.kind != "import"]
 
-    def normalize_and_assemble(self, imports, all_decl, logic, guards, main, docstring=None):
+    def normalize_and_assemble(self, imports, all_decl, logic, guards, main, docstring=None,
+                               type_checking=None):
         future_imports = [s for s in imports if "from __future__" in s.text]
         regular_imports = [s for s in imports if s not in future_imports]
 
+        if self.annotations == "defer" and not any("annotations" in s.text for s in future_imports):
+            future_imports.append(Span(DEFER_ANNOTATIONS, "import"))
+
+        emitted = ([all_decl] if all_decl else []) + logic + guards + main
+        used_names = None
+        if self.prune_imports:
+            used_names = referenced_names(emitted)
+
+        # Names only the dropped `if TYPE_CHECKING:` blocks referenced
+        unused_names = None
+        if type_checking:
+            unused_names = ((referenced_names(type_checking) | {"TYPE_CHECKING"})
+                            - referenced_names(emitted))
+
         regular_imports, import_symbols = normalize_imports(
             package_name=self.package_name,
             import_spans=regular_imports,
+            used_names=used_names,
+            lazy_import=self.wants_lazy_import if self.lazy_imports or self.pgo_cold_modules else None,
+            unused_names=unused_names,
+            inline_packages=self.inline_deps,
         )
 
+        if self.lazy_sections:
+            logic = self.defer_logic_sections(logic, future_imports + regular_imports, guards + main)
+
         ordered = []
         blank_line = Span(kind="blank", text="\n")
 
@@ -270,6 +546,135 @@ class FlatteningContext:
 
         return ordered, import_symbols
 
+    def eliminate_type_hints(self, logic, guards, main):
+        """Apply ``annotations`` to the spans, see type_hints.
+
+        With ``defer`` or ``strip``, ``if TYPE_CHECKING:`` blocks are dropped,
+        with ``strip`` the annotations evaluated at import time are removed
+        from the spans in place.  Functions the spans use as values keep
+        theirs.
+
+        Returns:
+            tuple: The remaining logic spans and the dropped blocks.
+        """
+        if self.annotations == "keep":
+            return logic, []
+        dropped = [ s for s in logic if s.kind == "logic" and is_type_checking_block(s.text) ]
+        logic = [ s for s in logic if s not in dropped ]
+        if self.annotations == "strip":
+            keep = value_references(span.text for span in logic + guards + main)
+            for span in logic + guards + main:
+                span.text = strip_annotations(span.text, keep)
+        return logic, dropped
+
+    def dedupe_logic_spans(self, logic):
+        """Drop logic spans repeating an earlier span when running it again is a no-op.
+
+        A repeat is dropped when the span is an idempotent binding, see
+        analyze_names.is_idempotent_binding(), and no span in between binds
+        a name the span binds or reads.  E.g. the `try: import x / except
+        ImportError: ...` fallback many modules of a package repeat.
+
+        Returns:
+            list: The remaining logic spans, in order.
+        """
+        first_seen = {}   # text -> index of its first span within logic
+        analyzed = {}     # text -> names bound or read, None if not idempotent
+        bound = [ None ] * len(logic)
+        result = []
+        for index, span in enumerate(logic):
+            key = span.text.strip()
+            if span.kind != "logic" or not key:
+                result.append(span)
+                continue
+            if key not in first_seen:
+                first_seen[key] = index
+                result.append(span)
+                continue
+            if key not in analyzed:
+                tree = ast.parse(span.text)
+                analyzed[key] = ((bound_names(tree) | referenced_names([span]))
+                                 if is_idempotent_binding(tree) else None)
+            names = analyzed[key]
+            # Copies in between, dropped or not, bind the same values
+            if names is not None and not any(
+                    names & self.span_bound_names(logic, bound, between)
+                    for between in range(first_seen[key] + 1, index)
+                    if logic[between].text.strip() != key):
+                if DEBUG: print(f"DEBUG: dropped duplicate logic span {key[:40]!r}", file=sys.stderr)
+                continue
+            # Rerunning it may matter, later repeats compare against this one
+            first_seen[key] = index
+            result.append(span)
+        return result
+
+    def apply_profile(self, imports, logic, trailing):
+        """Lay out the spans as the ``pgo`` profile suggests, see pgo.
+
+        Hot functions move ahead of cold ones, modules only cold functions
+        import are recorded in ``pgo_cold_modules`` to be bound lazily, and
+        ``pgo_report`` summarizes how well the profile covers the spans.
+
+        Returns:
+            list: The logic spans, reordered.
+        """
+        from .pgo import cold_modules, load_profile, order_hot_first, profile_coverage, span_key
+
+        profile = load_profile(self.pgo)
+        logic = order_hot_first(logic, profile)
+        ran = { entry["key"] for entry in profile["spans"] }
+        hot = [ s for s in logic if s.kind != "function" or span_key(s) in ran ]
+        self.pgo_cold_modules = cold_modules(imports, hot + trailing)
+        self.pgo_report = profile_coverage(logic, profile)
+        # As normalize_imports() does, local modules go and stdlib ones stay eager
+        lazy = sorted(m for m in self.pgo_cold_modules if self.wants_lazy_import(m)
+                      and not dotted_of_module(self.package_name, m)
+                      and not is_stdlib_module(m.split(".", 1)[0]))
+        if lazy:
+            self.pgo_report.append(f"bound lazily, only cold functions use them: {', '.join(lazy)}")
+        return logic
+
+    def defer_logic_sections(self, logic, imports, trailing):
+        """Move the logic each module may run on first use into lazy sections.
+
+        See lazy_sections.  The spans kept eager, and why, are recorded in
+        ``lazy_refusals`` as ``(module, span, reason)``.
+
+        Returns:
+            list: The eager logic spans followed by the sections and the
+            module ``__getattr__`` running them.
+        """
+        from .lazy_sections import plan_lazy_sections, render_lazy_sections
+
+        module_of = { id(s): mod for mod, spans in self.module_spans for s in spans }
+        sections, self.lazy_refusals = plan_lazy_sections(
+            [ (module_of.get(id(s), self.package_name), s) for s in logic ], imports, trailing)
+        if not sections:
+            return logic
+        deferred = { id(s) for spans in sections.values() for s in spans }
+        if DEBUG: print(f"DEBUG: lazy sections defer {len(deferred)} spans of {len(sections)} modules", file=sys.stderr)
+        return [ s for s in logic if id(s) not in deferred ] + render_lazy_sections(sections)
+
+    @staticmethod
+    def span_bound_names(logic, bound, index):
+        """Return, and memoize in ``bound``, the names logic[index] binds."""
+        if bound[index] is None:
+            try:
+                bound[index] = bound_names(ast.parse(logic[index].text))
+            except SyntaxError:
+                bound[index] = set()
+        return bound[index]
+
+    def wants_lazy_import(self, module: str) -> bool:
+        """True when third-party `module` should be bound lazily."""
+        if module in self.pgo_cold_modules and not dotted_member_of(module, self.lazy_deny):
+            return True
+        if not self.lazy_imports:
+            return False
+        if self.lazy_allow and not dotted_member_of(module, self.lazy_allow):
+            return False
+        return not dotted_member_of(module, self.lazy_deny)
+
     def check_clashes(self, spans, import_symbols):
         if not self.ignore_clashes:
             seen = set(import_symbols)
@@ -287,17 +692,73 @@ class FlatteningContext:
                     seen.add(name)
 
 
+    def rewrite_local_imports(self) -> None:
+        """Rewrite the local imports nested within functions, classes and logic.
+
+        Top-level local imports are dropped by normalize_imports().  Those
+        nested deeper, e.g. lazy imports within a function or a fallback in a
+        try block, would fail in the flattened module.  Their names are
+        globals of the flattened module, so each becomes ``pass``, or an
+        assignment for an alias.  The modules named through a plain
+        ``import pkg.mod`` within a function or class no longer exist,
+        ``pkg.mod.name`` becomes ``name`` where the import binds ``pkg``,
+        see rewrite_module_references().  A top-level ``import dep`` of an
+        inlined dependency is dropped along with the package's own, unless
+        ``dep`` is used as a value, and references through it are
+        rewritten likewise.  Spans are rewritten in place.
+        """
+        module_basenames = { mod.rsplit(".", 1)[-1] for mod, _ in self.module_spans }
+        modules = { mod for mod, _ in self.module_spans } | { self.package_name, *self.inline_deps }
+        for _, spans in self.module_spans:
+            bindings = {}
+            for span in spans:
+                if span.kind == "import" and self.inline_deps and plain_imports_of(span.text, self.inline_deps):
+                    bindings.update({ name: module for name, module
+                                      in local_module_bindings(span.text, self.package_name, self.inline_deps).items()
+                                      if dotted_member_of(module, self.inline_deps) })
+            bare = set()
+            for span in spans:
+                if span.kind == "import":
+                    continue
+                if IMPORT_KEYWORD.search(span.text) or any(name in span.text for name in bindings):
+                    span.text = rewrite_module_references(span.text, bindings, modules, self.package_name,
+                                                          self.inline_deps, bare)
+                if IMPORT_KEYWORD.search(span.text):
+                    span.text = rewrite_nested_local_imports(
+                        span.text, self.package_name, module_basenames, self.inline_deps)
+            for span in spans:
+                if (span.kind == "import" and bindings and plain_imports_of(span.text, self.inline_deps)
+                      and bare & set(local_module_bindings(span.text, self.package_name, self.inline_deps))):
+                    # `import dep` used as a value binds the module, here the flattened one
+                    span.text = rewrite_nested_local_imports(
+                        span.text, self.package_name, module_basenames, self.inline_deps)
+                    span.kind = "logic"
+
     def get_final_output_spans(self):
+        self.rewrite_local_imports()
         docstring, all_decl, root_imports, root_logic = self.gather_root_spans()
-        module_spans = self.gather_module_spans()
+        module_spans = self.gather_module_spans(docstring)
         main_guards = self.gather_main_guard_spans()
         main_body = self.get_main_spans()
 
         imports = root_imports + [s for s in module_spans if s.kind == "import"]
         logic = root_logic + [s for s in module_spans if s.kind not in["import", "main_guard"]]
 
+        if self.inline_deps:
+            # Dependencies run first, as they would on import
+            dep_spans = self.gather_inline_dep_spans()
+            self.check_inline_dep_clashes(dep_spans, logic + main_guards + main_body)
+            imports = [s for s in dep_spans if s.kind == "import"] + imports
+            logic = [s for s in dep_spans if s.kind != "import"] + logic
+
+        logic, type_checking = self.eliminate_type_hints(logic, main_guards, main_body)
+        if self.dedupe_logic:
+            logic = self.dedupe_logic_spans(logic)
+        if self.pgo:
+            logic = self.apply_profile(imports, logic, main_guards + main_body)
+
         spans, import_symbols = self.normalize_and_assemble(
-            imports, all_decl, logic, main_guards, main_body, docstring
+            imports, all_decl, logic, main_guards, main_body, docstring, type_checking
         )
 
         self.check_clashes(spans, import_symbols)
@@ -307,7 +768,13 @@ class FlatteningModule:
 
     __slots__ = ("module", "path")
 
-    def __init__(self, ctx : FlatteningContext, path: Path):
+    def __init__(self, ctx : FlatteningContext, path: Path, module: str = None):
+        self.path = path
+        if module:
+            # e.g. an inlined dependency or an archive member, outside the package root
+            self.module = module
+            return
+
         if not path.is_file():
             raise PathError(f"FlatteningModule must be created from a file: {path}")
 
@@ -318,13 +785,226 @@ class FlatteningModule:
 
         if relpath == Path('.'):
             relpath = Path(ctx.package_path.name)
+        self.module = FlatteningModule.module_name(ctx, relpath)
+
+    @staticmethod
+    def module_name(ctx : FlatteningContext, relpath: Path) -> str:
+        """Name the module at ``relpath`` within the package."""
         if relpath.name == "__init__.py":
-            self.module = ctx.package_name
+            return ctx.package_name
+        mod_suffix = str(relpath.with_suffix('')).replace('/', '.')
+        return ctx.package_name + "." + mod_suffix
+
+IMPORT_KEYWORD = re.compile(r"\bimport\b")
+
+# Binds a local module object: the flattened module holds all of its names
+FLATTENED_MODULE = "__import__('sys').modules[__name__]"
+
+def rewrite_nested_local_imports(text: str, package_name: str, module_basenames: set,
+                                 inline_deps: List[str] = ()) -> str:
+    """Replace the local import statements within ``text``, see rewrite_local_imports()."""
+    edits = []
+    for node in ast.walk(ast.parse(text)):
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            replacement = local_import_replacement(node, package_name, module_basenames, inline_deps)
+            if replacement is not None:
+                edits.append(((node.lineno, node.col_offset),
+                              (node.end_lineno, node.end_col_offset), replacement))
+    return replace_source_ranges(text, edits)
+
+def local_import_replacement(node, package_name: str, module_basenames: set, inline_deps: List[str] = ()):
+    """Return the statement replacing local import ``node``, None if it is not local.
+
+    Modules of the ``inline_deps`` are local too.
+    """
+    def is_local(module):
+        return dotted_of_module(package_name, module) or dotted_member_of(module, inline_deps)
+
+    if isinstance(node, ast.ImportFrom):
+        if not (node.level > 0 or (node.module and is_local(node.module))):
+            return None
+        bindings = []
+        for alias in node.names:
+            bound = alias.asname or alias.name
+            if node.level > 0 and not node.module and alias.name in module_basenames:
+                bindings.append(f"{bound} = {FLATTENED_MODULE}")  # from . import module
+            elif alias.name != '*' and bound != alias.name:
+                bindings.append(f"{bound} = {alias.name}")
+        return "; ".join(bindings) or "pass"
+
+    local = [ alias for alias in node.names if is_local(alias.name) ]
+    if not local:
+        return None
+    kept = [ ast.unparse(alias) for alias in node.names if alias not in local ]
+    bindings = [ f"import {', '.join(kept)}" ] if kept else []
+    for alias in local:
+        bound = alias.asname or alias.name.split(".", 1)[0]
+        bindings.append(f"{bound} = {FLATTENED_MODULE}")
+    return "; ".join(bindings)
+
+def plain_import_binding(alias, package_name: str, inline_deps: List[str] = ()):
+    """Return the ``(name, module)`` bound by ``alias`` of a plain local import, None if not local.
+
+    Examples:
+        ``import pkg.mod`` binds ``("pkg", "pkg")``, ``import pkg.mod as m``
+        binds ``("m", "pkg.mod")``.
+    """
+    if not (dotted_of_module(package_name, alias.name) or dotted_member_of(alias.name, inline_deps)):
+        return None
+    if alias.asname:
+        return alias.asname, alias.name
+    return alias.name.split(".", 1)[0], alias.name.split(".", 1)[0]
+
+def local_module_bindings(text: str, package_name: str, inline_deps: List[str] = ()) -> dict:
+    """Map the names bound by the plain local imports of ``text`` to the module each refers to."""
+    bindings = {}
+    for node in ast.walk(ast.parse(text)):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                binding = plain_import_binding(alias, package_name, inline_deps)
+                if binding:
+                    bindings[binding[0]] = binding[1]
+    return bindings
+
+SCOPE_NODES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)
+COMPREHENSION_NODES = (ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)
+
+def scope_names(node, package_name: str, inline_deps: List[str] = ()) -> Tuple[set, dict]:
+    """Return the names bound within the scope of function, lambda or class ``node``.
+
+    Returns:
+        tuple: ``(bound, imports)``, the names bound other than by a plain
+        local import, and the names bound only by plain local imports
+        mapped to their module, see local_module_bindings().  The nested
+        scopes are not entered, only the names of nested functions and
+        classes are bound.
+    """
+    bound, imports = set(), {}
+    if not isinstance(node, ast.ClassDef):
+        args = node.args
+        bound |= { arg.arg for arg in args.posonlyargs + args.args + args.kwonlyargs + [args.vararg, args.kwarg] if arg }
+    pending = [node.body] if isinstance(node, ast.Lambda) else list(node.body)
+    while pending:
+        child = pending.pop()
+        if isinstance(child, SCOPE_NODES + COMPREHENSION_NODES):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                bound.add(child.name)
+            continue
+        if isinstance(child, ast.Import):
+            for alias in child.names:
+                binding = plain_import_binding(alias, package_name, inline_deps)
+                if binding:
+                    imports[binding[0]] = binding[1]
+                else:
+                    bound.add(alias.asname or alias.name.split(".", 1)[0])
+            continue
+        if isinstance(child, ast.ImportFrom):
+            bound |= { alias.asname or alias.name for alias in child.names }
+            continue
+        if isinstance(child, ast.Name) and not isinstance(child.ctx, ast.Load):
+            bound.add(child.id)
+        elif isinstance(child, (ast.Global, ast.Nonlocal)):
+            bound |= set(child.names)
+        elif isinstance(getattr(child, "name", None), str):
+            bound.add(child.name)  # except ... as name, match patterns
+        elif isinstance(getattr(child, "rest", None), str):
+            bound.add(child.rest)
+        pending.extend(ast.iter_child_nodes(child))
+    return bound, { name: module for name, module in imports.items() if name not in bound }
+
+def attribute_chain(node) -> List[str]:
+    """Return the names of a ``a.b.c`` expression, None for any other expression."""
+    names = []
+    while isinstance(node, ast.Attribute):
+        names.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    names.append(node.id)
+    return names[::-1]
+
+def rewrite_module_references(text: str, bindings: dict, modules: set, package_name: str,
+                              inline_deps: List[str] = (), bare: set = None) -> str:
+    """Replace the references through local modules within ``text`` by flattened ones.
+
+    Args:
+        text (str): Source of a span.
+        bindings (dict): Names bound to local modules at the top level of
+            the module, see local_module_bindings().
+        modules (set): The local modules, e.g. ``pkg`` and ``pkg.mod``.
+        package_name (str), inline_deps (list): Which modules are local.
+        bare (set): When given, receives the names of ``bindings`` which
+            ``text`` uses other than as the start of an ``a.b`` expression.
+
+    Names are resolved by scope: a plain local import within a function or
+    class binds its name there, and any other binding of a name, e.g. a
+    parameter, hides the module of the enclosing scope.  ``pkg.mod.name``
+    becomes ``name``, or, when assigned or deleted, the attribute of the
+    flattened module.  ``pkg.mod`` used as a value becomes the flattened
+    module.
+    """
+    edits = []
+
+    def scoped(node, active):
+        bound, imports = scope_names(node, package_name, inline_deps)
+        inner = { name: value for name, value in active.items() if name not in bound and name not in imports }
+        inner.update({ name: (module, False) for name, module in imports.items() })
+        return inner
+
+    def visit(node, active, enclosing):
+        if isinstance(node, SCOPE_NODES):
+            body = [node.body] if isinstance(node, ast.Lambda) else node.body
+            for child in ast.iter_child_nodes(node):
+                if child not in body:
+                    visit(child, active, enclosing)  # decorators, defaults, annotations, bases
+            if isinstance(node, ast.ClassDef):
+                inner = scoped(node, active)
+                for child in body:
+                    visit(child, inner, active)
+            else:
+                inner = scoped(node, enclosing)
+                for child in body:
+                    visit(child, inner, inner)
+            return
+        if isinstance(node, COMPREHENSION_NODES):
+            targets = { name.id for generator in node.generators for name in ast.walk(generator.target)
+                        if isinstance(name, ast.Name) }
+            active = { name: value for name, value in active.items() if name not in targets }
+            enclosing = active
+        if isinstance(node, ast.Name) and node.id in active and active[node.id][1] and bare is not None:
+            bare.add(node.id)
+        names = attribute_chain(node) if isinstance(node, ast.Attribute) else None
+        if not names or names[0] not in active:
+            for child in ast.iter_child_nodes(node):
+                visit(child, active, enclosing)
+            return
+        module = active[names[0]][0]
+        dotted = module.split(".") + names[1:]
+        covered = len(module.split("."))
+        while covered < len(dotted) and ".".join(dotted[:covered + 1]) in modules:
+            covered += 1
+        depth = covered - len(module.split(".")) + 1  # names of the chain naming the module
+        if depth == len(names):
+            if depth > 1:
+                edits.append(((node.lineno, node.col_offset), (node.end_lineno, node.end_col_offset), FLATTENED_MODULE))
+            return
+        target = node
+        for _ in range(len(names) - depth - 1):
+            target = target.value
+        if isinstance(target.ctx, ast.Load):
+            replacement = target.attr
         else:
-            mod_suffix = str(relpath.with_suffix('')).replace('/', '.')
-            self.module = ctx.package_name + "." + mod_suffix
+            replacement = f"{FLATTENED_MODULE}.{target.attr}"
+        edits.append(((target.lineno, target.col_offset), (target.end_lineno, target.end_col_offset), replacement))
 
-        self.path = path
+    top = { name: (module, True) for name, module in bindings.items() }
+    visit(ast.parse(text), top, top)
+    return replace_source_ranges(text, edits)
+
+def plain_imports_of(text: str, modules: List[str]) -> bool:
+    """True when ``text`` holds an ``import x`` statement of one of ``modules``."""
+    return any(isinstance(node, ast.Import) and any(dotted_member_of(a.name, modules) for a in node.names)
+               for node in ast.parse(text).body)
 
 def dotted_member_of(dotted: str, module_list: List[str]) -> bool:
     if not module_list:
@@ -0,0 +1,146 @@
+"""Record the inputs of an output in its header, check it is still current.
+
+A ``.py`` output written to a file starts, after its shebang, with:
+
+    # pyonetrue 0.7.1 fresh 1 options=<digest> body=<digest>
+    # pyonetrue input <digest> <size> <path>
+    # pyonetrue tree <digest> <path>
+
+One ``input`` line per file flattening read, one ``tree`` line per package
+directory, whose digest covers the names of its ``.py`` files so an added or
+removed module is noticed.  Paths are relative to the output's directory.
+Digests are the first 16 hex digits of a sha256.
+
+``check_freshness()`` re-reads the inputs, without parsing them, and the
+body, and compares.  An output built by another version of pyonetrue is
+stale.  ``options`` digests the command line options which change the
+output, see fresh_options(), an output checked with other options is
+stale.
+"""
+
+import hashlib
+import os
+from typing import List, Optional
+
+try :
+    from pathlib import Path
+except ImportError:
+    from .vendor.pathlib import Path
+
+FRESH_HEADER_VERSION = 1
+
+FRESH_HEADER_PREFIX = "# pyonetrue "
+
+# Command line options which leave the output text as it is, or name
+# inputs and outputs recorded otherwise
+FRESH_IGNORED_OPTIONS = (
+    "--", "--bind", "--check", "--depfile", "--help", "--in-place", "--input-tar", "--is-fresh",
+    "--jobs", "--json", "--launcher", "--max-memory", "--no-cache", "--output", "--port", "--pyc",
+    "--python", "--read-threads", "--remote-cache", "--schedule-stats", "--show-cli-args",
+    "--source", "--version",
+)
+
+def fresh_options(args: dict) -> List[str]:
+    """Return ``name=value`` of the command line options in ``args`` which change the output."""
+    return [ f"{name}={args[name]!r}" for name in sorted(args)
+             if name.startswith("-") and name not in FRESH_IGNORED_OPTIONS ]
+
+def short_digest(data: bytes) -> str:
+    """Return the first 16 hex digits of the sha256 of ``data``."""
+    return hashlib.sha256(data).hexdigest()[:16]
+
+def spans_digest(spans) -> str:
+    """Return the short_digest() of the text of ``spans``, read one at a time."""
+    digest = hashlib.sha256()
+    for span in spans:
+        digest.update(span.text.encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+def tree_digest(directory: Path) -> str:
+    """Digest the paths of the ``.py`` files under ``directory``."""
+    names = sorted(subpath.relative_to(directory).as_posix() for subpath in Path(directory).rglob("*.py"))
+    return short_digest("\n".join(names).encode("utf-8"))
+
+def header_path(path, output_dir: str) -> str:
+    """Return ``path`` relative to ``output_dir``, absolute when on another drive."""
+    try:
+        return Path(os.path.relpath(os.path.abspath(str(path)), output_dir)).as_posix()
+    except ValueError:
+        return os.path.abspath(str(path))
+
+def add_fresh_header(text: str, output, inputs: List[str], trees: List[str], options: List[str]) -> str:
+    """Return ``text``, the output to be written to ``output``, with its header.
+
+    Args:
+        text (str): The output, starting with its shebang if any.
+        output: Path the output is written to.
+        inputs (List[str]): Files flattening read.
+        trees (List[str]): Package directories flattening walked.
+        options (List[str]): The command line options, see fresh_options().
+    """
+    shebang = ""
+    if text.startswith("#!"):
+        shebang, _, text = text.partition("\n")
+        shebang += "\n"
+    return shebang + fresh_header(output, inputs, trees, options, short_digest(text.encode("utf-8"))) + text
+
+def fresh_header(output, inputs: List[str], trees: List[str], options: List[str], body: str) -> str:
+    """Return the header lines of ``output``, whose text after the shebang has digest ``body``.
+
+    See add_fresh_header() for the other arguments.
+    """
+    from .cli import __version__
+
+    output_dir = os.path.dirname(os.path.abspath(str(output)))
+    lines = [ f"{__version__} fresh {FRESH_HEADER_VERSION}"
+              f" options={short_digest(chr(10).join(options).encode('utf-8'))} body={body}" ]
+    for path in dict.fromkeys(inputs):
+        data = Path(path).read_bytes()
+        lines.append(f"input {short_digest(data)} {len(data)} {header_path(path, output_dir)}")
+    for directory in dict.fromkeys(trees):
+        lines.append(f"tree {tree_digest(Path(directory))} {header_path(directory, output_dir)}")
+    return "".join(FRESH_HEADER_PREFIX + line + "\n" for line in lines)
+
+def check_freshness(output, options: List[str] = None) -> Optional[str]:
+    """Return why ``output`` is stale, None when it is current.
+
+    With ``options``, see fresh_options(), an output built with other
+    options is stale.
+    """
+    from .cli import __version__
+
+    try:
+        with open(str(output), encoding="utf-8", newline="") as f:
+            lines = f.readlines()
+    except (OSError, UnicodeDecodeError) as e:
+        return f"cannot read '{output}': {e}"
+    if lines and lines[0].startswith("#!"):
+        lines = lines[1:]
+    header = []
+    while lines and lines[0].startswith(FRESH_HEADER_PREFIX):
+        header.append(lines.pop(0)[len(FRESH_HEADER_PREFIX):].rstrip("\n").split(" ", 3))
+    if not header or header[0][1:3] != ["fresh", str(FRESH_HEADER_VERSION)]:
+        return "no pyonetrue freshness header"
+    if header[0][0] != __version__:
+        return f"built by pyonetrue {header[0][0]}, this is {__version__}"
+    fields = dict(field.split("=", 1) for field in header[0][3].split())
+    if fields.get("body") != short_digest("".join(lines).encode("utf-8")):
+        return "the output was modified"
+    if options is not None and fields.get("options") != short_digest("\n".join(options).encode("utf-8")):
+        return "built with other options"
+
+    output_dir = os.path.dirname(os.path.abspath(str(output)))
+    for entry in header[1:]:
+        kind, digest, rest = entry[0], entry[1], " ".join(entry[2:])
+        if kind == "input":
+            size, _, name = rest.partition(" ")
+            path = os.path.join(output_dir, name)
+            try:
+                if os.stat(path).st_size != int(size) or short_digest(Path(path).read_bytes()) != digest:
+                    return f"{name} changed"
+            except OSError:
+                return f"{name} is missing"
+        elif kind == "tree":
+            if tree_digest(Path(os.path.join(output_dir, rest))) != digest:
+                return f"modules were added to or removed from {rest}"
+    return None
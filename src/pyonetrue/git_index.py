@@ -0,0 +1,70 @@
+"""Discover the modules of a package from the local git index.
+
+``git ls-files`` lists the tracked ``.py`` files with their blob hashes, in
+place of walking the directory, which in a large work tree also visits
+build outputs, environments and other untracked files.  A blob hash names
+the exact content of a file, so it keys a cache of the file's spans.
+Files modified in the work tree are parsed from disk, never from the
+cache.
+"""
+
+import subprocess
+import sys
+from typing import List
+
+from .cache import cache_key, load_cached_json, store_cached_json
+from .exceptions import PathError
+from .extract_ast import Span, extract_spans
+
+try :
+    from pathlib import Path
+except ImportError:
+    from .vendor.pathlib import Path
+
+# Bump when extract_spans() output changes for the same source
+SPAN_CACHE_FORMAT = 1
+
+def git_ls_files(directory: Path, *options: str) -> List[str]:
+    """Run ``git ls-files -z`` in ``directory`` for its ``.py`` files, return the entries."""
+    try:
+        result = subprocess.run(
+            ["git", "-C", str(directory), "ls-files", "-z", *options, "--", "*.py"],
+            stdin=subprocess.DEVNULL, capture_output=True, check=True,
+        )
+    except FileNotFoundError:
+        raise PathError("--git requires the git command")
+    except subprocess.CalledProcessError as e:
+        message = e.stderr.decode(errors="replace").strip()
+        raise PathError(f"cannot list the git tracked files of '{directory}': {message}")
+    return [ entry for entry in result.stdout.decode("utf-8", "surrogateescape").split("\0") if entry ]
+
+def git_tracked_files(directory: Path) -> dict[str, str]:
+    """Map each tracked ``.py`` file under ``directory``, relative to it, to its blob hash.
+
+    Examples:
+        ``100644 8ab6...e1 0\\tpkg/mod.py`` is listed as ``{"pkg/mod.py": "8ab6...e1"}``.
+    """
+    tracked = {}
+    for entry in git_ls_files(directory, "--stage"):
+        info, _, path = entry.partition("\t")
+        mode, blob, _ = info.split(" ", 2)
+        if mode != "160000":  # a submodule, not a file
+            tracked[path] = blob
+    return tracked
+
+def git_modified_files(directory: Path) -> set:
+    """Return the tracked ``.py`` files under ``directory`` changed in the work tree."""
+    return set(git_ls_files(directory, "--modified"))
+
+def blob_spans(blob: str, path: Path, remote: str = None) -> List[Span]:
+    """Return the spans of ``path``, whose content is git blob ``blob``, cached by blob.
+
+    With ``remote``, the URL of a remote cache, entries are shared through it.
+    """
+    key = cache_key(blob, f"{SPAN_CACHE_FORMAT}:{sys.version_info[0]}.{sys.version_info[1]}")
+    cached = load_cached_json("spans", key, remote)
+    if cached is not None:
+        return [ Span(text, kind) for kind, text in cached ]
+    spans = extract_spans(path)
+    store_cached_json("spans", key, [ [span.kind, span.text] for span in spans ], remote)
+    return spans
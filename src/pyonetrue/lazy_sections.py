@@ -0,0 +1,221 @@
+"""Defer the top-level logic of each original module until first use.
+
+Experimental.  Functions and classes stay eager.  The logic spans of an
+original module which only bind names, e.g. ``TABLE = dict(KEYS)``, are
+moved into a section function, which runs the first time one of those
+names is looked up on the flattened module.  A module level
+``__getattr__`` (PEP 562) detects the lookup.
+
+Python resolves a global name used within the module itself without
+consulting ``__getattr__``.  A span is therefore only deferred when no
+eager code of the flattened module uses the names it binds, so in practice
+when they are only used by importers of the module.  The analysis also
+refuses spans with side effects it cannot defer: any statement other than
+an assignment to names, an import, or an ``if`` or ``try`` around those,
+and any call but those of ``DEFERRABLE_CALLS``: deferred, a call such as
+``build_table()`` would run later than the code around it expects, or
+never.
+"""
+
+import ast
+from typing import List, Optional
+
+from .analyze_names import bound_names, referenced_names
+from .extract_ast import Span
+from .minify import is_constant_statement, string_continuation_lines
+
+LAZY_SECTION_PREFIX = "_pyonetrue_section_"
+
+# Calls without side effects, which a deferred span may make
+DEFERRABLE_CALLS = frozenset({
+    "abs", "bool", "bytes", "dict", "float", "frozenset", "int", "len", "list", "max",
+    "min", "range", "re.compile", "repr", "set", "sorted", "str", "sum", "tuple",
+})
+
+LAZY_SECTION_TABLE = "_PYONETRUE_SECTIONS"
+
+LAZY_SECTION_GETATTR = f'''\
+_pyonetrue_module_getattr = globals().get("__getattr__")
+
+def __getattr__(name):
+    """Run the lazy section defining ``name`` on first use (PEP 562)."""
+    section = {LAZY_SECTION_TABLE}.get(name)
+    if section is not None:
+        for key in [ key for key, value in {LAZY_SECTION_TABLE}.items() if value is section ]:
+            del {LAZY_SECTION_TABLE}[key]
+        section()
+        if name in globals():
+            return globals()[name]
+    if _pyonetrue_module_getattr is not None:
+        return _pyonetrue_module_getattr(name)
+    raise AttributeError(f"module {{__name__!r}} has no attribute {{name!r}}")
+'''
+
+def deferral_refusal(tree: ast.Module) -> Optional[str]:
+    """Return why the statements of ``tree`` cannot be deferred, None if they can.
+
+    Examples:
+        >>> deferral_refusal(ast.parse("TABLE = dict(KEYS)\\n")) is None
+        True
+        >>> deferral_refusal(ast.parse("TABLE = build()\\n"))
+        'line 1: call to build() may have side effects'
+        >>> deferral_refusal(ast.parse("sys.path.append('x')\\n"))
+        'line 1: expression statement may have side effects'
+    """
+    for node in tree.body:
+        refusal = statement_refusal(node)
+        if refusal:
+            return refusal
+    names = bound_names(tree)
+    dunders = sorted(name for name in names if name.startswith("__") and name.endswith("__"))
+    if dunders:
+        return f"binds {', '.join(dunders)}, which the import system reads directly"
+    if not names:
+        return "binds no names"
+    return None
+
+def statement_refusal(node: ast.stmt) -> Optional[str]:
+    """Return why ``node`` cannot be deferred, None if it can."""
+    if isinstance(node, (ast.Import, ast.ImportFrom, ast.Pass)):
+        return None
+    if is_constant_statement(node):
+        return None
+    if isinstance(node, (ast.Assign, ast.AnnAssign)):
+        targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+        if isinstance(node, ast.AnnAssign) and node.value is None:
+            return f"line {node.lineno}: annotation without a value"
+        for target in targets:
+            elements = target.elts if isinstance(target, (ast.Tuple, ast.List)) else [target]
+            if not all(isinstance(e, ast.Name) for e in elements):
+                return f"line {node.lineno}: assignment to an attribute or item may have side effects"
+        return call_refusal(node.value)
+    if isinstance(node, (ast.If, ast.Try)):
+        if isinstance(node, ast.If) and call_refusal(node.test):
+            return call_refusal(node.test)
+        handlers = [ stmt for h in getattr(node, "handlers", []) for stmt in h.body ]
+        for stmt in node.body + node.orelse + getattr(node, "finalbody", []) + handlers:
+            refusal = statement_refusal(stmt)
+            if refusal:
+                return refusal
+        return None
+    if isinstance(node, ast.Expr):
+        return f"line {node.lineno}: expression statement may have side effects"
+    return f"line {node.lineno}: {type(node).__name__.lower()} statement may have side effects"
+
+def call_refusal(node: ast.expr) -> Optional[str]:
+    """Return why expression ``node`` makes a call which may have side effects, None if it makes none.
+
+    The body of a lambda is not run by the expression, its calls are ignored.
+    """
+    pending = [node]
+    while pending:
+        child = pending.pop()
+        if isinstance(child, ast.Lambda):
+            pending.extend(child.args.defaults + [ d for d in child.args.kw_defaults if d ])
+            continue
+        if isinstance(child, ast.Call) and ast.unparse(child.func) not in DEFERRABLE_CALLS:
+            return f"line {child.lineno}: call to {ast.unparse(child.func)}() may have side effects"
+        pending.extend(ast.iter_child_nodes(child))
+    return None
+
+def plan_lazy_sections(logic: list, imports: List[Span], trailing: List[Span]):
+    """Decide which logic spans to defer.
+
+    A span is deferred when ``deferral_refusal()`` accepts it and the
+    names it binds are bound nowhere else and read by no eager code.  The
+    names it reads must not be rebound later in the output, since the
+    section sees their final values, nor be bound by another section.
+    Refusing a span makes it eager, which may refuse others in turn.
+
+    Args:
+        logic (list): ``(module, span)`` of the logic spans, in output order.
+        imports (List[Span]): The normalized imports, emitted before the logic.
+        trailing (List[Span]): The guards and main, emitted after the logic.
+
+    Returns:
+        tuple: ``(sections, refusals)``, sections maps each module to its
+        deferred spans in order, refusals lists ``(module, span, reason)``.
+    """
+    refusals = []
+    bound = []
+    used = []
+    deferred = set()  # indices into logic
+    for index, (module, span) in enumerate(logic):
+        tree = ast.parse(span.text) if span.text.strip() else ast.Module(body=[], type_ignores=[])
+        bound.append(bound_names(tree))
+        # Listing a name in __all__ reads it through __getattr__
+        used.append(set() if span.kind == "__all__" else referenced_names([span]))
+        if span.kind != "logic" or all(is_constant_statement(node) for node in tree.body):
+            continue  # e.g. a docstring, nothing to defer
+        reason = deferral_refusal(tree)
+        if reason:
+            refusals.append((module, span, reason))
+        else:
+            deferred.add(index)
+
+    def names_bound_by(spans):
+        return set().union(*(bound_names(ast.parse(s.text)) for s in spans if s.text.strip()))
+
+    eager_bound = names_bound_by(imports + trailing)
+    trailing_bound = names_bound_by(trailing)
+    eager_used = referenced_names(imports + trailing)
+
+    changed = True
+    while changed:
+        changed = False
+        for index in sorted(deferred):
+            module, span = logic[index]
+            section = { i for i in deferred if logic[i][0] == module }
+            others = [ i for i in range(len(logic)) if i not in section ]
+            used_eagerly = bound[index] & set().union(
+                eager_used, *(used[i] for i in others if i not in deferred))
+            bound_elsewhere = bound[index] & set().union(eager_bound, *(bound[i] for i in others))
+            rebound = used[index] & set().union(
+                trailing_bound, *(bound[i] for i in others if i > index or i in deferred))
+            reason = None
+            if used_eagerly:
+                reason = f"{', '.join(sorted(used_eagerly))} read by eager code"
+            elif bound_elsewhere:
+                reason = f"{', '.join(sorted(bound_elsewhere))} bound elsewhere too"
+            elif rebound:
+                reason = f"reads {', '.join(sorted(rebound))}, bound later or by another section"
+            if reason:
+                refusals.append((module, span, reason))
+                deferred.discard(index)
+                changed = True
+
+    sections = {}
+    for index in sorted(deferred):
+        module, span = logic[index]
+        sections.setdefault(module, []).append(span)
+    return sections, refusals
+
+def render_lazy_sections(sections: dict) -> List[Span]:
+    """Return the spans defining each section, their name table and ``__getattr__``."""
+    rendered = []
+    table = []
+    for index, (module, spans) in enumerate(sections.items()):
+        function = f"{LAZY_SECTION_PREFIX}{index}"
+        names = set()
+        for span in spans:
+            names |= bound_names(ast.parse(span.text))
+        body = "".join(indent_source(span.text) for span in spans)
+        rendered.append(Span(
+            f"def {function}():\n"
+            f"    \"\"\"Deferred top-level logic of {module}.\"\"\"\n"
+            f"    global {', '.join(sorted(names))}\n"
+            f"{body}",
+            "logic",
+        ))
+        table.extend(f"    {name!r}: {function},\n" for name in sorted(names))
+    rendered.append(Span(f"{LAZY_SECTION_TABLE} = {{\n{''.join(table)}}}\n", "logic"))
+    rendered.append(Span(LAZY_SECTION_GETATTR, "logic"))
+    return rendered
+
+def indent_source(text: str) -> str:
+    """Indent ``text`` by four spaces, leaving multi-line string contents as they are."""
+    in_string = string_continuation_lines(text)
+    return "".join(
+        line if number in in_string or not line.strip() else "    " + line
+        for number, line in enumerate(text.splitlines(keepends=True), start=1)
+    )
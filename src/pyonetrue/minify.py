@@ -0,0 +1,86 @@
+"""Minify a flattened module.
+
+The module is parsed, its docstrings and ``assert`` statements are removed
+from the tree and the tree is unparsed, which drops comments and
+normalizes formatting.  Blank lines are then dropped and indentation is
+reduced to one space per level.  The result compiles to the same code as
+the original run with ``python -OO``.
+"""
+
+import ast
+import io
+import tokenize
+from typing import List
+
+def minify_source(text: str, keep_docstring: bool = False) -> str:
+    """Return a minified equivalent of the module source ``text``.
+
+    Args:
+        text (str): Module source.
+        keep_docstring (bool): Keep the module docstring, e.g. for a CLI
+            that parses ``__doc__``.
+
+    Returns:
+        str: Minified source, a leading ``#!`` line is kept.
+
+    Examples:
+        >>> minify_source('def f(x):\\n    "Doc."\\n    assert x\\n\\n    return x  # same\\n')
+        'def f(x):\\n return x\\n'
+    """
+    shebang = text.split("\n", 1)[0] + "\n" if text.startswith("#!") else ""
+    tree = ast.parse(text)
+    strip_docstrings_and_asserts(tree, keep_docstring)
+    return shebang + compact_lines(ast.unparse(tree) + "\n")
+
+def is_constant_statement(node: ast.stmt) -> bool:
+    """True for a statement which is only a constant, e.g. a docstring or ``...``."""
+    return isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant)
+
+def strip_docstrings_and_asserts(tree: ast.Module, keep_docstring: bool = False) -> None:
+    """Remove docstrings and ``assert`` statements from ``tree`` in place.
+
+    Every constant statement goes, not only docstrings, since a string
+    following a removed docstring would otherwise become the docstring.
+    A body left empty receives a ``pass``.
+    """
+    for node in ast.walk(tree):
+        for name in ("body", "orelse", "finalbody"):
+            body = getattr(node, name, None)
+            if not isinstance(body, list) or not body or not isinstance(body[0], ast.stmt):
+                continue
+            keep = []
+            for index, stmt in enumerate(body):
+                if isinstance(stmt, ast.Assert):
+                    continue
+                if is_constant_statement(stmt):
+                    module_docstring = (index == 0 and isinstance(node, ast.Module)
+                                        and isinstance(stmt.value.value, str))
+                    if not (keep_docstring and module_docstring):
+                        continue
+                keep.append(stmt)
+            if not keep and not isinstance(node, ast.Module):
+                keep = [ ast.Pass() ]
+            body[:] = keep
+
+def compact_lines(source: str) -> str:
+    """Drop blank lines and indent by one space per level.
+
+    Lines within multi-line strings are kept as they are.
+    """
+    in_string = string_continuation_lines(source)
+    lines: List[str] = []
+    for number, line in enumerate(source.splitlines(keepends=True), start=1):
+        if number in in_string:
+            lines.append(line)
+        elif line.strip():
+            stripped = line.lstrip(" ")
+            lines.append(" " * ((len(line) - len(stripped)) // 4) + stripped)
+    return "".join(lines)
+
+def string_continuation_lines(source: str) -> set:
+    """Return the numbers of the lines which continue a multi-line string."""
+    lines = set()
+    for token in tokenize.generate_tokens(io.StringIO(source).readline):
+        if token.type == tokenize.STRING or token.type == getattr(tokenize, "FSTRING_MIDDLE", None):
+            lines.update(range(token.start[0] + 1, token.end[0] + 1))
+    return lines
@@ -4,8 +4,11 @@
 TODO: Add module-level docstring.
 """
 import ast
+import re
 import sys
-from collections import defaultdict
+from functools import lru_cache
+from itertools import groupby
+from operator import itemgetter
 from typing import List, Tuple
 from dataclasses import dataclass
 
@@ -52,116 +55,272 @@ class ImportEntry:
 
 IE = ImportEntry
 
-def normalize_imports(package_name: str, import_spans: List[Span], pyver=None) -> Tuple[List[Span], List[str]]:
+# An import table row is a plain tuple of interned strings:
+#
+#     (module, symbol, asname, is_plain_import)
+#
+# Rows are far cheaper to build, hash and sort than ImportEntry instances,
+# which matters once a package carries tens of thousands of import aliases.
+
+def normalize_imports(package_name: str, import_spans: List[Span], pyver=None,
+                      used_names=None, lazy_import=None, unused_names=None,
+                      inline_packages=()) -> Tuple[List[Span], List[str]]:
     """
     Normalize import spans:
     - Eliminate all relative imports.
-    - Eliminate all absolute local imports matching the project_package.
+    - Eliminate all absolute local imports matching the project_package, or
+      one of the `inline_packages` flattened along with it.
+    - Eliminate imports whose bound name is not in `used_names`, when given,
+      or is in `unused_names`.  Star imports are always kept.
     - Deduplicate surviving imports by (module, alias-or-symbol).
     - Regroup into from-import lines.
     - Apply line-wrapping for >80 char lines.
     - Group stdlib and third-party imports separately.
+    - Bind third-party `import x` and `import x.y as z` statements lazily when
+      `lazy_import(module)` is true.  See LAZY_IMPORT_HELPER.
     Returns a tuple of (list of formatted import spans, list of imported global names).
     """
-    imports = []
-    for span in import_spans:
-        tree = ast.parse(span.text)
-        for node in tree.body:
-            if isinstance(node, ast.ImportFrom):
-                if node.level > 0:
-                    continue  # Eliminate relative imports
-                if node.module and ( node.module == package_name
-                                  or node.module.startswith(package_name+'.') ):
-                    continue  # Eliminate local absolute imports
-                module = node.module
-                for alias in node.names:
-                    imports.append(IE(module, alias.name, alias.asname, is_plain_import=False))
-            elif isinstance(node, ast.Import):
-                for alias in node.names:
-                    module = alias.name
-                    if ( module == package_name
-                      or module.startswith(package_name+'.') ):
-                        continue  # Eliminate local absolute imports
-                    imports.append(IE(module, alias.name, alias.asname, is_plain_import=True))
+    rows = build_import_table(package_name, import_spans, inline_packages)
 
     # Deduplicate by (module, alias-or-symbol)
     names = {}
     seen = set()
-    module_to_symbols = defaultdict(list)
+    groups = {}
+    table = []
     imported_names = []
 
-    for entry in imports:
+    for module, symbol, asname, is_plain_import in rows:
+        if (used_names is not None or unused_names) and symbol != '*':
+            # `import a.b` binds `a`
+            bound = asname or (module.split('.', 1)[0] if is_plain_import else symbol)
+            if used_names is not None and bound not in used_names:
+                continue
+            if unused_names and bound in unused_names:
+                continue
         # use alias if present, else symbol, else module stem
-        name = entry.asname or entry.symbol or entry.module.split('.')[-1]
-        key = (entry.module, name)
+        name = asname or symbol or module.rsplit('.', 1)[-1]
+        key = (module, name)
         if key in seen:
             continue
         if name in names:
-            raise ImportNormalizationError(f"name clash importing `{name}` from {entry.module}, already imported from {names[name]}")
+            raise ImportNormalizationError(f"name clash importing `{name}` from {module}, already imported from {names[name]}")
         seen.add(key)
-        names[name] = entry.module
+        names[name] = module
         imported_names.append(name)
-        module_to_symbols[entry.module].append(entry)
+        # Sort key: stdlib group first, then module, plain imports before
+        # from-imports, then symbol and alias.  One sort orders everything.
+        group = groups.get(module)
+        if group is None:
+            group = 0 if is_stdlib_module(module.split('.', 1)[0], pyver=pyver) else 1
+            groups[module] = group
+        table.append((group, module, not is_plain_import, symbol, asname))
 
-    stdlib_imports = {}
-    third_party_imports = {}
-
-    for module, entries in module_to_symbols.items():
-        if is_stdlib_module(module.split('.')[0], pyver=pyver):
-            stdlib_imports[module] = entries
-        else:
-            third_party_imports[module] = entries
+    table.sort()
 
     output_spans = []
+    lazy_bindings = []
+    previous_group = None
 
-    for group in (stdlib_imports, third_party_imports):
-        if not group:
-            continue
-        for module in sorted(group):
-            entries = sorted(group[module])
-            plain_entries = [e for e in entries if e.is_plain_import]
-            from_entries  = [e for e in entries if not e.is_plain_import]
-            if plain_entries:
-                text = "\n".join(format_plain_import(plain_entries)) + '\n'
-                output_spans.append(Span(kind="import", text=text))
-            if from_entries:
-                text = "\n".join(format_from_import(from_entries)) + '\n'
-                output_spans.append(Span(kind="import", text=text))
+    for (group, module, is_from), members in groupby(table, key=itemgetter(0, 1, 2)):
+        pairs = tuple((symbol, asname) for _, _, _, symbol, asname in members)
+        if group == 1 and not is_from and lazy_import and lazy_import(module):
+            eager = []
+            for symbol, asname in pairs:
+                if not asname and '.' in module:
+                    eager.append((symbol, asname))  # `import a.b` binds `a`, keep it
+                else:
+                    lazy_bindings.append(f"{asname or module} = {LAZY_IMPORT_FUNCTION}({module!r})\n")
+            pairs = tuple(eager)
+            if not pairs:
+                continue
+        if previous_group is not None and group != previous_group:
+            output_spans.append(Span(kind="blank", text="\n"))
+        previous_group = group
+        text = format_import_group(module, not is_from, pairs, LINE_LENGTH)
+        output_spans.append(Span(kind="import", text=text))
+
+    if output_spans:
+        output_spans.append(Span(kind="blank", text="\n"))
+
+    if lazy_bindings:
+        output_spans.append(Span(kind="function", text=LAZY_IMPORT_HELPER))
+        output_spans.append(Span(kind="blank", text="\n"))
+        output_spans.append(Span(kind="import", text="".join(lazy_bindings)))
         output_spans.append(Span(kind="blank", text="\n"))
 
     return output_spans, imported_names
 
+LAZY_IMPORT_FUNCTION = "_pyonetrue_lazy_import"
+
+# Emitted ahead of lazy import bindings.  The module is located eagerly, so a
+# missing dependency still fails at import time, but it is only executed on
+# first attribute access.  The bound object is the real module, as with a
+# plain `import`, once it has loaded.
+LAZY_IMPORT_HELPER = f'''def {LAZY_IMPORT_FUNCTION}(name):
+    import importlib.util
+    import sys
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {{name!r}}", name=name)
+    if not hasattr(spec.loader, "exec_module"):
+        return importlib.import_module(name)
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    parent, _, child = name.rpartition(".")
+    if parent:
+        setattr(sys.modules[parent], child, module)
+    return module
+'''
+
+def build_import_table(package_name: str, import_spans: List[Span], inline_packages=()) -> List[tuple]:
+    """Parse import spans into import table rows.
+
+    Each distinct span text is parsed once.  Simple single line statements,
+    by far the most common, are split directly; anything else goes through
+    ``ast``.  Relative imports and absolute imports of ``package_name`` or
+    ``inline_packages`` are dropped.
+
+    Args:
+        package_name (str): Name of the package being flattened.
+        import_spans (List[Span]): Spans of kind 'import'.
+        inline_packages (Iterable[str]): Other packages flattened into the output.
+
+    Returns:
+        List[tuple]: Rows of ``(module, symbol, asname, is_plain_import)``.
+    """
+    intern = sys.intern
+    local_names = (package_name, *inline_packages)
+    local_prefixes = tuple(name + '.' for name in local_names)
+    rows = []
+    for text in dict.fromkeys(span.text for span in import_spans):
+        parsed = split_simple_import(text)
+        if parsed is None:
+            parsed = parse_import_statements(text)
+        for level, module, aliases in parsed:
+            if level > 0:
+                continue  # Eliminate relative imports
+            if module is None:
+                # plain import : each alias names a module
+                for name, asname in aliases:
+                    if name in local_names or name.startswith(local_prefixes):
+                        continue  # Eliminate local absolute imports
+                    name = intern(name)
+                    rows.append((name, name, intern(asname), True))
+                continue
+            if module and ( module in local_names
+                         or module.startswith(local_prefixes) ):
+                continue  # Eliminate local absolute imports
+            module = intern(module)
+            for name, asname in aliases:
+                rows.append((module, intern(name), intern(asname), False))
+    return rows
+
+# from <dots><module> import <names>
+SIMPLE_FROM_IMPORT = re.compile(r"from\s+(\.*)\s*([\w.]*)\s+import\s+(.+)")
+
+def split_simple_import(text: str):
+    """Split a single line import statement without invoking the parser.
+
+    Returns a list of ``(level, module, aliases)`` tuples, as does
+    ``parse_import_statements()``, or None when ``text`` is anything other
+    than one plain ``import ...`` or ``from ... import ...`` line.  Plain
+    imports have a module of None and list the imported modules as aliases.
+    """
+    text = text.strip()
+    if not text or any(c in text for c in "()\\#;\n"):
+        return None
+    if text.startswith("import "):
+        names = split_import_names(text[7:])
+        if names is None:
+            return None
+        return [(0, None, names)]
+    match = SIMPLE_FROM_IMPORT.fullmatch(text)
+    if not match:
+        return None
+    dots, module, rest = match.groups()
+    if not (module or dots):
+        return None
+    names = split_import_names(rest)
+    if names is None:
+        return None
+    return [(len(dots), module, names)]
+
+def split_import_names(text: str):
+    """Split ``a as b, c`` into ``[('a', 'b'), ('c', '')]``, None if malformed."""
+    names = []
+    for part in text.split(','):
+        words = part.split()
+        if len(words) == 1:
+            names.append((words[0], ''))
+        elif len(words) == 3 and words[1] == 'as':
+            names.append((words[0], words[2]))
+        else:
+            return None
+    return names
+
+def parse_import_statements(text: str):
+    """Parse import statements with ``ast``, see ``split_simple_import()``."""
+    parsed = []
+    for node in ast.parse(text).body:
+        if isinstance(node, ast.ImportFrom):
+            aliases = [ (alias.name, alias.asname or '') for alias in node.names ]
+            parsed.append((node.level, node.module or '', aliases))
+        elif isinstance(node, ast.Import):
+            names = [ (alias.name, alias.asname or '') for alias in node.names ]
+            parsed.append((0, None, names))
+    return parsed
+
+@lru_cache(maxsize=4096)
+def format_import_group(module: str, is_plain_import: bool, pairs: tuple, line_length: int) -> str:
+    """Format the imports of one module as source text.
+
+    Results are cached per module key, so identical groups seen again (by
+    repeated runs, or by several entry points of one package) are free.
+
+    Args:
+        module (str): Imported module.
+        is_plain_import (bool): ``import x`` when True, ``from x import ...`` otherwise.
+        pairs (tuple): Sorted, unique ``(symbol, asname)`` pairs.
+        line_length (int): Wrap from-imports longer than this.
+
+    Returns:
+        str: Newline terminated import statement(s).
+    """
+    if is_plain_import:
+        lines = [ f"import {module} as {asname}" if asname else f"import {module}"
+                  for _, asname in pairs ]
+        return "\n".join(lines) + "\n"
+    symbols = [ f"{symbol} as {asname}" if asname else symbol
+                for symbol, asname in pairs ]
+    joined = ", ".join(symbols)
+    if len(joined) <= (line_length-len(f"from {module} import ")):
+        return f"from {module} import {joined}\n"
+    parts = [f"from {module} import ("]
+    for sym in symbols:
+        parts.append(f"    {sym},")
+    parts.append(")")
+    return "\n".join(parts) + "\n"
+
     """TODO: Add detailed docstring."""
 def format_plain_import(entries: List[ImportEntry]) -> List[str]:
     if not entries:
         return []
-    # entries are (symbol, asname), but for plain import, symbol is None
-    imports = set()
-    for e in entries:
-        if e.asname:
-            imports.add(f"{e.module} as {e.asname}")
-        else:
-            imports.add(f"{e.module}")
-    return [ "import " + sym_expr for sym_expr in sorted(imports) ]
+    module = entries[-1].module
+    pairs = sorted({ ('', e.asname) for e in entries })
+    return format_import_group(module, True, tuple(pairs), LINE_LENGTH).splitlines()
 
     """TODO: Add detailed docstring."""
 def format_from_import(entries: List[ImportEntry]) -> List[str]:
     if not entries:
         return []
-    symbols = set()
-    for e in entries:
-        if e.asname:
-            symbols.add(f"{e.symbol} as {e.asname}")
-        else:
-            symbols.add(f"{e.symbol}")
-    module = e.module
-    if len(", ".join(sorted(symbols))) <= (LINE_LENGTH-len(f"from {module} import ")):
-        return [f"from {module} import {', '.join(sorted(symbols))}"]
-    parts = [f"from {module} import ("]
-    for sym in sorted(symbols):
-        parts.append(f"    {sym},")
-    parts.append(")")
-    return parts
+    module = entries[-1].module
+    pairs = sorted({ (e.symbol, e.asname) for e in entries })
+    return format_import_group(module, False, tuple(pairs), LINE_LENGTH).splitlines()
 
     """TODO: Expand this docstring."""
 def is_stdlib_module(module, pyver=None):
@@ -0,0 +1,292 @@
+"""Profile-guided layout of the flattened module.
+
+``record_profile()`` runs a flattened artifact with a workload, i.e. its
+command line, under ``sys.monitoring`` (Python 3.12+) or ``sys.settrace``
+and records which of its top-level spans run, in order, and whether they
+first ran at startup or once the main guard was reached.  Spans are keyed
+by kind and name, see ``node_key()``, so a profile applies to later builds
+of the same source.
+
+A build given the profile puts the functions which ran ahead of those
+which did not, see ``order_hot_first()``, and binds the third-party
+modules only cold functions use lazily, see ``cold_modules()``.
+"""
+
+import ast
+import bisect
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from typing import List, Optional
+
+from .analyze_names import bound_names, referenced_names
+from .exceptions import FlatteningError, PathError
+
+try :
+    from pathlib import Path
+except ImportError:
+    from .vendor.pathlib import Path
+
+PGO_PROFILE_VERSION = 1
+
+# Runs the artifact, then writes the events to the output file:
+#   ["call", first line, phase]  first call of a function or class body
+#   ["line", line, phase]        first run of a top-level line
+# phase is "startup" until a line of a main guard runs, "run" afterwards.
+PGO_RUNNER = """
+import json, pkgutil, runpy, sys  # run_path() imports pkgutil
+path, output, guards = sys.argv[1], sys.argv[2], json.loads(sys.argv[3])
+sys.argv[:] = [path] + sys.argv[4:]
+guard_lines = { line for start, end in guards for line in range(start, end + 1) }
+events = []
+state = { "phase": "startup" }
+
+def on_line(line):
+    if line in guard_lines:
+        state["phase"] = "run"
+    events.append(["line", line, state["phase"]])
+
+if hasattr(sys, "monitoring"):
+    tracer = "sys.monitoring"
+    monitoring = sys.monitoring
+    monitoring.use_tool_id(monitoring.PROFILER_ID, "pyonetrue-pgo")
+
+    def on_start(code, offset):
+        if code.co_filename == path:
+            if code.co_name == "<module>":
+                monitoring.set_local_events(monitoring.PROFILER_ID, code, monitoring.events.LINE)
+            else:
+                events.append(["call", code.co_firstlineno, state["phase"]])
+        return monitoring.DISABLE
+
+    def on_monitored_line(code, line):
+        on_line(line)
+        return monitoring.DISABLE
+
+    monitoring.register_callback(monitoring.PROFILER_ID, monitoring.events.PY_START, on_start)
+    monitoring.register_callback(monitoring.PROFILER_ID, monitoring.events.LINE, on_monitored_line)
+    monitoring.set_events(monitoring.PROFILER_ID, monitoring.events.PY_START)
+else:
+    tracer = "sys.settrace"
+    seen = set()
+
+    def trace_lines(frame, event, arg):
+        if event == "line" and frame.f_lineno not in seen:
+            seen.add(frame.f_lineno)
+            on_line(frame.f_lineno)
+        return trace_lines
+
+    def trace_calls(frame, event, arg):
+        code = frame.f_code
+        if event != "call" or code.co_filename != path:
+            return None
+        if code.co_name == "<module>":
+            return trace_lines
+        if code not in seen:
+            seen.add(code)
+            events.append(["call", code.co_firstlineno, state["phase"]])
+        return None
+
+    sys.settrace(trace_calls)
+
+try:
+    runpy.run_path(path, run_name="__main__")
+finally:
+    sys.settrace(None)
+    if tracer == "sys.monitoring":
+        monitoring.set_events(monitoring.PROFILER_ID, 0)
+    with open(output, "w") as f:
+        json.dump({ "tracer": tracer, "events": events }, f)
+"""
+
+def record_profile(artifact: Path, argv: List[str], python: Optional[str] = None) -> dict:
+    """Run ``artifact`` with ``argv`` and record which of its spans run.
+
+    Args:
+        artifact (Path): Flattened script to run.
+        argv (List[str]): Arguments passed to the artifact, the workload.
+        python (str): Interpreter to run, default is the current one.
+
+    Returns:
+        dict: The profile, ``{"version", "artifact", "argv", "returncode",
+        "tracer", "spans": [ {"key", "phase"}, ... ], "cold": [ key, ... ]}``.
+        ``spans`` are in the order they first ran, ``cold`` never ran.
+    """
+    artifact = Path(artifact)
+    if not artifact.is_file():
+        raise PathError(f"artifact '{artifact}' is not a file")
+    nodes = ast.parse(artifact.read_text(), str(artifact)).body
+    guards = [ [node.lineno, node.end_lineno] for node in nodes if is_main_guard(node) ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "events.json")
+        result = subprocess.run(
+            [python or sys.executable, "-c", PGO_RUNNER, str(artifact), output, json.dumps(guards), *argv],
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            with open(output) as f:
+                recorded = json.load(f)
+        except (OSError, ValueError):
+            raise FlatteningError(f"recording '{artifact}' failed, exit status {result.returncode}")
+
+    ranges = top_level_ranges(nodes)
+    starts = [ start for _, start, _ in ranges ]
+    spans = []
+    ran = set()
+    for event, line, phase in recorded["events"]:
+        index = bisect.bisect_right(starts, line) - 1
+        key = ranges[index][0] if index >= 0 and line <= ranges[index][2] else None
+        if key is None or key in ran:
+            continue
+        # Running a `def` only defines the function
+        if event == "call" or not key.startswith("function:"):
+            ran.add(key)
+            spans.append({ "key": key, "phase": phase })
+    return {
+        "version": PGO_PROFILE_VERSION,
+        "artifact": artifact.name,
+        "argv": list(argv),
+        "returncode": result.returncode,
+        "tracer": recorded["tracer"],
+        "spans": spans,
+        "cold": [ key for key, _, _ in ranges if key not in ran ],
+    }
+
+def is_main_guard(node: ast.stmt) -> bool:
+    """True for ``if __name__ == "__main__":``."""
+    test = getattr(node, "test", None)
+    return (isinstance(node, ast.If) and isinstance(test, ast.Compare)
+            and isinstance(test.left, ast.Name) and test.left.id == "__name__"
+            and any(isinstance(c, ast.Constant) and c.value == "__main__" for c in test.comparators))
+
+def top_level_ranges(nodes: List[ast.stmt]) -> List[tuple]:
+    """Return ``(key, first line, last line)`` of each keyed top-level statement."""
+    ranges = []
+    for node in nodes:
+        key = node_key(node)
+        if key is not None:
+            start = min([ node.lineno ] + [ d.lineno for d in getattr(node, "decorator_list", []) ])
+            ranges.append((key, start, node.end_lineno))
+    return ranges
+
+def node_key(node: ast.stmt) -> Optional[str]:
+    """Identify a top-level statement across builds.
+
+    Functions and classes are keyed by name, other logic by the names it
+    binds.  Imports, main guards and statements binding nothing, e.g. a
+    docstring, have no key.
+
+    Examples:
+        >>> node_key(ast.parse("def main(): pass").body[0])
+        'function:main'
+        >>> node_key(ast.parse("A = B = 1").body[0])
+        'logic:A,B'
+    """
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        return f"function:{node.name}"
+    if isinstance(node, ast.ClassDef):
+        return f"class:{node.name}"
+    if isinstance(node, (ast.Import, ast.ImportFrom)) or is_main_guard(node):
+        return None
+    names = bound_names(node)
+    return f"logic:{','.join(sorted(names))}" if names else None
+
+def span_key(span) -> Optional[str]:
+    """Return the ``node_key()`` of a span holding a single top-level statement."""
+    if span.kind not in ("function", "class", "logic") or not span.text.strip():
+        return None
+    body = ast.parse(span.text).body
+    return node_key(body[0]) if len(body) == 1 else None
+
+def load_profile(path) -> dict:
+    """Read a profile written by ``pyonetrue pgo record``."""
+    try:
+        with open(str(path)) as f:
+            profile = json.load(f)
+    except OSError as e:
+        raise PathError(f"cannot read profile '{path}': {e.strerror}")
+    except ValueError:
+        raise FlatteningError(f"profile '{path}' is not JSON")
+    if not isinstance(profile, dict) or profile.get("version") != PGO_PROFILE_VERSION:
+        raise FlatteningError(f"profile '{path}' is not a version {PGO_PROFILE_VERSION} pyonetrue profile")
+    return profile
+
+def order_hot_first(spans: list, profile: dict) -> list:
+    """Move the functions which ran ahead of those which did not.
+
+    Only runs of consecutive, undecorated function definitions are
+    reordered, hot functions in the order they first ran.  A definition
+    evaluates its defaults and annotations, so one whose defaults or
+    annotations read a function of its run is not moved, nor is anything
+    moved across it.
+    """
+    order = { entry["key"]: index for index, entry in enumerate(profile["spans"]) }
+    result = []
+    run = []
+
+    def flush():
+        hot = sorted((s for s in run if span_key(s) in order), key=lambda s: order[span_key(s)])
+        result.extend(hot + [ s for s in run if span_key(s) not in order ])
+        run.clear()
+
+    for span in spans:
+        if not is_movable_function(span, run):
+            flush()
+            result.append(span)
+        else:
+            run.append(span)
+    flush()
+    return result
+
+def is_movable_function(span, run: list) -> bool:
+    """True when ``span`` is a plain function definition independent of ``run``."""
+    if span.kind != "function":
+        return False
+    body = ast.parse(span.text).body
+    if len(body) != 1 or not isinstance(body[0], (ast.FunctionDef, ast.AsyncFunctionDef)):
+        return False
+    node = body[0]
+    if node.decorator_list:
+        return False
+    arguments = node.args
+    evaluated = arguments.defaults + [ d for d in arguments.kw_defaults if d is not None ]
+    evaluated += [ a.annotation for a in arguments.posonlyargs + arguments.args + arguments.kwonlyargs
+                   + [ a for a in (arguments.vararg, arguments.kwarg) if a ] if a.annotation ]
+    evaluated += [ node.returns ] if node.returns else []
+    read = set()
+    for expr in evaluated:
+        read |= { n.id for n in ast.walk(expr) if isinstance(n, ast.Name) }
+    return not read & { span_key(s).split(":", 1)[1] for s in run }
+
+def cold_modules(imports: list, hot: list) -> set:
+    """Return the modules of plain ``import`` statements no hot span uses."""
+    used = referenced_names(span for span in hot if span.kind != "__all__")
+    modules = set()
+    for span in imports:
+        for node in ast.parse(span.text).body:
+            if isinstance(node, ast.Import):
+                for alias in node.names:
+                    if (alias.asname or alias.name.split(".", 1)[0]) not in used:
+                        modules.add(alias.name)
+    return modules
+
+def profile_coverage(spans: list, profile: dict) -> List[str]:
+    """Summarize how much of ``spans`` the profile covers, one line each."""
+    phases = { entry["key"]: entry["phase"] for entry in profile["spans"] }
+    keys = set()
+    lines = []
+    for kind in ("function", "class", "logic"):
+        of_kind = [ key for key in map(span_key, spans) if key and key.startswith(kind + ":") ]
+        keys.update(of_kind)
+        if not of_kind:
+            continue
+        ran = [ key for key in of_kind if key in phases ]
+        startup = sum(1 for key in ran if phases[key] == "startup")
+        lines.append(f"{len(ran)} of {len(of_kind)} {kind} spans ran, {startup} at startup")
+    unknown = sorted(set(phases) - keys)
+    if unknown:
+        lines.append(f"{len(unknown)} profiled spans not found: {', '.join(unknown)}")
+    return lines
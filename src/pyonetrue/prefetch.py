@@ -0,0 +1,84 @@
+"""Read the modules of a package ahead of parsing them.
+
+On a network file system reading a file mostly waits on the server, and
+reading then parsing each module in turn adds up those waits.  So a pool
+of threads reads the files ahead, in order, while they are parsed: at most
+``PREFETCH_DEPTH`` files are read or waiting to be parsed, which bounds the
+memory held, and they are handed to the parser in the order given, so the
+output does not depend on which read finishes first.
+
+Where the platform has ``posix_fadvise``, each file is declared read
+sequentially, so the kernel reads ahead within it.
+
+Every module is decoded as the import system does, see source_text(),
+whichever way it is read.
+"""
+
+from typing import Iterator, List, Optional, Tuple
+
+try :
+    from pathlib import Path
+except ImportError:
+    from .vendor.pathlib import Path
+
+# Files read ahead of the one being parsed, at most
+PREFETCH_DEPTH = 16
+
+def read_source_bytes(path) -> bytes:
+    """Return the content of ``path``, hinting that it is read sequentially."""
+    import os
+    with open(str(path), "rb") as f:
+        if hasattr(os, "posix_fadvise"):
+            try:
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            except OSError:
+                pass  # a hint, e.g. not supported by the file system
+        return f.read()
+
+def source_text(data: bytes) -> str:
+    """Return module source ``data`` decoded as on import.
+
+    A UTF-8 BOM is dropped, a coding cookie is honored and line endings
+    become ``\\n``.  Bytes which do not decode raise UnicodeDecodeError.
+    """
+    from importlib.util import decode_source
+    try:
+        return decode_source(data)
+    except SyntaxError as e:
+        if isinstance(e.__context__, UnicodeDecodeError):
+            raise e.__context__ from None  # e.g. invalid UTF-8 in the first lines
+        raise
+
+def read_source(path) -> str:
+    """Return the source of module ``path``, see source_text()."""
+    return source_text(read_source_bytes(path))
+
+def prefetch_files(paths: List[Path], threads: int, depth: int = PREFETCH_DEPTH) -> Iterator[Tuple[Path, Optional[bytes]]]:
+    """Yield ``(path, content)`` for each of ``paths``, in order, read by ``threads`` threads.
+
+    At most ``depth`` files are read ahead of the one last yielded.  The
+    content of a file which cannot be read is None, the caller reads it
+    again to report the error.
+    """
+    import collections
+    import concurrent.futures
+
+    remaining = iter(paths)
+    window = collections.deque()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as pool:
+
+        def read_next():
+            path = next(remaining, None)
+            if path is not None:
+                window.append((path, pool.submit(read_source_bytes, path)))
+
+        for _ in range(max(1, depth)):
+            read_next()
+        while window:
+            path, future = window.popleft()
+            try:
+                data = future.result()
+            except OSError:
+                data = None
+            read_next()
+            yield path, data
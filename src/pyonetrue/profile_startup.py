@@ -0,0 +1,206 @@
+"""Measure the import time of a flattened artifact.
+
+The artifact is run in a subprocess under ``python -X importtime``.  Each
+top-level import it triggers is attributed to the import line of the
+artifact responsible for it and, given the original source, to the source
+modules which carried that import.
+"""
+
+import ast
+import os
+import re
+import subprocess
+import sys
+from typing import List, Optional
+
+from .cache import cache_key, load_cached_json, store_cached_json
+from .exceptions import PathError
+
+try :
+    from pathlib import Path
+except ImportError:
+    from .vendor.pathlib import Path
+
+# Written to stderr just before the artifact starts, imports logged before it
+# belong to interpreter startup.
+STARTUP_MARKER = "pyonetrue: artifact start"
+
+# import time:       145 |        145 |   _io
+IMPORTTIME_LINE = re.compile(r"import time:\s*(\d+)\s*\|\s*(\d+)\s*\|( *)(\S+)")
+
+# x = _pyonetrue_lazy_import('mod')
+LAZY_BINDING = re.compile(r"\w+\s*=\s*_pyonetrue_lazy_import\(['\"]([\w.]+)['\"]\)")
+
+STARTUP_RUNNER = f"""
+import pkgutil, runpy, sys  # run_path() imports pkgutil
+path, sys.argv[:] = sys.argv[1], sys.argv[1:]
+sys.stderr.write({STARTUP_MARKER!r} + "\\n")
+sys.stderr.flush()
+runpy.run_path(path, run_name="__main__")
+"""
+
+def measure_import_times(artifact: Path, argv: List[str], python: Optional[str] = None,
+                         use_cache: bool = True) -> dict:
+    """Run ``artifact`` under ``-X importtime`` and collect its import costs.
+
+    Results are cached by interpreter, artifact content and argv.
+
+    Args:
+        artifact (Path): Flattened module to run.
+        argv (List[str]): Arguments passed to the artifact.
+        python (str): Interpreter to run, default is the current one.
+        use_cache (bool): Reuse a cached measurement when available.
+
+    Returns:
+        dict: ``{"returncode": int, "imports": [ {"module", "self_us",
+        "cumulative_us", "depth"}, ... ]}`` in the order the imports completed.
+    """
+    artifact = Path(artifact)
+    if not artifact.is_file():
+        raise PathError(f"artifact '{artifact}' is not a file")
+    python = python or sys.executable
+
+    key = cache_key(interpreter_identity(python), artifact.read_bytes(), "\0".join(argv))
+    if use_cache:
+        cached = load_cached_json("importtime", key)
+        if cached is not None:
+            return cached
+
+    result = subprocess.run(
+        [python, "-X", "importtime", "-c", STARTUP_RUNNER, str(artifact), *argv],
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        text=True,
+    )
+    measurement = {
+        "returncode": result.returncode,
+        "imports": parse_importtime(result.stderr),
+    }
+    store_cached_json("importtime", key, measurement)
+    return measurement
+
+def interpreter_identity(python: str) -> str:
+    """Identify an interpreter by resolved path and modification time."""
+    path = os.path.realpath(python)
+    try:
+        return f"{path}:{os.stat(path).st_mtime_ns}"
+    except OSError:
+        return path
+
+def parse_importtime(stderr: str) -> List[dict]:
+    """Parse ``-X importtime`` output, keeping imports made after STARTUP_MARKER."""
+    imports = []
+    started = False
+    for line in stderr.splitlines():
+        if line == STARTUP_MARKER:
+            started = True
+            continue
+        if not started:
+            continue
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            imports.append({
+                "module": module,
+                "self_us": int(self_us),
+                "cumulative_us": int(cumulative_us),
+                "depth": max(len(indent) - 1, 0) // 2,
+            })
+    return imports
+
+def artifact_import_lines(artifact: Path) -> dict[str, int]:
+    """Map each module imported at the top level of ``artifact`` to its line number.
+
+    Lazy bindings emitted by ``--lazy-imports`` count as imports.
+    """
+    lines = {}
+    source = Path(artifact).read_text()
+    for node in ast.parse(source, str(artifact)).body:
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                lines.setdefault(alias.name, node.lineno)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            lines.setdefault(node.module, node.lineno)
+        elif isinstance(node, ast.Assign):
+            match = LAZY_BINDING.match(ast.get_source_segment(source, node) or "")
+            if match:
+                lines.setdefault(match.group(1), node.lineno)
+    return lines
+
+def source_importers(ctx) -> dict[str, List[str]]:
+    """Map each imported module to the source modules importing it.
+
+    Args:
+        ctx (FlatteningContext): Context for the original source, modules
+            are discovered but not flattened.
+    """
+    ctx.discover_modules()
+    importers = {}
+    for module, spans in ctx.module_spans:
+        for span in spans:
+            if span.kind != "import":
+                continue
+            for node in ast.parse(span.text).body:
+                if isinstance(node, ast.Import):
+                    names = [ alias.name for alias in node.names ]
+                elif node.level == 0 and node.module:
+                    names = [ node.module ]
+                else:
+                    continue
+                for name in names:
+                    found = importers.setdefault(name, [])
+                    if module not in found:
+                        found.append(module)
+    return importers
+
+def attribute_import_times(measurement: dict, import_lines: dict[str, int],
+                           importers: Optional[dict[str, List[str]]] = None) -> List[dict]:
+    """Attribute top-level import costs to artifact lines and source modules.
+
+    Only imports at depth 0 are reported, the cost of the imports they make
+    is included in their cumulative time.  Imports not made by a top-level
+    import line of the artifact, e.g. from within a function, have no line.
+
+    Returns:
+        List[dict]: Rows sorted by descending cumulative time.
+    """
+    importers = importers or {}
+    rows = []
+    for entry in measurement["imports"]:
+        if entry["depth"] != 0:
+            continue
+        module = entry["module"]
+        statement = responsible_import(module, import_lines)
+        rows.append({
+            "module": module,
+            "self_us": entry["self_us"],
+            "cumulative_us": entry["cumulative_us"],
+            "line": import_lines.get(statement),
+            "statement": statement,
+            "sources": importers.get(statement, []) if statement else [],
+        })
+    rows.sort(key=lambda row: (-row["cumulative_us"], row["module"]))
+    return rows
+
+def responsible_import(module: str, import_lines: dict[str, int]) -> Optional[str]:
+    """Return the imported module whose import statement loaded ``module``.
+
+    ``import a.b`` loads ``a`` and then ``a.b``, both belong to ``a.b``.
+    """
+    candidates = [ name for name in import_lines
+                   if name == module or name.startswith(module + ".") or module.startswith(name + ".") ]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda name: import_lines[name])
+
+def format_startup_report(rows: List[dict], returncode: int = 0) -> str:
+    """Format attributed import times as a table."""
+    total = sum(row["cumulative_us"] for row in rows)
+    lines = [f"{'cumulative':>10}  {'self':>8}  {'line':>5}  module  [sources]"]
+    for row in rows:
+        line = row["line"] if row["line"] is not None else "-"
+        sources = f"  [{', '.join(row['sources'])}]" if row["sources"] else ""
+        lines.append(f"{row['cumulative_us']:>10}  {row['self_us']:>8}  {line:>5}  {row['module']}{sources}")
+    lines.append(f"{total:>10}  {'':>8}  {'':>5}  total (us)")
+    if returncode:
+        lines.append(f"artifact exited with status {returncode}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,104 @@
+"""Write a flattened module as an executable zipapp (PEP 441).
+
+The archive holds the flattened module, its bytecode and a ``__main__.py``:
+
+    <shebang>
+    __main__.py     runs the entry point
+    <module>.py     the flattened source
+    <module>.pyc    unchecked hash-based bytecode, loaded by zipimport
+
+zipimport uses the ``.pyc`` when its magic number matches the running
+Python and otherwise compiles ``<module>.py``, so the archive still runs on
+other versions, only slower.  zipimport reads stored and deflated members
+only, so those are the compression methods offered.
+"""
+
+import importlib.util
+import marshal
+import os
+import zipfile
+
+try :
+    from pathlib import Path
+except ImportError:
+    from .vendor.pathlib import Path
+
+PYZ_COMPRESSION = {
+    "stored": zipfile.ZIP_STORED,
+    "deflated": zipfile.ZIP_DEFLATED,
+}
+
+# Calls a console script style entry point, `module:function`
+PYZ_CALL_ENTRY = """\
+import sys
+from {module} import {attr}
+sys.exit({attr}())
+"""
+
+# Runs the module as a script, which is how the flattened __main__.py runs
+PYZ_RUN_MODULE = """\
+import runpy
+runpy.run_module({module!r}, run_name="__main__", alter_sys=True)
+"""
+
+def hash_based_pyc(source: bytes, filename: str) -> bytes:
+    """Compile ``source`` to the bytes of an unchecked hash-based ``.pyc``."""
+    code = compile(source, filename, "exec", dont_inherit=True)
+    return b"".join([
+        importlib.util.MAGIC_NUMBER,
+        (0b01).to_bytes(4, "little"),
+        importlib.util.source_hash(source),
+        marshal.dumps(code),
+    ])
+
+def pyz_main(module: str, attr: str = None) -> str:
+    """Return the ``__main__.py`` of a zipapp running ``module``.
+
+    Args:
+        module (str): Name of the flattened module within the archive.
+        attr (str): Entry function to call, the module is run as
+            ``__main__`` when None.
+    """
+    if attr:
+        return PYZ_CALL_ENTRY.format(module=module, attr=attr)
+    return PYZ_RUN_MODULE.format(module=module)
+
+def parse_compression(compression: str) -> tuple:
+    """Parse ``stored`` or ``deflated[:<level>]`` into ``(method, level)``.
+
+    Examples:
+        >>> parse_compression("deflated:9") == (zipfile.ZIP_DEFLATED, 9)
+        True
+    """
+    name, _, level = compression.partition(":")
+    if name not in PYZ_COMPRESSION or (level and (name == "stored" or not level.isdigit() or int(level) > 9)):
+        raise ValueError(f"invalid compression '{compression}', use `stored` or `deflated[:<0-9>]`")
+    return PYZ_COMPRESSION[name], int(level) if level else None
+
+def write_pyz(target: Path, text: str, module: str, attr: str = None,
+              shebang: str = "#!/usr/bin/env python3", compression: str = "deflated") -> Path:
+    """Write the flattened module ``text`` as an executable zipapp.
+
+    Args:
+        target (Path): Archive to write, made executable.
+        text (str): Flattened module source.
+        module (str): Name of the module within the archive.
+        attr (str): Entry function, see ``pyz_main()``.
+        shebang (str): Interpreter line, omitted when empty.
+        compression (str): ``stored`` or ``deflated[:<level>]``.
+
+    Returns:
+        Path: ``target``.
+    """
+    method, level = parse_compression(compression)
+    source = text.encode("utf-8")
+    target = Path(target)
+    with open(target, "wb") as f:
+        if shebang:
+            f.write(shebang.rstrip("\n").encode("utf-8") + b"\n")
+        with zipfile.ZipFile(f, "w", compression=method, compresslevel=level) as archive:
+            archive.writestr("__main__.py", pyz_main(module, attr))
+            archive.writestr(f"{module}.py", source)
+            archive.writestr(f"{module}.pyc", hash_based_pyc(source, f"{module}.py"))
+    os.chmod(str(target), 0o755)
+    return target
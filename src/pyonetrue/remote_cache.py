@@ -0,0 +1,207 @@
+"""Share cache entries between machines over HTTP.
+
+The protocol is content addressed, an entry never changes once stored:
+
+    GET  <url>/<namespace>/<key>   200 and the entry, or 404
+    PUT  <url>/<namespace>/<key>   stores the request body, 201
+
+``<namespace>`` is e.g. ``spans`` or ``output``, ``<key>`` a ``cache_key()``,
+64 hex digits, digesting every input of the entry, including the versions
+of pyonetrue and Python.  Entries are the JSON documents of the local
+cache, see cache.  Any server implementing the two requests will do, e.g. a
+bucket behind a proxy.  ``serve_remote_cache()`` is a reference server
+storing the entries in a directory, see ``pyonetrue cache serve``.
+
+The client gives up on a request after ``REMOTE_CACHE_TIMEOUT`` seconds
+and on a server it could not reach for the rest of the run, the caller
+then computes the entry itself.
+"""
+
+import os
+import re
+import sys
+from typing import List, Optional
+
+try :
+    from pathlib import Path
+except ImportError:
+    from .vendor.pathlib import Path
+
+REMOTE_CACHE_TIMEOUT = 2.0
+
+# Largest entry the reference server accepts, in bytes
+REMOTE_CACHE_MAX_ENTRY = 256 * 1024 * 1024
+
+REMOTE_CACHE_PATH = re.compile(r"/([a-z0-9-]+)/([0-9a-f]{64})")
+
+# Servers which could not be reached, not asked again
+REMOTE_CACHE_UNREACHABLE = set()
+
+def remote_entry_url(url: str, namespace: str, key: str) -> str:
+    """Return the URL of entry ``key`` of ``namespace`` on the server at ``url``."""
+    return f"{url.rstrip('/')}/{namespace}/{key}"
+
+def remote_get(url: str, namespace: str, key: str) -> Optional[bytes]:
+    """Fetch an entry, None when it is missing or the server fails."""
+    import http.client
+    import urllib.error
+    import urllib.request
+    if url in REMOTE_CACHE_UNREACHABLE:
+        return None
+    try:
+        with urllib.request.urlopen(remote_entry_url(url, namespace, key),
+                                    timeout=REMOTE_CACHE_TIMEOUT) as response:
+            return response.read()
+    except urllib.error.HTTPError:
+        return None  # e.g. 404, a miss
+    except (OSError, ValueError, http.client.HTTPException) as e:
+        remote_unreachable(url, e)
+        return None
+
+def remote_put(url: str, namespace: str, key: str, data: bytes) -> bool:
+    """Store an entry, False when the server fails."""
+    import http.client
+    import urllib.error
+    import urllib.request
+    if url in REMOTE_CACHE_UNREACHABLE:
+        return False
+    request = urllib.request.Request(remote_entry_url(url, namespace, key), data=data, method="PUT",
+                                     headers={ "Content-Type": "application/json" })
+    try:
+        with urllib.request.urlopen(request, timeout=REMOTE_CACHE_TIMEOUT):
+            return True
+    except urllib.error.HTTPError:
+        return False
+    except (OSError, ValueError, http.client.HTTPException) as e:
+        remote_unreachable(url, e)
+        return False
+
+def remote_unreachable(url: str, error: Exception) -> None:
+    """Stop using the server at ``url`` for the rest of the run."""
+    REMOTE_CACHE_UNREACHABLE.add(url)
+    print(f"[INFO] remote cache {url} unreachable, computing locally: {error}", file=sys.stderr)
+
+def serve_remote_cache(directory, host: str = "127.0.0.1", port: int = 0):
+    """Return a reference server storing the entries under ``directory``.
+
+    Call ``serve_forever()`` on the server, ``server_address`` holds the
+    port actually bound when ``port`` is 0.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    root = Path(directory)
+
+    class RemoteCacheHandler(BaseHTTPRequestHandler):
+
+        def entry_path(self):
+            match = REMOTE_CACHE_PATH.fullmatch(self.path)
+            if not match:
+                self.send_error(400, "expected /<namespace>/<key>")
+                return None
+            return root / match.group(1) / match.group(2)
+
+        def do_GET(self):
+            path = self.entry_path()
+            if path is None:
+                return
+            try:
+                data = path.read_bytes()
+            except OSError:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_PUT(self):
+            path = self.entry_path()
+            if path is None:
+                return
+            length = int(self.headers.get("Content-Length") or -1)
+            if not 0 <= length <= REMOTE_CACHE_MAX_ENTRY:
+                self.send_error(411 if length < 0 else 413)
+                return
+            data = self.rfile.read(length)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temp = path.with_name(f".{path.name}.{os.getpid()}.{id(self)}.tmp")
+            temp.write_bytes(data)
+            os.replace(temp, path)
+            self.send_response(201)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            print(f"[INFO] cache serve: {self.address_string()} {format % args}", file=sys.stderr)
+
+    return ThreadingHTTPServer((host, port), RemoteCacheHandler)
+
+def output_cache_key(ctx) -> str:
+    """Digest every input of flattening ``ctx`` into the key of its output.
+
+    The options, the source of each ``.py`` file it may read and the
+    versions of pyonetrue and Python.  Paths are relative to the package,
+    so checkouts at different locations share entries.
+    """
+    from .cache import cache_key
+    from .cli import __version__
+
+    parts = [ "output", __version__, f"{sys.version_info[0]}.{sys.version_info[1]}" ] + option_parts(ctx)
+    if ctx.pgo:
+        try:
+            parts += [ "pgo", Path(ctx.pgo).read_bytes() ]
+        except OSError:
+            parts += [ "pgo", ctx.pgo ]  # flattening reports it
+
+    path = Path(ctx.package_path)
+    if ctx.archive_sources:
+        for name in sorted(ctx.archive_sources):
+            parts += [ name, ctx.archive_sources[name] ]
+    elif path.is_file():
+        parts += [ path.name, path.read_bytes() ]
+    else:
+        parts += package_file_parts(path)
+
+    for dep in ctx.inline_deps:
+        import importlib.util
+        spec = importlib.util.find_spec(dep)
+        if spec is None:
+            continue  # flattening reports it
+        for location in spec.submodule_search_locations or [ spec.origin ]:
+            parts += [ dep ] + package_file_parts(Path(location))
+    return cache_key(*parts)
+
+def option_parts(ctx) -> List[str]:
+    """Return ``name=value`` of each option of ``ctx`` affecting the output text.
+
+    Results of flattening and inputs, read by content, are left out.
+    """
+    import dataclasses
+    skipped = { "package_path", "output", "main_py", "module_spans", "guard_sources",
+                "archive_sources", "archive_spans", "input_files", "lazy_refusals", "pgo",
+                "pgo_report", "pgo_cold_modules", "remote_cache", "max_memory", "span_store",
+                "resident_bytes", "jobs", "read_threads", "schedule_stats",
+                "parse_stats" }
+    return [ f"{f.name}={getattr(ctx, f.name)!r}" for f in dataclasses.fields(ctx) if f.name not in skipped ]
+
+def package_file_parts(path: Path) -> list:
+    """Return the path, relative to ``path``, and content of each ``.py`` file under it."""
+    if path.is_file():
+        return [ path.name, path.read_bytes() ]
+    parts = []
+    for subpath in sorted(path.rglob("*.py")):
+        parts += [ subpath.relative_to(path).as_posix(), subpath.read_bytes() ]
+    return parts
+
+def relative_inputs(paths: List[str], root) -> List[str]:
+    """Return ``paths`` relative to ``root`` when within it, for a cache entry."""
+    relative = []
+    for path in paths:
+        name = os.path.relpath(os.path.abspath(path), os.path.abspath(str(root)))
+        relative.append(path if name.startswith(os.pardir) else Path(name).as_posix())
+    return relative
+
+def absolute_inputs(names: List[str], root) -> List[str]:
+    """Undo relative_inputs() for a cache entry read in the package at ``root``."""
+    return [ name if os.path.isabs(name) else str(Path(root) / name) for name in names ]
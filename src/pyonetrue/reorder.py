@@ -0,0 +1,186 @@
+"""Put single files in canonical order, see ``pyonetrue --in-place`` and ``--check``.
+
+A file is in canonical order when flattening it on its own, keeping its
+main guards, shebang, header comments and relative imports, reproduces it.  Flattening drops
+the comments between top-level statements, a file which has any is not
+rewritten.  Files are processed by a pool of worker processes, largest
+first, see schedule.  The content hash of each file found or made
+canonical is cached, so an unchanged file is skipped on later runs without
+being parsed.
+"""
+
+import re
+import sys
+from typing import List, Tuple
+
+try :
+    from pathlib import Path
+except ImportError:
+    from .vendor.pathlib import Path
+
+# Bump when canonical_text() output changes for the same source
+REORDER_CACHE_FORMAT = 2
+
+# A relative import marked by mark_relative_imports(), and its dot if any
+RELATIVE_IMPORT_MARK = re.compile(r"_pyonetrue_relative_(\d+)_\.?")
+
+# Options of a FlatteningContext which apply to a reordered file
+REORDER_OPTIONS = ("ignore_clashes", "prune_imports", "annotations", "dedupe_logic")
+
+def canonical_text(path: Path, options: dict) -> str:
+    """Return the text of the file at ``path`` in canonical order.
+
+    Args:
+        path (Path): The file.
+        options (dict): FlatteningContext options, see REORDER_OPTIONS.
+    """
+    from .flattening import FlatteningContext
+
+    with open(str(path), encoding="utf-8") as f:
+        lines = f.readlines()
+    shebang = lines[0].rstrip("\n") if lines and lines[0].startswith("#!") else ""
+    header = []
+    for line in lines[1 if shebang else 0:]:
+        if line.strip() and not line.lstrip().startswith("#"):
+            break
+        header.append(line)
+    header = "".join(header).strip("\n")
+
+    ctx = FlatteningContext(package_path=str(path), module_only=True, guards_all=True,
+                            shebang=shebang, **options)
+    ctx.add_module(Path(path), source=mark_relative_imports("".join(lines)))
+    spans = ctx.get_final_output_spans()
+    text = RELATIVE_IMPORT_MARK.sub(lambda m: "." * int(m.group(1)), "".join(span.text for span in spans))
+    if header:
+        text = header + "\n\n" + text
+    if shebang:
+        text = shebang + "\n" + text
+    return text
+
+def mark_relative_imports(source: str) -> str:
+    """Return ``source`` with its relative imports made absolute imports of a marker module.
+
+    Flattening drops or rewrites relative imports, the modules they name are
+    flattened along.  A reordered file stays in its package, so they are
+    kept as the imports of a third-party module, ``from ..mod import x``
+    becomes ``from _pyonetrue_relative_2_.mod import x``, and restored by
+    canonical_text().
+
+    Examples:
+        >>> mark_relative_imports("from . import a\\nfrom ..b import c\\n")
+        'from _pyonetrue_relative_1_ import a\\nfrom _pyonetrue_relative_2_.b import c\\n'
+    """
+    import ast
+    import re
+    from .extract_ast import replace_source_ranges
+
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return source  # reported by flattening
+    lines = source.splitlines(keepends=True)
+    edits = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.level:
+            line = lines[node.lineno - 1].encode("utf-8")[node.col_offset:].decode("utf-8")
+            match = re.match(r"from\s+(\.+)\s*", line)
+            if match is None:  # the dots on a continuation line, left to flattening
+                continue
+            module = f"_pyonetrue_relative_{node.level}_" + ("." if node.module else " ")
+            start = node.col_offset + len(line[:match.start(1)].encode("utf-8"))
+            end = node.col_offset + len(line[:match.end()].encode("utf-8"))
+            edits.append(((node.lineno, start), (node.lineno, end), module))
+    return replace_source_ranges(source, edits)
+
+def dropped_comments(original: str, text: str) -> List[Tuple[int, str]]:
+    """Return the ``(line, comment)`` of ``original`` missing from ``text``."""
+    import collections
+    import io
+    import tokenize
+
+    def comments(source):
+        tokens = tokenize.generate_tokens(io.StringIO(source).readline)
+        return [ (token.start[0], token.string) for token in tokens if token.type == tokenize.COMMENT ]
+
+    kept = collections.Counter(comment for _, comment in comments(text))
+    dropped = []
+    for line, comment in comments(original):
+        if kept[comment]:
+            kept[comment] -= 1
+        else:
+            dropped.append((line, comment))
+    return dropped
+
+def reorder_cache_key(content: bytes, options: dict) -> str:
+    """Return the cache key of a file with ``content`` which is canonical under ``options``."""
+    from .cache import cache_key
+    from .cli import __version__
+    return cache_key("reorder", str(REORDER_CACHE_FORMAT), __version__,
+                     f"{sys.version_info[0]}.{sys.version_info[1]}", repr(sorted(options.items())), content)
+
+def reorder_file(path: str, options: dict, write: bool) -> Tuple[str, str, str]:
+    """Reorder one file, run by a worker.
+
+    Returns:
+        tuple: ``(path, status, message)``, status is ``unchanged``,
+        ``reordered``, or with ``write`` false ``unordered``, or ``error``.
+    """
+    from .cache import store_cached_json
+    from .exceptions import PyonetrueError
+    try:
+        content = Path(path).read_bytes()
+        text = canonical_text(Path(path), options)
+    except (OSError, UnicodeDecodeError, PyonetrueError) as e:
+        cause = e.__cause__ if isinstance(e.__cause__, SyntaxError) else e
+        return path, "error", str(cause)
+    canonical = text.encode("utf-8")
+    dropped = dropped_comments(content.decode("utf-8"), text) if canonical != content else []
+    if dropped:
+        line, comment = dropped[0]
+        return path, "error", f"reordering would drop {len(dropped)} comments, e.g. line {line}: {comment}"
+    if canonical == content:
+        status = "unchanged"
+    elif not write:
+        return path, "unordered", ""
+    else:
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+        status = "reordered"
+    store_cached_json("reorder", reorder_cache_key(canonical, options), True)
+    return path, status, ""
+
+def reorder_files(paths: List[str], options: dict, write: bool, jobs: int = None,
+                  stats: dict = None) -> List[Tuple[str, str, str]]:
+    """Reorder ``paths`` with a pool of ``jobs`` workers, default one per CPU.
+
+    Files whose content is cached as canonical are reported ``cached``
+    without being parsed.  See reorder_file() for the other statuses.
+    When workers are used, ``stats`` is updated with the statistics of
+    schedule.schedule_tasks().
+    """
+    from .cache import load_cached_json
+
+    paths = list(dict.fromkeys(paths))
+    results = {}
+    pending = []
+    for path in paths:
+        try:
+            content = Path(path).read_bytes()
+        except OSError as e:
+            results[path] = (path, "error", e.strerror or str(e))
+            continue
+        if load_cached_json("reorder", reorder_cache_key(content, options)):
+            results[path] = (path, "cached", "")
+        else:
+            pending.append(path)
+
+    if len(pending) < 2 or jobs == 1:
+        done = [ reorder_file(path, options, write) for path in pending ]
+    else:
+        from .schedule import schedule_tasks
+        done, run_stats = schedule_tasks(reorder_file, pending, (options, write), jobs)
+        if stats is not None:
+            stats.update(run_stats)
+    for result in done:
+        results[result[0]] = result
+    return [ results[path] for path in paths ]
@@ -0,0 +1,150 @@
+"""Spread per-file work over worker processes, largest files first.
+
+Parsing time grows with file size, and packages are skewed: one large
+generated module can take longer than all the others together.  Handing
+files out in directory order leaves it for last, and the run waits on one
+worker.  So files are handed out largest first, and small files, where
+the cost of sending the work to a worker outweighs the work itself, are
+grouped into batches of about ``SCHEDULE_BATCH_BYTES``.
+
+Batches wait in a single queue and an idle worker takes the next one, so a
+worker held up by a large file never has work waiting behind it which
+another, idle, worker could do.  Only ``2 * jobs`` batches are submitted at
+a time, the rest stay in order in the queue.
+
+The statistics of a run are returned with its results, see
+schedule_tasks().
+"""
+
+from typing import Callable, List, Optional, Tuple
+
+# Files from this size are sent to a worker on their own
+SCHEDULE_SMALL_FILE = 32 * 1024
+
+# Small files are sent in batches of about this many bytes
+SCHEDULE_BATCH_BYTES = 128 * 1024
+
+def plan_batches(sizes: dict[str, int]) -> List[List[str]]:
+    """Group the files of ``sizes``, path to size in bytes, into batches, largest first.
+
+    Examples:
+        >>> plan_batches({"a.py": 100, "big.py": 50000, "b.py": 200})
+        [['big.py'], ['b.py', 'a.py']]
+    """
+    batches = []
+    batch, batch_bytes = [], 0
+    for path in sorted(sizes, key=lambda path: (-sizes[path], path)):
+        if sizes[path] >= SCHEDULE_SMALL_FILE:
+            batches.append([path])
+            continue
+        batch.append(path)
+        batch_bytes += sizes[path]
+        if batch_bytes >= SCHEDULE_BATCH_BYTES:
+            batches.append(batch)
+            batch, batch_bytes = [], 0
+    if batch:
+        batches.append(batch)
+    return batches
+
+def file_sizes(paths: List[str]) -> dict[str, int]:
+    """Map each of ``paths`` to its size, 0 when it cannot be read."""
+    import os
+    sizes = {}
+    for path in paths:
+        try:
+            sizes[path] = os.stat(str(path)).st_size
+        except OSError:
+            sizes[path] = 0
+    return sizes
+
+def parse_file_spans(path: str) -> Optional[List[Tuple[str, str]]]:
+    """Return the ``(kind, text)`` of the spans of ``path``, None when it fails to parse.
+
+    Run by a worker, the failure is reported when the file is parsed again
+    by flattening itself.
+    """
+    from .extract_ast import extract_spans
+    from .prefetch import read_source
+    try:
+        return [ (span.kind, span.text) for span in extract_spans(read_source(path), path) ]
+    except Exception:
+        return None
+
+def run_batch(task: Callable, batch: List[str], args: tuple, submitted: float) -> dict:
+    """Run ``task(path, *args)`` for each path of ``batch``, run by a worker."""
+    import os
+    import time
+    started = time.time()
+    clock = time.perf_counter()
+    results = [ task(path, *args) for path in batch ]
+    return { "pid": os.getpid(), "wait": max(0.0, started - submitted),
+             "busy": time.perf_counter() - clock, "results": results }
+
+def schedule_tasks(task: Callable, paths: List[str], args: tuple = (), jobs: int = None) -> Tuple[list, dict]:
+    """Run ``task(path, *args)`` for each of ``paths`` on ``jobs`` workers, default one per CPU.
+
+    ``task`` must be a module level function, it runs in another process.
+
+    Returns:
+        tuple: ``(results, stats)``, the results in the order of ``paths``
+        and the statistics of the run:
+
+        - ``files``, ``batches``, ``workers``: the counts;
+        - ``wall``: seconds from the first submission to the last result;
+        - ``per_worker``: per worker process, ``{"busy", "batches", "files"}``,
+          the seconds spent running ``task`` and the work done;
+        - ``wait_mean``, ``wait_max``: seconds batches waited, once
+          submitted, for a worker;
+        - ``utilization``: the share of ``workers * wall`` spent busy.
+    """
+    import collections
+    import concurrent.futures
+    import os
+    import time
+
+    paths = list(dict.fromkeys(paths))
+    batches = collections.deque(plan_batches(file_sizes(paths)))
+    workers = max(1, min(jobs or os.cpu_count() or 1, len(batches)))
+    stats = { "files": len(paths), "batches": len(batches), "workers": workers, "per_worker": {} }
+    results = {}
+    waits = []
+
+    start = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+
+        def submit():
+            batch = batches.popleft()
+            pending[pool.submit(run_batch, task, batch, args, time.time())] = batch
+
+        while batches and len(pending) < 2 * workers:
+            submit()
+        while pending:
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                batch = pending.pop(future)
+                run = future.result()
+                results.update(zip(batch, run["results"]))
+                worker = stats["per_worker"].setdefault(run["pid"], { "busy": 0.0, "batches": 0, "files": 0 })
+                worker["busy"] += run["busy"]
+                worker["batches"] += 1
+                worker["files"] += len(batch)
+                waits.append(run["wait"])
+                if batches:
+                    submit()
+    stats["wall"] = time.perf_counter() - start
+    stats["wait_mean"] = sum(waits) / len(waits) if waits else 0.0
+    stats["wait_max"] = max(waits, default=0.0)
+    busy = sum(worker["busy"] for worker in stats["per_worker"].values())
+    stats["utilization"] = busy / (workers * stats["wall"]) if stats["wall"] else 0.0
+    return [ results[path] for path in paths ], stats
+
+def format_schedule_stats(label: str, stats: dict) -> List[str]:
+    """Return the ``[INFO]`` lines reporting the ``stats`` of schedule_tasks()."""
+    lines = [ f"[INFO] {label}: {stats['files']} files in {stats['batches']} batches on {stats['workers']} workers,"
+              f" {stats['wall']:.3f}s wall, {stats['utilization']:.0%} busy" ]
+    lines.append(f"[INFO] {label}: queue wait {stats['wait_mean']:.3f}s mean, {stats['wait_max']:.3f}s max")
+    for pid, worker in sorted(stats["per_worker"].items()):
+        lines.append(f"[INFO] {label}: worker {pid}: {worker['busy']:.3f}s busy,"
+                     f" {worker['files']} files in {worker['batches']} batches")
+    return lines
@@ -0,0 +1,116 @@
+"""Write a flattened module as a compressed, self-extracting script.
+
+The script is a short stub followed by the compressed source, base85
+encoded.  The stub decompresses, compiles and executes the source in its
+own namespace, so ``__name__`` and ``__file__`` are those of the script
+whether it is run or imported, and the stub leaves none of its names
+there.
+
+With ``cache=True`` the stub stores the compiled code object on first run,
+keyed by the digest of the source and the interpreter's cache tag, and
+later runs load it without decompressing or compiling.  The cache lives in
+``$PYONETRUE_SFX_CACHE``, else ``$XDG_CACHE_HOME/pyonetrue/sfx`` or
+``~/.cache/pyonetrue/sfx``.  A cache that cannot be written is ignored.
+"""
+
+import base64
+import hashlib
+import lzma
+import os
+import zlib
+
+try :
+    from pathlib import Path
+except ImportError:
+    from .vendor.pathlib import Path
+
+SFX_STUB = '''{shebang}
+# Self-extracting {module}: {size} bytes of {method} compressed source.
+def _pyonetrue_sfx_run(payload, digest, cache):
+    # Imported and bound here, the program runs in this module's namespace
+    import marshal, os, sys
+    path = code = None
+    if cache:
+        root = os.environ.get("PYONETRUE_SFX_CACHE") or os.path.join(
+            os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+            "pyonetrue", "sfx")
+        path = os.path.join(root, f"{{digest}}.{{sys.implementation.cache_tag}}.code")
+        try:
+            with open(path, "rb") as f:
+                code = marshal.load(f)
+        except (OSError, ValueError, EOFError, TypeError):
+            pass
+    if code is None:
+        import base64, {method}
+        code = compile({method}.decompress(base64.b85decode(payload)), __file__, "exec", dont_inherit=True)
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temp = f"{{path}}.{{os.getpid()}}.tmp"
+                with open(temp, "wb") as f:
+                    marshal.dump(code, f)
+                os.replace(temp, path)
+            except OSError:
+                pass
+    namespace = globals()
+    del namespace["_pyonetrue_sfx_run"]
+    exec(code, namespace)
+
+_pyonetrue_sfx_run({payload}, {digest!r}, {cache!r})
+'''
+
+# Characters per line of the base85 payload
+SFX_PAYLOAD_WIDTH = 76
+
+def parse_sfx_compression(compression: str) -> tuple:
+    """Parse ``zlib[:<level>]`` or ``lzma[:<preset>]`` into ``(method, level)``.
+
+    Examples:
+        >>> parse_sfx_compression("zlib:9")
+        ('zlib', 9)
+    """
+    name, _, level = compression.partition(":")
+    if name not in ("zlib", "lzma") or (level and (not level.isdigit() or int(level) > 9)):
+        raise ValueError(f"invalid compression '{compression}', use `zlib[:<0-9>]` or `lzma[:<0-9>]`")
+    return name, int(level) if level else None
+
+def compress_source(source: bytes, compression: str = "lzma") -> bytes:
+    """Compress ``source`` as described by ``compression``, see ``parse_sfx_compression()``."""
+    method, level = parse_sfx_compression(compression)
+    if method == "zlib":
+        return zlib.compress(source, 9 if level is None else level)
+    return lzma.compress(source, preset=9 if level is None else level)
+
+def sfx_text(text: str, module: str, compression: str = "lzma", cache: bool = False,
+             shebang: str = "#!/usr/bin/env python3") -> str:
+    """Return the self-extracting script running the flattened module ``text``.
+
+    Args:
+        text (str): Flattened module source.
+        module (str): Name of the module, for the stub's comment.
+        compression (str): ``zlib[:<level>]`` or ``lzma[:<preset>]``.
+        cache (bool): Cache the compiled code on first run.
+        shebang (str): Interpreter line, omitted when empty.
+    """
+    source = text.encode("utf-8")
+    method, _ = parse_sfx_compression(compression)
+    encoded = base64.b85encode(compress_source(source, compression)).decode("ascii")
+    lines = [ encoded[i:i + SFX_PAYLOAD_WIDTH] for i in range(0, len(encoded), SFX_PAYLOAD_WIDTH) ]
+    payload = "(\n" + "".join(f"    {line!r}\n" for line in lines) + ")"
+    return SFX_STUB.format(
+        shebang=shebang.rstrip("\n") if shebang else "",
+        module=module,
+        size=len(source),
+        method=method,
+        payload=payload,
+        digest=hashlib.sha256(source).hexdigest()[:32],
+        cache=bool(cache),
+    ).lstrip("\n")
+
+def write_sfx(target: Path, text: str, module: str, compression: str = "lzma",
+              cache: bool = False, shebang: str = "#!/usr/bin/env python3") -> Path:
+    """Write ``sfx_text()`` to ``target`` and make it executable."""
+    target = Path(target)
+    target.write_text(sfx_text(text, module, compression, cache, shebang))
+    os.chmod(str(target), 0o755)
+    return target
@@ -0,0 +1,83 @@
+"""Keep span text on disk to bound memory, see ``--max-memory``.
+
+Once the text of the spans discovered exceeds the budget, further spans
+are spilled: their text moves to an anonymous temporary file, a
+``SpanStore``, and only its offset and length stay in memory.  A
+``SpilledSpan`` reads its text back when asked for it, so flattening works
+on it unchanged, and the output is written span by span rather than
+joined into one string.
+"""
+
+from typing import IO, Iterable, Tuple
+
+from .extract_ast import Span
+
+MEMORY_UNITS = { "": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4 }
+
+def parse_memory_size(text: str) -> int:
+    """Parse a size in bytes, with an optional K, M, G or T suffix.
+
+    Examples:
+        >>> parse_memory_size("512M")
+        536870912
+        >>> parse_memory_size("2g")
+        2147483648
+    """
+    text = text.strip().upper()
+    if text.endswith("B"):
+        text = text[:-1]
+    unit = text[-1:] if text[-1:] in MEMORY_UNITS else ""
+    number = text[:-1] if unit else text
+    try:
+        size = int(float(number) * MEMORY_UNITS[unit])
+    except ValueError:
+        raise ValueError(f"invalid memory size '{text}', e.g. 512M or 2G")
+    if size < 0:
+        raise ValueError(f"invalid memory size '{text}', e.g. 512M or 2G")
+    return size
+
+class SpanStore:
+    """Span text appended to an anonymous temporary file."""
+
+    def __init__(self):
+        import tempfile
+        self.file = tempfile.TemporaryFile()
+        self.size = 0
+
+    def put(self, text: str) -> Tuple[int, int]:
+        """Store ``text``, return its ``(offset, length)`` in bytes."""
+        data = text.encode("utf-8", "surrogatepass")
+        offset = self.size
+        self.file.seek(offset)
+        self.file.write(data)
+        self.size += len(data)
+        return offset, len(data)
+
+    def get(self, offset: int, length: int) -> str:
+        """Return the text stored at ``offset``."""
+        self.file.seek(offset)
+        return self.file.read(length).decode("utf-8", "surrogatepass")
+
+class SpilledSpan(Span):
+    """A span whose text is kept in a SpanStore.
+
+    Assigning ``text``, e.g. when imports are rewritten, stores the new
+    text, the old one is left unused in the store.
+    """
+
+    def __init__(self, store: SpanStore, text: str, kind: str):
+        self.store = store
+        super().__init__(text, kind)
+
+    @property
+    def text(self) -> str:
+        return self.store.get(self.offset, self.length)
+
+    @text.setter
+    def text(self, value: str) -> None:
+        self.offset, self.length = self.store.put(value)
+
+def write_spans(stream: IO[str], spans: Iterable[Span]) -> None:
+    """Write the text of ``spans`` to ``stream`` one at a time."""
+    for span in spans:
+        stream.write(span.text)
@@ -0,0 +1,133 @@
+"""Remove the import time cost of type hints from flattened spans.
+
+Annotations of function signatures and module-level variables are
+evaluated when the module is imported.  ``strip_annotations()`` removes
+them from source text, ``is_type_checking_block()`` recognizes the
+``if TYPE_CHECKING:`` blocks which only exist for type checkers.
+
+Annotations read at runtime are kept: those within class bodies, which
+dataclasses, NamedTuple and TypedDict turn into fields, those of
+decorated functions, which decorators such as ``functools.singledispatch``
+may inspect, and those of functions passed around as values, e.g. to
+``typer.run(main)`` or ``get_type_hints(f)``, see value_references().
+"""
+
+import ast
+from typing import Iterable, List, Set
+
+from .extract_ast import replace_source_ranges
+
+ANNOTATION_MODES = ("keep", "defer", "strip")
+
+DEFER_ANNOTATIONS = "from __future__ import annotations\n"
+
+def strip_annotations(text: str, keep: Set[str] = frozenset()) -> str:
+    """Remove the annotations evaluated at import time from ``text``.
+
+    Args:
+        text (str): Source of one or more top-level statements.
+        keep (set): Names of the functions which keep their annotations.
+
+    Returns:
+        str: ``text`` without the annotations of undecorated module-level
+        function signatures, but those of ``keep``, and of module-level
+        assignments.  Methods keep theirs.  ``X: int`` without a
+        value is left as is, removing it would change ``__annotations__``
+        for nothing.
+
+    Examples:
+        >>> strip_annotations("def f(a: int, *b: str) -> bool:\\n    return a\\n")
+        'def f(a, *b):\\n    return a\\n'
+    """
+    if ":" not in text:
+        return text
+    tree = ast.parse(text)
+    data = text.encode("utf-8")
+    line_starts = [0]
+    for line in data.splitlines(keepends=True):
+        line_starts.append(line_starts[-1] + len(line))
+
+    edits = []
+    for node in tree.body:
+        if isinstance(node, ast.AnnAssign) and node.value is not None:
+            edits.append(((node.target.end_lineno, node.target.end_col_offset),
+                          (node.value.lineno, node.value.col_offset), " = "))
+    for node in module_level_functions(tree.body):
+        if not node.decorator_list and node.name not in keep:
+            edits.extend(signature_annotation_edits(node, data, line_starts))
+    return replace_source_ranges(text, edits)
+
+def value_references(texts: Iterable[str]) -> Set[str]:
+    """Return the names ``texts`` use other than by calling them.
+
+    A function passed as a value may have its annotations read, e.g. by
+    ``typer.run(main)`` or ``dispatcher.register(handler)``.
+
+    Examples:
+        >>> sorted(value_references(["main()", "run(main, options)"]))
+        ['main', 'options']
+    """
+    names = set()
+    for text in texts:
+        tree = ast.parse(text)
+        called = { id(node.func) for node in ast.walk(tree) if isinstance(node, ast.Call) }
+        names |= { node.id for node in ast.walk(tree)
+                   if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and id(node) not in called }
+    return names
+
+def module_level_functions(body: List[ast.stmt]) -> List[ast.FunctionDef]:
+    """Return the functions defined by ``body``, also within its ``if``, ``try`` and other blocks.
+
+    Methods and nested functions are not module-level, their annotations
+    are not evaluated at import time.
+    """
+    functions = []
+    for node in body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            functions.append(node)
+        elif not isinstance(node, ast.ClassDef):
+            for field in ("body", "orelse", "finalbody"):
+                functions += module_level_functions(getattr(node, field, []))
+            for handler in getattr(node, "handlers", []):
+                functions += module_level_functions(handler.body)
+    return functions
+
+def signature_annotation_edits(node: ast.FunctionDef, data: bytes, line_starts: List[int]) -> List[tuple]:
+    """Return the ``replace_source_ranges()`` edits removing ``node``'s annotations."""
+    edits = []
+    arguments = node.args
+    for arg in (arguments.posonlyargs + arguments.args + arguments.kwonlyargs
+                + [ a for a in (arguments.vararg, arguments.kwarg) if a ]):
+        if arg.annotation is not None:
+            name_end = arg.col_offset + len(arg.arg.encode("utf-8"))
+            edits.append(((arg.lineno, name_end),
+                          (arg.annotation.end_lineno, arg.annotation.end_col_offset), ""))
+    if node.returns is not None:
+        # The arrow is the last `->` before the annotation
+        returns_start = line_starts[node.returns.lineno - 1] + node.returns.col_offset
+        arrow = data.rindex(b"->", 0, returns_start)
+        while arrow > 0 and data[arrow - 1:arrow] in (b" ", b"\t"):
+            arrow -= 1
+        line = next(i for i in range(len(line_starts) - 1, -1, -1) if line_starts[i] <= arrow)
+        edits.append(((line + 1, arrow - line_starts[line]),
+                      (node.returns.end_lineno, node.returns.end_col_offset), ""))
+    return edits
+
+def is_type_checking_block(text: str) -> bool:
+    """True when ``text`` is only ``if TYPE_CHECKING:`` blocks without an else.
+
+    ``typing.TYPE_CHECKING`` is False at runtime, so such blocks never run.
+    """
+    if "TYPE_CHECKING" not in text:
+        return False
+    body = ast.parse(text).body
+    return bool(body) and all(
+        isinstance(node, ast.If) and not node.orelse and is_type_checking_test(node.test)
+        for node in body
+    )
+
+def is_type_checking_test(test: ast.expr) -> bool:
+    """True for ``TYPE_CHECKING`` or ``<module>.TYPE_CHECKING``."""
+    if isinstance(test, ast.Name):
+        return test.id == "TYPE_CHECKING"
+    return isinstance(test, ast.Attribute) and test.attr == "TYPE_CHECKING"
@@ -0,0 +1,6 @@
+import pytest
+
+@pytest.fixture(autouse=True)
+def isolated_cache_dir(tmp_path_factory, monkeypatch):
+    """Keep the on-disk cache of every test out of the user's cache directory."""
+    monkeypatch.setenv("PYONETRUE_CACHE_DIR", str(tmp_path_factory.getbasetemp() / "cache"))
@@ -0,0 +1,96 @@
+import io
+import sys
+import tarfile
+import zipfile
+
+import pytest
+
+from pyonetrue import main, FlatteningContext, ModuleInferenceError
+
+MODULES = {
+    "__init__.py": '"""The package."""\nfrom .util import helper\n',
+    "util.py": "import os\n\ndef helper():\n    return os.sep\n",
+    "extra/__init__.py": "",
+    "extra/more.py": "def more():\n    return helper()\n",
+    "__main__.py": "print(helper())\n",
+}
+
+def flatten(path, **kwargs):
+    ctx = FlatteningContext(package_path=str(path), **kwargs)
+    ctx.discover_modules()
+    return ctx, "".join(span.text for span in ctx.get_final_output_spans())
+
+def make_tree(tmp_path):
+    root = tmp_path / "tree" / "pkg"
+    for name, text in MODULES.items():
+        (root / name).parent.mkdir(parents=True, exist_ok=True)
+        (root / name).write_text(text)
+    return root
+
+def make_wheel(tmp_path):
+    path = tmp_path / "pkg-1.0-py3-none-any.whl"
+    with zipfile.ZipFile(path, "w") as archive:
+        for name, text in MODULES.items():
+            archive.writestr(f"pkg/{name}", text)
+        archive.writestr("pkg-1.0.dist-info/METADATA", "Name: pkg\n")
+        archive.writestr("tests/__init__.py", "")
+    return path
+
+def make_sdist(tmp_path):
+    path = tmp_path / "pkg-1.0.tar.gz"
+    with tarfile.open(path, "w:gz") as archive:
+        for name, text in list(MODULES.items()) + [("../setup.py", "")]:
+            data = text.encode()
+            info = tarfile.TarInfo(f"pkg-1.0/src/pkg/{name}".replace("src/pkg/../", ""))
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return path
+
+@pytest.mark.parametrize("make_archive", [make_wheel, make_sdist])
+def test_archive_flattens_as_directory(tmp_path, make_archive):
+    _, expected = flatten(make_tree(tmp_path))
+    ctx, text = flatten(make_archive(tmp_path))
+    assert ctx.package_name == "pkg"
+    assert text == expected
+    assert "print(helper())" in text
+    # The sources read from the archive stay out of the context's repr
+    assert ctx.archive_sources and "archive_sources" not in repr(ctx)
+
+def test_archive_exclude_and_module_only(tmp_path):
+    _, text = flatten(make_wheel(tmp_path), module_only=True, exclude=["extra"])
+    assert "def more" not in text and "print(helper())" not in text
+    assert "def helper" in text
+
+def test_single_module_wheel(tmp_path):
+    path = tmp_path / "tool-0.1-py3-none-any.whl"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("tool.py", "def run():\n    return 1\n")
+        archive.writestr("tool-0.1.dist-info/METADATA", "Name: tool\n")
+    ctx, text = flatten(path)
+    assert ctx.package_name == "tool"
+    assert "def run" in text
+    empty = tmp_path / "empty.zip"
+    with zipfile.ZipFile(empty, "w") as archive:
+        archive.writestr("README", "")
+    with pytest.raises(ModuleInferenceError):
+        FlatteningContext(package_path=str(empty))
+
+class Stdin:
+    def __init__(self, data):
+        self.buffer = io.BytesIO(data)
+
+@pytest.mark.parametrize("mode", ["w", "w:gz"])
+def test_input_tar_from_stdin(tmp_path, monkeypatch, capsys, mode):
+    _, expected = flatten(make_tree(tmp_path), module_only=True)
+    data = io.BytesIO()
+    with tarfile.open(fileobj=data, mode=mode) as archive:
+        for name, text in MODULES.items():
+            content = text.encode()
+            info = tarfile.TarInfo(f"./pkg/{name}")
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+    monkeypatch.setattr(sys, "stdin", Stdin(data.getvalue()))
+    monkeypatch.chdir(tmp_path)
+    assert main(["pyonetrue", "--module-only", "--input-tar", "-"]) == 0
+    assert capsys.readouterr().out == "#!/usr/bin/env python3\n" + expected
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["tree"]
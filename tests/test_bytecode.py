@@ -0,0 +1,84 @@
+import os
+import sys
+import subprocess
+import importlib.util
+import pytest
+
+from pyonetrue import main, write_pyc, write_launcher, CLIOptionError
+
+def pyc_flags(pyc):
+    with open(pyc, "rb") as f:
+        return int.from_bytes(f.read()[4:8], "little")
+
+@pytest.mark.parametrize("mode, flags", [("checked", 0b11), ("unchecked", 0b01)])
+def test_write_pyc_hash_based(tmp_path, mode, flags):
+    src = tmp_path / "flat.py"
+    src.write_text("VALUE = 1\n")
+    pyc = write_pyc(src, mode)
+    assert str(pyc) == importlib.util.cache_from_source(str(src))
+    assert pyc_flags(pyc) == flags
+
+def test_write_pyc_rejects_unknown_mode(tmp_path):
+    src = tmp_path / "flat.py"
+    src.write_text("VALUE = 1\n")
+    with pytest.raises(ValueError):
+        write_pyc(src, "timestamp")
+
+def run(script, *args):
+    return subprocess.run([sys.executable, str(script), *args],
+                          capture_output=True, text=True)
+
+def test_launcher_runs_bytecode(tmp_path):
+    src = tmp_path / "flat.py"
+    src.write_text("import sys\nprint('compiled', __file__.endswith('flat.py'), sys.argv[1:])\n")
+    pyc = write_pyc(src, "unchecked")
+    launcher = write_launcher(tmp_path / "tool", src, pyc)
+    assert os.access(launcher, os.X_OK)
+    assert run(launcher, "a").stdout == "compiled True ['a']\n"
+    # Unchecked, the source is not consulted while the pyc matches
+    src.write_text("print('source')\n")
+    assert run(launcher).stdout.startswith("compiled")
+
+def test_launcher_leaves_program_namespace_clean(tmp_path):
+    src = tmp_path / "flat.py"
+    src.write_text("import sys\n"
+                   "print(sorted(n for n in globals() if not n.startswith('__')), __name__, __doc__,\n"
+                   "      sys.modules['__main__'].__dict__ is globals())\n")
+    launcher = write_launcher(tmp_path / "tool", src, write_pyc(src, "checked"))
+    assert run(launcher).stdout == "['sys'] __main__ None True\n"
+
+def test_launcher_falls_back_to_source(tmp_path):
+    src = tmp_path / "flat.py"
+    src.write_text("print('compiled')\n")
+    pyc = write_pyc(src, "checked")
+    launcher = write_launcher(tmp_path / "tool", src, pyc)
+    # Checked, a changed source invalidates the pyc
+    src.write_text("print('source')\n")
+    assert run(launcher).stdout == "source\n"
+    # Another Python version's magic number
+    with open(pyc, "r+b") as f:
+        magic = f.read(1)
+        f.seek(0)
+        f.write(bytes([magic[0] ^ 0xff]))
+    assert run(launcher).stdout == "source\n"
+
+def test_cli_pyc_and_launcher(tmp_path):
+    src = tmp_path / "mod.py"
+    src.write_text("def x():\n    print('ran')\nif __name__ == '__main__':\n    x()\n")
+    out = tmp_path / "dist" / "mod.py"
+    out.parent.mkdir()
+    assert main(["pyonetrue", str(src), "--all-guards", "--output", str(out),
+                 "--launcher", str(tmp_path / "dist" / "mod")]) == 0
+    # Checked by default, an edited output is run from its source
+    assert pyc_flags(importlib.util.cache_from_source(str(out))) == 0b11
+    assert run(tmp_path / "dist" / "mod").stdout == "ran\n"
+    out.write_text(out.read_text().replace("'ran'", "'edited'"))
+    assert run(tmp_path / "dist" / "mod").stdout == "edited\n"
+
+def test_cli_pyc_requires_output(tmp_path):
+    src = tmp_path / "mod.py"
+    src.write_text("x = 1\n")
+    with pytest.raises(CLIOptionError):
+        main(["pyonetrue", str(src), "--pyc", "checked"])
+    with pytest.raises(CLIOptionError):
+        main(["pyonetrue", str(src), "--pyc", "always", "--output", str(tmp_path / "o.py")])
@@ -0,0 +1,38 @@
+import pytest
+
+from pyonetrue import main, CLIOptionError
+
+def make_project(tmp_path):
+    (tmp_path / "pyproject.toml").write_text('[project]\nname = "pkg"\n\n[project.scripts]\npkg = "pkg.cli:main"\n')
+    pkg = tmp_path / "src" / "my pkg"
+    pkg.mkdir(parents=True)
+    (pkg / "__init__.py").write_text("")
+    (pkg / "cli.py").write_text("def main():\n    return 0\n")
+    (pkg / "extra.py").write_text("def extra():\n    return 1\n")
+    return pkg
+
+def test_depfile_lists_the_inputs_read(tmp_path):
+    pkg = make_project(tmp_path)
+    output = tmp_path / "out.py"
+    depfile = tmp_path / "out.d"
+    assert main(["pyonetrue", "-E", "extra", "-o", str(output), "--depfile", str(depfile), str(pkg)]) == 0
+
+    rule = depfile.read_text()
+    target, _, inputs = rule.partition(": \\\n")
+    assert target == str(output)
+    inputs = [ line.strip(" \\") for line in inputs.splitlines() ]
+    escaped = str(pkg).replace(" ", "\\ ")
+    assert inputs == [f"{escaped}/__init__.py", f"{escaped}/cli.py", str((tmp_path / "pyproject.toml").resolve())]
+
+def test_depfile_lists_both_project_configs(tmp_path):
+    pkg = make_project(tmp_path)
+    (tmp_path / "setup.cfg").write_text("[metadata]\nname = pkg\n")
+    output = tmp_path / "out.py"
+    depfile = tmp_path / "out.d"
+    assert main(["pyonetrue", "-o", str(output), "--depfile", str(depfile), str(pkg)]) == 0
+    inputs = [ line.strip(" \\") for line in depfile.read_text().splitlines()[1:] ]
+    assert inputs[-2:] == [str((tmp_path / name).resolve()) for name in ("pyproject.toml", "setup.cfg")]
+
+def test_depfile_requires_output(tmp_path):
+    with pytest.raises(CLIOptionError):
+        main(["pyonetrue", "--depfile", str(tmp_path / "out.d"), str(make_project(tmp_path))])
@@ -0,0 +1,71 @@
+import io
+import sys
+import contextlib
+
+from pyonetrue import main
+
+def run_cli(args):
+    stdout = io.StringIO()
+    with contextlib.redirect_stdout(stdout):
+        code = main(argv=["pyonetrue"] + args)
+    return type("R", (), {"returncode": code, "stdout": stdout.getvalue()})
+
+def make_package(root, name="pkg"):
+    pkg = root / name
+    pkg.mkdir(parents=True)
+    (pkg / "__init__.py").write_text("")
+    (pkg / "__main__.py").write_text('print("DRIVER")\n')
+    (pkg / "cli.py").write_text('def main():\n    print("CLI")\n')
+    return pkg
+
+def test_entry_points_from_pyproject(tmp_path):
+    (tmp_path / "pyproject.toml").write_text(
+        '[project]\nname = "pkg"\n\n[project.scripts]\npkg-tool = "pkg.cli:main"\nother = "other.cli:main"\n'
+    )
+    pkg = make_package(tmp_path / "src")
+    result = run_cli(["--show-cli-args", str(pkg)])
+    assert "value='pkg.cli:main'" in result.stdout
+    assert "other.cli" not in result.stdout
+    result = run_cli([str(pkg)])
+    assert "CLI" in result.stdout
+    assert "DRIVER" not in result.stdout
+
+def test_entry_points_from_setup_cfg(tmp_path):
+    (tmp_path / "setup.cfg").write_text(
+        "[options.entry_points]\nconsole_scripts =\n    pkg-tool = pkg.cli:main\n"
+    )
+    pkg = make_package(tmp_path)
+    result = run_cli(["--show-cli-args", str(pkg)])
+    assert "value='pkg.cli:main'" in result.stdout
+
+def test_entry_points_from_setup_cfg_beside_build_only_pyproject(tmp_path):
+    (tmp_path / "pyproject.toml").write_text('[build-system]\nrequires = ["setuptools"]\n')
+    (tmp_path / "setup.cfg").write_text(
+        "[options.entry_points]\nconsole_scripts =\n    pkg-tool = pkg.cli:main\n"
+    )
+    pkg = make_package(tmp_path)
+    result = run_cli(["--show-cli-args", str(pkg)])
+    assert "value='pkg.cli:main'" in result.stdout
+
+def test_entry_points_from_installed_distributions(tmp_path, monkeypatch):
+    site = tmp_path / "site"
+    dist = site / "zzpkg-1.0.dist-info"
+    dist.mkdir(parents=True)
+    (dist / "entry_points.txt").write_text("[console_scripts]\nzz = zzpkg.cli:main\n")
+    pkg = make_package(tmp_path / "work", "zzpkg")
+    monkeypatch.setattr(sys, "path", [str(site)])
+    result = run_cli(["--show-cli-args", str(pkg)])
+    assert "value='zzpkg.cli:main'" in result.stdout
+    # The per-directory index is rebuilt when the directory changes
+    other = site / "zzpkg_extra-1.0.dist-info"
+    other.mkdir()
+    (other / "entry_points.txt").write_text("[gui_scripts]\nzz-gui = zzpkg.gui:main\n")
+    result = run_cli(["--show-cli-args", str(pkg)])
+    assert "value='zzpkg.gui:main'" in result.stdout
+
+def test_module_only_skips_entry_points(tmp_path):
+    (tmp_path / "pyproject.toml").write_text('[project.scripts]\npkg-tool = "pkg.cli:main"\n')
+    pkg = make_package(tmp_path)
+    result = run_cli(["--module-only", str(pkg)])
+    assert "CLI" in result.stdout
+    assert "DRIVER" not in result.stdout
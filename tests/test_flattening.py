@@ -1,7 +1,10 @@
+import os
+import sys
 import pytest
 from pyonetrue.vendor.pathlib import Path
 
 import textwrap
+import types
 
 from pyonetrue import (
     FlatteningContext,
@@ -14,6 +17,7 @@ from pyonetrue import (
     FlatteningError,
     ModuleInferenceError,
     PathError,
+    strip_annotations,
 )
 
 def test_flatten_context_preserves_order(tmp_path):
@@ -411,3 +415,384 @@ def test_normalize_a_module_name_invalid_type():
 def test_normalize_module_names_invalid_type():
     with pytest.raises(FlatteningError):
         normalize_module_names("mypkg", 456)  # not a string or list
+
+def test_prune_imports_drops_unreferenced(tmp_path):
+    pkg = tmp_path / "pkg"
+    write(pkg, "__init__.py", "import os\nimport json\nfrom typing import List, Dict\n")
+    write(pkg, "a.py", "import sys\ndef f(x: 'List[int]'):\n    return os.sep\n")
+    ctx = FlatteningContext(package_path=pkg, prune_imports=True)
+    ctx.discover_modules()
+    spans = ctx.get_final_output_spans()
+    text = "".join(span.text for span in spans)
+    assert "import os\n" in text
+    assert "from typing import List\n" in text
+    assert "json" not in text
+    assert "sys" not in text
+
+def test_prune_imports_keeps_all_and_star(tmp_path):
+    pkg = tmp_path / "pkg"
+    write(pkg, "__init__.py", "from os import path, sep\nfrom glob import *\n__all__ = ['path']\n")
+    ctx = FlatteningContext(package_path=pkg, prune_imports=True)
+    ctx.discover_modules()
+    text = "".join(span.text for span in ctx.get_final_output_spans())
+    assert "from glob import *\n" in text
+    assert "from os import path\n" in text
+
+def test_lazy_imports_defer_third_party_modules(tmp_path, monkeypatch):
+    site = tmp_path / "site"
+    write(site, "heavymod.py", "import os\nos.environ['HEAVYMOD_LOADED'] = '1'\nVALUE = 42\n")
+    pkg = tmp_path / "pkg"
+    write(pkg, "__init__.py", "import os\nimport heavymod\nimport heavymod as hm\n"
+                              "def value():\n    return heavymod.VALUE + hm.VALUE\n")
+    monkeypatch.syspath_prepend(str(site))
+    monkeypatch.delenv("HEAVYMOD_LOADED", raising=False)
+    monkeypatch.delitem(sys.modules, "heavymod", raising=False)
+
+    ctx = FlatteningContext(package_path=pkg, lazy_imports=True)
+    ctx.discover_modules()
+    text = "".join(span.text for span in ctx.get_final_output_spans())
+    assert "import os\n" in text
+    assert "heavymod = _pyonetrue_lazy_import('heavymod')\n" in text
+    assert "hm = _pyonetrue_lazy_import('heavymod')\n" in text
+
+    namespace = {}
+    exec(compile(text, "flat.py", "exec"), namespace)
+    assert "HEAVYMOD_LOADED" not in os.environ
+    assert namespace["value"]() == 84
+    assert os.environ["HEAVYMOD_LOADED"] == "1"
+
+def test_lazy_imports_allow_and_deny(tmp_path):
+    pkg = tmp_path / "pkg"
+    write(pkg, "__init__.py", "import numpy\nimport pandas\nimport scipy.linalg\nfrom yaml import load\n")
+    ctx = FlatteningContext(package_path=pkg, lazy_imports=True, lazy_deny="pandas")
+    ctx.discover_modules()
+    text = "".join(span.text for span in ctx.get_final_output_spans())
+    assert "numpy = _pyonetrue_lazy_import('numpy')\n" in text
+    assert "import pandas\n" in text
+    assert "import scipy.linalg\n" in text
+    assert "from yaml import load\n" in text
+    ctx = FlatteningContext(package_path=pkg, lazy_imports=True, lazy_allow=["pandas"])
+    ctx.discover_modules()
+    text = "".join(span.text for span in ctx.get_final_output_spans())
+    assert "import numpy\n" in text
+    assert "pandas = _pyonetrue_lazy_import('pandas')\n" in text
+
+def test_function_local_package_imports_are_rewritten(tmp_path):
+    pkg = tmp_path / "pkg"
+    write(pkg, "__init__.py", "")
+    write(pkg, "helpers.py", "def twice(x):\n    return 2 * x\n")
+    write(pkg, "cli.py", textwrap.dedent("""
+        def run(x):
+            from .helpers import twice
+            from pkg.helpers import twice as double
+            from . import helpers
+            import os, pkg.helpers
+            return twice(x) + double(x) + helpers.twice(x) + len(os.sep)
+    """))
+    ctx = FlatteningContext(package_path=pkg, module_only=True)
+    ctx.discover_modules()
+    text = "".join(span.text for span in ctx.get_final_output_spans())
+    assert "from .helpers" not in text
+    assert "from pkg.helpers" not in text
+    assert "import os" in text
+    namespace = {"__name__": "flat_pkg_test"}
+    sys.modules["flat_pkg_test"] = type(sys)("flat_pkg_test")
+    try:
+        exec(compile(text, "flat.py", "exec"), namespace)
+        sys.modules["flat_pkg_test"].__dict__.update(namespace)
+        assert namespace["run"](1) == 7
+    finally:
+        del sys.modules["flat_pkg_test"]
+
+def test_function_local_dotted_package_imports_are_rewritten(tmp_path):
+    pkg = tmp_path / "pkg"
+    write(pkg, "__init__.py", "")
+    write(pkg, "helpers.py", "def twice(x):\n    return 2 * x\n")
+    write(pkg, "cli.py", textwrap.dedent("""
+        def run(x):
+            import pkg.helpers
+            import pkg.helpers as h
+            module = pkg.helpers
+            return pkg.helpers.twice(x) + h.twice(x) + module.twice(x)
+    """))
+    ctx = FlatteningContext(package_path=pkg, module_only=True)
+    ctx.discover_modules()
+    text = "".join(span.text for span in ctx.get_final_output_spans())
+    assert "pkg.helpers" not in text
+    assert "return twice(x) + twice(x)" in text
+    namespace = {"__name__": "flat_pkg_dotted"}
+    sys.modules["flat_pkg_dotted"] = type(sys)("flat_pkg_dotted")
+    try:
+        exec(compile(text, "flat.py", "exec"), namespace)
+        sys.modules["flat_pkg_dotted"].__dict__.update(namespace)
+        assert namespace["run"](1) == 6
+    finally:
+        del sys.modules["flat_pkg_dotted"]
+
+def test_module_references_respect_shadowed_names(tmp_path):
+    pkg = tmp_path / "pkg"
+    write(pkg, "__init__.py", "")
+    write(pkg, "helpers.py", "def twice(x):\n    return 2 * x\n")
+    write(pkg, "cli.py", textwrap.dedent("""
+        def run(x):
+            import pkg.helpers
+            def inner(pkg):
+                return pkg.helpers.twice
+            return pkg.helpers.twice(x), inner
+
+        def other(pkg):
+            return pkg.helpers.twice
+    """))
+    ctx = FlatteningContext(package_path=pkg, module_only=True)
+    ctx.discover_modules()
+    text = "".join(span.text for span in ctx.get_final_output_spans())
+    assert "return twice(x), inner" in text
+    assert text.count("return pkg.helpers.twice\n") == 2
+    namespace = {"__name__": "flat_pkg_shadowed"}
+    sys.modules["flat_pkg_shadowed"] = type(sys)("flat_pkg_shadowed")
+    try:
+        exec(compile(text, "flat.py", "exec"), namespace)
+        sys.modules["flat_pkg_shadowed"].__dict__.update(namespace)
+        value, inner = namespace["run"](1)
+        other = types.SimpleNamespace(helpers=types.SimpleNamespace(twice="param"))
+        assert (value, inner(other), namespace["other"](other)) == (2, "param", "param")
+    finally:
+        del sys.modules["flat_pkg_shadowed"]
+
+TYPED_MODULE = textwrap.dedent('''
+    from __future__ import print_function
+    import functools
+    from dataclasses import dataclass, fields
+    from typing import TYPE_CHECKING, ClassVar, List
+    if TYPE_CHECKING:
+        from collections import OrderedDict
+    LIMIT: int = 3
+
+    @dataclass
+    class Item:
+        name: str
+        tags: List[str]
+        count: ClassVar[int] = 0
+
+    def first(items: "OrderedDict[str, Item]", *rest: int, key: str = "x") -> List[Item]:
+        return list(items)[:LIMIT]
+
+    @functools.singledispatch
+    def show(value):
+        return "value"
+
+    @show.register
+    def _(value: int):
+        return "int"
+''')
+
+@pytest.mark.parametrize("mode", ["defer", "strip"])
+def test_annotations_modes_drop_type_checking(tmp_path, mode):
+    pkg = tmp_path / "pkg"
+    write(pkg, "__init__.py", TYPED_MODULE)
+    ctx = FlatteningContext(package_path=pkg, module_only=True, annotations=mode)
+    ctx.discover_modules()
+    text = "".join(span.text for span in ctx.get_final_output_spans())
+    assert "TYPE_CHECKING" not in text
+    assert "OrderedDict" not in text.replace('"OrderedDict[str, Item]"', "")
+    assert ("from __future__ import annotations\n" in text) == (mode == "defer")
+    if mode == "strip":
+        assert "def first(items, *rest, key = \"x\"):" in text
+        assert "LIMIT = 3\n" in text
+    # Runtime consumers of annotations are unaffected
+    # dataclasses resolve deferred annotations through sys.modules
+    module = sys.modules["flat_typed"] = type(sys)("flat_typed")
+    namespace = module.__dict__
+    try:
+        exec(compile(text, "flat.py", "exec"), namespace)
+        assert [ f.name for f in namespace["fields"](namespace["Item"]) ] == ["name", "tags"]
+        assert namespace["show"](1) == "int"
+        assert namespace["first"]({"a": 1}) == ["a"]
+    finally:
+        del sys.modules["flat_typed"]
+
+def test_strip_annotations_keeps_methods():
+    text = textwrap.dedent("""
+        class Model:
+            def __init__(self, name: str) -> None:
+                self.name = name
+        if True:
+            def g(a: int) -> int:
+                return a
+    """)
+    stripped = strip_annotations(text)
+    assert "def __init__(self, name: str) -> None:" in stripped
+    assert "def g(a):" in stripped
+    namespace = {}
+    exec(compile(stripped, "flat.py", "exec"), namespace)
+    assert namespace["Model"].__init__.__annotations__ == {"name": str, "return": None}
+
+def test_strip_annotations_keeps_functions_used_as_values(tmp_path):
+    pkg = tmp_path / "pkg"
+    write(pkg, "__init__.py", "from .cli import main, run\n")
+    write(pkg, "cli.py", textwrap.dedent("""
+        import typing
+
+        def helper(count: int) -> int:
+            return count
+
+        def main(name: str, count: int = 1) -> str:
+            return name * helper(count)
+
+        def run():
+            return typing.get_type_hints(main)
+    """))
+    ctx = FlatteningContext(package_path=pkg, module_only=True, annotations="strip")
+    ctx.discover_modules()
+    text = "".join(span.text for span in ctx.get_final_output_spans())
+    assert "def helper(count):" in text
+    assert "def main(name: str, count: int = 1) -> str:" in text
+    namespace = {}
+    exec(compile(text, "flat.py", "exec"), namespace)
+    assert namespace["run"]() == {"name": str, "count": int, "return": str}
+
+def test_annotations_keep_by_default(tmp_path):
+    pkg = tmp_path / "pkg"
+    write(pkg, "__init__.py", TYPED_MODULE)
+    ctx = FlatteningContext(package_path=pkg, module_only=True)
+    ctx.discover_modules()
+    text = "".join(span.text for span in ctx.get_final_output_spans())
+    assert "if TYPE_CHECKING:" in text
+    with pytest.raises(FlatteningError):
+        FlatteningContext(package_path=pkg, annotations="erase")
+
+def test_dedupe_logic_drops_idempotent_repeats(tmp_path):
+    pkg = tmp_path / "pkg"
+    fallback = "try:\n    import json\nexcept ImportError:\n    json = None\n"
+    write(pkg, "__init__.py", "BASE = [1]\n")
+    write(pkg, "a.py", fallback + "MODE = 'fast'\nREGISTRY = {}\nSIZE = 4 * 1024\nITEMS = BASE + BASE\n")
+    write(pkg, "b.py", "MODE = 'slow'\n")
+    write(pkg, "c.py", fallback + "MODE = 'fast'\nREGISTRY = {}\nSIZE = 4 * 1024\nITEMS = BASE + BASE\n")
+    ctx = FlatteningContext(package_path=pkg, module_only=True, ignore_clashes=True, dedupe_logic=True)
+    ctx.discover_modules()
+    text = "".join(span.text for span in ctx.get_final_output_spans())
+    assert text.count(fallback) == 1
+    # b.py rebinds MODE in between, c.py's assignment still matters
+    assert text.count("MODE = 'fast'\n") == 2
+    # A new dict each time, never collapsed
+    assert text.count("REGISTRY = {}\n") == 2
+    # An operator on constants is a constant, on names it may build a new object
+    assert text.count("SIZE = 4 * 1024\n") == 1
+    assert text.count("ITEMS = BASE + BASE\n") == 2
+    namespace = {}
+    exec(compile(text, "flat.py", "exec"), namespace)
+    assert namespace["MODE"] == "fast"
+
+def test_dedupe_logic_keeps_repeated_attribute_assignments(tmp_path):
+    pkg = tmp_path / "pkg"
+    write(pkg, "__init__.py", "")
+    write(pkg, "_cfg.py", "class Config:\n    debug = None\n\nconfig = Config()\n")
+    write(pkg, "a.py", "config.debug = False\n")
+    write(pkg, "b.py", "config.debug = True\n")
+    write(pkg, "c.py", "config.debug = False\n")
+    ctx = FlatteningContext(package_path=pkg, module_only=True, dedupe_logic=True)
+    ctx.discover_modules()
+    text = "".join(span.text for span in ctx.get_final_output_spans())
+    assert text.count("config.debug = False\n") == 2
+    namespace = {}
+    exec(compile(text, "flat.py", "exec"), namespace)
+    assert namespace["config"].debug is False
+
+def test_lazy_sections_run_module_logic_on_first_use(tmp_path):
+    pkg = tmp_path / "pkg"
+    write(pkg, "__init__.py", "import sys\n")
+    write(pkg, "table.py", textwrap.dedent('''\
+        import os
+
+        def build(n):
+            sys.modules[__name__].builds += 1
+            return list(range(n))
+
+        builds = 0
+        TABLE = build(3)
+        SQUARES = sorted([4, 0, 1])
+        SIZE = len(SQUARES)
+        sys.modules[__name__].loaded = True
+    '''))
+    write(pkg, "use.py", "SEP = os.sep\n\ndef table_size():\n    return builds\n")
+    ctx = FlatteningContext(package_path=pkg, module_only=True, lazy_sections=True)
+    ctx.discover_modules()
+    text = "".join(span.text for span in ctx.get_final_output_spans())
+    refused = { span.text.strip(): reason for _, span, reason in ctx.lazy_refusals }
+    assert "builds read by eager code" in refused["builds = 0"]
+    assert "call to build() may have side effects" in refused["TABLE = build(3)"]
+    assert "side effects" in refused["sys.modules[__name__].loaded = True"]
+
+    module = sys.modules["flat_lazy"] = type(sys)("flat_lazy")
+    try:
+        exec(compile(text, "flat.py", "exec"), module.__dict__)
+        # A call stays eager, where it ran before flattening
+        assert module.loaded and module.builds == 1 and module.TABLE == [0, 1, 2]
+        assert "SQUARES" not in module.__dict__ and "SEP" not in module.__dict__
+        assert module.SIZE == 3 and module.SQUARES == [0, 1, 4]
+        assert module.SEP == os.sep
+        with pytest.raises(AttributeError):
+            module.MISSING
+    finally:
+        del sys.modules["flat_lazy"]
+
+def make_inline_dep(tmp_path, monkeypatch):
+    site = tmp_path / "site"
+    write(site / "minidep", "__init__.py", '"""Mini dependency."""\n__version__ = "1.0"\n__all__ = ["greet"]\nfrom .words import HELLO\n\ndef greet(name):\n    return f"{HELLO}, {name}"\n')
+    write(site / "minidep", "words.py", "HELLO = 'hello'\n")
+    monkeypatch.syspath_prepend(str(site))
+    return site
+
+def test_inline_deps_flattens_installed_package(tmp_path, monkeypatch):
+    make_inline_dep(tmp_path, monkeypatch)
+    pkg = tmp_path / "pkg"
+    write(pkg, "__init__.py", '"""The package."""\nfrom minidep import greet\n\nGREETING = greet("world")\n')
+    write(pkg, "cli.py", "def main():\n    import minidep.words\n    return minidep.words.HELLO\n")
+    ctx = FlatteningContext(package_path=pkg, module_only=True, inline_deps="minidep")
+    ctx.discover_modules()
+    text = "".join(span.text for span in ctx.get_final_output_spans())
+    assert text.startswith('"""The package."""')
+    assert "import minidep" not in text and "from .words" not in text
+    assert "__version__" not in text and "__all__" not in text
+    namespace = {}
+    exec(compile(text, "flat.py", "exec"), namespace)
+    assert namespace["GREETING"] == "hello, world"
+
+def test_inline_deps_plain_import_references(tmp_path, monkeypatch):
+    site = make_inline_dep(tmp_path, monkeypatch)
+    write(site / "tool", "__init__.py", "def tool(name):\n    return name.upper()\n")
+    pkg = tmp_path / "pkg"
+    write(pkg, "__init__.py", "import minidep\nimport minidep.words\nimport tool\n\n"
+                              "def main():\n    return tool.tool(minidep.greet('x')) + minidep.words.HELLO\n")
+    ctx = FlatteningContext(package_path=pkg, module_only=True, inline_deps="minidep,tool")
+    ctx.discover_modules()
+    text = "".join(span.text for span in ctx.get_final_output_spans())
+    assert "import minidep" not in text and "import tool" not in text
+    namespace = {}
+    exec(compile(text, "flat.py", "exec"), namespace)
+    assert namespace["main"]() == "HELLO, Xhello"
+
+def test_inline_deps_references_respect_shadowed_names(tmp_path, monkeypatch):
+    make_inline_dep(tmp_path, monkeypatch)
+    pkg = tmp_path / "pkg"
+    write(pkg, "__init__.py", "import minidep\n\n"
+                              "def main(minidep=None):\n    return minidep.greet('x')\n\n"
+                              "def hello():\n    return [ minidep.greet(minidep) for minidep in 'ab' ]\n")
+    ctx = FlatteningContext(package_path=pkg, module_only=True, inline_deps="minidep")
+    ctx.discover_modules()
+    text = "".join(span.text for span in ctx.get_final_output_spans())
+    assert "return minidep.greet('x')" in text and "minidep.greet(minidep) for" in text
+    namespace = {}
+    exec(compile(text, "flat.py", "exec"), namespace)
+    assert namespace["main"](types.SimpleNamespace(greet=str.upper)) == "X"
+
+def test_inline_deps_detects_clashes(tmp_path, monkeypatch):
+    make_inline_dep(tmp_path, monkeypatch)
+    pkg = tmp_path / "pkg"
+    write(pkg, "__init__.py", "import minidep\n\nHELLO = 'hi'\n")
+    ctx = FlatteningContext(package_path=pkg, module_only=True, inline_deps=["minidep"])
+    ctx.discover_modules()
+    with pytest.raises(DuplicateNameError):
+        ctx.get_final_output_spans()
+    with pytest.raises(ModuleInferenceError):
+        FlatteningContext(package_path=pkg, inline_deps=["no_such_dep"]).discover_modules()
@@ -0,0 +1,59 @@
+import contextlib
+import io
+
+from pyonetrue import main
+
+def build(tmp_path):
+    pkg = tmp_path / "pkg"
+    pkg.mkdir()
+    (pkg / "__init__.py").write_text("from .util import helper\n")
+    (pkg / "util.py").write_text("def helper():\n    return 1\n")
+    output = tmp_path / "dist" / "out.py"
+    output.parent.mkdir()
+    assert main(["pyonetrue", "-M", "-o", str(output), str(pkg)]) == 0
+    return pkg, output
+
+def is_fresh(output, *options):
+    stderr = io.StringIO()
+    with contextlib.redirect_stderr(stderr):
+        code = main(["pyonetrue", *options, "--is-fresh", str(output)])
+    return code, stderr.getvalue()
+
+def test_header_records_inputs(tmp_path):
+    pkg, output = build(tmp_path)
+    text = output.read_text()
+    assert text.startswith("#!/usr/bin/env python3\n# pyonetrue ")
+    assert "# pyonetrue input " in text and " ../pkg/util.py\n" in text
+    assert "# pyonetrue tree " in text
+    assert is_fresh(output, "-M") == (0, "")
+
+def test_is_fresh_detects_changes(tmp_path):
+    pkg, output = build(tmp_path)
+    (pkg / "util.py").write_text("def helper():\n    return 2\n")
+    code, stderr = is_fresh(output, "-M")
+    assert code == 1 and "../pkg/util.py changed" in stderr
+
+    (pkg / "util.py").write_text("def helper():\n    return 1\n")
+    assert is_fresh(output, "-M")[0] == 0
+    (pkg / "more.py").write_text("")
+    code, stderr = is_fresh(output, "-M")
+    assert code == 1 and "added to or removed from" in stderr
+
+    (pkg / "more.py").unlink()
+    output.write_text(output.read_text() + "# edited\n")
+    code, stderr = is_fresh(output, "-M")
+    assert code == 1 and "modified" in stderr
+
+def test_is_fresh_detects_other_options(tmp_path):
+    pkg, output = build(tmp_path)
+    code, stderr = is_fresh(output, "-M", "--minify")
+    assert code == 1 and "built with other options" in stderr
+    assert is_fresh(output)[0] == 1
+    # Options which leave the output as it is are not compared
+    assert is_fresh(output, "-M", "-j", "2", "--remote-cache", "http://127.0.0.1:9/")[0] == 0
+
+def test_is_fresh_without_header(tmp_path):
+    plain = tmp_path / "plain.py"
+    plain.write_text("x = 1\n")
+    code, stderr = is_fresh(plain)
+    assert code == 1 and "no pyonetrue freshness header" in stderr
@@ -0,0 +1,68 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from pyonetrue import FlatteningContext, PathError, blob_spans, git_tracked_files
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="requires git")
+
+MODULES = {
+    "__init__.py": '"""The package."""\nfrom .util import helper\n',
+    "util.py": "import os\n\ndef helper():\n    return os.sep\n",
+    "extra/__init__.py": "",
+    "extra/more.py": "def more():\n    return helper()\n",
+    "__main__.py": "print(helper())\n",
+}
+
+def flatten(path, **kwargs):
+    ctx = FlatteningContext(package_path=str(path), **kwargs)
+    ctx.discover_modules()
+    return "".join(span.text for span in ctx.get_final_output_spans())
+
+def git(repo, *args):
+    env = dict(os.environ, GIT_AUTHOR_NAME="t", GIT_AUTHOR_EMAIL="t@t",
+               GIT_COMMITTER_NAME="t", GIT_COMMITTER_EMAIL="t@t")
+    subprocess.run(["git", "-C", str(repo), *args], check=True, env=env, capture_output=True)
+
+def make_repo(tmp_path):
+    repo = tmp_path / "repo"
+    root = repo / "src" / "pkg"
+    for name, text in MODULES.items():
+        (root / name).parent.mkdir(parents=True, exist_ok=True)
+        (root / name).write_text(text)
+    git(repo, "init", "-q")
+    git(repo, "add", ".")
+    git(repo, "commit", "-q", "-m", "init")
+    return root
+
+def test_git_discovery_matches_directory_walk(tmp_path):
+    root = make_repo(tmp_path)
+    expected = flatten(root)
+    assert flatten(root, git=True) == expected
+    assert flatten(root, git=True, module_only=True, exclude=["extra"]) == \
+        flatten(root, module_only=True, exclude=["extra"])
+
+    # Untracked files, e.g. build outputs, are not discovered
+    (root / "build").mkdir()
+    (root / "build" / "junk.py").write_text("def junk(): pass\n")
+    assert flatten(root, git=True) == expected
+
+def test_git_discovery_caches_spans_by_blob(tmp_path):
+    root = make_repo(tmp_path)
+    expected = flatten(root, git=True)
+    blob = git_tracked_files(root)["util.py"]
+    assert blob_spans(blob, root / "missing.py")[-1].text.startswith("def helper")
+    assert flatten(root, git=True) == expected
+
+    # A modified file is read from the work tree, not the cache
+    (root / "util.py").write_text("import os\n\ndef helper():\n    return os.pathsep\n")
+    assert "os.pathsep" in flatten(root, git=True)
+
+def test_git_discovery_requires_a_repository(tmp_path):
+    root = tmp_path / "pkg"
+    root.mkdir()
+    (root / "__init__.py").write_text("")
+    with pytest.raises(PathError):
+        flatten(root, git=True)
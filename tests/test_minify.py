@@ -0,0 +1,66 @@
+import ast
+import sys
+import textwrap
+import types
+import pytest
+
+from pyonetrue import FlatteningContext, Span, minify_source, normalize_imports, main, CLIOptionError
+from pyonetrue import strip_docstrings_and_asserts
+
+from pyonetrue.vendor.pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / "src" / "pyonetrue"
+
+def test_minify_strips_docstrings_comments_blanks_and_asserts():
+    text = textwrap.dedent('''\
+        """Module doc."""
+        import os  # needed
+
+        class A:
+            """Class doc."""
+
+        def f(x):
+            """Function doc."""
+            assert x, "x"
+            if x:
+                # comment
+                return """line one
+
+            line three"""
+    ''')
+    assert minify_source(text) == (
+        'import os\n'
+        'class A:\n'
+        ' pass\n'
+        'def f(x):\n'
+        ' if x:\n'
+        "  return 'line one\\n\\n    line three'\n"
+    )
+    assert minify_source(text, keep_docstring=True).startswith('"""Module doc."""\nimport os\n')
+
+def test_minify_preserves_flattened_package():
+    ctx = FlatteningContext(package_path=SRC, module_only=True)
+    ctx.discover_modules()
+    text = "".join(span.text for span in ctx.get_final_output_spans())
+    minified = minify_source(text)
+    assert len(minified) < len(text) * 0.8
+    # Formatting is lossless, only docstrings and asserts are gone
+    tree = ast.parse(text)
+    strip_docstrings_and_asserts(tree)
+    assert ast.dump(ast.parse(minified)) == ast.dump(tree)
+    # and the result still works
+    flat = types.ModuleType("flat_minified")
+    sys.modules[flat.__name__] = flat
+    try:
+        exec(compile(minified, "flat_minified.py", "exec"), flat.__dict__)
+        spans = [ Span("import sys\n", "import"), Span("from os import sep, path\n", "import") ]
+        assert ([ s.text for s in flat.normalize_imports("p", spans)[0] ]
+                == [ s.text for s in normalize_imports("p", spans)[0] ])
+    finally:
+        del sys.modules[flat.__name__]
+
+def test_cli_keep_docstring_requires_minify(tmp_path):
+    src = tmp_path / "mod.py"
+    src.write_text('"""Doc."""\nx = 1\n')
+    with pytest.raises(CLIOptionError):
+        main(["pyonetrue", str(src), "--keep-docstring"])
@@ -164,3 +164,10 @@ def test_preserve_from_import_alias_format():
     normalized, _ = normalize_imports("mypkg", spans)
     assert any(span.text.startswith("from os import path as p") for span in normalized)
 
+
+def test_used_names_prunes_imports():
+    spans = [imp("import os.path"), imp("import json as j"), imp("from sys import argv, path")]
+    normalized, names = normalize_imports("pkg", spans, used_names={"os", "argv"})
+    text = "".join(s.text for s in normalized)
+    assert text == "import os.path\nfrom sys import argv\n\n"
+    assert names == ["os.path", "argv"]
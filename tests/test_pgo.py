@@ -0,0 +1,75 @@
+import io
+import json
+import contextlib
+
+from pyonetrue import main, FlatteningContext, load_profile
+
+TOOL = '''\
+import sys
+
+def helper():
+    return 1
+
+def unused():
+    import slowdep
+    return slowdep
+
+def setup():
+    return helper()
+
+CONFIG = setup()
+
+class Command:
+    def run(self):
+        return helper()
+
+def main(argv):
+    return Command().run() + len(argv)
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
+'''
+
+def record(tmp_path, *argv):
+    artifact = tmp_path / "tool.py"
+    artifact.write_text(TOOL)
+    profile = tmp_path / "profile.json"
+    stderr = io.StringIO()
+    with contextlib.redirect_stderr(stderr):
+        code = main(["pyonetrue", "pgo", "record", "-o", str(profile), str(artifact), "--", *argv])
+    assert code == 0
+    return profile, stderr.getvalue()
+
+def test_pgo_record_orders_spans_by_first_run(tmp_path):
+    profile, stderr = record(tmp_path, "a", "b")
+    data = load_profile(profile)
+    assert data["returncode"] == 3
+    phases = { entry["key"]: entry["phase"] for entry in data["spans"] }
+    keys = [ entry["key"] for entry in data["spans"] ]
+    assert keys.index("function:setup") < keys.index("function:helper") < keys.index("function:main")
+    assert phases["function:setup"] == phases["logic:CONFIG"] == phases["class:Command"] == "startup"
+    assert phases["function:main"] == "run"
+    assert data["cold"] == ["function:unused"]
+    assert "5 of 6 spans ran, 4 at startup" in stderr
+
+def test_pgo_build_puts_hot_functions_first(tmp_path):
+    profile, _ = record(tmp_path)
+    pkg = tmp_path / "tool"
+    pkg.mkdir()
+    (pkg / "__init__.py").write_text("import slowdep\nimport json\n")
+    (pkg / "funcs.py").write_text(
+        "def unused():\n    return slowdep\n\n"
+        "def main(argv):\n    return helper() + len(json.dumps(argv))\n\n"
+        "def renamed():\n    pass\n\n"
+        "def helper(f=unused):\n    return 1\n")
+    ctx = FlatteningContext(package_path=pkg, module_only=True, pgo=str(profile))
+    ctx.discover_modules()
+    text = "".join(span.text for span in ctx.get_final_output_spans())
+    assert text.index("def main") < text.index("def unused") < text.index("def renamed")
+    # helper's default reads unused, so it may not move ahead of it
+    assert text.index("def renamed") < text.index("def helper")
+    assert "slowdep = _pyonetrue_lazy_import('slowdep')" in text
+    assert "import json\n" in text
+    assert ctx.pgo_report[0] == "2 of 4 function spans ran, 1 at startup"
+    assert ctx.pgo_report[1] == "3 profiled spans not found: class:Command, function:setup, logic:CONFIG"
+    assert any(line.startswith("bound lazily") and "slowdep" in line for line in ctx.pgo_report)
@@ -0,0 +1,61 @@
+import contextlib
+import io
+
+import pytest
+
+from pyonetrue import FlatteningError, main, prefetch_files
+
+def test_prefetch_files_in_order_with_missing(tmp_path):
+    paths = []
+    for i in range(40):
+        path = tmp_path / f"m{i:02}.py"
+        if i != 7:
+            path.write_bytes(b"x = %d\r\n" % i)
+        paths.append(path)
+    results = list(prefetch_files(paths, threads=4, depth=3))
+    assert [ path for path, _ in results ] == paths
+    assert results[7][1] is None
+    assert results[8][1] == b"x = 8\r\n"
+
+def test_prefetch_bounds_read_ahead(tmp_path):
+    paths = []
+    for i in range(20):
+        path = tmp_path / f"m{i:02}.py"
+        path.write_text("x = 1\n")
+        paths.append(path)
+    reads = prefetch_files(paths, threads=2, depth=4)
+    next(reads)
+    # Only the next 4 files are read ahead, the others are read when reached
+    for path in paths[5:]:
+        path.unlink()
+    contents = [ data for _, data in reads ]
+    assert contents[:4] == [ b"x = 1\n" ] * 4
+    assert contents[4:] == [ None ] * 15
+
+def flatten(pkg, *options):
+    with contextlib.redirect_stdout(io.StringIO()) as stdout, contextlib.redirect_stderr(io.StringIO()):
+        assert main(["pyonetrue", "-M", *options, str(pkg)]) == 0
+    return stdout.getvalue()
+
+def test_read_ahead_output_matches_unbuffered(tmp_path):
+    pkg = tmp_path / "pkg"
+    pkg.mkdir()
+    (pkg / "__init__.py").write_text("from .a import f\n")
+    (pkg / "a.py").write_bytes(b"def f():\r\n    return 'caf\xc3\xa9'\r\n")
+    (pkg / "bom.py").write_bytes(b"\xef\xbb\xbfdef h():\n    return 'caf\xc3\xa9'\n")
+    (pkg / "latin.py").write_bytes(b"# -*- coding: latin-1 -*-\ndef k():\n    return 'caf\xe9'\n")
+    for i in range(10):
+        (pkg / f"m{i}.py").write_text(f"def g{i}():\n    return {i}\n")
+    unbuffered = flatten(pkg, "--read-threads", "1")
+    assert "return 'caf\u00e9'" in unbuffered and "\ufeff" not in unbuffered
+    assert flatten(pkg, "--read-threads", "8") == unbuffered
+    assert flatten(pkg, "--jobs", "2") == unbuffered
+
+def test_read_ahead_reports_syntax_errors(tmp_path):
+    pkg = tmp_path / "pkg"
+    pkg.mkdir()
+    (pkg / "__init__.py").write_text("x = 1\n")
+    (pkg / "bad.py").write_text("def broken(:\n")
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        with pytest.raises(FlatteningError, match="bad.py"):
+            main(["pyonetrue", "-M", str(pkg)])
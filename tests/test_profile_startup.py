@@ -0,0 +1,55 @@
+import io
+import json
+import contextlib
+
+from pyonetrue import main
+
+def run_profile(args):
+    stdout = io.StringIO()
+    with contextlib.redirect_stdout(stdout):
+        code = main(argv=["pyonetrue", "profile-startup"] + args)
+    return code, stdout.getvalue()
+
+def make_artifact(tmp_path):
+    site = tmp_path / "site"
+    site.mkdir()
+    (site / "slowdep.py").write_text("import time\nVALUE = sum(range(100000))\n")
+    artifact = tmp_path / "tool.py"
+    artifact.write_text(
+        "import sys\n"
+        f"sys.path.insert(0, {str(site)!r})\n"
+        "import slowdep\n"
+        "import json\n"
+        "if __name__ == '__main__':\n"
+        "    sys.exit(len(sys.argv) - 1)\n"
+    )
+    pkg = tmp_path / "tool"
+    pkg.mkdir()
+    (pkg / "__init__.py").write_text("import json\n")
+    (pkg / "deps.py").write_text("import slowdep\n")
+    return artifact, pkg
+
+def test_profile_startup_attributes_imports(tmp_path, monkeypatch):
+    monkeypatch.setenv("PYONETRUE_CACHE_DIR", str(tmp_path / "cache"))
+    artifact, pkg = make_artifact(tmp_path)
+    code, out = run_profile(["--json", "--source", str(pkg), str(artifact), "--", "a", "b"])
+    assert code == 0
+    report = json.loads(out)
+    assert report["returncode"] == 2
+    rows = { row["module"]: row for row in report["imports"] }
+    assert rows["slowdep"]["line"] == 3
+    assert rows["slowdep"]["sources"] == ["tool.deps"]
+    assert rows["slowdep"]["cumulative_us"] >= rows["slowdep"]["self_us"] > 0
+    assert "time" not in rows  # nested below slowdep
+    costs = [ row["cumulative_us"] for row in report["imports"] ]
+    assert costs == sorted(costs, reverse=True)
+
+def test_profile_startup_is_cached(tmp_path, monkeypatch):
+    monkeypatch.setenv("PYONETRUE_CACHE_DIR", str(tmp_path / "cache"))
+    artifact, _ = make_artifact(tmp_path)
+    code, first = run_profile([str(artifact)])
+    assert code == 0
+    assert "slowdep" in first
+    assert len(list((tmp_path / "cache" / "importtime").glob("*.json"))) == 1
+    code, second = run_profile([str(artifact)])
+    assert second == first
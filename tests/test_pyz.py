@@ -0,0 +1,54 @@
+import sys
+import zipfile
+import subprocess
+import importlib.util
+import pytest
+
+from pyonetrue import main, CLIOptionError
+
+def write(pkg, relpath, content):
+    path = pkg / relpath
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+
+def run(pyz, *args):
+    return subprocess.run([sys.executable, str(pyz), *args], capture_output=True, text=True)
+
+@pytest.fixture
+def pkg(tmp_path):
+    pkg = tmp_path / "tool"
+    write(pkg, "__init__.py", "")
+    write(pkg, "cli.py", "import sys\ndef main():\n    print('cli', sys.argv[1:])\n    return 3\n")
+    write(pkg, "__main__.py", "from .cli import main\nif __name__ == '__main__':\n    print('as script')\n")
+    return pkg
+
+def test_pyz_calls_entry_function(tmp_path, pkg):
+    out = tmp_path / "tool.pyz"
+    assert main(["pyonetrue", str(pkg), "--entry", "tool.cli:main", "--format", "pyz",
+                 "--shebang", "#!/usr/bin/python3", "--output", str(out)]) == 0
+    with open(out, "rb") as f:
+        assert f.readline() == b"#!/usr/bin/python3\n"
+    with zipfile.ZipFile(out) as archive:
+        assert sorted(archive.namelist()) == ["__main__.py", "tool.py", "tool.pyc"]
+        assert archive.read("tool.pyc")[:4] == importlib.util.MAGIC_NUMBER
+        assert archive.getinfo("tool.py").compress_type == zipfile.ZIP_DEFLATED
+    result = run(out, "x")
+    assert result.stdout == "cli ['x']\n"
+    assert result.returncode == 3
+
+def test_pyz_runs_package_main_as_script(tmp_path, pkg):
+    out = tmp_path / "tool.pyz"
+    assert main(["pyonetrue", str(pkg), "--format", "pyz", "--compression", "stored",
+                 "--output", str(out)]) == 0
+    with zipfile.ZipFile(out) as archive:
+        assert archive.getinfo("tool.pyc").compress_type == zipfile.ZIP_STORED
+    assert run(out).stdout == "as script\n"
+
+def test_pyz_options_are_validated(tmp_path, pkg):
+    with pytest.raises(CLIOptionError):
+        main(["pyonetrue", str(pkg), "--format", "pyz"])
+    with pytest.raises(CLIOptionError):
+        main(["pyonetrue", str(pkg), "--format", "zip", "--output", str(tmp_path / "x")])
+    with pytest.raises(CLIOptionError):
+        main(["pyonetrue", str(pkg), "--format", "pyz", "--compression", "lzma",
+              "--output", str(tmp_path / "x")])
@@ -0,0 +1,60 @@
+import contextlib
+import io
+import threading
+
+import pytest
+
+from pyonetrue import main, remote_get, remote_put, serve_remote_cache
+
+@pytest.fixture
+def server(tmp_path):
+    server = serve_remote_cache(tmp_path / "remote")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address[:2]
+    with contextlib.redirect_stderr(io.StringIO()):
+        yield f"http://{host}:{port}"
+    server.shutdown()
+    server.server_close()
+
+def flatten(tmp_path, *options):
+    pkg = tmp_path / "pkg"
+    if not pkg.exists():
+        pkg.mkdir()
+        (pkg / "__init__.py").write_text("from .util import helper\n")
+        (pkg / "util.py").write_text("def helper():\n    return 1\n")
+    output = tmp_path / "out.py"
+    stderr = io.StringIO()
+    with contextlib.redirect_stderr(stderr):
+        assert main(["pyonetrue", "-M", "-o", str(output), *options, str(pkg)]) == 0
+    return output.read_text(), stderr.getvalue()
+
+def test_remote_cache_protocol(server):
+    key = "0123456789abcdef" * 4
+    assert remote_get(server, "spans", key) is None
+    assert remote_put(server, "spans", key, b'{"a": 1}')
+    assert remote_get(server, "spans", key) == b'{"a": 1}'
+    assert not remote_put(server, "spans", "not-a-key", b"{}")
+
+def test_remote_cache_shares_output_between_runners(tmp_path, monkeypatch, server):
+    monkeypatch.setenv("PYONETRUE_CACHE_DIR", str(tmp_path / "cache"))
+    text, stderr = flatten(tmp_path, "--remote-cache", server)
+    assert "def helper" in text and "reused" not in stderr
+
+    # A fresh runner, its local cache is empty
+    monkeypatch.setenv("PYONETRUE_CACHE_DIR", str(tmp_path / "fresh"))
+    again, stderr = flatten(tmp_path, "--remote-cache", server)
+    assert again == text and "output reused from the cache" in stderr
+    assert list((tmp_path / "remote" / "output").iterdir())
+
+    # Changing a source changes the key
+    (tmp_path / "pkg" / "util.py").write_text("def helper():\n    return 2\n")
+    changed, stderr = flatten(tmp_path, "--remote-cache", server)
+    assert "return 2" in changed and "reused" not in stderr
+
+def test_remote_cache_unreachable_builds_locally(tmp_path, monkeypatch):
+    monkeypatch.setenv("PYONETRUE_CACHE_DIR", str(tmp_path / "cache"))
+    # Unreachable servers are remembered for the run, use a fresh URL
+    text, stderr = flatten(tmp_path, "--remote-cache", f"http://127.0.0.1:9/{tmp_path.parent.name}")
+    assert "def helper" in text
+    assert "unreachable, computing locally" in stderr
@@ -0,0 +1,91 @@
+import contextlib
+import io
+
+from pyonetrue import main, canonical_text, reorder_files
+
+SCRIPT = '''\
+#!/usr/bin/env python3
+# Copyright header
+"""A script."""
+import sys
+import os
+
+def main():
+    return helper()
+
+def helper():
+    return len(os.sep)
+
+if __name__ == "__main__":
+    sys.exit(main())
+'''
+
+def run(*argv):
+    stderr = io.StringIO()
+    with contextlib.redirect_stderr(stderr):
+        code = main(["pyonetrue", *argv])
+    return code, stderr.getvalue()
+
+def test_in_place_then_check(tmp_path):
+    paths = []
+    for index in range(4):
+        path = tmp_path / f"script{index}.py"
+        path.write_text(SCRIPT)
+        paths.append(str(path))
+
+    code, stderr = run("--check", *paths)
+    assert code == 1 and stderr.count("would reorder") == 4
+    assert (tmp_path / "script0.py").read_text() == SCRIPT
+
+    code, stderr = run("--in-place", "-j", "2", *paths)
+    assert code == 0 and "4 reordered" in stderr
+    text = (tmp_path / "script0.py").read_text()
+    assert text.startswith("#!/usr/bin/env python3\n# Copyright header\n\n\"\"\"A script.\"\"\"\n")
+    assert text.index("import os") < text.index("import sys") < text.index("def main")
+    assert "sys.exit(main())" in text
+    assert canonical_text(tmp_path / "script0.py", {}) == text
+
+    # Unchanged canonical files are skipped without parsing
+    code, stderr = run("--check", *paths)
+    assert code == 0 and "4 cached" in stderr
+
+def test_check_without_cache_and_errors(tmp_path):
+    good = tmp_path / "good.py"
+    good.write_text(canonical_text_of(tmp_path, SCRIPT))
+    commented = tmp_path / "commented.py"
+    commented.write_text("import os\n\n# explains X\nX = os.sep\n")
+    broken = tmp_path / "broken.py"
+    broken.write_text("x = (\n")
+
+    results = { status for _, status, _ in reorder_files([str(good)], {}, write=False, jobs=1) }
+    assert results <= { "unchanged", "cached" }
+    results = reorder_files([str(commented), str(broken)], {}, write=True, jobs=1)
+    assert [ status for _, status, _ in results ] == ["error", "error"]
+    assert "# explains X" in results[0][2]
+    assert commented.read_text() == "import os\n\n# explains X\nX = os.sep\n"
+
+def canonical_text_of(tmp_path, source):
+    path = tmp_path / "source.py"
+    path.write_text(source)
+    return canonical_text(path, {})
+
+def test_in_place_keeps_relative_imports(tmp_path, monkeypatch):
+    pkg = tmp_path / "relpkg"
+    pkg.mkdir()
+    (pkg / "__init__.py").write_text("")
+    (pkg / "util.py").write_text("def helper():\n    return 1\n")
+    (pkg / "sub").mkdir()
+    (pkg / "sub" / "__init__.py").write_text("")
+    mod = pkg / "sub" / "mod.py"
+    mod.write_text("def run():\n    from .. import util\n    return helper() + util.helper()\n\n"
+                   "from ..util import helper\nimport os\n")
+
+    code, stderr = run("--in-place", str(mod))
+    assert code == 0 and "1 reordered" in stderr
+    text = mod.read_text()
+    assert "from ..util import helper\n" in text and "    from .. import util\n" in text
+    assert text.index("import os") < text.index("from ..util") < text.index("def run")
+
+    monkeypatch.syspath_prepend(str(tmp_path))
+    import relpkg.sub.mod
+    assert relpkg.sub.mod.run() == 2
@@ -0,0 +1,45 @@
+import contextlib
+import io
+
+from pyonetrue import main, plan_batches, schedule_tasks
+
+def test_plan_batches_largest_first_small_files_grouped():
+    sizes = { "small%d.py" % i: 1000 for i in range(300) }
+    sizes["huge.py"] = 5_000_000
+    sizes["big.py"] = 100_000
+    batches = plan_batches(sizes)
+    assert batches[0] == ["huge.py"] and batches[1] == ["big.py"]
+    small = batches[2:]
+    assert 1 < len(small) < 300
+    assert sorted(path for batch in small for path in batch) == sorted(set(sizes) - {"huge.py", "big.py"})
+
+def test_schedule_tasks_keeps_order_and_reports_stats(tmp_path):
+    paths = []
+    for i, size in enumerate([10, 80_000, 20, 40_000]):
+        path = tmp_path / f"m{i}.py"
+        path.write_text("x = 1\n" + "#" * size + "\n")
+        paths.append(str(path))
+    results, stats = schedule_tasks(len, paths, jobs=2)
+    assert results == [ len(path) for path in paths ]
+    assert stats["files"] == 4 and stats["workers"] == 2 and stats["batches"] == 3
+    assert sum(worker["files"] for worker in stats["per_worker"].values()) == 4
+    assert stats["wait_max"] >= stats["wait_mean"] >= 0.0
+
+def test_jobs_output_matches_serial(tmp_path):
+    pkg = tmp_path / "pkg"
+    pkg.mkdir()
+    (pkg / "__init__.py").write_text("from .a import f\nfrom .b import g\n")
+    (pkg / "a.py").write_text("def f():\n    return 1\n")
+    (pkg / "b.py").write_text("def g():\n    return 2\n" + "\n".join(f"v{i} = {i}" for i in range(5000)) + "\n")
+
+    def flatten(*options):
+        stderr = io.StringIO()
+        with contextlib.redirect_stdout(io.StringIO()) as stdout, contextlib.redirect_stderr(stderr):
+            assert main(["pyonetrue", "-M", *options, str(pkg)]) == 0
+        return stdout.getvalue(), stderr.getvalue()
+
+    serial, _ = flatten()
+    parallel, stderr = flatten("-j", "2", "--schedule-stats")
+    assert parallel == serial
+    assert "[INFO] parse: 3 files in 2 batches on 2 workers" in stderr
+    assert "queue wait" in stderr and "s busy" in stderr
@@ -0,0 +1,60 @@
+import os
+import sys
+import marshal
+import subprocess
+import pytest
+
+from pyonetrue import main, sfx_text, write_sfx, CLIOptionError
+
+SOURCE = "import os\nprint(__name__, os.path.basename(__file__))\n" + "# padding\n" * 200
+
+def run(script, env=None, *args):
+    return subprocess.run([sys.executable, str(script), *args], capture_output=True, text=True,
+                          env=dict(os.environ, **(env or {})))
+
+@pytest.mark.parametrize("compression", ["lzma", "zlib", "zlib:1"])
+def test_sfx_runs_with_script_semantics(tmp_path, compression):
+    script = write_sfx(tmp_path / "tool", SOURCE, "tool", compression)
+    assert os.path.getsize(script) < len(SOURCE)
+    assert run(script).stdout == "__main__ tool\n"
+
+def test_sfx_imports_with_module_semantics(tmp_path):
+    (tmp_path / "tool.py").write_text(sfx_text("VALUE = __name__, __file__\n", "tool"))
+    sys.path.insert(0, str(tmp_path))
+    try:
+        import tool
+        assert tool.VALUE == ("tool", str(tmp_path / "tool.py"))
+        # The stub leaves none of its names in the program's namespace
+        assert not [ name for name in vars(tool) if "pyonetrue" in name ]
+    finally:
+        sys.path.remove(str(tmp_path))
+        sys.modules.pop("tool", None)
+
+def test_sfx_caches_compiled_code(tmp_path):
+    cache = tmp_path / "cache"
+    script = write_sfx(tmp_path / "tool", SOURCE, "tool", cache=True)
+    env = {"PYONETRUE_SFX_CACHE": str(cache)}
+    assert run(script, env).stdout == "__main__ tool\n"
+    [entry] = os.listdir(cache)
+    # Later runs execute the cached code object
+    with open(cache / entry, "wb") as f:
+        marshal.dump(compile("print('cached')", "x", "exec"), f)
+    assert run(script, env).stdout == "cached\n"
+
+def test_sfx_rejects_unknown_compression():
+    with pytest.raises(ValueError):
+        sfx_text(SOURCE, "tool", "bzip2")
+
+def test_cli_sfx(tmp_path):
+    src = tmp_path / "mod.py"
+    src.write_text("def x():\n    print('ran')\nif __name__ == '__main__':\n    x()\n")
+    out = tmp_path / "mod"
+    assert main(["pyonetrue", str(src), "--all-guards", "--format", "sfx",
+                 "--compression", "zlib:9", "--output", str(out)]) == 0
+    assert out.read_text().startswith("#!/usr/bin/env python3\n# Self-extracting mod:")
+    assert run(out).stdout == "ran\n"
+    with pytest.raises(CLIOptionError):
+        main(["pyonetrue", str(src), "--format", "sfx", "--compression", "deflated",
+              "--output", str(out)])
+    with pytest.raises(CLIOptionError):
+        main(["pyonetrue", str(src), "--sfx-cache", "--output", str(out)])
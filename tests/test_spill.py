@@ -0,0 +1,60 @@
+import pytest
+
+from pyonetrue import main, FlatteningContext, SpilledSpan, parse_memory_size, CLIOptionError
+
+MODULES = {
+    "__init__.py": '"""The package."""\nfrom .util import helper\n',
+    "util.py": "import os\n\ndef helper():\n    return os.sep\n",
+    "sub/__init__.py": "",
+    "sub/more.py": "from ..util import helper\n\ndef more():\n    return helper()\n\nTABLE = more()\n",
+}
+
+def make_package(tmp_path):
+    root = tmp_path / "pkg"
+    for name, text in MODULES.items():
+        (root / name).parent.mkdir(parents=True, exist_ok=True)
+        (root / name).write_text(text)
+    return root
+
+def flatten(path, **kwargs):
+    ctx = FlatteningContext(package_path=str(path), module_only=True, **kwargs)
+    ctx.discover_modules()
+    return ctx, "".join(span.text for span in ctx.get_final_output_spans())
+
+def test_parse_memory_size():
+    assert parse_memory_size("1024") == 1024
+    assert parse_memory_size("64K") == 64 * 1024
+    assert parse_memory_size("1.5g") == 3 * 1024 ** 3 // 2
+    with pytest.raises(ValueError):
+        parse_memory_size("lots")
+
+def test_spilled_output_is_unchanged(tmp_path):
+    root = make_package(tmp_path)
+    _, expected = flatten(root)
+    ctx, text = flatten(root, max_memory=60)
+    spilled = [ span for _, spans in ctx.module_spans for span in spans if isinstance(span, SpilledSpan) ]
+    assert spilled and len(spilled) < sum(len(spans) for _, spans in ctx.module_spans)
+    assert text == expected
+
+def test_max_memory_counts_bytes(tmp_path):
+    root = tmp_path / "pkg"
+    root.mkdir()
+    text = 'GREETING = "\u00e9t\u00e9"\n'
+    (root / "__init__.py").write_text(text, encoding="utf-8")
+    # Fits in characters, not in bytes
+    ctx, _ = flatten(root, max_memory=len(text))
+    assert ctx.resident_bytes == 0
+    ctx, _ = flatten(root, max_memory=len(text.encode("utf-8")))
+    assert ctx.resident_bytes == len(text.encode("utf-8"))
+
+def test_cli_max_memory(tmp_path):
+    root = make_package(tmp_path)
+    plain, spilled = tmp_path / "plain.py", tmp_path / "spilled.py"
+    assert main(["pyonetrue", "-M", "-o", str(plain), str(root)]) == 0
+    assert main(["pyonetrue", "-M", "-o", str(spilled), "--max-memory", "0", str(root)]) == 0
+    assert spilled.read_text() == plain.read_text()
+    assert main(["pyonetrue", "-M", "--is-fresh", str(spilled)]) == 0
+    with pytest.raises(CLIOptionError):
+        main(["pyonetrue", "-M", "--minify", "--max-memory", "1M", str(root)])
+    with pytest.raises(CLIOptionError, match="--jobs"):
+        main(["pyonetrue", "-M", "--jobs", "2", "--max-memory", "1M", str(root)])
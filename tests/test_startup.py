@@ -0,0 +1,39 @@
+import os
+import sys
+import subprocess
+from pyonetrue.vendor.pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+# Generous, the point is to catch a heavy import creeping back in
+STARTUP_BUDGET_US = 150_000
+
+def imported_modules(args):
+    """Run `python -X importtime -m pyonetrue <args>`, return {module: cumulative_us}."""
+    env = dict(os.environ, PYTHONPATH=str(SRC))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "pyonetrue", *args],
+        env=env, capture_output=True, text=True,
+    )
+    assert result.returncode == 0, result.stderr
+    modules = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                modules[name.strip()] = int(cumulative)
+    return modules
+
+def test_version_imports_only_the_cli():
+    modules = imported_modules(["--version"])
+    loaded = { name for name in modules if name.startswith("pyonetrue") }
+    assert loaded == {"pyonetrue", "pyonetrue.cli", "pyonetrue.exceptions"}
+    assert modules["pyonetrue"] < STARTUP_BUDGET_US
+
+def test_single_file_flatten_skips_entry_point_discovery(tmp_path):
+    src = tmp_path / "mod.py"
+    src.write_text("def x(): pass\n")
+    modules = imported_modules([str(src)])
+    for heavy in ("importlib.metadata", "tomllib", "configparser", "subprocess",
+                  "hashlib", "pyonetrue.cache", "pyonetrue.profile_startup"):
+        assert heavy not in modules
@@ -7,6 +7,7 @@ from pyonetrue.vendor.pathlib import Path
 from pyonetrue import main
 from pyonetrue import FlatteningContext
 from pyonetrue import extract_spans, Span
+from pyonetrue import normalize_imports
 
 DEBUG = False
 
@@ -30,3 +31,16 @@ def test_stress_large_dir(tmp_path):
     res = run_cli(tmp_path, [str(tmp_path)])
     assert res.returncode == 0
     assert res.stdout.count('def f') == 200
+
+def test_stress_many_import_aliases():
+    spans = []
+    for i in range(20000):
+        spans.append(Span(f"from mod{i % 500} import a{i}, b{i} as c{i}, d{i % 500}\n", "import"))
+        spans.append(Span(f"import pkg{i % 1000}\n", "import"))
+        spans.append(Span("import os\n", "import"))
+    output, names = normalize_imports("pkg", spans)
+    text = "".join(s.text for s in output)
+    assert len(names) == 20000 * 2 + 500 + 1000 + 1
+    assert text.startswith("import os\n\n")
+    assert text.count("import pkg") == 1000
+    assert "    b19999 as c19999,\n" in text
@@ -7,7 +7,9 @@ import pytest
 
 @pytest.mark.skipif(os.getenv("PYONETRUE_ROUND_TRIP"), reason="Never runs in round-trip mode")
 @pytest.mark.skipif(not Path("scripts/runner").exists(), reason="Flattening script not present")
-def test_round_trip_flatten_and_run_tests():
+@pytest.mark.parametrize("options", [[], ["--minify"], ["--dedupe-logic"]],
+                         ids=["plain", "minify", "dedupe-logic"])
+def test_round_trip_flatten_and_run_tests(options):
     root = Path(__file__).resolve().parent.parent
 
     src_dir = root / "src"
@@ -21,7 +23,7 @@ def test_round_trip_flatten_and_run_tests():
     print(f"\n*** Flattening to: {output_file}")
 
     result = subprocess.run([
-        "scripts/runner", "src/pyonetrue", "--module-only", "--output", str(output_file),
+        "scripts/runner", "src/pyonetrue", "--module-only", "--output", str(output_file), *options,
     ], cwd=root, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
     assert result.returncode == 0, f"Flattening failed:\n{result.stdout}"
 